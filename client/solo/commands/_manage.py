@@ -557,9 +557,11 @@ class SoloManage(SoloCommand):
         return run_queue, removal_queue
 
     def _download_packages(self, entropy_client, package_matches,
-                           downdata, multifetch=1):
+                           downdata, multifetch=1, fetched_function=None):
         """
         Download packages from mirrors, essentially.
+        If fetched_function is given, it is called (from any thread) with
+        each package match whose files have been fetched and verified.
         """
         # read multifetch parameter from config if needed.
         client_settings = entropy_client.ClientSettings()
@@ -597,7 +599,8 @@ class SoloManage(SoloCommand):
                 try:
                     pkg = action_factory.get(
                         action_factory.MULTI_FETCH_ACTION,
-                        matches)
+                        matches,
+                        opts={'fetched_function': fetched_function})
 
                     xterm_header = "equo (%s) :: %d of %d ::" % (
                         _("download"), count, total)
@@ -654,6 +657,8 @@ class SoloManage(SoloCommand):
                 exit_st = pkg.start()
                 if exit_st != 0:
                     return 1
+                if fetched_function is not None:
+                    fetched_function(match)
 
             finally:
                 if pkg is not None:
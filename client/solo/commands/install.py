@@ -565,96 +565,105 @@ Install or update packages or package files.
             if exit_st != 0:
                 return 1, False
 
-        ugc_thread = None
-        down_data = {}
-        exit_st = self._download_packages(
-            entropy_client, run_queue, down_data, multifetch)
-        if exit_st == 0:
-            ugc_thread = ParallelTask(
-                self._signal_ugc, entropy_client, down_data)
-            ugc_thread.name = "UgcThread"
-            ugc_thread.start()
-
-        elif exit_st != 0:
-            return 1, False
-
-        # is --fetch on? then quit.
-        if fetch:
-            if ugc_thread is not None:
-                ugc_thread.join()
-            entropy_client.output(
-                "%s." % (
-                    blue(_("Download complete")),),
-                header=darkred(" @@ "))
-            return 0, False
-
-        notification_lock = UpdatesNotificationResourceLock(
-            output=entropy_client)
         package_set = set(packages)
-        total = len(run_queue)
-
-        notif_acquired = False
-        try:
-            # this is a best effort, we will not sleep if the lock
-            # is not acquired because we may get blocked for an eternity
-            # (well, for a very long time) in this scenario:
-            # 1. RigoDaemon is running some action queue
-            # 2. Another thread in RigoDaemon is stuck on the activity
-            #    mutex with the notification lock held.
-            # 3. We cannot move on here because of 2.
-            # Nothing bad will happen if we just ignore the acquisition
-            # state.
-            notif_acquired = notification_lock.try_acquire_shared()
-
-            for count, pkg_match in enumerate(run_queue, 1):
-
-                metaopts = {
-                    'removeconfig': config_files,
-                }
-
-                if onlydeps:
-                    metaopts['install_source'] = \
-                        etpConst['install_sources']['automatic_dependency']
-                elif pkg_match in package_set:
-                    metaopts['install_source'] = \
-                        etpConst['install_sources']['user']
-                else:
-                    metaopts['install_source'] = \
-                        etpConst['install_sources']['automatic_dependency']
-
-                package_id, repository_id = pkg_match
-                atom = entropy_client.open_repository(
-                    repository_id).retrieveAtom(package_id)
-
-                pkg = None
-                try:
-                    pkg = action_factory.get(
-                        action_factory.INSTALL_ACTION,
-                        pkg_match, opts=metaopts)
+        metaopts_map = {}
+        for pkg_match in run_queue:
+
+            metaopts = {
+                'removeconfig': config_files,
+            }
+
+            if onlydeps:
+                metaopts['install_source'] = \
+                    etpConst['install_sources']['automatic_dependency']
+            elif pkg_match in package_set:
+                metaopts['install_source'] = \
+                    etpConst['install_sources']['user']
+            else:
+                metaopts['install_source'] = \
+                    etpConst['install_sources']['automatic_dependency']
 
-                    xterm_header = "equo (%s) :: %d of %d ::" % (
-                        _("install"), count, total)
+            metaopts_map[pkg_match] = metaopts
 
-                    pkg.set_xterm_header(xterm_header)
+        # package files are verified while being downloaded and unpacked
+        # ahead by the pipeline, as soon as they are available, if enabled
+        # in client.conf (unpack-workers). Nothing to unpack with --fetch.
+        workers = None
+        if fetch:
+            workers = 0
+        pipeline = action_factory.install_pipeline(
+            run_queue, opts_map=metaopts_map, workers=workers,
+            fetching=True)
+
+        with pipeline:
+            ugc_thread = None
+            down_data = {}
+            exit_st = self._download_packages(
+                entropy_client, run_queue, down_data, multifetch,
+                fetched_function=pipeline.fetched)
+            if exit_st == 0:
+                ugc_thread = ParallelTask(
+                    self._signal_ugc, entropy_client, down_data)
+                ugc_thread.name = "UgcThread"
+                ugc_thread.start()
+
+            elif exit_st != 0:
+                return 1, False
 
-                    entropy_client.output(
-                        purple(atom),
-                        count=(count, total),
-                        header=darkgreen(" +++ ") + ">>> ")
-
-                    exit_st = pkg.start()
-                    if exit_st != 0:
-                        if ugc_thread is not None:
-                            ugc_thread.join()
-                        return 1, True
-
-                finally:
-                    if pkg is not None:
-                        pkg.finalize()
-
-        finally:
-            if notif_acquired:
-                notification_lock.release()
+            # is --fetch on? then quit.
+            if fetch:
+                if ugc_thread is not None:
+                    ugc_thread.join()
+                entropy_client.output(
+                    "%s." % (
+                        blue(_("Download complete")),),
+                    header=darkred(" @@ "))
+                return 0, False
+
+            notification_lock = UpdatesNotificationResourceLock(
+                output=entropy_client)
+            total = len(run_queue)
+
+            notif_acquired = False
+            try:
+                # this is a best effort, we will not sleep if the lock
+                # is not acquired because we may get blocked for an
+                # eternity (well, for a very long time) in this scenario:
+                # 1. RigoDaemon is running some action queue
+                # 2. Another thread in RigoDaemon is stuck on the activity
+                #    mutex with the notification lock held.
+                # 3. We cannot move on here because of 2.
+                # Nothing bad will happen if we just ignore the acquisition
+                # state.
+                notif_acquired = notification_lock.try_acquire_shared()
+
+                with action_factory.deferred_triggers():
+                    for count, pkg in enumerate(pipeline, 1):
+
+                        try:
+                            atom = pkg.atom()
+                            xterm_header = "equo (%s) :: %d of %d ::" % (
+                                _("install"), count, total)
+
+                            pkg.set_xterm_header(xterm_header)
+
+                            entropy_client.output(
+                                purple(atom),
+                                count=(count, total),
+                                header=darkgreen(" +++ ") + ">>> ")
+
+                            exit_st = pkg.start()
+                            if exit_st != 0:
+                                if ugc_thread is not None:
+                                    ugc_thread.join()
+                                return 1, True
+
+                        finally:
+                            pkg.finalize()
+
+            finally:
+                if notif_acquired:
+                    notification_lock.release()
 
         if ugc_thread is not None:
             ugc_thread.join()
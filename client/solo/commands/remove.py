@@ -172,33 +172,34 @@ Remove previously installed packages from system.
 
         action_factory = entropy_client.PackageActionFactory()
 
-        for count, (atom, package_id) in enumerate(final_queue, 1):
+        with action_factory.deferred_triggers():
+            for count, (atom, package_id) in enumerate(final_queue, 1):
 
-            metaopts = {}
-            metaopts['removeconfig'] = remove_config_files
-            pkg = None
-            try:
-                pkg = action_factory.get(
-                    action_factory.REMOVE_ACTION,
-                    (package_id, inst_repo.repository_id()),
-                    opts=metaopts)
+                metaopts = {}
+                metaopts['removeconfig'] = remove_config_files
+                pkg = None
+                try:
+                    pkg = action_factory.get(
+                        action_factory.REMOVE_ACTION,
+                        (package_id, inst_repo.repository_id()),
+                        opts=metaopts)
 
-                xterm_header = "equo (%s) :: %d of %d ::" % (
-                    _("removal"), count, len(final_queue))
-                pkg.set_xterm_header(xterm_header)
+                    xterm_header = "equo (%s) :: %d of %d ::" % (
+                        _("removal"), count, len(final_queue))
+                    pkg.set_xterm_header(xterm_header)
 
-                entropy_client.output(
-                    darkgreen(atom),
-                    count=(count, len(final_queue)),
-                    header=darkred(" --- ") + ">>> ")
+                    entropy_client.output(
+                        darkgreen(atom),
+                        count=(count, len(final_queue)),
+                        header=darkred(" --- ") + ">>> ")
 
-                exit_st = pkg.start()
-                if exit_st != 0:
-                    return 1
+                    exit_st = pkg.start()
+                    if exit_st != 0:
+                        return 1
 
-            finally:
-                if pkg is not None:
-                    pkg.finalize()
+                finally:
+                    if pkg is not None:
+                        pkg.finalize()
 
         entropy_client.output(
             "%s." % (blue(_("All done")),),
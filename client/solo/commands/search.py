@@ -118,7 +118,8 @@ Search for packages.
         """
         Search method, returns search results.
         """
-        search_data = set()
+        # package match -> relevance, lower is better
+        search_data = {}
         found = False
 
         def _adv_search(dbconn, package):
@@ -126,23 +127,32 @@ Search for packages.
             tag = entropy.dep.dep_gettag(package)
             package = entropy.dep.remove_slot(package)
             package = entropy.dep.remove_tag(package)
-            pkg_ids = set(dbconn.searchPackages(
+            if not (slot or tag) and dbconn.isSearchIndexAvailable():
+                pkg_ids = dbconn.searchPackagesRanked(
+                    package, just_id = True, description = False)
+                pkg_ids = dict((x, rank) for rank, x in enumerate(pkg_ids))
+            else:
+                pkg_ids = dict((x, 0) for x in dbconn.searchPackages(
                     package, slot = slot,
                     tag = tag, just_id = True, order_by = "atom"))
             if not pkg_ids: # look for something else?
                 pkg_id, _rc = dbconn.atomMatch(
                     package, matchSlot = slot)
                 if pkg_id != -1:
-                    pkg_ids.add(pkg_id)
+                    pkg_ids[pkg_id] = 0
             return pkg_ids
 
+        def _add(pkg_ids, repo):
+            for pkg_id, rank in pkg_ids.items():
+                search_data[(pkg_id, repo)] = rank
+
         if not self._installed:
             for repo in entropy_client.repositories():
                 dbconn = entropy_client.open_repository(repo)
                 pkg_ids = _adv_search(dbconn, string)
                 if pkg_ids:
                     found = True
-                search_data.update(((x, repo) for x in pkg_ids))
+                _add(pkg_ids, repo)
 
         # try to actually match something in installed packages db
         if not found and (inst_repo is not None) \
@@ -151,12 +161,12 @@ Search for packages.
                 pkg_ids = _adv_search(inst_repo, string)
             if pkg_ids:
                 found = True
-            search_data.update(
-                ((x, inst_repo.repository_id()) for x in pkg_ids))
+            _add(pkg_ids, inst_repo.repository_id())
 
+        # best ranked first, then in atom order
         with inst_repo.shared():
-            key_sorter = lambda x: \
-                entropy_client.open_repository(x[1]).retrieveAtom(x[0])
+            key_sorter = lambda x: (search_data[x],
+                entropy_client.open_repository(x[1]).retrieveAtom(x[0]))
             return sorted(search_data, key=key_sorter)
 
     @sharedlock
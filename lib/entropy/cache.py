@@ -17,13 +17,19 @@
 """
 import os
 import errno
+import fcntl
 import hashlib
+import mmap
+import stat
+import struct
 import sys
 import tempfile
+import zlib
 
 from entropy.const import etpConst, const_debug_write, \
     const_debug_enabled, const_pid_exists, const_setup_perms, \
-    const_mkdtemp
+    const_setup_file, const_mkdtemp, const_mkstemp, \
+    const_convert_to_rawstring
 from entropy.core import Singleton
 from entropy.misc import TimeScheduled, ParallelTask, Lifo
 import time
@@ -33,6 +39,310 @@ import copy
 import entropy.dump
 import entropy.tools
 
+class CacheStore(object):
+
+    """
+    Single file, append-only, on-disk object store.
+
+    Objects are pickled and appended to a log file whose header carries
+    a generation string (for instance, a repository checksum). The log
+    is memory mapped and indexed in RAM by key digest, so that a cache
+    hit does not cost any system call: the file is only looked at again
+    when a key is missing and another process may have extended it.
+
+    Opening a store with a different generation unlinks the stale file,
+    thus cache invalidation always boils down to a single unlink().
+
+    Sample code:
+
+    >>> from entropy.cache import CacheStore
+    >>> store = CacheStore("/tmp/foo" + CacheStore.EXT, "generation-1")
+    >>> store.put("my_identifier", [1, 2, 3])
+    >>> store.get("my_identifier")
+    [1, 2, 3]
+    >>> store.close()
+    """
+
+    # file extension of the on-disk stores
+    EXT = ".estore"
+
+    # once the log grows past this size, it is dropped and recreated
+    MAX_SIZE = 64 * 1024 * 1024
+
+    _MAGIC = const_convert_to_rawstring("ENTROPY_CACHE_STORE_1\n")
+    _GENERATION = struct.Struct("<I")
+    # key digest, data length, data crc32
+    _RECORD = struct.Struct("<20sII")
+
+    def __init__(self, path, generation):
+        """
+        CacheStore constructor.
+
+        @param path: path to the store file
+        @type path: string
+        @param generation: generation identifier, if the on-disk store
+            has been written for a different generation, it is discarded
+        @type generation: string
+        @raise IOError: if the store cannot be opened nor created
+        @raise OSError: if the store cannot be opened nor created
+        """
+        object.__init__(self)
+        self._path = path
+        self._generation = generation
+        self._lock = threading.RLock()
+        self._fd = None
+        self._map = None
+        self._writable = False
+        self._offset = 0
+        self._index = {}
+        self._open()
+
+    @property
+    def path(self):
+        """
+        Return the path to the store file.
+        """
+        return self._path
+
+    @property
+    def generation(self):
+        """
+        Return the store generation identifier.
+        """
+        return self._generation
+
+    def _header(self):
+        """
+        Return the raw header of the store file.
+        """
+        generation = const_convert_to_rawstring(self._generation)
+        return self._MAGIC + self._GENERATION.pack(
+            len(generation)) + generation
+
+    def _create(self, header):
+        """
+        Atomically create a new, empty, store file.
+        """
+        store_dir = os.path.dirname(self._path)
+        d_paths = []
+        my_dir = store_dir
+        while not os.path.isdir(my_dir):
+            d_paths.append(my_dir)
+            my_dir = os.path.dirname(my_dir)
+        for d_path in sorted(d_paths):
+            try:
+                os.mkdir(d_path)
+            except OSError as err:
+                if err.errno != errno.EEXIST:
+                    raise
+                continue
+            const_setup_file(d_path, entropy.dump.E_GID, 0o775)
+
+        tmp_fd, tmp_path = const_mkstemp(
+            dir=store_dir, prefix=os.path.basename(self._path))
+        try:
+            os.write(tmp_fd, header)
+            const_setup_file(tmp_path, entropy.dump.E_GID, 0o664)
+            os.rename(tmp_path, self._path)
+            tmp_path = None
+        finally:
+            os.close(tmp_fd)
+            if tmp_path is not None:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+    def _open(self):
+        """
+        Open (or create) the store file and load its index.
+        """
+        header = self._header()
+        for attempt in (False, True):
+            writable = True
+            try:
+                fd = os.open(self._path, os.O_RDWR | os.O_APPEND)
+            except OSError as err:
+                if err.errno in (errno.EACCES, errno.EPERM, errno.EROFS):
+                    writable = False
+                    fd = os.open(self._path, os.O_RDONLY)
+                elif err.errno == errno.ENOENT and not attempt:
+                    self._create(header)
+                    continue
+                else:
+                    raise
+
+            os.lseek(fd, 0, os.SEEK_SET)
+            if os.read(fd, len(header)) == header:
+                break
+
+            # stale generation or garbage
+            os.close(fd)
+            if attempt:
+                raise IOError(errno.EINVAL,
+                    "invalid cache store", self._path)
+            self._create(header)
+
+        self._fd = fd
+        self._writable = writable
+        self._offset = len(header)
+        self._index.clear()
+        self._refresh()
+
+    def _refresh(self):
+        """
+        Map the records appended to the log since the last call and
+        add them to the index.
+        """
+        size = os.fstat(self._fd).st_size
+        if self._map is not None and size <= len(self._map):
+            return
+
+        if self._map is not None:
+            self._map.close()
+        self._map = mmap.mmap(self._fd, size, access = mmap.ACCESS_READ)
+
+        offset = self._offset
+        record_size = self._RECORD.size
+        while offset + record_size <= size:
+            digest, length, crc = self._RECORD.unpack_from(self._map, offset)
+            data_offset = offset + record_size
+            if data_offset + length > size:
+                # record is still being written
+                break
+            self._index[digest] = (data_offset, length, crc)
+            offset = data_offset + length
+        self._offset = offset
+
+    def _reset(self):
+        """
+        Drop the current store file and create a new, empty one.
+        """
+        self._close()
+        try:
+            os.remove(self._path)
+        except OSError as err:
+            if err.errno != errno.ENOENT:
+                raise
+        self._open()
+
+    def _close(self):
+        """
+        Close the memory map and the file descriptor, without locking.
+        """
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        self._index.clear()
+
+    @staticmethod
+    def _digest(key):
+        """
+        Return the binary digest of the given key.
+        """
+        return hashlib.sha1(const_convert_to_rawstring(key)).digest()
+
+    def get(self, key):
+        """
+        Retrieve the object stored with the given key.
+
+        @param key: cache data identifier
+        @type key: string
+        @return: the stored object or None, if not found
+        @rtype: any picklable object
+        """
+        digest = self._digest(key)
+        with self._lock:
+            if self._fd is None:
+                return None
+
+            entry = self._index.get(digest)
+            if entry is None:
+                try:
+                    self._refresh()
+                except (IOError, OSError, ValueError,
+                        EnvironmentError):
+                    return None
+                entry = self._index.get(digest)
+                if entry is None:
+                    return None
+
+            offset, length, crc = entry
+            data = self._map[offset:offset + length]
+
+        if (zlib.crc32(data) & 0xffffffff) != crc:
+            # torn write, can't trust the log anymore
+            with self._lock:
+                if self._writable:
+                    try:
+                        self._reset()
+                    except (IOError, OSError):
+                        pass
+            return None
+
+        try:
+            return entropy.dump.unserialize_string(data)
+        except (ValueError, EOFError, IOError, OSError,
+            entropy.dump.pickle.UnpicklingError, TypeError,
+            AttributeError, ImportError, SystemError,):
+            return None
+
+    def put(self, key, obj):
+        """
+        Store the given object with the given key. If the store file
+        is not writable, the call is silently ignored.
+
+        @param key: cache data identifier
+        @type key: string
+        @param obj: picklable object
+        @type obj: any picklable object
+        @raise IOError: if data cannot be written
+        @raise OSError: if data cannot be written
+        """
+        data = entropy.dump.serialize_string(obj)
+        record = self._RECORD.pack(
+            self._digest(key), len(data),
+            zlib.crc32(data) & 0xffffffff) + data
+
+        with self._lock:
+            if self._fd is None or not self._writable:
+                return
+
+            if self._offset + len(record) > self.MAX_SIZE:
+                self._reset()
+
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                while record:
+                    written = os.write(self._fd, record)
+                    record = record[written:]
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            self._refresh()
+
+    def close(self):
+        """
+        Close the store. Further get() calls will return None.
+        """
+        with self._lock:
+            self._close()
+
+    def remove(self):
+        """
+        Close the store and unlink its file, invalidating it.
+        """
+        with self._lock:
+            self._close()
+            try:
+                os.remove(self._path)
+            except OSError as err:
+                if err.errno != errno.ENOENT:
+                    raise
+
+
 class EntropyCacher(Singleton):
 
     # Max number of cache objects written at once
@@ -104,6 +414,8 @@ class EntropyCacher(Singleton):
         self.__cache_writer = None
         self.__cache_buffer = Lifo()
         self.__stashing_cache = {}
+        self.__stores = {}
+        self.__stores_lock = threading.Lock()
         self.__inside_with_stmt = 0
         self.__dump_data_lock = threading.Lock()
         self.__worker_sem = threading.Semaphore(0)
@@ -171,7 +483,10 @@ class EntropyCacher(Singleton):
                 pass
 
         def _commit_data(_massive_data):
-            for (key, cache_dir), data in _massive_data:
+            for (key, cache_dir, store, generation), data in _massive_data:
+                if store is not None:
+                    self.__store_put(key, data, cache_dir, store, generation)
+                    continue
                 d_o = entropy.dump.dumpobj
                 if d_o is not None:
                     d_o(key, data, dump_dir = cache_dir)
@@ -223,9 +538,9 @@ class EntropyCacher(Singleton):
                             task, len(massive_data),))
 
                 if EntropyCacher.STASHING_CACHE:
-                    for (key, cache_dir), data in massive_data:
+                    for stash_key, data in massive_data:
                         try:
-                            del self.__stashing_cache[(key, cache_dir)]
+                            del self.__stashing_cache[stash_key]
                         except (AttributeError, KeyError,):
                             continue
                 del massive_data[:]
@@ -305,8 +620,60 @@ class EntropyCacher(Singleton):
         """
         self.__cache_buffer.clear()
         self.__stashing_cache.clear()
+        self.close_stores()
+
+    def __store(self, cache_dir, store, generation):
+        """
+        Return the CacheStore object for the given store name and
+        generation, opening (and invalidating, if stale) it if needed.
+        Return None if the store cannot be opened.
+        """
+        path = os.path.join(cache_dir, store) + CacheStore.EXT
+        with self.__stores_lock:
+            store_obj = self.__stores.get(path)
+            if store_obj is not None:
+                if store_obj.generation == generation:
+                    return store_obj
+                store_obj.close()
+                del self.__stores[path]
 
-    def save(self, key, data, cache_dir = None):
+            try:
+                store_obj = CacheStore(path, generation)
+            except (IOError, OSError, ValueError,
+                    mmap.error, EnvironmentError) as err:
+                if const_debug_enabled():
+                    const_debug_write(__name__,
+                        "EntropyCacher: cannot open store %s: %s" % (
+                            path, repr(err),))
+                return None
+            self.__stores[path] = store_obj
+            return store_obj
+
+    def __store_put(self, key, data, cache_dir, store, generation):
+        """
+        Write data to the given store, ignoring I/O errors.
+        """
+        store_obj = self.__store(cache_dir, store, generation)
+        if store_obj is None:
+            return
+        try:
+            store_obj.put(key, data)
+        except (IOError, OSError, ValueError, mmap.error,
+                entropy.dump.pickle.PicklingError):
+            pass
+
+    def close_stores(self):
+        """
+        Close all the CacheStore objects opened so far. They will be
+        reopened from disk on demand.
+        """
+        with self.__stores_lock:
+            for store_obj in self.__stores.values():
+                store_obj.close()
+            self.__stores.clear()
+
+    def save(self, key, data, cache_dir = None, store = None,
+             generation = None):
         """
         Save data object to cache asynchronously and in any case.
         This method guarantees that cached data is stored even if cacher
@@ -318,9 +685,28 @@ class EntropyCacher(Singleton):
         @type data: any picklable object
         @keyword cache_dir: alternative cache directory
         @type cache_dir: string
+        @keyword store: if given, data is appended to the CacheStore
+            with this name (relative to cache_dir), see push()
+        @type store: string
+        @keyword generation: CacheStore generation identifier
+        @type generation: string
         """
         if cache_dir is None:
             cache_dir = self.current_directory()
+
+        if store is not None:
+            store_obj = self.__store(cache_dir, store, generation)
+            if store_obj is None:
+                raise IOError("cannot open store %s in %s" % (
+                    store, cache_dir))
+            try:
+                store_obj.put(key, data)
+            except (IOError, OSError, ValueError, mmap.error,
+                    entropy.dump.pickle.PicklingError) as err:
+                raise IOError("cannot store %s to %s. err: %s" % (
+                    key, store, repr(err)))
+            return
+
         try:
             with self.__dump_data_lock:
                 entropy.dump.dumpobj(key, data, dump_dir = cache_dir,
@@ -329,7 +715,8 @@ class EntropyCacher(Singleton):
             raise IOError("cannot store %s to %s. err: %s" % (
                 key, cache_dir, repr(err)))
 
-    def push(self, key, data, async = True, cache_dir = None):
+    def push(self, key, data, async = True, cache_dir = None,
+             store = None, generation = None):
         """
         This is the place where data is either added
         to the write queue or written to disk (if async == False)
@@ -343,6 +730,13 @@ class EntropyCacher(Singleton):
         @type async: bool
         @keyword cache_dir: alternative cache directory
         @type cache_dir: string
+        @keyword store: if given, data is appended to the CacheStore
+            with this name (relative to cache_dir) instead of being
+            written to its own file
+        @type store: string
+        @keyword generation: CacheStore generation identifier, a store
+            written for a different generation is discarded
+        @type generation: string
         """
         if not self.__alive:
             return
@@ -353,10 +747,11 @@ class EntropyCacher(Singleton):
         if async:
             try:
                 obj_copy = self.__copy_obj(data)
-                self.__cache_buffer.push(((key, cache_dir,), obj_copy,))
+                stash_key = (key, cache_dir, store, generation)
+                self.__cache_buffer.push((stash_key, obj_copy,))
                 self.__worker_sem.release()
                 if EntropyCacher.STASHING_CACHE:
-                    self.__stashing_cache[(key, cache_dir)] = obj_copy
+                    self.__stashing_cache[stash_key] = obj_copy
             except TypeError:
                 # sometimes, very rarely, copy.deepcopy() is unable
                 # to properly copy an object (blame Python bug)
@@ -372,10 +767,14 @@ class EntropyCacher(Singleton):
             #    const_debug_write(__name__,
             #        "EntropyCacher.push, sync push %s, into %s" % (
             #            key, cache_dir,))
+            if store is not None:
+                self.__store_put(key, data, cache_dir, store, generation)
+                return
             with self.__dump_data_lock:
                 entropy.dump.dumpobj(key, data, dump_dir = cache_dir)
 
-    def pop(self, key, cache_dir = None, aging_days = None):
+    def pop(self, key, cache_dir = None, aging_days = None,
+            store = None, generation = None):
         """
         This is the place where data is retrieved from cache.
         You must know the cache identifier used when push()
@@ -385,6 +784,14 @@ class EntropyCacher(Singleton):
         @type key: string
         @keyword cache_dir: alternative cache directory
         @type cache_dir: string
+        @keyword aging_days: if int, consider the cached object invalid
+            if older than aging_days (ignored for CacheStore objects)
+        @type aging_days: int
+        @keyword store: CacheStore name (relative to cache_dir) data has
+            been pushed to, if any
+        @type store: string
+        @keyword generation: CacheStore generation identifier
+        @type generation: string
         @rtype: Python object
         @return: object stored into the stack or None (if stack is empty)
         """
@@ -393,10 +800,17 @@ class EntropyCacher(Singleton):
 
         if EntropyCacher.STASHING_CACHE:
             # object is being saved on disk, it's in RAM atm
-            ram_obj = self.__stashing_cache.get((key, cache_dir))
+            ram_obj = self.__stashing_cache.get(
+                (key, cache_dir, store, generation))
             if ram_obj is not None:
                 return ram_obj
 
+        if store is not None:
+            store_obj = self.__store(cache_dir, store, generation)
+            if store_obj is None:
+                return None
+            return store_obj.get(key)
+
         l_o = entropy.dump.loadobj
         if not l_o:
             return
@@ -420,7 +834,8 @@ class EntropyCacher(Singleton):
         for currentdir, subdirs, files in os.walk(dump_dir):
             path = os.path.join(dump_dir, currentdir)
             for item in files:
-                if item.endswith(entropy.dump.D_EXT):
+                if item.endswith(entropy.dump.D_EXT) or \
+                        item.endswith(CacheStore.EXT):
                     item = os.path.join(path, item)
                     try:
                         os.remove(item)
@@ -433,6 +848,142 @@ class EntropyCacher(Singleton):
                 pass
 
 
+class DigestCache(Singleton):
+
+    """
+    Persistent file digests cache, shared by the client and server tools.
+
+    Digests are stored in a CacheStore, keyed by device, inode, size,
+    modification and change time of the files, thus moved or hard linked
+    files are not hashed again, while modified or replaced files are just
+    never looked up again (utime() can restore the mtime, not the ctime).
+    On cache miss, only the missing algorithms are computed and added to
+    the cached ones. Files smaller than MIN_SIZE are not cached at all,
+    hashing them costs as much as a lookup.
+
+    Sample code:
+
+    >>> from entropy.cache import DigestCache
+    >>> DigestCache().digests("/path/to/file", ("md5", "sha256"))
+    {'md5': '...', 'sha256': '...'}
+    """
+
+    MIN_SIZE = 1024 * 1024
+
+    # files modified or changed less than these seconds before being
+    # hashed are not cached, a further write within the same timestamp
+    # granularity would go unnoticed
+    RACY_SECS = 2
+
+    _STORE = "digests"
+    _GENERATION = "digests-2"
+    _READ_SIZE = 1024000
+
+    def init_singleton(self):
+        """
+        Singleton overloaded constructor.
+        """
+        self.__store_lock = threading.Lock()
+        self.__store = None
+        self.__store_path = None
+
+    def __get_store(self):
+        """
+        Return the CacheStore object, or None if it cannot be opened.
+        """
+        path = os.path.join(entropy.dump.D_DIR, self._STORE) + CacheStore.EXT
+        with self.__store_lock:
+            if self.__store_path == path:
+                return self.__store
+
+            if self.__store is not None:
+                self.__store.close()
+            self.__store = None
+            self.__store_path = path
+            try:
+                self.__store = CacheStore(path, self._GENERATION)
+            except (IOError, OSError, ValueError,
+                    mmap.error, EnvironmentError) as err:
+                if const_debug_enabled():
+                    const_debug_write(__name__,
+                        "DigestCache: cannot open store %s: %s" % (
+                            path, repr(err),))
+            return self.__store
+
+    @staticmethod
+    def _key(st):
+        """
+        Return the cache key for the given os.stat() result.
+        """
+        mtime = getattr(st, "st_mtime_ns", None)
+        if mtime is None:
+            mtime = repr(st.st_mtime)
+        ctime = getattr(st, "st_ctime_ns", None)
+        if ctime is None:
+            ctime = repr(st.st_ctime)
+        return "%d:%d:%d:%s:%s" % (
+            st.st_dev, st.st_ino, st.st_size, mtime, ctime)
+
+    @classmethod
+    def _compute(cls, file_obj, algorithms):
+        """
+        Calculate the hashes of the given file object data using the
+        given hashlib algorithms, in a single read pass.
+        """
+        hashers = [(x, hashlib.new(x)) for x in algorithms]
+        block = file_obj.read(cls._READ_SIZE)
+        while block:
+            for _name, m in hashers:
+                m.update(block)
+            block = file_obj.read(cls._READ_SIZE)
+        return dict((name, m.hexdigest()) for name, m in hashers)
+
+    def digests(self, path, algorithms):
+        """
+        Return the hex digests of the file at path, for the given hashlib
+        algorithms.
+
+        @param path: path to file
+        @type path: string
+        @param algorithms: hashlib algorithm names
+        @type algorithms: iterable
+        @return: dict mapping algorithm names to hex digests
+        @rtype: dict
+        @raise IOError: if the file cannot be read
+        @raise OSError: if the file cannot be read
+        """
+        algorithms = tuple(algorithms)
+        with open(path, "rb") as path_f:
+            st = os.fstat(path_f.fileno())
+            store = None
+            if stat.S_ISREG(st.st_mode) and st.st_size >= self.MIN_SIZE:
+                store = self.__get_store()
+            if store is None:
+                return self._compute(path_f, algorithms)
+
+            key = self._key(st)
+            cached = store.get(key)
+            if not isinstance(cached, dict):
+                cached = {}
+            missing = [x for x in algorithms if x not in cached]
+            if not missing:
+                return dict((x, cached[x]) for x in algorithms)
+
+            start_t = time.time()
+            cached.update(self._compute(path_f, missing))
+
+            # make sure the file did not change while we were reading it
+            if self._key(os.fstat(path_f.fileno())) == key and \
+                    max(st.st_mtime, st.st_ctime) < start_t - self.RACY_SECS:
+                try:
+                    store.put(key, cached)
+                except (IOError, OSError, ValueError, mmap.error,
+                        entropy.dump.pickle.PicklingError):
+                    pass
+
+        return dict((x, cached[x]) for x in algorithms)
+
+
 class MtimePingus(object):
 
     """
@@ -24,7 +24,7 @@ from entropy.const import const_debug_write, const_setup_perms, etpConst, \
     const_file_writable
 from entropy.output import blue, darkred, red, darkgreen, purple, teal, brown, \
     bold, TextInterface
-from entropy.dump import dumpobj, loadobj
+from entropy.dump import dumpobj
 from entropy.cache import EntropyCacher
 from entropy.db import EntropyRepository
 from entropy.exceptions import RepositoryError, SystemDatabaseError, \
@@ -122,6 +122,9 @@ class InstalledPackagesRepository(CachedRepository):
     # Name of the repository
     NAME = "__system__"
 
+    # readers (e.g. RigoDaemon) must not wait for Entropy Client writes
+    _PROFILE = EntropyRepository.PROFILE_INSTALLED
+
     def __init__(self, *args, **kwargs):
         # force our own name, always.
         kwargs = kwargs.copy()
@@ -162,6 +165,8 @@ class AvailablePackagesRepositoryUpdater(object):
         UrlFetcher.TIMEOUT_FETCH_ERROR,
         UrlFetcher.GENERIC_FETCH_ERROR)
 
+    _GPG_LOCK = threading.Lock()
+
     def __init__(self, entropy_client, repository_id, force, gpg):
         self.__force = force
         self.__big_sock_timeout = 20
@@ -174,7 +179,7 @@ class AvailablePackagesRepositoryUpdater(object):
         self._supported_download_items = (
             "db", "dbck", "dblight", "ck", "cklight", "compck",
             "lock", "dbdump", "dbdumplight", "dbdumplightck", "dbdumpck",
-            "meta_file", "meta_file_gpg", "notice_board"
+            "meta_file", "meta_file_gpg", "notice_board", "dbdeltas"
         )
         self._developer_repo = \
             self._settings['repositories']['developer_repo']
@@ -186,6 +191,7 @@ class AvailablePackagesRepositoryUpdater(object):
         self.__webservices = None
         self.__webservice = None
         self.__repo_eapi = None
+        self._fetched_revision = None
 
         avail_data = self._settings['repositories']['available']
         if self._repository_id not in avail_data:
@@ -906,6 +912,7 @@ class AvailablePackagesRepositoryUpdater(object):
         meta_file = etpConst['etpdatabasemetafilesfile']
         meta_file_gpg = etpConst['etpdatabasemetafilesfile'] + \
             etpConst['etpgpgextension']
+        deltas_file = etpConst['etpdatabasedeltasfile']
         md5_ext = etpConst['packagesmd5fileext']
         ec_cm2 = None
         ec_cm3 = None
@@ -982,6 +989,10 @@ class AvailablePackagesRepositoryUpdater(object):
                 "%s/%s" % (uri, meta_file_gpg,),
                 "%s/%s" % (repo_dbpath, meta_file_gpg,),
             ),
+            'dbdeltas': (
+                "%s/%s" % (uri, deltas_file,),
+                "%s/%s" % (repo_dbpath, deltas_file,),
+            ),
         }
 
         url, path = mymap.get(item)
@@ -994,6 +1005,15 @@ class AvailablePackagesRepositoryUpdater(object):
     def _download_item(self, uri, item, cmethod = None,
                        disallow_redirect = True, get_signature = False):
 
+        url, filepath = self._construct_paths(
+            uri, item, cmethod, get_signature = get_signature)
+        return self._download_file(url, filepath,
+            disallow_redirect = disallow_redirect)
+
+    def _download_file(self, url, filepath, disallow_redirect = True):
+        """
+        Download the given URL to filepath, return True if successful.
+        """
         my_repos = self._settings['repositories']
         avail_data = my_repos['available']
         repo_data = avail_data[self._repository_id]
@@ -1002,9 +1022,6 @@ class AvailablePackagesRepositoryUpdater(object):
         basic_pwd = repo_data.get('password')
         https_validate_cert = not repo_data.get('https_validate_cert') == "false"
 
-        url, filepath = self._construct_paths(
-            uri, item, cmethod, get_signature = get_signature)
-
         # See bug #3495, download the file to
         # a temporary location and then move it
         # if we are successful
@@ -1600,6 +1617,155 @@ class AvailablePackagesRepositoryUpdater(object):
 
         return gpg_rc
 
+    def _delta_database_sync(self, uri, revision):
+        """
+        Update the local repository database by applying the chain of
+        repository deltas published by the server, going from the local
+        repository revision to the given remote one.
+        Return the list of downloaded files if the repository has been
+        updated, None otherwise (and a full download is required).
+        """
+        if not self._differential_update or self._developer_repo:
+            return None
+        if self.__force:
+            return None
+
+        avail_data = self._settings['repositories']['available']
+        repo_data = avail_data[self._repository_id]
+        dbfile = os.path.join(repo_data['dbpath'],
+            etpConst['etpdatabasefile'])
+        if not const_file_writable(dbfile):
+            return None
+
+        local_revision = AvailablePackagesRepository.revision(
+            self._repository_id)
+        if local_revision == -1:
+            return None
+
+        if not self._download_item(uri, "dbdeltas",
+                                   disallow_redirect = True):
+            return None
+        downloaded_files = []
+        durl, deltas_path = self._construct_paths(uri, "dbdeltas", None)
+        downloaded_files.append(deltas_path)
+        if self._download_item(uri, "dbdeltas", disallow_redirect = True,
+                               get_signature = True):
+            downloaded_files.append(
+                self.__append_gpg_signature_to_path(deltas_path))
+
+        try:
+            deltas = entropy.tools.read_repository_deltas(deltas_path)
+        except (IOError, OSError) as err:
+            const_debug_write(__name__,
+                "_delta_database_sync: cannot read deltas: %s" % (err,))
+            return None
+
+        # build the chain of deltas from the local revision
+        deltas_map = dict((x[0], x) for x in deltas)
+        chain = []
+        current_revision = local_revision
+        while current_revision != revision:
+            delta = deltas_map.get(current_revision)
+            if delta is None or delta[1] <= current_revision:
+                break
+            chain.append(delta)
+            current_revision = delta[1]
+
+        if not chain or current_revision != revision:
+            const_debug_write(__name__,
+                "_delta_database_sync: no delta chain from %s to %s" % (
+                    local_revision, revision))
+            return None
+
+        mytxt = "%s: %s -> %s (%s %s)" % (
+            red(_("Applying repository deltas")),
+            bold(str(local_revision)),
+            bold(str(revision)),
+            blue(str(len(chain))),
+            blue(_("deltas")),
+        )
+        self._entropy.output(
+            mytxt,
+            importance = 1,
+            level = "info",
+            header = "\t"
+        )
+
+        delta_paths = []
+        unpacked_paths = []
+        tmp_dbfile = dbfile + ".delta"
+        dbconn = None
+        try:
+            for from_rev, to_rev, file_name, md5 in chain:
+                delta_url = "%s/%s" % (uri, file_name,)
+                delta_path = os.path.join(repo_data['dbpath'], file_name)
+                delta_paths.append(delta_path)
+                if not self._download_file(delta_url, delta_path):
+                    return None
+                if entropy.tools.md5sum(delta_path) != md5:
+                    const_debug_write(__name__,
+                        "_delta_database_sync: bad checksum: %s" % (
+                            file_name,))
+                    return None
+
+                cmethod = etpConst['etpdatabasecompressclasses'].get(
+                    file_name.rsplit(".", 1)[-1])
+                if cmethod is None:
+                    return None
+                unpacked_path = getattr(entropy.tools, cmethod[1])(delta_path)
+                delta_paths.append(unpacked_path)
+                unpacked_paths.append(unpacked_path)
+
+            shutil.copy2(dbfile, tmp_dbfile)
+            dbconn = self._entropy.open_generic_repository(tmp_dbfile,
+                xcache = False, indexing_override = False)
+
+            checksum = None
+            for delta_path in unpacked_paths:
+                delta_repo = self._entropy.open_generic_repository(
+                    delta_path, xcache = False, indexing_override = False)
+                try:
+                    checksum = dbconn.importDelta(delta_repo)
+                finally:
+                    delta_repo.close()
+
+            local_checksum = dbconn.checksum(
+                do_order = True, strict = False, include_signatures = True)
+            dbconn.close()
+            dbconn = None
+            if local_checksum != checksum:
+                mytxt = "%s: %s" % (
+                    bold(_("Attention")),
+                    red(_("repository deltas checksum mismatch")),
+                )
+                self._entropy.output(
+                    mytxt,
+                    importance = 1,
+                    level = "warning",
+                    header = "\t"
+                )
+                return None
+
+            os.rename(tmp_dbfile, dbfile)
+
+        except (DatabaseError, IntegrityError, OperationalError,
+                SystemDatabaseError, EOFError, IOError, OSError) as err:
+            const_debug_write(__name__,
+                "_delta_database_sync: error: %s" % (repr(err),))
+            return None
+
+        finally:
+            if dbconn is not None:
+                dbconn.close()
+            for path in delta_paths + [tmp_dbfile]:
+                try:
+                    os.remove(path)
+                except OSError as err:
+                    if err.errno != errno.ENOENT:
+                        raise
+
+        return downloaded_files
+
     def _webservice_database_sync(self):
         """
         Update the local repository database through the webservice
@@ -2018,7 +2184,28 @@ class AvailablePackagesRepositoryUpdater(object):
         return rev
 
     def update(self):
+        """
+        Update the repository, running both the fetch() and commit()
+        stages.
+
+        @return: EntropyRepositoryBase.REPOSITORY_* status code
+        @rtype: int
+        """
+        status = self.fetch()
+        if status != EntropyRepositoryBase.REPOSITORY_UPDATED_OK:
+            return status
+        return self.commit()
 
+    def fetch(self):
+        """
+        Run the first stage of the repository update: mirror selection,
+        download, checksum and GPG verification and unpack. This stage
+        can run concurrently with the fetch() stage of other repositories.
+        If REPOSITORY_UPDATED_OK is returned, commit() must be called.
+
+        @return: EntropyRepositoryBase.REPOSITORY_* status code
+        @rtype: int
+        """
         # disallow unprivileged update
         if not entropy.tools.is_root():
             raise PermissionDenied(
@@ -2081,6 +2268,7 @@ class AvailablePackagesRepositoryUpdater(object):
         cmethod = etpConst['etpdatabasecompressclasses'].get(
             cformat)
 
+        delta_files = None
         while True:
 
             downloaded_db_item = None
@@ -2088,6 +2276,10 @@ class AvailablePackagesRepositoryUpdater(object):
             db_checksum_down_status = False
             if self._repo_eapi < 3:
 
+                delta_files = self._delta_database_sync(uri, revision)
+                if delta_files is not None:
+                    break
+
                 down_status, sig_down_status, downloaded_db_item = \
                     self.__database_download(uri, cmethod)
                 if not down_status:
@@ -2121,6 +2313,8 @@ class AvailablePackagesRepositoryUpdater(object):
                 break
 
         downloaded_files = self._standard_items_download(uri)
+        if delta_files is not None:
+            downloaded_files.extend(delta_files)
         # also add db file to downloaded item
         # and md5 check repository
         if downloaded_db_item is not None:
@@ -2147,14 +2341,18 @@ class AvailablePackagesRepositoryUpdater(object):
                 return EntropyRepositoryBase.REPOSITORY_CHECKSUM_ERROR
 
         # GPG pubkey install hook
+        # the GPG keyring is shared among repositories
         if self._gpg_feature:
-            gpg_available = self._install_gpg_key_if_available()
-            if gpg_available:
-                gpg_rc = self._gpg_verify_downloaded_files(downloaded_files)
+            with AvailablePackagesRepositoryUpdater._GPG_LOCK:
+                gpg_available = self._install_gpg_key_if_available()
+                if gpg_available:
+                    gpg_rc = self._gpg_verify_downloaded_files(
+                        downloaded_files)
 
         # Now we can unpack
         files_to_remove = []
-        if self._repo_eapi in (1, 2,):
+        # with repository deltas, the database has been already updated
+        if self._repo_eapi in (1, 2,) and delta_files is None:
 
             # if do_db_update_transfer == False and not None
             if (do_db_update_transfer is not None) and not \
@@ -2229,6 +2427,27 @@ class AvailablePackagesRepositoryUpdater(object):
             except OSError:
                 continue
 
+        self._fetched_revision = revision
+        return EntropyRepositoryBase.REPOSITORY_UPDATED_OK
+
+    def commit(self):
+        """
+        Run the second stage of the repository update: validation,
+        revision update, indexing and the Source Package Manager post
+        update hook. Calls to this method must be serialized.
+
+        @return: EntropyRepositoryBase.REPOSITORY_* status code
+        @rtype: int
+        """
+        assert self._fetched_revision is not None, "fetch() not called"
+        revision = self._fetched_revision
+        self._fetched_revision = None
+
+        repo_data = self._settings['repositories']['available'][
+            self._repository_id]
+        dbfile_old = os.path.join(repo_data['dbpath'],
+            etpConst['etpdatabasefile']) + ".sync"
+
         valid = self.__validate_database()
         if not valid:
             # repository failed validation
@@ -2260,7 +2479,6 @@ class AvailablePackagesRepositoryUpdater(object):
 
         return EntropyRepositoryBase.REPOSITORY_UPDATED_OK
 
-
 class MaskableRepository(EntropyRepositoryBase):
     """
     Objects inheriting from this class support package masking.
@@ -2298,25 +2516,32 @@ class MaskableRepository(EntropyRepositoryBase):
         from entropy.client.interfaces import Client
         return Client()._settings_client_plugin
 
+    def _mask_filter_store(self):
+        return "MaskableRepositoryFilter/%s_%s" % (
+            self.name,
+            self.atomMatchCacheKey(),
+            )
+
     def _mask_filter_fetch_cache(self, package_id):
         if self._caching:
-            return loadobj(
-                "MaskableRepositoryFilter/%s_%s/%s" % (
-                    self.name,
-                    self.atomMatchCacheKey(),
-                    package_id,
-                    )
-                )
+            return self._cacher.pop(
+                str(package_id),
+                store = self._mask_filter_store(),
+                generation = self.checksum(strict = False))
 
     def _mask_filter_store_cache(self, package_id, value):
         if self._caching:
-            dumpobj(
-                "MaskableRepositoryFilter/%s_%s/%s" % (
-                    self.name,
-                    self.atomMatchCacheKey(),
-                    package_id,
-                    ),
-                value)
+            # written even if the cacher is not started, like it was
+            # before using a CacheStore
+            try:
+                self._cacher.save(
+                    str(package_id),
+                    value,
+                    store = self._mask_filter_store(),
+                    generation = self.checksum(strict = False))
+            except IOError as err:
+                const_debug_write(__name__,
+                    "_mask_filter_store_cache: %s" % (repr(err),))
 
     def _maskFilter_live(self, package_id):
 
@@ -2741,6 +2966,10 @@ class AvailablePackagesRepository(CachedRepository, MaskableRepository):
     subclass of EntropyRepository. It implements the update() method in order
     to make possible to update the repository.
     """
+
+    # these repositories are only written during updates
+    _PROFILE = EntropyRepository.PROFILE_AVAILABLE
+
     def __init__(self, *args, **kwargs):
         super(AvailablePackagesRepository, self).__init__(*args, **kwargs)
 
@@ -2763,6 +2992,18 @@ class AvailablePackagesRepository(CachedRepository, MaskableRepository):
         else:
             return updater.update()
 
+    @staticmethod
+    def updater(entropy_client, repository_id, force, gpg):
+        """
+        Reimplemented from EntropyRepositoryBase
+        """
+        try:
+            return AvailablePackagesRepositoryUpdater(
+                entropy_client, repository_id,
+                force, gpg)
+        except KeyError:
+            return None
+
     @staticmethod
     def revision(repository_id):
         """
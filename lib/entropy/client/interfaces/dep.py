@@ -184,30 +184,143 @@ class CalculatorsMixin:
 
         cache_key = None
         if self.xcache and use_cache:
-            sha = hashlib.sha1()
-
-            cache_fmt = "a{%s}mr{%s}ms{%s}rh{%s}mf{%s}"
-            cache_fmt += "ar{%s}m{%s}cm{%s}s{%s;%s;%s}"
-            cache_s = cache_fmt % (
-                atom,
-                ";".join(match_repo),
-                match_slot,
-                self.repositories_checksum(),
-                mask_filter,
-                ";".join(sorted(self._settings['repositories']['available'])),
-                self._settings.packages_configuration_hash(),
-                self._settings_client_plugin.packages_configuration_hash(),
-                multi_match,
-                multi_repo,
-                extended_results)
-            sha.update(const_convert_to_rawstring(cache_s))
-
-            cache_key = "atom_match/atom_match_%s" % (sha.hexdigest(),)
-
+            cache_key = self._atom_match_cache_key(
+                atom, match_slot, mask_filter, multi_match,
+                multi_repo, match_repo, extended_results)
             cached = self._cacher.pop(cache_key)
             if cached is not None:
                 return cached
 
+        return self._atom_match(
+            atom, match_slot, mask_filter, multi_match, multi_repo,
+            match_repo, extended_results, use_cache, cache_key)
+
+    def atom_match_many(self, atoms, match_slot = None, mask_filter = True,
+            multi_match = False, multi_repo = False, match_repo = None,
+            extended_results = False, use_cache = True):
+        """
+        Match many atoms inside all the available repositories at once.
+        The returned list contains what atom_match() would return for each
+        atom, in the same order. Repository lookups are batched through
+        EntropyRepositoryBase.atomMatchMany().
+        Arguments are the same of atom_match(), except for atoms, which is
+        an iterable of atoms.
+
+        @return: list of atom_match() results
+        @rtype: list
+        """
+        requests = []
+        results = {}
+        cache_keys = {}
+        plain_atoms = []
+        plain_atoms_set = set()
+
+        for orig_atom in atoms:
+            atom, repos = entropy.dep.dep_get_match_in_repos(orig_atom)
+            atom_match_repo = match_repo
+            if (atom_match_repo is None) and (repos is not None):
+                atom_match_repo = repos
+            if atom_match_repo is None:
+                atom_match_repo = tuple()
+            request = (atom, tuple(atom_match_repo))
+            requests.append(request)
+            if request in results or request in cache_keys:
+                continue
+
+            cache_key = None
+            if self.xcache and use_cache:
+                cache_key = self._atom_match_cache_key(
+                    atom, match_slot, mask_filter, multi_match,
+                    multi_repo, atom_match_repo, extended_results)
+                cached = self._cacher.pop(cache_key)
+                if cached is not None:
+                    results[request] = cached
+                    continue
+            cache_keys[request] = cache_key
+
+            # "@repo" atoms and "or" dependencies go through the usual path
+            if repos is not None:
+                continue
+            if atom.endswith(etpConst['entropyordepquestion']):
+                continue
+            if atom not in plain_atoms_set:
+                plain_atoms_set.add(atom)
+                plain_atoms.append(atom)
+
+        repo_matches = {}
+        if plain_atoms:
+            valid_repos = self._enabled_repos
+            if match_repo and (type(match_repo) in (list, tuple, set)):
+                valid_repos = list(match_repo)
+
+            for repo in valid_repos:
+                try:
+                    dbconn = self.open_repository(repo)
+                except (RepositoryError, SystemDatabaseError):
+                    continue
+                try:
+                    matches = dbconn.atomMatchMany(
+                        plain_atoms,
+                        matchSlot = match_slot,
+                        maskFilter = mask_filter,
+                        extendedResults = extended_results,
+                        useCache = use_cache)
+                except (OperationalError, DatabaseError):
+                    # let _atom_match() handle the broken repository
+                    continue
+                for atom, match in zip(plain_atoms, matches):
+                    repo_matches[(repo, atom)] = match
+
+        outcome = []
+        for request in requests:
+            result = results.get(request)
+            if result is None:
+                atom, atom_match_repo = request
+                result = self._atom_match(
+                    atom, match_slot, mask_filter, multi_match, multi_repo,
+                    atom_match_repo, extended_results, use_cache,
+                    cache_keys[request], repo_matches = repo_matches)
+                results[request] = result
+            elif isinstance(result[0], set):
+                # do not share mutable objects across results
+                result = (set(result[0]), result[1])
+            outcome.append(result)
+        return outcome
+
+    def _atom_match_cache_key(self, atom, match_slot, mask_filter,
+                              multi_match, multi_repo, match_repo,
+                              extended_results):
+        """
+        Return the on-disk cache key of an atom_match() call.
+        """
+        sha = hashlib.sha1()
+
+        cache_fmt = "a{%s}mr{%s}ms{%s}rh{%s}mf{%s}"
+        cache_fmt += "ar{%s}m{%s}cm{%s}s{%s;%s;%s}"
+        cache_s = cache_fmt % (
+            atom,
+            ";".join(match_repo),
+            match_slot,
+            self.repositories_checksum(),
+            mask_filter,
+            ";".join(sorted(self._settings['repositories']['available'])),
+            self._settings.packages_configuration_hash(),
+            self._settings_client_plugin.packages_configuration_hash(),
+            multi_match,
+            multi_repo,
+            extended_results)
+        sha.update(const_convert_to_rawstring(cache_s))
+
+        return "atom_match/atom_match_%s" % (sha.hexdigest(),)
+
+    def _atom_match(self, atom, match_slot, mask_filter, multi_match,
+                    multi_repo, match_repo, extended_results, use_cache,
+                    cache_key, repo_matches = None):
+        """
+        atom_match() implementation, with cache lookup already done.
+        If repo_matches is given, it is used to look up the
+        (repository, atom) atomMatch() results computed in advance.
+        """
         valid_repos = self._enabled_repos
         if match_repo and (type(match_repo) in (list, tuple, set)):
             valid_repos = list(match_repo)
@@ -243,13 +356,19 @@ class CalculatorsMixin:
 
                 while True:
                     try:
-                        query_data, query_rc = dbconn.atomMatch(
-                            atom,
-                            matchSlot = match_slot,
-                            maskFilter = mask_filter,
-                            extendedResults = extended_results,
-                            useCache = xuse_cache
-                        )
+                        prefetched = None
+                        if repo_matches is not None and xuse_cache:
+                            prefetched = repo_matches.get((repo, atom))
+                        if prefetched is not None:
+                            query_data, query_rc = prefetched
+                        else:
+                            query_data, query_rc = dbconn.atomMatch(
+                                atom,
+                                matchSlot = match_slot,
+                                maskFilter = mask_filter,
+                                extendedResults = extended_results,
+                                useCache = xuse_cache
+                            )
                         if query_rc == 0:
                             # package found, add to our dictionary
                             if extended_results:
@@ -346,8 +465,9 @@ class CalculatorsMixin:
         """
         Search packages inside all the available repositories, including the
         installed packages one.
-        Results are returned in random order by default, and as a list of
-        package matches (pkg_id_int, repo_string).
+        Results are returned as a list of package matches
+        (pkg_id_int, repo_string), in relevance order for repositories
+        having a full-text search index, in random order otherwise.
 
         @param keyword: string to search
         @type keyword: string
@@ -393,6 +513,9 @@ class CalculatorsMixin:
             atom = entropy.dep.remove_tag(atom)
 
         matches = []
+        # repositories searched through the full-text search index,
+        # descriptions included
+        ranked = set()
 
         for repository in repositories:
 
@@ -402,10 +525,16 @@ class CalculatorsMixin:
                 # ouch, repository not available or corrupted !
                 continue
 
-            pkg_ids = repo.searchPackages(
-                atom, slot = match_slot,
-                tag = search_tag,
-                just_id = True)
+            if not (match_slot or search_tag) and \
+                    repo.isSearchIndexAvailable():
+                pkg_ids = repo.searchPackagesRanked(
+                    atom, just_id = True, description = description)
+                ranked.add(repository)
+            else:
+                pkg_ids = repo.searchPackages(
+                    atom, slot = match_slot,
+                    tag = search_tag,
+                    just_id = True)
 
             matches.extend((pkg_id, repository) for pkg_id in pkg_ids)
 
@@ -415,6 +544,8 @@ class CalculatorsMixin:
             matches_cache.update(matches)
 
             for repository in repositories:
+                if repository in ranked:
+                    continue
 
                 try:
                     repo = self.open_repository(repository)
@@ -1291,8 +1422,10 @@ class CalculatorsMixin:
                     post_deps,))
 
         deps = set()
-        for unsat_dep in myundeps:
-            match_pkg_id, match_repo_id = self.atom_match(unsat_dep)
+        myundeps = list(myundeps)
+        matches = self.atom_match_many(myundeps + list(post_deps))
+        for unsat_dep, (match_pkg_id, match_repo_id) in zip(
+                myundeps, matches):
             if match_pkg_id == -1:
                 # dependency not found !
                 deps_not_found.add(unsat_dep)
@@ -1304,8 +1437,8 @@ class CalculatorsMixin:
                 stack.push((match_pkg_id, match_repo_id))
 
         post_deps_matches = set()
-        for post_dep in post_deps:
-            match_pkg_id, match_repo_id = self.atom_match(post_dep)
+        for post_dep, (match_pkg_id, match_repo_id) in zip(
+                post_deps, matches[len(myundeps):]):
             # if post dependency is not found, we can happily ignore the fact
             if match_pkg_id == -1:
                 # not adding to deps_not_found
@@ -1942,10 +2075,10 @@ class CalculatorsMixin:
         virtual_cat = EntropyRepositoryBase.VIRTUAL_META_PACKAGE_CATEGORY
 
         repo = self.open_repository(repository_id)
-        dependencies = repo.retrieveDependencies(
-            package_id, exclude_deptypes = excluded_dep_types)
-        for dependency in dependencies:
-            depmatch = self.atom_match(dependency)
+        dependencies = list(repo.retrieveDependencies(
+            package_id, exclude_deptypes = excluded_dep_types))
+        # match all the dependencies with one lookup per repository
+        for depmatch in self.atom_match_many(dependencies):
             if depmatch[0] == -1:
                 continue
 
@@ -1962,10 +2095,10 @@ class CalculatorsMixin:
                 # virtual/libffi points to dev-libs/libffi which got a
                 # soname bump. Buggy outcome: dev-libs/libffi is not
                 # pulled in as dependency when it should be.
-                virtual_dependencies = dep_db.retrieveDependencies(
-                    dep_pkg_id, exclude_deptypes = excluded_dep_types)
-                for virtual_dependency in virtual_dependencies:
-                    virtualmatch = self.atom_match(virtual_dependency)
+                virtual_dependencies = list(dep_db.retrieveDependencies(
+                    dep_pkg_id, exclude_deptypes = excluded_dep_types))
+                for virtualmatch in self.atom_match_many(
+                        virtual_dependencies):
                     if virtualmatch[0] == -1:
                         continue
                     matched_deps.add(virtualmatch)
@@ -2277,8 +2410,7 @@ class CalculatorsMixin:
             raise DependenciesNotFound(deps_not_found)
 
         # get adjacency map before it gets destroyed by solve()
-        adj_map = dict((x.item(), set(k.item() for k in y)) \
-            for x, y in graph.get_adjacency_map().items())
+        adj_map = graph.get_item_adjacency_map()
         # solve depgraph and append conflicts
         deptree = graph.solve()
         if 0 in deptree:
@@ -3202,6 +3334,47 @@ class CalculatorsMixin:
             # client db is broken!
             raise SystemDatabaseError("installed packages repository is broken")
 
+        def _key_slot(pkgkey, slot):
+            if slot is None:
+                return pkgkey
+            return "%s%s%s" % (pkgkey, etpConst['entropyslotprefix'], slot)
+
+        def _key_slot_tag(pkgkey, slot, tag):
+            return "%s%s%s" % (
+                _key_slot(pkgkey, slot), etpConst['entropytagprefix'], tag)
+
+        # match all the installed packages at once, atom_match() is only
+        # used below to recover from broken cache entries.
+        match_atoms = []
+        for package_id in package_ids:
+            strict_data = inst_repo.getStrictData(package_id)
+            if strict_data is None:
+                continue
+            cl_pkgkey, cl_slot, _cl_version, cl_tag, _cl_revision, \
+                _cl_atom = strict_data
+            if cl_tag:
+                match_atoms.append(_key_slot_tag(cl_pkgkey, cl_slot, cl_tag))
+            match_atoms.append(_key_slot(cl_pkgkey, cl_slot))
+
+        try:
+            batch_matches = dict(zip(match_atoms, self.atom_match_many(
+                match_atoms, extended_results = True,
+                match_repo = match_repos)))
+        except OperationalError:
+            batch_matches = {}
+
+        def _match(atom, use_match_cache):
+            if use_match_cache:
+                match = batch_matches.get(atom)
+                if match is not None:
+                    return match
+            return self.atom_match(
+                atom,
+                extended_results = True,
+                use_cache = use_match_cache,
+                match_repo = match_repos
+            )
+
         count = 0
         total = len(package_ids)
         last_count = 0
@@ -3252,10 +3425,7 @@ class CalculatorsMixin:
             # otherwise, do the usual duties.
             cl_pkgkey_tag = None
             if cl_tag:
-                cl_pkgkey_tag = "%s%s%s" % (
-                    cl_pkgkey,
-                    etpConst['entropytagprefix'],
-                    cl_tag)
+                cl_pkgkey_tag = _key_slot_tag(cl_pkgkey, cl_slot, cl_tag)
 
             while True:
                 try:
@@ -3264,13 +3434,7 @@ class CalculatorsMixin:
                         # search with tag first, if nothing
                         # pops up, fallback
                         # to usual search?
-                        match = self.atom_match(
-                            cl_pkgkey_tag,
-                            match_slot = cl_slot,
-                            extended_results = True,
-                            use_cache = use_match_cache,
-                            match_repo = match_repos
-                        )
+                        match = _match(cl_pkgkey_tag, use_match_cache)
                         try:
                             if const_isnumber(match[1]):
                                 match = None
@@ -3281,13 +3445,8 @@ class CalculatorsMixin:
                             continue
 
                     if match is None:
-                        match = self.atom_match(
-                            cl_pkgkey,
-                            match_slot = cl_slot,
-                            extended_results = True,
-                            use_cache = use_match_cache,
-                            match_repo = match_repos
-                        )
+                        match = _match(
+                            _key_slot(cl_pkgkey, cl_slot), use_match_cache)
                 except OperationalError:
                     # ouch, but don't crash here
                     do_continue = True
@@ -40,8 +40,10 @@ from .actions.config import _PackageConfigAction
 from .actions.fetch import _PackageFetchAction
 from .actions.install import _PackageInstallAction
 from .actions.multifetch import _PackageMultiFetchAction
+from .actions.pipeline import _PackageInstallPipeline
 from .actions.remove import _PackageRemoveAction
 from .actions.source import _PackageSourceAction
+from .actions._triggers import TriggerQueue
 
 
 class PackageActionFactory(object):
@@ -62,6 +64,25 @@ class PackageActionFactory(object):
     >>> obj.finalize()
 
     You can reuse the factory as many times as you want.
+    When handling a queue of packages, wrap it into deferred_triggers()
+    so that environment updates and info files registration run once:
+
+    >>> with factory.deferred_triggers():
+    ...     for package_match in package_matches:
+    ...         obj = factory.get(install, package_match)
+    ...         exit_status = obj.start()
+    ...         obj.finalize()
+
+    Install queues can also be run through a pipeline that verifies and
+    unpacks the package files in worker threads, ahead of the package
+    being installed. Installation itself stays serialized:
+
+    >>> with factory.deferred_triggers():
+    ...     with factory.install_pipeline(package_matches) as pipeline:
+    ...         for obj in pipeline:
+    ...             exit_status = obj.start()
+    ...             obj.finalize()
+
     If you pass an invalid action string, InvalidAction() will be raised.
     The PackageAction objects (well, their methods) are not thread-safe.
 
@@ -108,6 +129,18 @@ class PackageActionFactory(object):
         """
         return sorted(self._actions.keys())
 
+    def deferred_triggers(self):
+        """
+        Return a context manager that defers and coalesces the idempotent
+        post-install and post-remove triggers (env-update, info files
+        registration) of the actions executed inside it. Deferred triggers
+        are run before any package phase and when the context is closed.
+
+        @return: a context manager
+        @rtype: context manager
+        """
+        return TriggerQueue.transaction(self._entropy)
+
     def get(self, action, package_match, opts = None):
         """
         Return the PackageAction instance associated with the given action.
@@ -127,6 +160,42 @@ class PackageActionFactory(object):
                 "action does not exist")
         return action_class(self._entropy, package_match, opts = opts)
 
+    def install_pipeline(self, package_matches, opts_map = None,
+                         workers = None, fetching = False):
+        """
+        Return a context manager object that, once entered, can be iterated
+        to get the install PackageAction instances of the given ordered
+        install queue, while the package files are verified and unpacked
+        in parallel ahead of the package being installed.
+        The caller must start() and finalize() the returned objects in
+        order, as it would do with the ones returned by get().
+
+        @param package_matches: ordered list of Entropy package match tuples
+            (package_id, repository_id), as returned by
+            Client.get_install_queue()
+        @type package_matches: list
+        @keyword opts_map: dict mapping package matches to the metadata
+            options to pass to their PackageAction instances
+        @type opts_map: dict
+        @keyword workers: number of worker threads, if None, the
+            "unpack-workers" client.conf setting is used. If 0, the
+            pipeline does not do any work ahead.
+        @type workers: int
+        @keyword fetching: if True, the package files are still being
+            fetched and packages are only unpacked once passed to the
+            fetched() method of the pipeline, see the "fetched_function"
+            option of the multi fetch action.
+        @type fetching: bool
+        @return: the install pipeline object
+        @rtype: context manager
+        """
+        if workers is None:
+            misc_settings = self._entropy.ClientSettings()['misc']
+            workers = misc_settings['unpack_workers']
+        return _PackageInstallPipeline(
+            self._entropy, package_matches, opts_map = opts_map,
+            workers = workers, fetching = fetching)
+
 
 class PackageActionFactoryWrapper(PackageActionFactory):
     """
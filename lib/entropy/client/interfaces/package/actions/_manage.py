@@ -24,6 +24,62 @@ from .. import _content as Content
 from .action import PackageAction
 
 
+class _PathTrie(object):
+    """
+    Set of paths, stored as a trie of path components, that can be
+    matched against a path and all its parent directories in a single
+    walk.
+    """
+
+    __slots__ = ("_root",)
+
+    def __init__(self, paths):
+        self._root = {}
+        for path in paths:
+            node = self._root
+            for component in self._split(path):
+                node = node.setdefault(component, {})
+            node[None] = True
+
+    @staticmethod
+    def _split(path):
+        if path == "/":
+            return ("",)
+        return path.split("/")
+
+    def match(self, path):
+        """
+        Return whether path or any of its parent directories is in the set.
+        """
+        node = self._root
+        for component in self._split(path):
+            node = node.get(component)
+            if node is None:
+                return False
+            if None in node:
+                return True
+        return False
+
+
+class _ConfigProtectMatcher(object):
+    """
+    CONFIG_PROTECT and CONFIG_PROTECT_MASK paths matcher.
+    """
+
+    __slots__ = ("_protect", "_mask")
+
+    def __init__(self, protect, mask):
+        self._protect = _PathTrie(protect)
+        self._mask = _PathTrie(mask)
+
+    def match(self, path):
+        """
+        Return whether path is inside a configuration protected directory
+        and not inside a masked one.
+        """
+        return self._protect.match(path) and not self._mask.match(path)
+
+
 class _PackageInstallRemoveAction(PackageAction):
     """
     Abstract class that exposes shared functions between install
@@ -200,6 +256,8 @@ class _PackageInstallRemoveAction(PackageAction):
 
         data['accept_license'] = self._get_licenses(
             inst_repo, installed_package_id)
+        data['dependencies'] = inst_repo.retrieveDependencies(
+            installed_package_id)
 
         return data
 
@@ -270,17 +328,24 @@ class _PackageInstallRemoveAction(PackageAction):
         }
         return metadata
 
-    def _handle_config_protect(self, protect, mask, protectskip,
+    def _get_config_protect_matcher(self, protect, mask):
+        """
+        Return a _ConfigProtectMatcher object for the given configuration
+        protection and mask path sets, as returned by _get_config_protect().
+        """
+        return _ConfigProtectMatcher(protect, mask)
+
+    def _handle_config_protect(self, protect_matcher, protectskip,
                                fromfile, tofile,
                                do_allocation_check = True,
                                do_quiet = False):
         """
         Handle configuration file protection. This method contains the logic
         for determining if a file should be protected from overwrite.
+        protect_matcher is the _ConfigProtectMatcher object returned by
+        _get_config_protect_matcher().
         """
-        protected = False
         do_continue = False
-        in_mask = False
 
         tofile_os = tofile
         fromfile_os = fromfile
@@ -288,45 +353,8 @@ class _PackageInstallRemoveAction(PackageAction):
             tofile_os = const_convert_to_rawstring(tofile)
             fromfile_os = const_convert_to_rawstring(fromfile)
 
-        if tofile in protect:
-            protected = True
-            in_mask = True
-
-        elif os.path.dirname(tofile) in protect:
-            protected = True
-            in_mask = True
-
-        else:
-            tofile_testdir = os.path.dirname(tofile)
-            old_tofile_testdir = None
-            while tofile_testdir != old_tofile_testdir:
-                if tofile_testdir in protect:
-                    protected = True
-                    in_mask = True
-                    break
-                old_tofile_testdir = tofile_testdir
-                tofile_testdir = os.path.dirname(tofile_testdir)
-
-        if protected: # check if perhaps, file is masked, so unprotected
-
-            if tofile in mask:
-                protected = False
-                in_mask = False
-
-            elif os.path.dirname(tofile) in mask:
-                protected = False
-                in_mask = False
-
-            else:
-                tofile_testdir = os.path.dirname(tofile)
-                old_tofile_testdir = None
-                while tofile_testdir != old_tofile_testdir:
-                    if tofile_testdir in mask:
-                        protected = False
-                        in_mask = False
-                        break
-                    old_tofile_testdir = tofile_testdir
-                    tofile_testdir = os.path.dirname(tofile_testdir)
+        protected = protect_matcher.match(tofile)
+        in_mask = protected
 
         if not os.path.lexists(tofile_os):
             protected = False # file doesn't exist
@@ -446,7 +474,7 @@ class _PackageInstallRemoveAction(PackageAction):
                                          not_removed_due_to_collisions,
                                          colliding_path_messages,
                                          automerge_metadata, col_protect,
-                                         protect, mask, protectskip,
+                                         protect_matcher, protectskip,
                                          sys_root):
         """
         Body of the _remove_content_from_system() method.
@@ -466,6 +494,13 @@ class _PackageInstallRemoveAction(PackageAction):
                 if paths is not None:
                     preserved_lib_paths.update(paths)
 
+        # resolve the owners of all the files at once, the package
+        # being removed is no longer in the installed packages repository.
+        owned_items = {}
+        if col_protect > 0:
+            owned_items = inst_repo.resolveFileOwners(
+                item for _pkg_id, item, _ftype in remove_content if item)
+
         for _pkg_id, item, _ftype in remove_content:
 
             if not item:
@@ -482,7 +517,7 @@ class _PackageInstallRemoveAction(PackageAction):
             # collision check
             if col_protect > 0:
 
-                if inst_repo.isFileAvailable(item) \
+                if item in owned_items \
                     and os.path.isfile(sys_root_item_encoded):
 
                     # in this way we filter out directories
@@ -498,7 +533,7 @@ class _PackageInstallRemoveAction(PackageAction):
                 protected_item_test = sys_root_item
                 (in_mask, protected, _x,
                  do_continue) = self._handle_config_protect(
-                     protect, mask, protectskip, None, protected_item_test,
+                     protect_matcher, protectskip, None, protected_item_test,
                      do_allocation_check = False, do_quiet = True
                  )
 
@@ -666,6 +701,7 @@ class _PackageInstallRemoveAction(PackageAction):
             protect, mask = protect_mask
         else:
             protect, mask = set(), set()
+        protect_matcher = self._get_config_protect_matcher(protect, mask)
         protectskip = self._get_config_protect_skip()
 
         remove_content = None
@@ -684,7 +720,7 @@ class _PackageInstallRemoveAction(PackageAction):
                 directories, directories_cache,
                 preserved_mgr,
                 not_removed_due_to_collisions, colliding_path_messages,
-                automerge_metadata, col_protect, protect, mask, protectskip,
+                automerge_metadata, col_protect, protect_matcher, protectskip,
                 sys_root)
 
         finally:
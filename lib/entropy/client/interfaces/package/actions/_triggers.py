@@ -10,6 +10,7 @@
 
 """
 import codecs
+import contextlib
 import os
 import subprocess
 import sys
@@ -17,7 +18,8 @@ import threading
 
 from entropy.const import etpConst, etpSys, const_convert_to_rawstring, \
     const_mkstemp
-from entropy.output import brown, bold, darkred, red, teal, purple
+from entropy.output import brown, bold, darkred, red, teal, purple, \
+    darkgreen
 from entropy.i18n import _
 
 import entropy.dep
@@ -267,6 +269,9 @@ class Trigger(object):
         return self._trigger_call_ext_generic()
 
     def _trigger_call_ext_generic(self):
+        exit_st = self._flush_deferred_triggers()
+        if exit_st != 0:
+            return exit_st
         try:
             return self._do_trigger_call_ext_generic()
         except Exception as err:
@@ -474,43 +479,67 @@ class Trigger(object):
                 except OSError:
                     pass
 
+    def _flush_deferred_triggers(self):
+        """
+        Flush the triggers deferred by the active TriggerQueue, if any,
+        when the package phases and external triggers about to be run may
+        depend on them, see TriggerQueue.barrier().
+        """
+        queue = TriggerQueue.get(self._entropy)
+        if queue is None:
+            return 0
+        return queue.barrier(self._dependency_keys())
+
+    def _package_key(self):
+        """
+        Return the key (category/name) of the package, or None.
+        """
+        category = self._pkgdata.get('category')
+        name = self._pkgdata.get('name')
+        if category is None or name is None:
+            return None
+        return "%s/%s" % (category, name)
+
+    def _dependency_keys(self):
+        """
+        Return the keys (category/name) of the package dependencies, or
+        None if the package metadata does not contain them.
+        """
+        dependencies = self._pkgdata.get('dependencies')
+        if dependencies is None:
+            return None
+
+        keys = set()
+        for dependency in dependencies:
+            if dependency.startswith("!"):
+                # conflicts are not used by package phases
+                continue
+            if dependency.endswith(etpConst['entropyordepquestion']):
+                atoms = dependency[:-1].split(etpConst['entropyordepsep'])
+            else:
+                atoms = (dependency,)
+            for atom in atoms:
+                key = entropy.dep.dep_getkey(
+                    entropy.dep.remove_entropy_revision(
+                        entropy.dep.remove_slot(atom)))
+                if key:
+                    keys.add(key)
+        return keys
+
     def _trigger_env_update(self):
-        self._entropy.logger.log(
-            "[Trigger]",
-            etpConst['logging']['normal_loglevel_id'],
-            "[POST] Running env_update"
-        )
-        return self._spm.environment_update()
+        queue = TriggerQueue.get(self._entropy)
+        if queue is not None:
+            queue.env_update(package_key = self._package_key())
+            return 0
+        return _environment_update(self._entropy)
 
     def _trigger_infofile_install(self):
-        info_exec = Trigger.INSTALL_INFO_EXEC
-        if not os.path.isfile(info_exec):
-            self._entropy.logger.log(
-                "[Trigger]",
-                etpConst['logging']['normal_loglevel_id'],
-                "[POST] %s is not available" % (info_exec,)
-            )
+        info_files = self._pkgdata['affected_infofiles']
+        queue = TriggerQueue.get(self._entropy)
+        if queue is not None:
+            queue.add_infofiles(sorted(info_files))
             return 0
-
-        env = os.environ.copy()
-        for info_file in self._pkgdata['affected_infofiles']:
-            self._entropy.output(
-                "%s: %s" % (
-                    teal(_("Installing info")),
-                    info_file,),
-                importance = 0,
-                header = purple("    # ")
-            )
-            info_root = os.path.dirname(info_file)
-            args = (
-                info_exec,
-                "--dir-file=%s/dir" % (info_root,),
-                info_file)
-            proc = subprocess.Popen(
-                args, stdout = sys.stdout, stderr = sys.stderr,
-                env = env)
-            proc.wait() # ignore any error
-        return 0
+        return _install_infofiles(self._entropy, info_files)
 
     def _execute_package_phase(self, action_metadata, package_metadata,
                                action_name, phase_name):
@@ -523,6 +552,10 @@ class Trigger(object):
             importance = 0,
             header = red("   ## "))
 
+        exit_st = self._flush_deferred_triggers()
+        if exit_st != 0:
+            return exit_st
+
         spm = self._spm
 
         try:
@@ -596,3 +629,234 @@ class Trigger(object):
         return self._execute_package_phase(
             self._action_metadata,
             self._pkgdata, self._action, "postremove")
+
+
+class TriggerQueue(object):
+
+    """
+    Transaction-level queue of the idempotent post-install and post-remove
+    triggers (env-update and info files registration).
+
+    While a transaction is open, Trigger objects bound to the same Entropy
+    Client instance record these triggers here instead of running them.
+    The queue is flushed once when the outermost transaction is closed, or
+    earlier, right before a package phase or external trigger of a package
+    depending on one that requested an environment update, since those
+    may use the environment of the packages already merged.
+
+    Example code:
+
+    >>> with TriggerQueue.transaction(entropy_client):
+    ...     for package_match in package_matches:
+    ...         install the package
+    """
+
+    _queues = {}
+    _queues_lock = threading.Lock()
+
+    def __init__(self, entropy_client):
+        self._entropy = entropy_client
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._env_update = False
+        self._env_update_keys = set()
+        self._infofiles = []
+        self._infofiles_set = set()
+
+    @classmethod
+    def get(cls, entropy_client):
+        """
+        Return the TriggerQueue of the currently open transaction for the
+        given Entropy Client instance, or None.
+
+        @param entropy_client: Entropy Client interface object
+        @type entropy_client: entropy.client.interfaces.client.Client
+        @return: the active TriggerQueue or None
+        @rtype: TriggerQueue or None
+        """
+        with cls._queues_lock:
+            return cls._queues.get(id(entropy_client))
+
+    @classmethod
+    @contextlib.contextmanager
+    def transaction(cls, entropy_client):
+        """
+        Open a (possibly nested) trigger transaction for the given Entropy
+        Client instance. Deferred triggers are flushed when the outermost
+        transaction is closed, even if an exception is raised.
+
+        @param entropy_client: Entropy Client interface object
+        @type entropy_client: entropy.client.interfaces.client.Client
+        """
+        key = id(entropy_client)
+        with cls._queues_lock:
+            queue = cls._queues.get(key)
+            if queue is None:
+                queue = cls(entropy_client)
+                cls._queues[key] = queue
+            with queue._lock:
+                queue._depth += 1
+
+        try:
+            yield queue
+        finally:
+            with cls._queues_lock:
+                with queue._lock:
+                    queue._depth -= 1
+                    outermost = queue._depth == 0
+                if outermost:
+                    cls._queues.pop(key, None)
+
+            if outermost:
+                exit_st = queue.flush()
+                if exit_st != 0:
+                    entropy_client.output(
+                        "%s: %d" % (
+                            brown(_("Cannot run deferred triggers, "
+                                    "exit status")),
+                            exit_st,),
+                        importance = 1,
+                        header = darkred("   ## "),
+                        level = "warning")
+
+    def env_update(self, package_key = None):
+        """
+        Record that the system environment must be updated.
+
+        @keyword package_key: the key (category/name) of the package
+            requiring the update, if known
+        @type package_key: string
+        """
+        with self._lock:
+            self._env_update = True
+            self._env_update_keys.add(package_key)
+
+    def add_infofiles(self, info_files):
+        """
+        Record info files that must be registered into the info
+        directory index. Duplicates are registered only once.
+
+        @param info_files: list of info file paths
+        @type info_files: iterable
+        """
+        with self._lock:
+            for info_file in info_files:
+                if info_file not in self._infofiles_set:
+                    self._infofiles_set.add(info_file)
+                    self._infofiles.append(info_file)
+
+    def pending(self):
+        """
+        Return whether there are triggers waiting to be flushed.
+
+        @rtype: bool
+        """
+        with self._lock:
+            return self._env_update or bool(self._infofiles)
+
+    def barrier(self, package_keys):
+        """
+        Flush the queue if the package phases about to be run may use the
+        environment of the packages merged so far, that is, if they belong
+        to a package depending on one that requested an environment
+        update. Otherwise, triggers stay deferred.
+
+        @param package_keys: the keys (category/name) of the dependencies
+            of the package whose phases are about to be run, if None,
+            any pending trigger is flushed
+        @type package_keys: set or None
+        @return: exit status, non-zero values must be considered an error
+        @rtype: int
+        """
+        with self._lock:
+            if package_keys is None:
+                required = self.pending()
+            else:
+                # updates requested by unknown packages are always barriers
+                required = None in self._env_update_keys or \
+                    not self._env_update_keys.isdisjoint(package_keys)
+        if required:
+            return self.flush()
+        return 0
+
+    def flush(self):
+        """
+        Run all the recorded triggers, in their recording order
+        (env-update first), then clear the queue.
+
+        @return: exit status, non-zero values must be considered an error
+        @rtype: int
+        """
+        with self._lock:
+            env_update = self._env_update
+            info_files = self._infofiles
+            self._env_update = False
+            self._env_update_keys = set()
+            self._infofiles = []
+            self._infofiles_set = set()
+
+        exit_st = 0
+        if env_update:
+            exit_st = _environment_update(self._entropy)
+
+        # files may have been removed by a later package
+        info_files = [x for x in info_files if os.path.isfile(x)]
+        if info_files:
+            self._entropy.output(
+                "%s: %d" % (
+                    darkgreen(_("Installing deferred info files")),
+                    len(info_files),),
+                importance = 0,
+                header = purple("    # ")
+            )
+            _install_infofiles(self._entropy, info_files)
+
+        return exit_st
+
+
+def _environment_update(entropy_client):
+    """
+    Run the Source Package Manager environment update (env-update, ldconfig).
+    """
+    entropy_client.logger.log(
+        "[Trigger]",
+        etpConst['logging']['normal_loglevel_id'],
+        "[POST] Running env_update"
+    )
+    return entropy_client.Spm().environment_update()
+
+
+def _install_infofiles(entropy_client, info_files):
+    """
+    Register the given info files into their info directory index.
+    install-info accepts a single info file per invocation, so one
+    process is spawned for each file. Errors are ignored.
+    """
+    info_exec = Trigger.INSTALL_INFO_EXEC
+    if not os.path.isfile(info_exec):
+        entropy_client.logger.log(
+            "[Trigger]",
+            etpConst['logging']['normal_loglevel_id'],
+            "[POST] %s is not available" % (info_exec,)
+        )
+        return 0
+
+    env = os.environ.copy()
+    for info_file in info_files:
+        entropy_client.output(
+            "%s: %s" % (
+                teal(_("Installing info")),
+                info_file,),
+            importance = 0,
+            header = purple("    # ")
+        )
+        info_root = os.path.dirname(info_file)
+        args = (
+            info_exec,
+            "--dir-file=%s/dir" % (info_root,),
+            info_file)
+        proc = subprocess.Popen(
+            args, stdout = sys.stdout, stderr = sys.stderr,
+            env = env)
+        proc.wait() # ignore any error
+    return 0
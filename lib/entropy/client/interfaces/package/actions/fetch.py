@@ -19,7 +19,7 @@ from entropy.const import etpConst, const_debug_write, const_debug_enabled, \
     const_mkstemp
 from entropy.client.mirrors import StatusInterface
 from entropy.exceptions import InterruptError
-from entropy.fetchers import UrlFetcher
+from entropy.fetchers import UrlFetcher, SegmentedUrlFetcher
 from entropy.i18n import _
 from entropy.output import red, darkred, blue, purple, darkgreen, brown
 from entropy.security import Repository as RepositorySecurity
@@ -37,6 +37,10 @@ class _PackageFetchAction(PackageAction):
 
     NAME = "fetch"
 
+    # packages bigger than this (in bytes) are downloaded in segments
+    # from all the available mirrors at the same time
+    SEGMENTED_FETCH_MIN_SIZE = 64 * 1024 * 1024
+
     def __init__(self, entropy_client, package_match, opts = None):
         """
         Object constructor.
@@ -106,6 +110,7 @@ class _PackageFetchAction(PackageAction):
             )['misc']['edelta_support']
         metadata['edelta_support'] = edelta_support
         metadata['checksum'] = repo.retrieveDigest(self._package_id)
+        metadata['size'] = repo.retrieveSize(self._package_id)
         sha1, sha256, sha512, gpg = repo.retrieveSignatures(
             self._package_id)
         signatures = {
@@ -634,8 +639,80 @@ class _PackageFetchAction(PackageAction):
 
         return 0, data_transfer, resumed
 
+    def _try_segmented_fetch(self, uris, mirror_status, download,
+                             download_path, checksum, size, resume):
+        """
+        Try to download a big package file from all the usable mirrors at
+        the same time, using SegmentedUrlFetcher. Return a (status,
+        data transfer) tuple, status is 0 on success, -100 if the user
+        discarded the download, a positive number if it has not been
+        possible and the usual per-mirror download should be used.
+        """
+        if size is None or size < self.SEGMENTED_FETCH_MIN_SIZE:
+            return 1, 0.0
+        if self._entropy._url_fetcher is not UrlFetcher:
+            # custom fetcher, likely reimplementing the progress output
+            return 1, 0.0
+
+        urls = []
+        for uri in uris:
+            if mirror_status.get_failing_mirror_status(uri) >= 30:
+                continue
+            if not SegmentedUrlFetcher.supports_url(uri):
+                continue
+            urls.append(uri + "/" + download)
+        if len(urls) < 2:
+            return 1, 0.0
+
+        txt = blue("%s: ") % (_("Downloading from"),)
+        txt += red(", ".join(self._get_url_name(x) for x in urls))
+        self._entropy.output(
+            txt,
+            importance = 1,
+            level = "warning",
+            header = red("   ## ")
+        )
+
+        avail_data = self._settings['repositories']['available']
+        repo_data = avail_data[self._repository_id]
+        https_validate_cert = not repo_data.get(
+            'https_validate_cert') == "false"
+
+        fetch_abort_function = self._meta.get('fetch_abort_function')
+        fetch_intf = SegmentedUrlFetcher(
+            urls, download_path, resume = resume,
+            abort_check_func = fetch_abort_function,
+            http_basic_user = repo_data.get('username'),
+            http_basic_pwd = repo_data.get('password'),
+            https_validate_cert = https_validate_cert)
+
+        data_transfer = 0.0
+        try:
+            if fetch_abort_function != None:
+                fetch_abort_function()
+
+            fetch_checksum = fetch_intf.download()
+            data_transfer = fetch_intf.get_transfer_rate()
+        except (KeyboardInterrupt, InterruptError):
+            return -100, data_transfer
+
+        if fetch_checksum in (UrlFetcher.GENERIC_FETCH_ERROR,
+                              UrlFetcher.TIMEOUT_FETCH_ERROR):
+            return 1, data_transfer
+
+        if checksum and (fetch_checksum != checksum):
+            # mirrors out of sync? start over with plain downloads
+            try:
+                os.remove(download_path)
+            except OSError:
+                pass
+            return 2, data_transfer
+
+        return 0, data_transfer
+
     def _download_package(self, package_id, repository_id, download,
-                          download_path, checksum, resume = True):
+                          download_path, checksum, resume = True,
+                          size = None):
 
         avail_data = self._settings['repositories']['available']
         excluded_data = self._settings['repositories']['excluded']
@@ -669,6 +746,26 @@ class _PackageFetchAction(PackageAction):
         remaining = set(uris)
         mirror_status = StatusInterface()
 
+        exit_st, data_transfer = self._try_segmented_fetch(
+            uris, mirror_status, download, download_path, checksum,
+            size, resume)
+        if exit_st == 0:
+            txt = "%s: %s %s/%s" % (
+                blue(_("Successfully downloaded from mirrors")),
+                _("at"),
+                entropy.tools.bytes_into_human(data_transfer),
+                _("second"),
+            )
+            self._entropy.output(
+                txt,
+                importance = 1,
+                level = "info",
+                header = red("   ## ")
+            )
+            return 0
+        elif exit_st == -100:
+            return 1
+
         mirrorcount = 0
         for uri in uris:
 
@@ -860,7 +957,7 @@ class _PackageFetchAction(PackageAction):
                 header = darkred("   ## ")
             )
 
-        def _fetch(path, download, checksum):
+        def _fetch(path, download, checksum, size):
             txt = "%s: %s" % (
                 blue(_("Downloading")),
                 red(os.path.basename(download)),)
@@ -875,7 +972,8 @@ class _PackageFetchAction(PackageAction):
                 self._repository_id,
                 download,
                 path,
-                checksum
+                checksum,
+                size = size
             )
 
         locks = []
@@ -899,7 +997,8 @@ class _PackageFetchAction(PackageAction):
                     download_st = _fetch(
                         download_path,
                         self._meta['download'],
-                        self._meta['checksum'])
+                        self._meta['checksum'],
+                        self._meta['size'])
 
                     if download_st == 0:
                         verify_st = self._match_checksum(
@@ -940,7 +1039,8 @@ class _PackageFetchAction(PackageAction):
                         download_st = _fetch(
                             download_path,
                             extra_download['download'],
-                            extra_download['md5'])
+                            extra_download['md5'],
+                            extra_download['size'])
 
                         if download_st == 0:
                             verify_st = self._match_checksum(
@@ -960,10 +1060,16 @@ class _PackageFetchAction(PackageAction):
                 l.close()
 
     def _match_checksum(self, download_path, repository_id,
-                        checksum, signatures):
+                        checksum, signatures, digests = None):
         """
         Verify package checksum and return an exit status code.
+        If digests is given, it must be a dict mapping hash names to
+        the hex digests of download_path computed while downloading it
+        (see UrlFetcher.get_digests()), these are used in place of
+        reading the file again.
         """
+        if digests is None:
+            digests = {}
         download_path_mtime = download_path + etpConst['packagemtimefileext']
 
         misc_settings = self._entropy.ClientSettings()['misc']
@@ -1082,7 +1188,10 @@ class _PackageFetchAction(PackageAction):
 
                     down_name = os.path.basename(download_path)
 
-                    valid = cmp_func(download_path, hash_val)
+                    if digests.get(hash_type) is not None:
+                        valid = digests[hash_type] == str(hash_val)
+                    else:
+                        valid = cmp_func(download_path, hash_val)
                     if valid is None:
                         self._entropy.output(
                             "[%s] %s '%s' %s" % (
@@ -1134,7 +1243,11 @@ class _PackageFetchAction(PackageAction):
         download_name = os.path.basename(download_path)
         valid_checksum = False
         try:
-            valid_checksum = entropy.tools.compare_md5(download_path, checksum)
+            if digests.get("md5") is not None:
+                valid_checksum = digests["md5"] == str(checksum)
+            else:
+                valid_checksum = entropy.tools.compare_md5(
+                    download_path, checksum)
         except (OSError, IOError) as err:
             valid_checksum = False
             const_debug_write(
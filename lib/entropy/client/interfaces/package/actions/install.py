@@ -145,6 +145,11 @@ class _PackageInstallAction(_PackageInstallRemoveAction):
             metadata['extra_download'] += extra_download
 
         metadata['download'] = repo.retrieveDownloadURL(self._package_id)
+        # package files coming from package repositories are not
+        # fetched, thus there is nothing to verify them against
+        metadata['checksum'] = None
+        if not is_package_repo:
+            metadata['checksum'] = repo.retrieveDigest(self._package_id)
 
         description = repo.retrieveDescription(self._package_id)
         if description:
@@ -242,21 +247,65 @@ class _PackageInstallAction(_PackageInstallRemoveAction):
         # the install trigger
         metadata['__install_trigger__'] = {}
 
+        # exit status of prepare(), None if not called
+        metadata['prepare_status'] = None
+
         self._meta = metadata
 
-    def _run(self):
+    def prepare(self, verified = False):
         """
-        Execute the action. Return an exit status.
+        Run the Source Package Manager setup hook, verify the package files
+        checksum and unpack them ahead of start(), which will then skip
+        these steps. This does not touch the live system nor the installed
+        packages repository, so it can run in another thread while other
+        packages are being installed, but never concurrently with start()
+        on the same object.
+
+        @keyword verified: if True, the package files have just been
+            verified by the fetch action and they are not read again
+        @type verified: bool
+        @return: exit status
+        @rtype: int
         """
         self.setup()
+        if self._meta['prepare_status'] is not None:
+            return self._meta['prepare_status']
 
         spm_class = self._entropy.Spm_class()
         exit_st = spm_class.entropy_install_setup_hook(
             self._entropy, self._meta)
-        if exit_st != 0:
-            return exit_st
 
-        for method in self._meta['phases']:
+        if exit_st == 0 and not self._meta['merge_from']:
+            if not verified:
+                exit_st = self._verify_phase()
+            if exit_st == 0:
+                exit_st = self._unpack_phase()
+
+        self._meta['prepare_status'] = exit_st
+        return exit_st
+
+    def _run(self):
+        """
+        Execute the action. Return an exit status.
+        """
+        self.setup()
+
+        phases = self._meta['phases']
+        prepare_status = self._meta['prepare_status']
+        if prepare_status is None:
+            spm_class = self._entropy.Spm_class()
+            exit_st = spm_class.entropy_install_setup_hook(
+                self._entropy, self._meta)
+            if exit_st != 0:
+                return exit_st
+        elif prepare_status != 0:
+            return prepare_status
+        else:
+            # already unpacked by prepare()
+            phases = [x for x in phases if x != self._unpack_phase]
+
+        exit_st = 0
+        for method in phases:
             exit_st = method()
             if exit_st != 0:
                 break
@@ -561,6 +610,50 @@ class _PackageInstallAction(_PackageInstallRemoveAction):
         return spm_class.entropy_install_unpack_hook(self._entropy,
             self._meta)
 
+    def _verify_phase(self):
+        """
+        Execute the package files checksum verification phase.
+        """
+        def _verify(download_path, checksum):
+            lock = self.path_lock(download_path)
+            try:
+                with lock.shared():
+                    if not self._stat_path(download_path):
+                        return 2
+                    if checksum and not entropy.tools.compare_md5(
+                            download_path, checksum):
+                        return 1
+                    return 0
+            finally:
+                lock.close()
+
+        files = [(self._meta['pkgpath'], self._meta['checksum'])]
+        for extra_download in self._meta['extra_download']:
+            files.append((
+                self.get_standard_fetch_disk_path(
+                    extra_download['download']),
+                extra_download['md5']))
+
+        for download_path, checksum in files:
+            exit_st = _verify(download_path, checksum)
+            if exit_st != 0:
+                const_debug_write(
+                    __name__,
+                    "_verify_phase: %s verification error: %s" % (
+                        download_path, exit_st,))
+                self._entropy.output(
+                    "%s: %s" % (
+                        red(_("Package file checksum mismatch")),
+                        darkred(os.path.basename(download_path)),
+                    ),
+                    importance = 1,
+                    level = "error",
+                    header = red("   ## ")
+                )
+                return exit_st
+
+        return 0
+
     def _unpack_phase(self):
         """
         Execute the unpack phase.
@@ -789,6 +882,7 @@ class _PackageInstallAction(_PackageInstallRemoveAction):
         data['affected_infofiles'] = self._meta['affected_infofiles']
         data['spm_repository'] = repo.retrieveSpmRepository(self._package_id)
         data['accept_license'] = self._get_licenses(repo, self._package_id)
+        data['dependencies'] = repo.retrieveDependencies(self._package_id)
 
         # replace current empty "content" metadata info
         # content metadata is required by
@@ -974,6 +1068,16 @@ class _PackageInstallAction(_PackageInstallRemoveAction):
             header = red("   ## ")
         )
 
+        self._remove_unpack_dir()
+        return 0
+
+    def _remove_unpack_dir(self):
+        """
+        Remove the package unpack directory, if any.
+        """
+        if self._meta is None:
+            return
+
         # shutil.rmtree wants raw strings, otherwise it will explode
         unpack_dir = const_convert_to_rawstring(self._meta['unpackdir'])
 
@@ -990,8 +1094,6 @@ class _PackageInstallAction(_PackageInstallRemoveAction):
         except OSError:
             pass
 
-        return 0
-
     def _filter_out_files_installed_on_diff_path(self, content_file,
                                                  installed_content):
         """
@@ -1432,17 +1534,18 @@ class _PackageInstallAction(_PackageInstallRemoveAction):
 
         return 0
 
-    def _handle_install_collision_protect_unlocked(self, inst_repo,
+    def _handle_install_collision_protect_unlocked(self, file_owners,
                                                    remove_package_id,
                                                    tofile,
                                                    todbfile):
         """
         Handle files collition protection for the install phase.
+        file_owners is the dictionary returned by
+        EntropyRepositoryBase.resolveFileOwners() for the image files.
         """
 
-        avail = inst_repo.isFileAvailable(
-            const_convert_to_unicode(todbfile),
-            get_id = True)
+        avail = file_owners.get(
+            const_convert_to_unicode(todbfile), frozenset())
 
         if (remove_package_id not in avail) and avail:
             mytxt = darkred(_("Collision found during install for"))
@@ -1478,6 +1581,7 @@ class _PackageInstallAction(_PackageInstallRemoveAction):
         protect = self._get_config_protect(repo, self._package_id)
         mask = self._get_config_protect(repo, self._package_id,
                                         mask = True)
+        protect_matcher = self._get_config_protect_matcher(protect, mask)
         protectskip = self._get_config_protect_skip()
 
         # support for unit testing settings
@@ -1497,6 +1601,15 @@ class _PackageInstallAction(_PackageInstallRemoveAction):
                 from_enctype = etpConst['conf_encoding'])
         movefile = entropy.tools.movefile
 
+        # resolve the owners of all the image files at once
+        file_owners = {}
+        if col_protect > 1:
+            file_owners = inst_repo.resolveFileOwners(
+                const_convert_to_unicode(
+                    os.path.join(currentdir, item)[len(image_dir):])
+                for currentdir, _subdirs, files in os.walk(image_dir)
+                for item in files)
+
         def workout_subdir(currentdir, subdir):
 
             imagepath_dir = os.path.join(currentdir, subdir)
@@ -1737,7 +1850,7 @@ class _PackageInstallAction(_PackageInstallRemoveAction):
             if col_protect > 1:
                 todbfile = fromfile[len(image_dir):]
                 myrc = self._handle_install_collision_protect_unlocked(
-                    inst_repo, remove_package_id, tofile, todbfile)
+                    file_owners, remove_package_id, tofile, todbfile)
                 if not myrc:
                     return 0
 
@@ -1752,7 +1865,7 @@ class _PackageInstallAction(_PackageInstallRemoveAction):
             pre_tofile = tofile[:]
             (in_mask, protected,
              tofile, do_return) = self._handle_config_protect(
-                 protect, mask, protectskip, fromfile, tofile)
+                 protect_matcher, protectskip, fromfile, tofile)
 
             # collect new config automerge data
             if in_mask and os.path.exists(fromfile):
@@ -47,6 +47,7 @@ class _PackageMultiFetchAction(_PackageFetchAction):
 
         self._package_matches = package_matches
         self._meta = None
+        self._fetched_lock = threading.Lock()
 
     def finalize(self):
         """
@@ -78,6 +79,9 @@ class _PackageMultiFetchAction(_PackageFetchAction):
 
         metadata['fetch_abort_function'] = self._opts.get(
             'fetch_abort_function')
+        # called, from the download threads, with the package matches
+        # whose files have all been fetched and verified
+        metadata['fetched_function'] = self._opts.get('fetched_function')
 
         misc_settings = self._entropy.ClientSettings()['misc']
         metadata['edelta_support'] = misc_settings['edelta_support']
@@ -133,6 +137,13 @@ class _PackageMultiFetchAction(_PackageFetchAction):
 
         metadata['multi_fetch_list'] = download_list
 
+        fetch_pending = {}
+        for package_id, repository_id, download, _digest, _sig in \
+                download_list:
+            obj = fetch_pending.setdefault((package_id, repository_id), set())
+            obj.add(self.get_standard_fetch_disk_path(download))
+        metadata['fetch_pending'] = fetch_pending
+
         metadata['phases'] = []
         if metadata['multi_fetch_list']:
             metadata['phases'].append(self._fetch_phase)
@@ -145,6 +156,12 @@ class _PackageMultiFetchAction(_PackageFetchAction):
         """
         self.setup()
 
+        # nothing to fetch for these (package files from package
+        # repositories)
+        for package_match in self._package_matches:
+            if package_match not in self._meta['fetch_pending']:
+                self._notify_fetched(package_match)
+
         exit_st = 0
         for method in self._meta['phases']:
             exit_st = method()
@@ -152,6 +169,30 @@ class _PackageMultiFetchAction(_PackageFetchAction):
                 break
         return exit_st
 
+    def _notify_fetched(self, package_match):
+        """
+        Call the fetched function, if any, for the given package match.
+        """
+        fetched_function = self._meta['fetched_function']
+        if fetched_function is not None:
+            fetched_function(package_match)
+
+    def _file_fetched(self, package_id, repository_id, download_path):
+        """
+        Mark the given package file as fetched and verified. Once all the
+        files of a package are, the fetched function is called. This
+        method is thread-safe.
+        """
+        package_match = (package_id, repository_id)
+        with self._fetched_lock:
+            pending = self._meta['fetch_pending'].get(package_match)
+            if not pending or download_path not in pending:
+                return
+            pending.discard(download_path)
+            if pending:
+                return
+        self._notify_fetched(package_match)
+
     def _setup_url_directories(self, url_data):
         """
         Create the directories needed to download the files in url_data.
@@ -374,6 +415,7 @@ class _PackageMultiFetchAction(_PackageFetchAction):
                 valid = False
 
             if valid:
+                self._file_fetched(pkg_id, repository_id, dest_path)
                 url_data_item = (
                     pkg_id, repository_id, url,
                     dest_path, orig_cksum, signs
@@ -404,11 +446,18 @@ class _PackageMultiFetchAction(_PackageFetchAction):
         validated_download_ids_lock = threading.Lock()
         validated_download_ids = set()
 
+        # signatures are computed on the way by UrlFetcher, from the
+        # same data that is written to disk, there is no need to
+        # read the downloaded files again to verify them.
+        misc_settings = self._entropy.ClientSettings()['misc']
+        digests = [x for x in ("sha1", "sha256", "sha512") if \
+                       x in misc_settings['packagehashes']]
+
         # Note: the following two hooks are running in separate threads.
 
         def pre_download_hook(path, download_id):
             path_data = url_data[download_id - 1]
-            (_hook_package_id, hook_repository_id, _hook_url,
+            (hook_package_id, hook_repository_id, _hook_url,
              hook_download_path, hook_cksum, hook_signs) = path_data
 
             if self._stat_path(hook_download_path):
@@ -421,18 +470,21 @@ class _PackageMultiFetchAction(_PackageFetchAction):
                     # UrlFetcher returns the md5 checksum on success
                     with validated_download_ids_lock:
                         validated_download_ids.add(download_id)
+                    self._file_fetched(
+                        hook_package_id, hook_repository_id,
+                        hook_download_path)
                     return hook_cksum
 
             # request the download
             return None
 
-        def post_download_hook(_path, _status, download_id):
+        def post_download_hook(_path, _status, download_id, hook_digests):
             path_data = url_data[download_id - 1]
-            (_hook_package_id, hook_repository_id, _hook_url,
+            (hook_package_id, hook_repository_id, _hook_url,
              hook_download_path, hook_cksum, hook_signs) = path_data
 
             with validated_download_ids_lock:
-                if hook_download_path in validated_download_ids:
+                if download_id in validated_download_ids:
                     # nothing to check, path already verified
                     return
 
@@ -443,10 +495,14 @@ class _PackageMultiFetchAction(_PackageFetchAction):
                 hook_download_path,
                 hook_repository_id,
                 hook_cksum,
-                hook_signs)
+                hook_signs,
+                digests = hook_digests)
             if verify_st == 0:
                 with validated_download_ids_lock:
                     validated_download_ids.add(download_id)
+                self._file_fetched(
+                    hook_package_id, hook_repository_id,
+                    hook_download_path)
 
         url_path_list = []
         last_repos_id = None
@@ -488,7 +544,8 @@ class _PackageMultiFetchAction(_PackageFetchAction):
             post_download_hook = post_download_hook,
             http_basic_user = basic_user,
             http_basic_pwd = basic_pwd,
-            https_validate_cert = https_validate_cert)
+            https_validate_cert = https_validate_cert,
+            digests = digests)
         try:
             # make sure that we don't need to abort already
             # doing the check here avoids timeouts
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""
+
+    @author: Fabio Erculiani <lxnay@sabayon.org>
+    @contact: lxnay@sabayon.org
+    @copyright: Fabio Erculiani
+    @license: GPL-2
+
+    B{Entropy Package Manager Client Package Interface}.
+
+"""
+import collections
+import threading
+
+from entropy.const import const_debug_write
+from entropy.misc import ParallelTaskPool
+
+import entropy.tools
+
+from .install import _PackageInstallAction
+
+
+class _PackageInstallPipeline(object):
+    """
+    Install queue pipeline. Package files are verified and unpacked by
+    a pool of worker threads ahead of the package being installed (the
+    merge cursor), while the actual installation, which touches the live
+    system and the installed packages repository, is executed serially
+    by the caller, in queue order.
+
+    Iterating over this object returns the _PackageInstallAction objects
+    of the queue, in order. The caller must start() and finalize() them.
+
+    The pipeline can be entered while the package files are still being
+    fetched, in this case, packages are prepared as soon as fetched() is
+    called for them, which can happen from any thread.
+    """
+
+    def __init__(self, entropy_client, package_matches, opts_map = None,
+                 workers = 1, fetching = False):
+        """
+        Object constructor.
+
+        @param entropy_client: a valid Client instance
+        @type entropy_client: entropy.client.interfaces.Client
+        @param package_matches: ordered install queue, list of
+            (package_id, repository_id) tuples
+        @type package_matches: list
+        @keyword opts_map: dict mapping package matches to the metadata
+            options to pass to their _PackageInstallAction instances
+        @type opts_map: dict
+        @keyword workers: number of worker threads, if 0, no work is done
+            ahead of the merge cursor
+        @type workers: int
+        @keyword fetching: if True, the package files are being fetched and
+            verified while the pipeline runs, packages are not prepared
+            until they are passed to fetched()
+        @type fetching: bool
+        """
+        self._entropy = entropy_client
+        self._package_matches = list(package_matches)
+        if opts_map is None:
+            opts_map = {}
+        self._opts_map = opts_map
+        self._workers = max(workers, 0)
+        # bound the amount of unpacked data waiting to be installed
+        self._lookahead = self._workers * 2
+        self._fetching = fetching
+        self._indexes = dict((x, y) for y, x in \
+                                 enumerate(self._package_matches))
+
+        self._actions = {}
+        self._prepared = {}
+        self._fetched = set()
+        self._unfetched = set()
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+        self._pool = ParallelTaskPool("PackageInstallPipeline")
+        self._scheduled = 0
+        self._cursor = 0
+        self._closed = False
+
+    def __enter__(self):
+        """
+        Start the worker threads.
+        """
+        for _count in range(self._workers):
+            self._pool.spawn(self._worker)
+        # get the first packages ready while the files are still
+        # being fetched, or the caller is not iterating yet
+        self._schedule(self._lookahead)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """
+        Stop the worker threads and cleanup the packages that have not
+        been handed to the caller.
+        """
+        self.close()
+
+    def __iter__(self):
+        while self._cursor < len(self._package_matches):
+            index = self._cursor
+            self._schedule(index + 1 + self._lookahead)
+            action = self._actions.pop(index, None)
+            if action is None:
+                action = self._new_action(index)
+            else:
+                self._wait_prepared(index, action)
+            self._cursor += 1
+            yield action
+
+    def _new_action(self, index):
+        """
+        Return a new _PackageInstallAction for the queue item at index.
+        """
+        package_match = self._package_matches[index]
+        return _PackageInstallAction(
+            self._entropy, package_match,
+            opts = self._opts_map.get(package_match))
+
+    def _schedule(self, end):
+        """
+        Setup the actions of the queue items before the end index and
+        hand them to the worker threads. This runs in the caller thread.
+        """
+        if not self._pool:
+            return
+
+        end = min(end, len(self._package_matches))
+        while self._scheduled < end:
+            index = self._scheduled
+            self._scheduled += 1
+
+            action = self._new_action(index)
+            self._actions[index] = action
+            try:
+                action.setup()
+            except Exception as err:
+                # setup() will be called again, and raise again,
+                # by start(), when the caller reaches this package
+                const_debug_write(
+                    __name__,
+                    "_schedule: setup error for %s: %s" % (
+                        self._package_matches[index], repr(err),))
+                continue
+
+            with self._cond:
+                self._prepared[index] = threading.Event()
+                package_match = self._package_matches[index]
+                if self._fetching and package_match not in self._fetched:
+                    self._unfetched.add(index)
+                else:
+                    self._queue.append(index)
+                    self._cond.notify()
+
+    def fetched(self, package_match):
+        """
+        Tell the pipeline that the files of the given package match have
+        been fetched and verified, so that they can be unpacked without
+        being verified again. This method is thread-safe.
+
+        @param package_match: the package match
+        @type package_match: tuple
+        """
+        with self._cond:
+            self._fetched.add(package_match)
+            index = self._indexes.get(package_match)
+            if index in self._unfetched:
+                self._unfetched.discard(index)
+                self._queue.append(index)
+                self._cond.notify()
+
+    def _wait_prepared(self, index, action):
+        """
+        Wait for the action at index to be prepared, preparing it in the
+        caller thread if no worker picked it up yet.
+        """
+        with self._cond:
+            event = self._prepared.pop(index, None)
+            inline = False
+            if index in self._queue:
+                self._queue.remove(index)
+                inline = True
+            elif index in self._unfetched:
+                self._unfetched.discard(index)
+                inline = True
+            verified = self._package_matches[index] in self._fetched
+
+        if event is None:
+            return
+        if inline:
+            self._prepare(action, verified)
+            return
+
+        # do not block the main thread, to not miss signals
+        while not event.is_set():
+            event.wait(0.5)
+
+    def _prepare(self, action, verified):
+        """
+        Prepare the given action. On unexpected errors, the action is
+        left unprepared and start() will go through all the steps.
+        """
+        try:
+            action.prepare(verified = verified)
+        except Exception:
+            entropy.tools.print_traceback()
+
+    def _worker(self):
+        """
+        Worker thread body.
+        """
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait(0.5)
+                if self._closed:
+                    return
+                index = self._queue.popleft()
+                event = self._prepared[index]
+                action = self._actions[index]
+                verified = self._package_matches[index] in self._fetched
+
+            try:
+                self._prepare(action, verified)
+            finally:
+                event.set()
+
+    def close(self):
+        """
+        Stop the worker threads and cleanup the packages that have not
+        been handed to the caller.
+        """
+        with self._cond:
+            self._closed = True
+            self._queue.clear()
+            self._unfetched.clear()
+            self._cond.notify_all()
+
+        self._pool.join()
+
+        for index in sorted(self._actions):
+            action = self._actions.pop(index)
+            action._remove_unpack_dir()
+            action.finalize()
+        self._prepared.clear()
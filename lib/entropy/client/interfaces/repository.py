@@ -21,8 +21,9 @@ from entropy.const import const_debug_write, etpConst, const_file_readable
 from entropy.i18n import _, ngettext
 from entropy.exceptions import RepositoryError, PermissionDenied
 from entropy.output import blue, darkred, red, darkgreen, bold, purple, teal, \
-    brown
+    brown, buffer_output, TextInterface
 from entropy.locks import ResourceLock
+from entropy.misc import ParallelTaskPool
 
 from entropy.db.exceptions import Error
 from entropy.db.skel import EntropyRepositoryBase
@@ -61,6 +62,9 @@ class Repository(object):
     Entropy Client Repositories management interface.
     """
 
+    _repository_locks = {}
+    _repository_locks_lock = threading.Lock()
+
     def __init__(self, entropy_client, repo_identifiers = None,
         force = False, fetch_security = True, gpg = True):
         """
@@ -134,16 +138,89 @@ class Repository(object):
 
         return br_rc
 
+    def _repository_lock(self, repository_id):
+        """
+        Return the threading.Lock object that serializes the update of
+        the given repository.
+        """
+        with Repository._repository_locks_lock:
+            lock = Repository._repository_locks.get(repository_id)
+            if lock is None:
+                lock = threading.Lock()
+                Repository._repository_locks[repository_id] = lock
+        return lock
+
+    def _fetch_repositories(self, updaters):
+        """
+        Run the fetch() stage of the given repository updaters in parallel,
+        using at most the number of workers set in repositories.conf.
+
+        @param updaters: dictionary mapping repository identifiers to
+            staged repository updaters
+        @type updaters: dict
+        @return: dictionary mapping repository identifiers to their
+            fetch() status
+        @rtype: dict
+        """
+        def _fetch(repository_id):
+            # the output of each repository is written at once, when
+            # done, instead of being interleaved with the others
+            messages = []
+            try:
+                with buffer_output() as messages:
+                    with self._repository_lock(repository_id):
+                        return updaters[repository_id].fetch()
+            except PermissionDenied:
+                return EntropyRepositoryBase.\
+                    REPOSITORY_PERMISSION_DENIED_ERROR
+            except Exception:
+                entropy.tools.print_traceback(f = self._entropy.logger)
+                raise
+            finally:
+                with TextInterface.OUTPUT_LOCK:
+                    for message in messages:
+                        self._entropy.output(**message)
+
+        return ParallelTaskPool.map(
+            _fetch, [x for x in self.repo_ids if x in updaters],
+            self._settings['repositories']['sync_workers'],
+            "RepositorySync")
+
     def _run_sync(self):
 
         self.updated = False
         sts = EntropyRepositoryBase
 
+        # repositories supporting staged updates can be downloaded and
+        # verified in parallel, while validation, indexing and the
+        # post update hooks are serialized.
+        updaters = {}
+        for repo in self.repo_ids:
+            updater = self._entropy.get_repository(repo).updater(
+                self._entropy, repo, self.force, self._gpg_feature)
+            if updater is not None:
+                updaters[repo] = updater
+
+        fetched = {}
+        if self._settings['repositories']['sync_workers'] > 1 \
+                and len(updaters) > 1:
+            fetched = self._fetch_repositories(updaters)
+
         for repo in self.repo_ids:
 
+            updater = updaters.get(repo)
             try:
-                status = self._entropy.get_repository(repo).update(
-                    self._entropy, repo, self.force, self._gpg_feature)
+                with self._repository_lock(repo):
+                    if updater is None:
+                        status = self._entropy.get_repository(repo).update(
+                            self._entropy, repo, self.force,
+                            self._gpg_feature)
+                    else:
+                        status = fetched.get(repo)
+                        if status is None:
+                            status = updater.fetch()
+                        if status == sts.REPOSITORY_UPDATED_OK:
+                            status = updater.commit()
             except PermissionDenied:
                 status = sts.REPOSITORY_PERMISSION_DENIED_ERROR
 
@@ -386,6 +386,7 @@ class ClientSystemSettingsPlugin(SystemSettingsPlugin):
             'splitdebug': etpConst['splitdebug'],
             'splitdebug_dirs': etpConst['splitdebug_dirs'],
             'multifetch': 1,
+            'unpack_workers': 0,
             'collisionprotect': etpConst['collisionprotect'],
             'configprotect': set(),
             'configprotectmask': set(),
@@ -439,6 +440,11 @@ class ClientSystemSettingsPlugin(SystemSettingsPlugin):
                 if bool_setting:
                     data['multifetch'] = 3
 
+        def _unpack_workers(setting):
+            int_setting = entropy.tools.setting_to_int(setting, 0, 16)
+            if int_setting is not None:
+                data['unpack_workers'] = int_setting
+
         def _gpg(setting):
             bool_setting = entropy.tools.setting_to_bool(setting)
             if bool_setting is not None:
@@ -485,6 +491,7 @@ class ClientSystemSettingsPlugin(SystemSettingsPlugin):
             'packagehashes': _packagehashes,
             'package-hashes': _packagehashes,
             'multifetch': _multifetch,
+            'unpack-workers': _unpack_workers,
             'gpg': _gpg,
             'ignore-spm-downgrades': _spm_downgrades,
             'splitdebug': _splitdebug,
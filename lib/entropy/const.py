@@ -348,6 +348,16 @@ def const_default_settings(rootdir):
         'etpdatabasemetafilesnotfound': default_etp_dbfile+".meta_notfound",
         # database file checksum
         'etpdatabasehashfile': default_etp_dbfile+".md5",
+        # list of the repository deltas available on mirrors, one
+        # "<from revision> <to revision> <file name> <md5>" per line
+        'etpdatabasedeltasfile': default_etp_dbfile+".deltas",
+        # repository delta file, the format argument is the delta slot
+        'etpdatabasedeltafile': default_etp_dbfile+".delta.%d",
+        # package metadata digests of the last repository delta
+        # generated by Entropy Server
+        'etpdatabasedeltabasefile': default_etp_dbfile+".delta_base",
+        # maximum number of repository deltas kept on mirrors
+        'etpdatabasedeltasmax': 20,
 
         # the remote database lock file
         'etpdatabaselockfile': default_etp_dbfile+".lock",
@@ -490,6 +500,8 @@ def const_default_settings(rootdir):
         'packagesweakfileext': ".weak",
         # number of days after a package will be removed from mirrors
         'packagesexpirationdays': 15,
+        # entropy server max parallel uploads per packages mirror
+        'syncconnectionspermirror': 2,
         # name of the trigger file that would be executed
         # by equo inside triggerTools
         'triggername': "trigger",
@@ -612,6 +624,10 @@ def const_default_settings(rootdir):
 
         # entropy client packages download speed limit (in kb/sec)
         'downloadspeedlimit': None,
+        # entropy client max parallel downloads per mirror
+        'downloadworkerspermirror': 4,
+        # entropy client max repositories downloaded in parallel
+        'repositorysyncworkers': 3,
 
         # data storage directory, useful to speed up
         # entropy client across multiple issued commands
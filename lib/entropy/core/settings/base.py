@@ -1890,6 +1890,8 @@ class SystemSettings(Singleton, EntropyPluginStore):
             'arch': etpConst['currentarch'],
             'default_repository': etpConst['officialrepositoryid'],
             'transfer_limit': etpConst['downloadspeedlimit'],
+            'download_workers': etpConst['downloadworkerspermirror'],
+            'sync_workers': etpConst['repositorysyncworkers'],
             'timeout': etpConst['default_download_timeout'],
             'security_advisories_url': etpConst['securityurl'],
             'developer_repo': False,
@@ -1995,6 +1997,22 @@ class SystemSettings(Singleton, EntropyPluginStore):
             except ValueError:
                 return
 
+        def _down_workers(line, setting):
+            try:
+                myval = int(setting)
+            except ValueError:
+                return
+            if myval > 0:
+                data['download_workers'] = myval
+
+        def _sync_workers(line, setting):
+            try:
+                myval = int(setting)
+            except ValueError:
+                return
+            if myval > 0:
+                data['sync_workers'] = myval
+
         def _security_url(setting):
             data['security_advisories_url'] = setting
 
@@ -2014,6 +2032,8 @@ class SystemSettings(Singleton, EntropyPluginStore):
             # backward compatibility
             'downloadtimeout': _down_timeout,
             'download-timeout': _down_timeout,
+            'download-workers-per-mirror': _down_workers,
+            'sync-workers': _sync_workers,
             # backward compatibility
             'securityurl': _security_url,
             'security-url': _security_url,
@@ -239,6 +239,18 @@ class EntropyMySQLRepository(EntropySQLRepository):
                     dependency VARCHAR(1024) NOT NULL
                 );
 
+                CREATE TABLE reversedependencies (
+                    iddependency INTEGER(10) UNSIGNED NOT NULL,
+                    idpackage INTEGER(10) UNSIGNED NOT NULL,
+                    FOREIGN KEY(idpackage)
+                        REFERENCES baseinfo(idpackage) ON DELETE CASCADE
+                );
+
+                CREATE TABLE reversedependenciesnames (
+                    iddependency INTEGER(10) UNSIGNED NOT NULL,
+                    name VARCHAR(255) NOT NULL
+                );
+
                 CREATE TABLE conflicts (
                     idpackage INTEGER(10) UNSIGNED NOT NULL,
                     conflict VARCHAR(128) NOT NULL,
@@ -654,80 +666,40 @@ class EntropyMySQLRepository(EntropySQLRepository):
         """
         return "CONCAT(" + ", ".join(fields) + ")"
 
-    def _cursor(self):
+    def _createConnection(self):
         """
         Reimplemented from EntropySQLRepository.
         """
-        current_thread = threading.current_thread()
-        c_key = self._cursor_connection_pool_key()
-
-        cursor = None
-        with self._cursor_pool_mutex():
-            threads = set()
-            cursor_pool = self._cursor_pool()
-            cursor_data = cursor_pool.get(c_key)
-            if cursor_data is not None:
-                cursor, threads = cursor_data
-            # handle possible thread ident clashing
-            # in the cleanup thread function, because
-            # thread idents are recycled
-            # on thread termination
-            threads.add(current_thread)
-
-            if cursor is None:
-                conn = self._connection_impl(_from_cursor=True)
-                cursor = conn.cursor()
-                cursor.execute("SET storage_engine=InnoDB;")
-                cursor.execute("SET autocommit=OFF;")
-                cursor = MySQLCursorWrapper(
-                    cursor, self.ModuleProxy.exceptions(),
-                    self.ModuleProxy().errno())
-                cursor_pool[c_key] = cursor, threads
-                self._start_cleanup_monitor(current_thread, c_key)
-
-        return cursor
+        return MySQLConnectionWrapper.connect(
+            self.ModuleProxy, self._mysql,
+            MySQLConnectionWrapper,
+            host = self._host, user = self._user,
+            passwd = self._password, db = self._db,
+            port = self._port, autoreconnect = True)
 
-    def _connection_impl(self, _from_cursor=False):
+    def _cursor(self):
         """
-        Connection getter method implementation, adds
-        _from_cursor argument to avoid calling the
-        cleanup routine if True.
+        Reimplemented from EntropySQLRepository.
         """
-        current_thread = threading.current_thread()
-        c_key = self._cursor_connection_pool_key()
-
-        conn = None
-        with self._connection_pool_mutex():
-            threads = set()
-            connection_pool = self._connection_pool()
-            conn_data = connection_pool.get(c_key)
-            if conn_data is not None:
-                conn, threads = conn_data
-            # handle possible thread ident clashing
-            # in the cleanup thread function
-            # because thread idents are recycled on
-            # thread termination
-            threads.add(current_thread)
-
-            if conn is None:
-                conn = MySQLConnectionWrapper.connect(
-                    self.ModuleProxy, self._mysql,
-                    MySQLConnectionWrapper,
-                    host = self._host, user = self._user,
-                    passwd = self._password, db = self._db,
-                    port = self._port, autoreconnect = True)
-                connection_pool[c_key] = conn, threads
-                if not _from_cursor:
-                    self._start_cleanup_monitor(current_thread, c_key)
-            else:
-                conn.ping()
-        return conn
+        conn_data = self._thread_connection()
+        cursor = conn_data.cursor
+        if cursor is None:
+            cursor = conn_data.connection.cursor()
+            cursor.execute("SET storage_engine=InnoDB;")
+            cursor.execute("SET autocommit=OFF;")
+            cursor = MySQLCursorWrapper(
+                cursor, self.ModuleProxy.exceptions(),
+                self.ModuleProxy().errno())
+            conn_data.cursor = cursor
+        return cursor
 
     def _connection(self):
         """
         Reimplemented from EntropySQLRepository.
         """
-        return self._connection_impl()
+        conn = self._thread_connection().connection
+        conn.ping()
+        return conn
 
     def __show_info(self):
         password = hashlib.new("md5")
@@ -741,8 +713,8 @@ class EntropyMySQLRepository(EntropySQLRepository):
             self._indexing,)
         third_part = ", name: %s, skip_upd: %s, st_upd: %s" % (
             self.name, self._skip_checks, self.__structure_update,)
-        fourth_part = ", conn_pool: %s, cursor_cache: %s>" % (
-            self._connection_pool(), self._cursor_pool(),)
+        fourth_part = ", conn_pool: %s>" % (
+            self._connection_pool(),)
 
         return first_part + second_part + third_part + fourth_part
 
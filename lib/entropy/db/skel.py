@@ -358,6 +358,86 @@ class EntropyRepositoryPluginStore(EntropyPluginStore):
         meta[key] = value
 
 
+class _AtomMatchCandidates(object):
+    """
+    In-memory package metadata used by EntropyRepositoryBase.atomMatchMany()
+    to match many atoms against packages read all at once. It implements
+    the subset of the EntropyRepositoryBase methods used by atomMatch().
+    Masking is still evaluated by the repository, once per package.
+    """
+
+    def __init__(self, repository, atoms, packages, useflags):
+        """
+        Object constructor.
+
+        @param repository: the repository the packages belong to
+        @type repository: EntropyRepositoryBase
+        @param atoms: atoms that can be matched using these packages
+        @type atoms: set
+        @param packages: list of (package_id, category, name, version,
+            versiontag, revision, slot) tuples, for every package
+            whose name is referenced by atoms
+        @type packages: list
+        @param useflags: map of package identifiers to USE flags or None,
+            if USE flags must be read from the repository
+        @type useflags: dict or None
+        """
+        self._repository = repository
+        self._atoms = frozenset(atoms)
+        self._packages = {}
+        self._names = {}
+        for package in packages:
+            self._packages[package[0]] = package
+            obj = self._names.setdefault(package[2], [])
+            obj.append(package[0])
+        self._useflags = useflags
+        self._masks = {}
+
+    def __contains__(self, atom):
+        return atom in self._atoms
+
+    def searchName(self, keyword, sensitive = False, just_id = False):
+        return tuple(self._names.get(keyword, ()))
+
+    def searchNameCategory(self, name, category, just_id = False):
+        return tuple(x for x in self._names.get(name, ())
+                     if self._packages[x][1] == category)
+
+    def searchProvidedVirtualPackage(self, keyword):
+        return self._repository.searchProvidedVirtualPackage(keyword)
+
+    def retrieveCategory(self, package_id):
+        return self._packages[package_id][1]
+
+    def retrieveKeySplit(self, package_id):
+        return self._packages[package_id][1:3]
+
+    def retrieveVersion(self, package_id):
+        return self._packages[package_id][3]
+
+    def retrieveTag(self, package_id):
+        return self._packages[package_id][4]
+
+    def retrieveRevision(self, package_id):
+        return self._packages[package_id][5]
+
+    def retrieveSlot(self, package_id):
+        return self._packages[package_id][6]
+
+    def retrieveUseflags(self, package_id):
+        if self._useflags is None:
+            return self._repository.retrieveUseflags(package_id)
+        return self._useflags.get(package_id, frozenset())
+
+    def maskFilter(self, package_id, live = True):
+        key = (package_id, live)
+        mask = self._masks.get(key)
+        if mask is None:
+            mask = self._repository.maskFilter(package_id, live = live)
+            self._masks[key] = mask
+        return mask
+
+
 class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
     """
     EntropyRepository interface base class.
@@ -1089,6 +1169,29 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         """
         raise NotImplementedError()
 
+    @contextlib.contextmanager
+    def bulkInsert(self, drop_indexes = False):
+        """
+        Context manager that tells the repository that many packages
+        are going to be added or removed by the calling thread, so that
+        work that only depends on the final repository status can be
+        done once on exit. Subclasses can reimplement this, the default
+        implementation does nothing.
+
+        @keyword drop_indexes: if True, indexes can be dropped for the
+            duration of the context. Only use it if no commit is done
+            inside the context, since an interrupted run would leave
+            the repository without them.
+        @type drop_indexes: bool
+
+        Example:
+        >>> with repository.bulkInsert():
+        ...     for pkg_data in packages:
+        ...         repository.handlePackage(pkg_data)
+        ...     repository.commit()
+        """
+        yield
+
     def getPackagesToRemove(self, name, category, slot, injected):
         """
         Return a list of packages that would be removed given name, category,
@@ -1276,6 +1379,28 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         """
         raise NotImplementedError()
 
+    def setDescription(self, package_id, description):
+        """
+        Set description for package.
+
+        @param package_id: package indentifier
+        @type package_id: int
+        @param description: package description
+        @type description: string
+        """
+        raise NotImplementedError()
+
+    def setHomepage(self, package_id, homepage):
+        """
+        Set homepage for package.
+
+        @param package_id: package indentifier
+        @type package_id: int
+        @param homepage: package homepage
+        @type homepage: string
+        """
+        raise NotImplementedError()
+
     def setName(self, package_id, name):
         """
         Set name for package.
@@ -1411,6 +1536,26 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         """
         raise NotImplementedError()
 
+    def removeProvide(self, package_id):
+        """
+        Remove all the PROVIDE metadata of package.
+
+        @param package_id: package indentifier
+        @type package_id: int
+        """
+        raise NotImplementedError()
+
+    def insertProvide(self, package_id, provides):
+        """
+        Insert PROVIDE metadata for package, see retrieveProvide().
+
+        @param package_id: package indentifier
+        @type package_id: int
+        @param provides: list of (atom, is_default) tuples
+        @type provides: list
+        """
+        raise NotImplementedError()
+
     def insertContent(self, package_id, content, already_formatted = False):
         """
         Insert content metadata for package. "content" can either be a dict()
@@ -3848,6 +3993,21 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         """
         raise NotImplementedError()
 
+    def resolveFileOwners(self, paths):
+        """
+        Resolve the owners of many file paths at once. This is the
+        batched version of isFileAvailable(path, get_id = True) and should
+        be preferred when checking the files of a whole package.
+
+        @param paths: iterable of file or directory paths
+        @type paths: iterable
+        @return: dictionary mapping owned paths to a frozenset of
+            package_ids owning them. Paths not owned by any package
+            are not included.
+        @rtype: dict
+        """
+        raise NotImplementedError()
+
     def resolveNeeded(self, needed, elfclass = -1, extended = False):
         """
         Resolve NEEDED ELF entry (a library name) to package_ids owning given
@@ -4209,6 +4369,40 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         """
         raise NotImplementedError()
 
+    def searchPackagesRanked(self, keyword, limit = None, just_id = False,
+                             description = True):
+        """
+        Search packages matching all the words in the given keyword, in
+        any of their name, atom, provide, description or homepage, and
+        return them sorted by relevance: exact name matches first, then
+        name prefix matches, name substring matches, atom matches and
+        finally description (or homepage, provide) matches.
+
+        @param keyword: search term
+        @type keyword: string
+        @keyword limit: return at most the given amount of results
+        @type limit: int
+        @keyword just_id: just return package identifiers
+        @type just_id: bool
+        @keyword description: if False, only match name, atom and provide
+        @type description: bool
+        @return: list (tuple) of (atom, package_id) tuples or list (tuple)
+            of package identifiers (if just_id is True), best match first
+        @rtype: tuple
+        """
+        raise NotImplementedError()
+
+    def isSearchIndexAvailable(self):
+        """
+        Return whether searchPackagesRanked() is backed by a full-text
+        search index. If not, searchPackages() and searchDescription()
+        are usually faster.
+
+        @return: True, if the full-text search index is available
+        @rtype: bool
+        """
+        return False
+
     def searchDescription(self, keyword, just_id = False):
         """
         Search packages using given description string as keyword.
@@ -4696,11 +4890,63 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         """
         raise NotImplementedError()
 
+    def listAllPackageDataDigests(self):
+        """
+        Return the digests of the metadata of all the packages, as shipped
+        by repository deltas (without content, content safety and
+        ChangeLog), see exportDelta().
+
+        @return: dict mapping package identifiers to package metadata
+            digests
+        @rtype: dict
+        """
+        raise NotImplementedError()
+
+    def exportDelta(self, delta_repo, base_digests):
+        """
+        Store into delta_repo the changes required to turn a repository
+        whose packages have the given digests into this one: the added
+        and changed packages metadata (without content, content safety
+        and ChangeLog), the removed package identifiers, the tree updates
+        and package sets metadata and the checksum the resulting
+        repository must have. Package identifiers are preserved.
+
+        @param delta_repo: empty repository the delta is written to
+        @type delta_repo: entropy.db.skel.EntropyRepositoryBase
+        @param base_digests: dict mapping package identifiers to package
+            metadata digests, as returned by a previous call, of the
+            repository the delta applies to
+        @type base_digests: dict
+        @return: dict mapping package identifiers of this repository to
+            their package metadata digests
+        @rtype: dict
+        """
+        raise NotImplementedError()
+
+    def importDelta(self, delta_repo):
+        """
+        Apply the delta stored into delta_repo by exportDelta().
+
+        @param delta_repo: repository containing the delta
+        @type delta_repo: entropy.db.skel.EntropyRepositoryBase
+        @return: the checksum, as returned by checksum(do_order = True,
+            strict = False, include_signatures = True), this repository
+            must have after the delta is applied
+        @rtype: string
+        @raise SystemDatabaseError: if delta_repo is not a valid delta
+        """
+        raise NotImplementedError()
+
     def checksum(self, do_order = False, strict = True,
                  include_signatures = False, include_dependencies = False):
         """
         Get Repository metadata checksum, useful for integrity verification.
         Note: result is cached in EntropyRepository.live_cache (dict).
+        If do_order is False, implementations may return an opaque,
+        incrementally maintained, fingerprint that changes whenever the
+        repository is modified. Such value is only suitable as a cache key
+        and cannot be compared across different repositories. Use
+        do_order = True to compare repository contents.
 
         @keyword do_order: order metadata collection alphabetically
         @type do_order: bool
@@ -4941,6 +5187,31 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         """
         raise NotImplementedError()
 
+    @staticmethod
+    def updater(entropy_client, repository_id, force, gpg):
+        """
+        Return an object implementing the update() logic in two stages:
+        fetch(), which downloads and verifies the repository and can run
+        concurrently with the fetch() stage of other repositories, and
+        commit(), which validates and installs it and must be serialized.
+        Both return the same status codes of update(), commit() must be
+        called only if fetch() returned REPOSITORY_UPDATED_OK.
+        Return None if the repository does not support staged updates,
+        update() will be used instead.
+
+        @param entropy_client: Entropy Client based object
+        @type entropy_client: entropy.client.interfaces.Client
+        @param repository_id: repository identifier
+        @type repository_id: string
+        @param force: force update anyway
+        @type force: bool
+        @param gpg: GPG feature enable
+        @type gpg: bool
+        @return: staged updater object or None
+        @rtype: object or None
+        """
+        return None
+
     @staticmethod
     def revision(repository_id):
         """
@@ -5025,6 +5296,16 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
             identifiers) and command status is returned.
         @rtype: tuple or set
         """
+        return self.__atomMatch(atom, matchSlot, multiMatch, maskFilter,
+            extendedResults, useCache, self)
+
+    def __atomMatch(self, atom, matchSlot, multiMatch, maskFilter,
+                    extendedResults, useCache, metadata):
+        """
+        atomMatch() implementation. Package metadata is read through
+        metadata, which is either this repository or an
+        _AtomMatchCandidates instance.
+        """
         if not atom:
             return -1, 1
 
@@ -5114,8 +5395,9 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
 
             # IDs found in the database that match our search
             try:
-                found_ids, default_package_ids = self.__generate_found_ids_match(
-                    pkgkey, pkgname, pkgcat, multiMatch)
+                found_ids, default_package_ids = \
+                    self.__generate_found_ids_match(
+                        pkgkey, pkgname, pkgcat, multiMatch, metadata)
             except OperationalError:
                 # we are fault tolerant, cannot crash because
                 # tables are not available and validateDatabase()
@@ -5128,10 +5410,10 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         # filter slot and tag
         if found_ids:
             found_ids = self.__filterSlotTagUse(found_ids, matchSlot,
-                matchTag, matchUse, direction)
+                matchTag, matchUse, direction, metadata)
             if maskFilter:
                 def _filter(pkg_id):
-                    pkg_id, pkg_reason = self.maskFilter(pkg_id)
+                    pkg_id, pkg_reason = metadata.maskFilter(pkg_id)
                     return pkg_id != -1
                 found_ids = set(filter(_filter, found_ids))
 
@@ -5140,7 +5422,8 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         dbpkginfo = set()
         if found_ids:
             dbpkginfo = self.__handle_found_ids_match(found_ids, direction,
-                matchTag, matchRevision, justname, stripped_atom, pkgversion)
+                matchTag, matchRevision, justname, stripped_atom, pkgversion,
+                metadata)
 
         if not dbpkginfo:
             if extendedResults:
@@ -5168,8 +5451,8 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
 
         if multiMatch:
             if extendedResults:
-                x = set([(x[0], 0, x[1], self.retrieveTag(x[0]), \
-                    self.retrieveRevision(x[0])) for x in dbpkginfo])
+                x = set([(x[0], 0, x[1], metadata.retrieveTag(x[0]), \
+                    metadata.retrieveRevision(x[0])) for x in dbpkginfo])
                 self.__atomMatchStoreCache(
                     atom, matchSlot,
                     multiMatch, maskFilter,
@@ -5188,8 +5471,8 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         if len(dbpkginfo) == 1:
             x = dbpkginfo.pop()
             if extendedResults:
-                x = (x[0], 0, x[1], self.retrieveTag(x[0]),
-                    self.retrieveRevision(x[0]),)
+                x = (x[0], 0, x[1], metadata.retrieveTag(x[0]),
+                    metadata.retrieveRevision(x[0]),)
 
                 self.__atomMatchStoreCache(
                     atom, matchSlot,
@@ -5223,8 +5506,8 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         versions = set()
 
         for x in dbpkginfo:
-            info_tuple = (x[1], self.retrieveTag(x[0]), \
-                self.retrieveRevision(x[0]))
+            info_tuple = (x[1], metadata.retrieveTag(x[0]), \
+                metadata.retrieveRevision(x[0]))
             versions.add(info_tuple)
             pkgdata[info_tuple] = x[0]
 
@@ -5276,13 +5559,114 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
             )
             return x, rc
 
-    def __generate_found_ids_match(self, pkgkey, pkgname, pkgcat, multiMatch):
+    def atomMatchMany(self, atoms, matchSlot = None, multiMatch = False,
+        maskFilter = True, extendedResults = False, useCache = True):
+        """
+        Match many atoms (or dependencies) in repository at once. This
+        returns exactly what calling atomMatch() on every atom would, in
+        the same order, but allows subclasses to resolve whole groups of
+        atoms with fewer queries.
+
+        @param atoms: atoms or dependencies to match in repository
+        @type atoms: iterable
+        @keyword matchSlot: see atomMatch()
+        @type matchSlot: string
+        @keyword multiMatch: see atomMatch()
+        @type multiMatch: bool
+        @keyword maskFilter: see atomMatch()
+        @type maskFilter: bool
+        @keyword extendedResults: see atomMatch()
+        @type extendedResults: bool
+        @keyword useCache: see atomMatch()
+        @type useCache: bool
+        @return: list of atomMatch() results, one per given atom
+        @rtype: list
+        """
+        atoms = list(atoms)
+        try:
+            candidates = self._atomMatchCandidates(set(atoms))
+        except OperationalError:
+            # let atomMatch() deal with the broken repository
+            candidates = None
+
+        matches = {}
+        results = []
+        for atom in atoms:
+            match = matches.get(atom)
+            if match is None:
+                if candidates is not None and atom in candidates:
+                    match = self.__atomMatch(atom, matchSlot, multiMatch,
+                        maskFilter, extendedResults, useCache, candidates)
+                else:
+                    match = self.atomMatch(atom, matchSlot = matchSlot,
+                        multiMatch = multiMatch, maskFilter = maskFilter,
+                        extendedResults = extendedResults,
+                        useCache = useCache)
+                matches[atom] = match
+            elif multiMatch:
+                # do not share mutable objects across results
+                match = (set(match[0]), match[1])
+            results.append(match)
+        return results
+
+    def _atomMatchCandidates(self, atoms):
+        """
+        Return the metadata of all the packages that atomMatch() could
+        select for the given atoms, as an _AtomMatchCandidates object,
+        read with as few queries as possible. This is used by
+        atomMatchMany(). Atoms not contained in the returned object are
+        matched through atomMatch().
+        The base implementation returns None.
+
+        @param atoms: set of atoms
+        @type atoms: set
+        @return: an _AtomMatchCandidates object or None
+        @rtype: _AtomMatchCandidates or None
+        """
+        return None
+
+    def _atomMatchName(self, atom):
+        """
+        Return the package category and name that atomMatch() would use
+        to look up candidates for the given atom, or None if the atom is
+        an "or" dependency or cannot be parsed. The category is "null" if
+        the atom does not specify one.
+
+        @param atom: atom or dependency
+        @type atom: string
+        @return: tuple composed by category and name or None
+        @rtype: tuple or None
+        """
+        if not atom or atom.endswith(etpConst['entropyordepquestion']):
+            return None
+
+        scan_atom = entropy.dep.remove_usedeps(atom)
+        scan_atom = entropy.dep.remove_tag(scan_atom)
+        scan_atom = entropy.dep.remove_slot(scan_atom)
+        scan_atom = entropy.dep.remove_entropy_revision(scan_atom)
+        if not scan_atom:
+            return None
+
+        scan_cpv = entropy.dep.dep_getcpv(scan_atom)
+        pkgkey = scan_cpv
+        if not entropy.dep.isjustname(scan_cpv):
+            if entropy.dep.catpkgsplit(scan_cpv) is None:
+                return None
+            pkgkey = entropy.dep.dep_getkey(scan_cpv)
+
+        splitkey = pkgkey.split("/")
+        if len(splitkey) == 2:
+            return tuple(splitkey)
+        return "null", splitkey[0]
+
+    def __generate_found_ids_match(self, pkgkey, pkgname, pkgcat, multiMatch,
+                                   metadata):
 
         if pkgcat == "null":
-            results = self.searchName(pkgname, sensitive = True,
+            results = metadata.searchName(pkgname, sensitive = True,
                 just_id = True)
         else:
-            results = self.searchNameCategory(pkgname, pkgcat, just_id = True)
+            results = metadata.searchNameCategory(pkgname, pkgcat, just_id = True)
 
         old_style_virtuals = None
         # if it's a PROVIDE, search with searchProvide
@@ -5290,7 +5674,7 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         if (not results) and (pkgcat == self.VIRTUAL_META_PACKAGE_CATEGORY):
 
             # look for default old-style virtual
-            virtuals = self.searchProvidedVirtualPackage(pkgkey)
+            virtuals = metadata.searchProvidedVirtualPackage(pkgkey)
             if virtuals:
                 old_style_virtuals = set([x[0] for x in virtuals if x[1]])
                 flat_virtuals = [x[0] for x in virtuals]
@@ -5315,7 +5699,7 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
             found_id = None
             cats = set()
             for package_id in results:
-                cat = self.retrieveCategory(package_id)
+                cat = metadata.retrieveCategory(package_id)
                 cats.add(cat)
                 if (cat == pkgcat) or \
                     ((pkgcat == self.VIRTUAL_META_PACKAGE_CATEGORY) and \
@@ -5340,7 +5724,7 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
             # we need to search using the category
             if (not multiMatch) and (pkgcat == "null"):
                 # we searched by name, we need to search using category
-                results = self.searchNameCategory(
+                results = metadata.searchNameCategory(
                     pkgname, pkgcat, just_id = True)
 
             # if we get here, we have found the needed IDs
@@ -5356,11 +5740,11 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
             (old_style_virtuals is not None):
             # in case of virtual packages only
             # (that they're not stored as provide)
-            pkgcat, pkgname = self.retrieveKeySplit(package_id)
+            pkgcat, pkgname = metadata.retrieveKeySplit(package_id)
 
         # check if category matches
         if pkgcat != "null":
-            found_cat = self.retrieveCategory(package_id)
+            found_cat = metadata.retrieveCategory(package_id)
             if pkgcat == found_cat:
                 return set([package_id]), old_style_virtuals
             del results
@@ -5372,7 +5756,7 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
 
 
     def __handle_found_ids_match(self, found_ids, direction, matchTag,
-            matchRevision, justname, stripped_atom, pkgversion):
+            matchRevision, justname, stripped_atom, pkgversion, metadata):
 
         dbpkginfo = set()
         # now we have to handle direction
@@ -5403,7 +5787,7 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
 
                 for package_id in found_ids:
 
-                    dbver = self.retrieveVersion(package_id)
+                    dbver = metadata.retrieveVersion(package_id)
                     if (direction == "~"):
                         myrev = entropy.dep.dep_get_spm_revision(
                             dbver)
@@ -5417,7 +5801,7 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
                             if dbver.startswith(pkgversion[:-1]):
                                 dbpkginfo.add((package_id, dbver))
                         elif (matchRevision is not None) and (pkgversion == dbver):
-                            dbrev = self.retrieveRevision(package_id)
+                            dbrev = metadata.retrieveRevision(package_id)
                             if dbrev == matchRevision:
                                 dbpkginfo.add((package_id, dbver))
                         elif (pkgversion == dbver) and (matchRevision is None):
@@ -5437,14 +5821,14 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
                         revcmp = 0
                         tagcmp = 0
                         if matchRevision is not None:
-                            dbrev = self.retrieveRevision(package_id)
+                            dbrev = metadata.retrieveRevision(package_id)
                             revcmp = const_cmp(matchRevision, dbrev)
 
                         if matchTag is not None:
-                            dbtag = self.retrieveTag(package_id)
+                            dbtag = metadata.retrieveTag(package_id)
                             tagcmp = const_cmp(matchTag, dbtag)
 
-                        dbver = self.retrieveVersion(package_id)
+                        dbver = metadata.retrieveVersion(package_id)
                         pkgcmp = entropy.dep.compare_versions(
                             pkgversion, dbver)
 
@@ -5505,23 +5889,25 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
 
         else: # just the key
 
-            dbpkginfo = set([(x, self.retrieveVersion(x),) for x in found_ids])
+            dbpkginfo = set([(x, metadata.retrieveVersion(x),) for x in found_ids])
 
         return dbpkginfo
 
+    def __atomMatchStore(self):
+        return "%s/%s/%s" % (
+            self.__db_match_cache_key,
+            self.name,
+            self.atomMatchCacheKey(),
+            )
+
     def __atomMatchFetchCache(self, *args):
         if self._caching:
             ck_sum = self.checksum(strict = False)
             hash_str = self.__atomMatch_gen_hash_str(args)
-            cached = entropy.dump.loadobj(
-                "%s/%s/%s_%s_%s" % (
-                    self.__db_match_cache_key,
-                    self.name,
-                    self.atomMatchCacheKey(),
-                    ck_sum,
-                    hash_str,
-                    )
-                )
+            cached = self._cacher.pop(
+                hash_str,
+                store = self.__atomMatchStore(),
+                generation = ck_sum)
             return cached
 
     def __atomMatch_gen_hash_str(self, args):
@@ -5538,37 +5924,33 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
             ck_sum = self.checksum(strict = False)
             hash_str = self.__atomMatch_gen_hash_str(args)
             self._cacher.push(
-                "%s/%s/%s_%s_%s" % (
-                    self.__db_match_cache_key,
-                    self.name,
-                    self.atomMatchCacheKey(),
-                    ck_sum,
-                    hash_str,
-                    ),
+                hash_str,
                 kwargs.get('result'),
-                async = False)
+                async = False,
+                store = self.__atomMatchStore(),
+                generation = ck_sum)
 
-    def __filterSlot(self, package_id, slot):
+    def __filterSlot(self, package_id, slot, metadata):
         if slot is None:
             return package_id
-        dbslot = self.retrieveSlot(package_id)
+        dbslot = metadata.retrieveSlot(package_id)
         if dbslot == slot:
             return package_id
 
-    def __filterTag(self, package_id, tag, operators):
+    def __filterTag(self, package_id, tag, operators, metadata):
         if tag is None:
             return package_id
 
-        dbtag = self.retrieveTag(package_id)
+        dbtag = metadata.retrieveTag(package_id)
         compare = const_cmp(tag, dbtag)
         # cannot do operator compare because it breaks the tag concept
         if compare == 0:
             return package_id
 
-    def __filterUse(self, package_id, uses):
+    def __filterUse(self, package_id, uses, metadata):
         if not uses:
             return package_id
-        pkguse = set(self.retrieveUseflags(package_id))
+        pkguse = set(metadata.retrieveUseflags(package_id))
         enabled = set([x for x in uses if not x.startswith("-")])
         disabled = set(uses) - enabled
 
@@ -5635,19 +6017,20 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
             return None
         return package_id
 
-    def __filterSlotTagUse(self, found_ids, slot, tag, use, operators):
+    def __filterSlotTagUse(self, found_ids, slot, tag, use, operators,
+                           metadata):
 
         def myfilter(package_id):
 
-            package_id = self.__filterSlot(package_id, slot)
+            package_id = self.__filterSlot(package_id, slot, metadata)
             if not package_id:
                 return False
 
-            package_id = self.__filterUse(package_id, use)
+            package_id = self.__filterUse(package_id, use, metadata)
             if not package_id:
                 return False
 
-            package_id = self.__filterTag(package_id, tag, operators)
+            package_id = self.__filterTag(package_id, tag, operators, metadata)
             if not package_id:
                 return False
 
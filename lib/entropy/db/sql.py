@@ -10,11 +10,13 @@
     most of the EntropyRepository methods using standard SQL.
 
 """
+import contextlib
 import os
 import hashlib
 import itertools
 import time
 import threading
+import weakref
 
 from entropy.const import etpConst, const_debug_write, \
     const_debug_enabled, const_isunicode, const_convert_to_unicode, \
@@ -23,14 +25,13 @@ from entropy.const import etpConst, const_debug_write, \
 from entropy.exceptions import SystemDatabaseError, SPMError
 from entropy.spm.plugins.factory import get_default_instance as get_spm
 from entropy.output import bold, red
-from entropy.misc import ParallelTask
 
 from entropy.i18n import _
 
 import entropy.dep
 import entropy.tools
 
-from entropy.db.skel import EntropyRepositoryBase
+from entropy.db.skel import EntropyRepositoryBase, _AtomMatchCandidates
 from entropy.db.cache import EntropyRepositoryCacher
 from entropy.db.exceptions import Warning, Error, InterfaceError, \
     DatabaseError, DataError, OperationalError, IntegrityError, \
@@ -240,6 +241,73 @@ class SQLCursorWrapper(object):
         return self._cur.description
 
 
+class _ThreadConnection(object):
+
+    """
+    Connection and Cursor objects owned by a single thread, as stored
+    in the EntropySQLRepository connection pool.
+    """
+
+    __slots__ = ("key", "thread", "pid", "connection", "cursor", "closed",
+                 "finalizer")
+
+    def __init__(self, key, thread, connection):
+        self.key = key
+        self.thread = thread
+        self.pid = os.getpid()
+        self.connection = connection
+        self.cursor = None
+        self.closed = False
+        self.finalizer = None
+
+
+class _ThreadSentinel(object):
+
+    """
+    Object stored in the thread local storage, whose collection at
+    thread exit triggers the release of the thread Connection.
+    """
+
+    __slots__ = ("__weakref__",)
+
+
+class _BulkInsert(object):
+
+    """
+    Status of a bulkInsert() context: the in-memory reference tables
+    identifiers and the work deferred until its end.
+    """
+
+    __slots__ = ("references", "package_ids", "indexes")
+
+    def __init__(self, indexes):
+        # (table, value) -> identifier
+        self.references = {}
+        # packages whose search index entries must be updated
+        self.package_ids = set()
+        # True, if index creation has been deferred
+        self.indexes = indexes
+
+
+class _ReverseDependenciesIndexStatus(object):
+
+    """
+    Changes of a connection not reflected yet by the persistent reverse
+    dependencies index. They are applied before the index is read and
+    at commit time.
+    """
+
+    __slots__ = ("names", "dependency_ids", "unindexed")
+
+    def __init__(self):
+        # package names whose reverse dependencies must be re-indexed
+        self.names = set()
+        # dependency identifiers that must be re-indexed
+        self.dependency_ids = set()
+        # True, if new dependency strings may have been added
+        self.unindexed = False
+
+
 class EntropySQLRepository(EntropyRepositoryBase):
 
     """
@@ -280,14 +348,29 @@ class EntropySQLRepository(EntropyRepositoryBase):
                     FOREIGN KEY(idpackage)
                         REFERENCES baseinfo(idpackage) ON DELETE CASCADE
                 );
-                CREATE TABLE content (
+                CREATE TABLE contentdirectories (
+                    iddirectory INTEGER PRIMARY KEY AUTOINCREMENT,
+                    directory VARCHAR UNIQUE
+                );
+
+                CREATE TABLE contentfiles (
                     idpackage INTEGER,
-                    file VARCHAR,
+                    iddirectory INTEGER,
+                    name VARCHAR,
                     type VARCHAR,
                     FOREIGN KEY(idpackage)
                         REFERENCES baseinfo(idpackage) ON DELETE CASCADE
                 );
 
+                CREATE VIEW content AS
+                    SELECT contentfiles.idpackage AS idpackage,
+                        contentdirectories.directory || contentfiles.name
+                            AS file,
+                        contentfiles.type AS type
+                    FROM contentfiles, contentdirectories
+                    WHERE contentdirectories.iddirectory =
+                        contentfiles.iddirectory;
+
                 CREATE TABLE contentsafety (
                     idpackage INTEGER,
                     file VARCHAR,
@@ -318,6 +401,18 @@ class EntropySQLRepository(EntropyRepositoryBase):
                     dependency VARCHAR
                 );
 
+                CREATE TABLE reversedependencies (
+                    iddependency INTEGER,
+                    idpackage INTEGER,
+                    FOREIGN KEY(idpackage)
+                        REFERENCES baseinfo(idpackage) ON DELETE CASCADE
+                );
+
+                CREATE TABLE reversedependenciesnames (
+                    iddependency INTEGER,
+                    name VARCHAR
+                );
+
                 CREATE TABLE conflicts (
                     idpackage INTEGER,
                     conflict VARCHAR,
@@ -615,20 +710,33 @@ class EntropySQLRepository(EntropyRepositoryBase):
     # Generic repository name to use when none is given.
     GENERIC_NAME = "__generic__"
 
+    # settings table key of the persistent checksum() fingerprint
+    _CHECKSUM_FINGERPRINT_SETTING = "checksum_fingerprint"
+
+    # settings table keys of the repository delta metadata,
+    # see exportDelta()
+    _DELTA_REMOVED_SETTING = "delta_removed"
+    _DELTA_CHECKSUM_SETTING = "delta_checksum"
+
+    # tables whose indexes are used by handlePackage() lookups, kept
+    # by bulkInsert(drop_indexes = True)
+    _BULK_INSERT_INDEXED_TABLES = (
+        "baseinfo", "counters", "categories", "licenses", "flags",
+        "licensedata", "mirrorlinks", "configprotectreference",
+        "contentdirectories", "dependenciesreference", "keywordsreference",
+        "sourcesreference", "useflagsreference")
+
     def __init__(self, db, read_only, skip_checks, indexing,
                  xcache, temporary, name, direct=False, cache_policy=None):
-        # connection and cursor automatic cleanup support
-        self._cleanup_monitor_cache_mutex = threading.Lock()
-        self._cleanup_monitor_cache = {}
-
         self._db = db
         self._indexing = indexing
         self._skip_checks = skip_checks
         self._settings_cache = {}
+        # per-thread connections, the thread local storage is the
+        # lock-free fast path, the pool is used for cleanup.
+        self._thread_local = threading.local()
         self.__connection_pool = {}
         self.__connection_pool_mutex = threading.RLock()
-        self.__cursor_pool_mutex = threading.RLock()
-        self.__cursor_pool = {}
         if name is None:
             name = self.GENERIC_NAME
         self._live_cacher = EntropyRepositoryCacher()
@@ -648,173 +756,141 @@ class EntropySQLRepository(EntropyRepositoryBase):
         pid = os.getpid()
         return self._db, thread_id, pid
 
+    def _createConnection(self):
+        """
+        Return a new Connection object for the calling thread.
+        Must be implemented by subclasses and must return
+        a SQLConnectionWrapper object.
+        """
+        raise NotImplementedError()
+
+    def _thread_connection(self):
+        """
+        Return the _ThreadConnection object of the calling thread,
+        creating it if needed. The common case does not take any lock.
+        """
+        conn_data = getattr(self._thread_local, "connection", None)
+        if conn_data is not None and not conn_data.closed \
+                and conn_data.pid == os.getpid():
+            return conn_data
+        return self._new_thread_connection()
+
+    def _new_thread_connection(self):
+        """
+        Allocate a new Connection for the calling thread and register it
+        into the connection pool. The Connection is released when the
+        thread terminates, through a finalizer bound to an object stored
+        in the thread local storage.
+        """
+        c_key = self._cursor_connection_pool_key()
+        current_thread = threading.current_thread()
+        pool = self._connection_pool()
+        mutex = self._connection_pool_mutex()
+
+        stale = None
+        with mutex:
+            conn_data = pool.get(c_key)
+            if conn_data is not None and not conn_data.closed \
+                    and conn_data.thread is current_thread:
+                # connection pools can be shared among instances
+                # of the same repository.
+                self._thread_local.connection = conn_data
+                return conn_data
+
+            # thread idents are recycled, a connection left behind by
+            # a terminated thread may be there.
+            stale = conn_data
+            conn_data = _ThreadConnection(
+                c_key, current_thread, self._createConnection())
+            pool[c_key] = conn_data
+
+        sentinel = _ThreadSentinel()
+
+        def _finalize(_ref):
+            with mutex:
+                if pool.get(c_key) is conn_data:
+                    pool.pop(c_key)
+            EntropySQLRepository._close_thread_connection(conn_data)
+
+        conn_data.finalizer = weakref.ref(sentinel, _finalize)
+        self._thread_local.connection = conn_data
+        self._thread_local.sentinel = sentinel
+
+        if stale is not None:
+            self._close_thread_connection(stale)
+        return conn_data
+
     def _cleanup_all(self, _cleanup_main_thread=True):
         """
         Clean all the Cursor and Connection resources
-        left open.
+        left open. Connections owned by other alive threads are
+        left untouched, with the exception of the MainThread ones,
+        if _cleanup_main_thread is True.
         """
         if const_debug_enabled():
             const_debug_write(
                 __name__,
                 "called _cleanup_all() for %s" % (self,))
-        with self._cursor_pool_mutex():
-            with self._connection_pool_mutex():
-                th_data = set(self._cursor_pool().keys())
-                th_data.update(self._connection_pool().keys())
-                for c_key in th_data:
-                    self._cleanup_killer(
-                        c_key,
-                        _cleanup_main_thread=_cleanup_main_thread)
 
-    def _cleanup_monitor(self, target_thread, c_key):
+        current_thread = threading.current_thread()
+        released = []
+        with self._connection_pool_mutex():
+            pool = self._connection_pool()
+            for c_key, conn_data in list(pool.items()):
+                thread = conn_data.thread
+                if thread is not current_thread and thread.is_alive():
+                    # closing the main thread objects (forcibly)
+                    # is VERY dangerous, but it turned out
+                    # that the original version of EntropyRepository.close()
+                    # did that (that is why we have rwsems encapsulating
+                    # entropy calls in RigoDaemon and Rigo).
+                    # Also, one expects that close() really terminates
+                    # all the connections and releases all the resources.
+                    if not (_cleanup_main_thread and \
+                                self.isMainThread(thread)):
+                        continue
+                released.append(pool.pop(c_key))
+
+        for conn_data in released:
+            self._close_thread_connection(conn_data)
+
+    @staticmethod
+    def _close_thread_connection(conn_data):
         """
-        Execute Cursor and Connection resources
-        termination.
+        Close the Connection of the given _ThreadConnection object.
         """
-        # join on thread
-        target_thread.join()
-
-        if const_debug_enabled():
-            const_debug_write(
-                __name__,
-                "thread '%s' exited [%s], cleaning: %s" % (
-                    target_thread, hex(target_thread.ident),
-                    c_key,))
-        with self._cleanup_monitor_cache_mutex:
-            self._cleanup_monitor_cache.pop(c_key, None)
-        self._cleanup_killer(c_key)
-
-    def _start_cleanup_monitor(self, current_thread, c_key):
-        """
-        Allocate a new thread that monitors the thread object
-        passed as "current_thread". Once this thread terminates,
-        all its resources are automatically released.
-        current_thread is actually joined() and live cursor and
-        connections are checked against thread identity value
-        clashing (because thread.ident values are recycled).
-        For the main thread, this method is a NO-OP.
-        The allocated thread is a daemon thread, so it should
-        be safe to use join() on daemon threads as well.
-        """
-        if self.isMainThread(current_thread):
-            const_debug_write(
-                __name__,
-                "NOT setting up a cleanup monitor for the MainThread")
-            # do not install any cleanup monitor then
+        if conn_data.closed:
             return
-
-        with self._cleanup_monitor_cache_mutex:
-            mon = self._cleanup_monitor_cache.get(c_key)
-            if mon is not None:
-                # there is already a monitor for this
-                # cache key, quit straight away
-                return
-            self._cleanup_monitor_cache[c_key] = mon
+        conn_data.closed = True
 
         if const_debug_enabled():
             const_debug_write(
                 __name__,
-                "setting up a new cleanup monitor")
-        mon = ParallelTask(self._cleanup_monitor,
-                           current_thread, c_key)
-        mon.name = "CleanupMonitor"
-        mon.daemon = True
-        mon.start()
-
-    def _cleanup_killer(self, c_key, _cleanup_main_thread=False):
-        """
-        Cursor and Connection cleanup method.
-        """
-        db, th_ident, pid = c_key
-
-        with self._cursor_pool_mutex():
-            with self._connection_pool_mutex():
-                cursor_pool = self._cursor_pool()
-                cur = None
-                threads = set()
-
-                cur_data = cursor_pool.get(c_key)
-                if cur_data is not None:
-                    cur, threads = cur_data
-
-                connection_pool = self._connection_pool()
-                conn_data = connection_pool.get(c_key)
-                conn = None
-                if conn_data is not None:
-                    conn, _threads = conn_data
-                    threads |= _threads
-
-                if not threads:
-                    # no threads?
-                    return
-
-                # now cleanup threads set() first
-                # if it's empty, we can kill both
-                # connection and cursor
-                _dead_threads = set(
-                    (x for x in threads if not x.is_alive()))
-                # we need to use the method rather than
-                # the operator, because we alter its data in
-                # place.
-                threads.difference_update(_dead_threads)
-
-                # also remove myself from the list
-                current_thread = threading.current_thread()
-                threads.discard(current_thread)
-
-                # closing the main thread objects (forcibly)
-                # is VERY dangerous, but it turned out
-                # that the original version of EntropyRepository.close()
-                # did that (that is why we have rwsems encapsulating
-                # entropy calls in RigoDaemon and Rigo).
-                # Also, one expects that close() really terminates
-                # all the connections and releases all the resources.
-                if _cleanup_main_thread and threads:
-                    threads.discard(self._MAIN_THREAD)
-
-                if threads:
-                    if const_debug_enabled():
-                        const_debug_write(
-                            __name__,
-                            "_cleanup_killer: "
-                            "there are still alive threads, "
-                            "not cleaning up resources, "
-                            "alive: %s -- dead: %s" % (
-                                threads, _dead_threads,))
-                    return
-
-                cursor_pool.pop(c_key, None)
-                connection_pool.pop(c_key, None)
+                "_close_thread_connection: closing %s" % (
+                    conn_data.key,))
 
+        # WARNING !! BEHAVIOUR CHANGE
+        # no more implicit commit()
+        # caller has to do it!
+        conn = conn_data.connection
+        try:
+            conn.close()
+        except OperationalError as err:
             if const_debug_enabled():
                 const_debug_write(
                     __name__,
-                    "_cleanup_killer: "
-                    "all threads sharing the same "
-                    "ident are gone, i canz kill thread "
-                    "ids: %s." % (hex(th_ident),))
-
-            # WARNING !! BEHAVIOUR CHANGE
-            # no more implicit commit()
-            # caller has to do it!
+                    "_close_thread_connection_1: %s" % (err,))
             try:
+                conn.interrupt()
                 conn.close()
             except OperationalError as err:
+                # heh, unable to close due to
+                # unfinalized statements
+                # interpreter shutdown?
                 if const_debug_enabled():
                     const_debug_write(
                         __name__,
-                        "_cleanup_killer_1: %s" % (err,))
-                try:
-                    conn.interrupt()
-                    conn.close()
-                except OperationalError as err:
-                    # heh, unable to close due to
-                    # unfinalized statements
-                    # interpreter shutdown?
-                    if const_debug_enabled():
-                        const_debug_write(
-                            __name__,
-                            "_cleanup_killer_2: %s" % (err,))
+                        "_close_thread_connection_2: %s" % (err,))
 
     def _concatOperator(self, fields):
         """
@@ -919,18 +995,6 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         return self.__connection_pool_mutex
 
-    def _cursor_pool(self):
-        """
-        Return the Cursor Pool mapping object
-        """
-        return self.__cursor_pool
-
-    def _cursor_pool_mutex(self):
-        """
-        Return the Cursor Pool mapping mutex
-        """
-        return self.__cursor_pool_mutex
-
     def _doesTableExist(self, table, temporary = False):
         """
         Return whether a table exists.
@@ -1006,6 +1070,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
             # database file are opened and used before data is actually written
             # to disk, causing a tricky race condition hard to exploit.
             # So, FIRST commit changes, then call plugins.
+            self._flushReverseDependenciesIndex()
             try:
                 self._connection().commit()
             except OperationalError as err:
@@ -1023,6 +1088,12 @@ class EntropySQLRepository(EntropyRepositoryBase):
         Reimplemented from EntropyRepositoryBase.
         """
         self._connection().rollback()
+        # the pending changes have been rolled back as well
+        self._thread_local.reverse_deps = None
+        bulk = self._bulkInsertStatus()
+        if bulk is not None:
+            # the cached identifiers may belong to rolled back rows
+            bulk.references.clear()
 
     def initializeRepository(self):
         """
@@ -1186,14 +1257,14 @@ class EntropySQLRepository(EntropyRepositoryBase):
         idflags = None
         if not _baseinfo_extrainfo_2010:
             # create new category if it doesn't exist
-            catid = self._isCategoryAvailable(pkg_data['category'])
-            if catid == -1:
-                catid = self._addCategory(pkg_data['category'])
+            catid = self._getReferenceId(
+                "categories", pkg_data['category'],
+                self._isCategoryAvailable, self._addCategory)
 
             # create new license if it doesn't exist
-            licid = self._isLicenseAvailable(pkg_data['license'])
-            if licid == -1:
-                licid = self._addLicense(pkg_data['license'])
+            licid = self._getReferenceId(
+                "licenses", pkg_data['license'],
+                self._isLicenseAvailable, self._addLicense)
 
             idflags = self._areCompileFlagsAvailable(pkg_data['chost'],
                 pkg_data['cflags'], pkg_data['cxxflags'])
@@ -1201,15 +1272,13 @@ class EntropySQLRepository(EntropyRepositoryBase):
                 idflags = self._addCompileFlags(pkg_data['chost'],
                     pkg_data['cflags'], pkg_data['cxxflags'])
 
-        idprotect = self._isProtectAvailable(pkg_data['config_protect'])
-        if idprotect == -1:
-            idprotect = self._addProtect(pkg_data['config_protect'])
+        idprotect = self._getReferenceId(
+            "configprotectreference", pkg_data['config_protect'],
+            self._isProtectAvailable, self._addProtect)
 
-        idprotect_mask = self._isProtectAvailable(
-            pkg_data['config_protect_mask'])
-        if idprotect_mask == -1:
-            idprotect_mask = self._addProtect(
-                pkg_data['config_protect_mask'])
+        idprotect_mask = self._getReferenceId(
+            "configprotectreference", pkg_data['config_protect_mask'],
+            self._isProtectAvailable, self._addProtect)
 
         trigger = 0
         if pkg_data['trigger']:
@@ -1403,9 +1472,17 @@ class EntropySQLRepository(EntropyRepositoryBase):
                 pkg_data, revision = revision,
                 package_id = package_id,
                 formatted_content = formatted_content)
+            self._invalidateReverseDependenciesIndex(
+                self._getReverseDependenciesIndexNames(package_id))
+            bulk = self._bulkInsertStatus()
+            if bulk is not None:
+                bulk.package_ids.add(package_id)
+                return package_id
+            self._updateSearchIndex((package_id,))
+            self._bumpChecksumFingerprint()
             return package_id
         except:
-            self._connection().rollback()
+            self.rollback()
             raise
 
     def removePackage(self, package_id, from_add_package = False):
@@ -1419,12 +1496,102 @@ class EntropySQLRepository(EntropyRepositoryBase):
                 package_id, from_add_package = from_add_package)
             self.clearCache()
 
-            return self._removePackage(package_id,
+            index_names = None
+            if self._doesTableExist("reversedependencies"):
+                index_names = self._getReverseDependenciesIndexNames(
+                    package_id)
+
+            outcome = self._removePackage(package_id,
                 from_add_package = from_add_package)
+            self._removeSearchIndex((package_id,))
+            if index_names is not None:
+                self._invalidateReverseDependenciesIndex(index_names)
+            bulk = self._bulkInsertStatus()
+            if bulk is not None:
+                bulk.package_ids.discard(package_id)
+                return outcome
+            self._bumpChecksumFingerprint()
+            return outcome
         except:
-            self._connection().rollback()
+            self.rollback()
             raise
 
+    @contextlib.contextmanager
+    def bulkInsert(self, drop_indexes = False):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        Reference tables identifiers are cached in memory, the reverse
+        dependencies and full-text search indexes are updated once on
+        exit. If drop_indexes is True and the repository is empty, the
+        indexes not used by handlePackage() lookups are dropped and
+        created again on exit, errors included.
+        Cached identifiers are discarded by rollback().
+        Nested calls are allowed, the work is done by the outermost one.
+        """
+        if self._bulkInsertStatus() is not None:
+            yield
+            return
+
+        indexes = False
+        if drop_indexes and self._indexing and not self.listAllPackageIds():
+            indexes = self._dropIndexes(self._BULK_INSERT_INDEXED_TABLES)
+        bulk = _BulkInsert(indexes)
+        self._thread_local.bulk = bulk
+        try:
+            yield
+        finally:
+            self._thread_local.bulk = None
+            self._completeBulkInsert(bulk)
+
+    def _bulkInsertStatus(self):
+        """
+        Return the _BulkInsert object of the calling thread, if inside
+        a bulkInsert() context, or None.
+        """
+        return getattr(self._thread_local, "bulk", None)
+
+    def _completeBulkInsert(self, bulk):
+        """
+        Execute the work deferred by the given bulkInsert() context.
+        """
+        if bulk.indexes:
+            self.createAllIndexes()
+        self._updateSearchIndex(bulk.package_ids)
+        self._flushReverseDependenciesIndex()
+        self._bumpChecksumFingerprint()
+        self.clearCache()
+
+    def _getReferenceId(self, table, value, is_available, add):
+        """
+        Return the identifier of the given reference table value,
+        adding the value if not available. Inside bulkInsert() contexts,
+        identifiers are cached in memory.
+
+        @param table: reference table name
+        @type table: string
+        @param value: the value
+        @type value: string
+        @param is_available: function returning the value identifier
+            or -1, if not available
+        @type is_available: callable
+        @param add: function adding the value and returning its identifier
+        @type add: callable
+        @return: the value identifier
+        @rtype: int
+        """
+        bulk = self._bulkInsertStatus()
+        if bulk is not None:
+            ref_id = bulk.references.get((table, value))
+            if ref_id is not None:
+                return ref_id
+
+        ref_id = is_available(value)
+        if ref_id == -1:
+            ref_id = add(value)
+        if bulk is not None:
+            bulk.references[(table, value)] = ref_id
+        return ref_id
+
     def _removePackage(self, package_id, from_add_package = False):
         """
         Reimplemented from EntropyRepositoryBase.
@@ -1563,6 +1730,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         self._cursor().execute("""
         UPDATE extrainfo SET datecreation = ? WHERE idpackage = ?
         """, (str(date), package_id,))
+        self._bumpChecksumFingerprint()
 
     def setDigest(self, package_id, digest):
         """
@@ -1571,6 +1739,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         self._cursor().execute("""
         UPDATE extrainfo SET digest = ? WHERE idpackage = ?
         """, (digest, package_id,))
+        self._bumpChecksumFingerprint()
 
     def setSignatures(self, package_id, sha1, sha256, sha512, gpg = None):
         """
@@ -1580,6 +1749,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         UPDATE packagesignatures SET sha1 = ?, sha256 = ?, sha512 = ?,
         gpg = ? WHERE idpackage = ?
         """, (sha1, sha256, sha512, gpg, package_id))
+        self._bumpChecksumFingerprint()
 
     def setDownloadURL(self, package_id, url):
         """
@@ -1593,6 +1763,27 @@ class EntropySQLRepository(EntropyRepositoryBase):
         self._cursor().execute("""
         UPDATE extrainfo SET download = ? WHERE idpackage = ?
         """, (url, package_id,))
+        self._bumpChecksumFingerprint()
+
+    def setDescription(self, package_id, description):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        """
+        self._cursor().execute("""
+        UPDATE extrainfo SET description = ? WHERE idpackage = ?
+        """, (description, package_id,))
+        self._updateSearchIndex((package_id,))
+        self._bumpChecksumFingerprint()
+
+    def setHomepage(self, package_id, homepage):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        """
+        self._cursor().execute("""
+        UPDATE extrainfo SET homepage = ? WHERE idpackage = ?
+        """, (homepage, package_id,))
+        self._updateSearchIndex((package_id,))
+        self._bumpChecksumFingerprint()
 
     def setCategory(self, package_id, category):
         """
@@ -1601,6 +1792,9 @@ class EntropySQLRepository(EntropyRepositoryBase):
         self._cursor().execute("""
         UPDATE baseinfo SET category = ? WHERE idpackage = ?
         """, (category, package_id,))
+        self._invalidateReverseDependenciesIndex(
+            self._getReverseDependenciesIndexNames(package_id))
+        self._bumpChecksumFingerprint()
 
     def setCategoryDescription(self, category, description_data):
         """
@@ -1619,10 +1813,20 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
+        index_names = None
+        if self._doesTableExist("reversedependencies"):
+            index_names = self._getReverseDependenciesIndexNames(package_id)
+
         self._cursor().execute("""
         UPDATE baseinfo SET name = ? WHERE idpackage = ?
         """, (name, package_id,))
 
+        if index_names is not None:
+            index_names.add(name)
+            self._invalidateReverseDependenciesIndex(index_names)
+        self._updateSearchIndex((package_id,))
+        self._bumpChecksumFingerprint()
+
     def setDependency(self, iddependency, dependency):
         """
         Reimplemented from EntropyRepositoryBase.
@@ -1631,6 +1835,9 @@ class EntropySQLRepository(EntropyRepositoryBase):
         UPDATE dependenciesreference SET dependency = ?
         WHERE iddependency = ?
         """, (dependency, iddependency,))
+        self._invalidateReverseDependenciesIndex(
+            dependency_ids = (iddependency,))
+        self._bumpChecksumFingerprint()
 
     def setAtom(self, package_id, atom):
         """
@@ -1639,6 +1846,8 @@ class EntropySQLRepository(EntropyRepositoryBase):
         self._cursor().execute("""
         UPDATE baseinfo SET atom = ? WHERE idpackage = ?
         """, (atom, package_id,))
+        self._updateSearchIndex((package_id,))
+        self._bumpChecksumFingerprint()
 
     def setSlot(self, package_id, slot):
         """
@@ -1647,6 +1856,9 @@ class EntropySQLRepository(EntropyRepositoryBase):
         self._cursor().execute("""
         UPDATE baseinfo SET slot = ? WHERE idpackage = ?
         """, (slot, package_id,))
+        self._invalidateReverseDependenciesIndex(
+            self._getReverseDependenciesIndexNames(package_id))
+        self._bumpChecksumFingerprint()
 
     def setRevision(self, package_id, revision):
         """
@@ -1655,6 +1867,9 @@ class EntropySQLRepository(EntropyRepositoryBase):
         self._cursor().execute("""
         UPDATE baseinfo SET revision = ? WHERE idpackage = ?
         """, (revision, package_id,))
+        self._invalidateReverseDependenciesIndex(
+            self._getReverseDependenciesIndexNames(package_id))
+        self._bumpChecksumFingerprint()
 
     def removeDependencies(self, package_id):
         """
@@ -1663,6 +1878,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         self._cursor().execute("""
         DELETE FROM dependencies WHERE idpackage = ?
         """, (package_id,))
+        self._bumpChecksumFingerprint()
 
     def insertDependencies(self, package_id, depdata):
         """
@@ -1680,9 +1896,9 @@ class EntropySQLRepository(EntropyRepositoryBase):
                 elif not isinstance(dep, const_get_stringtype()):
                     dep, deptype = dep
 
-                iddep = self._isDependencyAvailable(dep)
-                if iddep == -1:
-                    iddep = self._addDependency(dep)
+                iddep = self._getReferenceId(
+                    "dependenciesreference", dep,
+                    self._isDependencyAvailable, self._addDependency)
 
                 deps.append((package_id, iddep, deptype,))
 
@@ -1691,6 +1907,9 @@ class EntropySQLRepository(EntropyRepositoryBase):
         self._cursor().executemany("""
         INSERT INTO dependencies VALUES (?, ?, ?)
         """, insert_list())
+        self._invalidateReverseDependenciesIndex(unindexed = True)
+        if self._bulkInsertStatus() is None:
+            self._bumpChecksumFingerprint()
 
     def removeConflicts(self, package_id):
         """
@@ -1716,6 +1935,28 @@ class EntropySQLRepository(EntropyRepositoryBase):
         INSERT INTO conflicts VALUES (?, ?)
         """, [(package_id, x,) for x in conflicts])
 
+    def removeProvide(self, package_id):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        """
+        index_names = self._getReverseDependenciesIndexNames(package_id)
+        self._cursor().execute("""
+        DELETE FROM provide WHERE idpackage = ?
+        """, (package_id,))
+        self._invalidateReverseDependenciesIndex(index_names)
+        self._updateSearchIndex((package_id,))
+        self._bumpChecksumFingerprint()
+
+    def insertProvide(self, package_id, provides):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        """
+        self._insertProvide(package_id, provides)
+        self._invalidateReverseDependenciesIndex(
+            self._getReverseDependenciesIndexNames(package_id))
+        self._updateSearchIndex((package_id,))
+        self._bumpChecksumFingerprint()
+
     def insertContent(self, package_id, content, already_formatted = False):
         """
         Reimplemented from EntropyRepositoryBase.
@@ -1751,14 +1992,68 @@ class EntropySQLRepository(EntropyRepositoryBase):
                     x = self._iter.next()
                     return self._package_id, x, self._content[x]
 
-        if already_formatted:
+        if not self._isContentInterned():
             self._cursor().executemany("""
             INSERT INTO content VALUES (?, ?, ?)
             """, MyIter(package_id, content, already_formatted))
-        else:
+            return
+
+        # directories are interned, files are inserted in chunks
+        # to keep memory usage bounded.
+        directories = {}
+        files = []
+        for _package_id, path, ftype in MyIter(
+                package_id, content, already_formatted):
+            directory, name = self._splitContentPath(path)
+            iddirectory = directories.get(directory)
+            if iddirectory is None:
+                iddirectory = self._getReferenceId(
+                    "contentdirectories", directory,
+                    self._isContentDirectoryAvailable,
+                    self._addContentDirectory)
+                directories[directory] = iddirectory
+            files.append((package_id, iddirectory, name, ftype))
+            if len(files) >= 1024:
+                self._cursor().executemany("""
+                INSERT INTO contentfiles VALUES (?, ?, ?, ?)
+                """, files)
+                del files[:]
+        if files:
             self._cursor().executemany("""
-            INSERT INTO content VALUES (?, ?, ?)
-            """, MyIter(package_id, content, already_formatted))
+            INSERT INTO contentfiles VALUES (?, ?, ?, ?)
+            """, files)
+
+    def _isContentInterned(self):
+        """
+        Return whether package files are stored in the path-interned
+        layout (contentdirectories and contentfiles tables, read through
+        the content view) rather than in the legacy content table.
+        """
+        return self._doesTableExist("contentfiles")
+
+    @staticmethod
+    def _splitContentPath(path):
+        """
+        Split a file path into its directory, including the trailing
+        slash, and its name, so that directory + name == path.
+        """
+        idx = path.rfind("/") + 1
+        return path[:idx], path[idx:]
+
+    def _addContentDirectory(self, directory):
+        """
+        Add a package files directory to repository. Return its
+        identifier (iddirectory).
+
+        @param directory: directory path, including the trailing slash
+        @type directory: string
+        @return: directory identifier (iddirectory)
+        @rtype: int
+        """
+        cur = self._cursor().execute("""
+        INSERT INTO contentdirectories VALUES (NULL, ?)
+        """, (directory,))
+        return cur.lastrowid
 
     def _insertContentSafety(self, package_id, content_safety):
         """
@@ -1934,10 +2229,9 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
 
         def mymf(key):
-            idkeyword = self._isKeywordAvailable(key)
-            if idkeyword == -1:
-                # create category
-                idkeyword = self._addKeyword(key)
+            idkeyword = self._getReferenceId(
+                "keywordsreference", key,
+                self._isKeywordAvailable, self._addKeyword)
             return (package_id, idkeyword,)
 
         self._cursor().executemany("""
@@ -1955,10 +2249,9 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
 
         def mymf(flag):
-            iduseflag = self._isUseflagAvailable(flag)
-            if iduseflag == -1:
-                # create category
-                iduseflag = self._addUseflag(flag)
+            iduseflag = self._getReferenceId(
+                "useflagsreference", flag,
+                self._isUseflagAvailable, self._addUseflag)
             return (package_id, iduseflag,)
 
         self._cursor().executemany("""
@@ -2079,9 +2372,9 @@ class EntropySQLRepository(EntropyRepositoryBase):
             (not entropy.tools.is_valid_string(source)):
                 return 0
 
-            idsource = self._isSourceAvailable(source)
-            if idsource == -1:
-                idsource = self._addSource(source)
+            idsource = self._getReferenceId(
+                "sourcesreference", source,
+                self._isSourceAvailable, self._addSource)
 
             return (package_id, idsource,)
 
@@ -2382,6 +2675,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         self._cleanupSources()
         self._cleanupDependencies()
         self._cleanupChangelogs()
+        self._cleanupContentDirectories()
 
     def _cleanupChangelogs(self):
         """
@@ -2404,6 +2698,16 @@ class EntropySQLRepository(EntropyRepositoryBase):
         DELETE FROM useflagsreference
         WHERE idflag NOT IN (SELECT idflag FROM useflags)""")
 
+    def _cleanupContentDirectories(self):
+        """
+        Cleanup package files directories unused references to save space.
+        """
+        if not self._isContentInterned():
+            return
+        self._cursor().execute("""
+        DELETE FROM contentdirectories
+        WHERE iddirectory NOT IN (SELECT iddirectory FROM contentfiles)""")
+
     def _cleanupSources(self):
         """
         Cleanup "sources" metadata unused references to save space.
@@ -2420,6 +2724,16 @@ class EntropySQLRepository(EntropyRepositoryBase):
         DELETE FROM dependenciesreference
         WHERE iddependency NOT IN (SELECT iddependency FROM dependencies)
         """)
+        if self._doesTableExist("reversedependencies"):
+            self._cursor().execute("""
+            DELETE FROM reversedependencies WHERE iddependency NOT IN
+                (SELECT iddependency FROM dependenciesreference)
+            """)
+            self._cursor().execute("""
+            DELETE FROM reversedependenciesnames WHERE iddependency NOT IN
+                (SELECT iddependency FROM dependenciesreference)
+            """)
+        self._bumpChecksumFingerprint()
 
     def getFakeSpmUid(self):
         """
@@ -3703,11 +4017,19 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
-        cached = self._getLiveCache("reverseDependenciesMetadata")
-        if cached is None:
-            cached = self._generateReverseDependenciesMetadata()
+        if self._isReverseDependenciesIndexAvailable():
+            self._flushReverseDependenciesIndex()
+            cached = None
+            cur = self._cursor().execute("""
+            SELECT iddependency FROM reversedependencies WHERE idpackage = ?
+            """, (package_id,))
+            dep_ids = self._cur2frozenset(cur)
+        else:
+            cached = self._getLiveCache("reverseDependenciesMetadata")
+            if cached is None:
+                cached = self._generateReverseDependenciesMetadata()
+            dep_ids = cached.get(package_id)
 
-        dep_ids = set((k for k, v in cached.items() if package_id in v))
         if not dep_ids:
             # avoid python3.x memleak
             del cached
@@ -3826,18 +4148,30 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
+        if self._isReverseDependenciesIndexAvailable():
+            self._flushReverseDependenciesIndex()
+            cur = self._cursor().execute("""
+            SELECT idpackage FROM reversedependencies LIMIT 1
+            """)
+            if cur.fetchone() is None:
+                return tuple()
+            cur = self._cursor().execute("""
+            SELECT idpackage FROM baseinfo
+            WHERE idpackage NOT IN (
+                SELECT idpackage FROM reversedependencies)
+            ORDER BY atom
+            """)
+            return self._cur2tuple(cur)
+
         cached = self._getLiveCache("reverseDependenciesMetadata")
         if cached is None:
             cached = self._generateReverseDependenciesMetadata()
 
-        pkg_ids = set()
-        for v in cached.values():
-            pkg_ids |= v
-        if not pkg_ids:
+        if not cached:
             # avoid python3.x memleak
             del cached
             return tuple()
-        pkg_ids_str = ', '.join((str(x) for x in pkg_ids))
+        pkg_ids_str = ', '.join((str(x) for x in cached))
 
         cur = self._cursor().execute("""
         SELECT idpackage FROM baseinfo
@@ -3898,8 +4232,16 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
-        cur = self._cursor().execute("""
-        SELECT idpackage FROM content WHERE file = ?""", (path,))
+        if self._isContentInterned():
+            cur = self._cursor().execute("""
+            SELECT contentfiles.idpackage
+            FROM contentdirectories, contentfiles
+            WHERE contentdirectories.directory = ?
+            AND contentfiles.iddirectory = contentdirectories.iddirectory
+            AND contentfiles.name = ?""", self._splitContentPath(path))
+        else:
+            cur = self._cursor().execute("""
+            SELECT idpackage FROM content WHERE file = ?""", (path,))
         result = self._cur2frozenset(cur)
         if get_id:
             return result
@@ -3907,6 +4249,62 @@ class EntropySQLRepository(EntropyRepositoryBase):
             return True
         return False
 
+    def resolveFileOwners(self, paths):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        """
+        owners = {}
+        paths = frozenset(paths)
+        if not paths:
+            return owners
+
+        table = "fileowners_lookup"
+        interned = self._isContentInterned()
+        if interned:
+            self._cursor().executescript("""
+                DROP TABLE IF EXISTS `%s`;
+                CREATE TEMPORARY TABLE `%s` (
+                    file VARCHAR, directory VARCHAR, name VARCHAR );
+                """ % (table, table,))
+        else:
+            self._cursor().executescript("""
+                DROP TABLE IF EXISTS `%s`;
+                CREATE TEMPORARY TABLE `%s` ( file VARCHAR );
+                """ % (table, table,))
+
+        try:
+            if interned:
+                self._cursor().executemany("""
+                INSERT INTO `%s` VALUES (?, ?, ?)""" % (table,),
+                    ((x,) + self._splitContentPath(x) for x in paths))
+                cur = self._cursor().execute("""
+                SELECT `%s`.file, contentfiles.idpackage
+                FROM `%s`, contentdirectories, contentfiles
+                WHERE contentdirectories.directory = `%s`.directory
+                AND contentfiles.iddirectory = contentdirectories.iddirectory
+                AND contentfiles.name = `%s`.name""" % (
+                        table, table, table, table,))
+            else:
+                self._cursor().executemany("""
+                INSERT INTO `%s` VALUES (?)""" % (table,),
+                    ((x,) for x in paths))
+                cur = self._cursor().execute("""
+                SELECT `%s`.file, content.idpackage FROM `%s`, content
+                WHERE content.file = `%s`.file""" % (table, table, table,))
+
+            for path, package_id in cur:
+                obj = owners.get(path)
+                if obj is None:
+                    obj = owners[path] = set()
+                obj.add(package_id)
+
+        finally:
+            self._cursor().execute('DROP TABLE IF EXISTS `%s`' % (table,))
+
+        for path, package_ids in owners.items():
+            owners[path] = frozenset(package_ids)
+        return owners
+
     def resolveNeeded(self, needed, elfclass = -1, extended = False):
         """
         Reimplemented from EntropyRepositoryBase.
@@ -3928,6 +4326,25 @@ class EntropySQLRepository(EntropyRepositoryBase):
         WHERE library = ?""" + elfclass_txt, args)
         return self._cur2frozenset(cur)
 
+    def _isContentDirectoryAvailable(self, directory):
+        """
+        Return whether given package files directory is available in
+        repository. Returns its identifier (iddirectory).
+
+        @param directory: directory path, including the trailing slash
+        @type directory: string
+        @return: directory identifier (iddirectory) or -1 if not found
+        @rtype: int
+        """
+        cur = self._cursor().execute("""
+        SELECT iddirectory FROM contentdirectories WHERE directory = ?
+        LIMIT 1
+        """, (directory,))
+        result = cur.fetchone()
+        if result:
+            return result[0]
+        return -1
+
     def _isSourceAvailable(self, source):
         """
         Return whether given source package URL is available in repository.
@@ -4078,6 +4495,9 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
+        if self._isContentInterned():
+            return self._searchBelongsInterned(bfile, like)
+
         if like:
             cur = self._cursor().execute("""
             SELECT content.idpackage FROM content,baseinfo
@@ -4091,6 +4511,50 @@ class EntropySQLRepository(EntropyRepositoryBase):
 
         return self._cur2frozenset(cur)
 
+    def _searchBelongsInterned(self, bfile, like):
+        """
+        searchBelongs() implementation for the path-interned content
+        layout. Exact lookups and LIKE patterns starting with a directory
+        are served by the contentdirectories indexes.
+        """
+        if not like:
+            cur = self._cursor().execute("""
+            SELECT contentfiles.idpackage
+            FROM contentdirectories, contentfiles, baseinfo
+            WHERE contentdirectories.directory = ?
+            AND contentfiles.iddirectory = contentdirectories.iddirectory
+            AND contentfiles.name = ?
+            AND contentfiles.idpackage = baseinfo.idpackage
+            """, self._splitContentPath(bfile))
+            return self._cur2frozenset(cur)
+
+        # the directory part of the pattern literal prefix restricts
+        # the directories to look at: the ones within the
+        # [prefix, prefix[:-1] + "0") case insensitive range (as LIKE is).
+        literal = bfile
+        for wildcard in ("%", "_"):
+            idx = literal.find(wildcard)
+            if idx != -1:
+                literal = literal[:idx]
+        prefix, _name = self._splitContentPath(literal)
+
+        range_str = ""
+        range_args = tuple()
+        if prefix.startswith("/"):
+            range_str = """
+            AND contentdirectories.directory >= ? COLLATE NOCASE
+            AND contentdirectories.directory < ? COLLATE NOCASE"""
+            range_args = (prefix, prefix[:-1] + "0")
+
+        cur = self._cursor().execute("""
+        SELECT contentfiles.idpackage
+        FROM contentdirectories, contentfiles, baseinfo
+        WHERE contentfiles.iddirectory = contentdirectories.iddirectory
+        AND contentdirectories.directory || contentfiles.name LIKE ? %s
+        AND contentfiles.idpackage = baseinfo.idpackage
+        """ % (range_str,), (bfile,) + range_args)
+        return self._cur2frozenset(cur)
+
     def searchContentSafety(self, sfile):
         """
         Search content safety metadata (usually, sha256 and mtime) related to
@@ -4388,37 +4852,116 @@ class EntropySQLRepository(EntropyRepositoryBase):
         if just_id:
             search_elements = 'idpackage'
 
+        # the full-text search index (if any) narrows the candidates,
+        # the LIKE predicates below still decide the match.
+        atom_filter, atom_filter_args = self._searchIndexFilter(
+            "t.idpackage", "atom", (like_keyword,))
+        provide_filter, provide_filter_args = self._searchIndexFilter(
+            "d.idpackage", "provide", (like_keyword,))
+        searchkeywords = (like_keyword,) + atom_filter_args + \
+            (like_keyword,) + provide_filter_args + searchkeywords[2:]
+
         if sensitive:
             cur = self._cursor().execute("""
             SELECT DISTINCT %s FROM (
                 SELECT %s FROM baseinfo t
-                    WHERE t.atom LIKE ?
+                    WHERE t.atom LIKE ? %s
                 UNION ALL
                 SELECT %s FROM baseinfo d, provide as p
                     WHERE d.idpackage = p.idpackage
-                    AND p.atom LIKE ?
+                    AND p.atom LIKE ? %s
             ) WHERE 1=1 %s %s %s
-            """ % (search_elements, search_elements_all,
-                search_elements_provide_all, slotstring, tagstring,
-                order_by_string), searchkeywords)
+            """ % (search_elements, search_elements_all, atom_filter,
+                search_elements_provide_all, provide_filter, slotstring,
+                tagstring, order_by_string), searchkeywords)
         else:
             cur = self._cursor().execute("""
             SELECT DISTINCT %s FROM (
                 SELECT %s FROM baseinfo t
-                    WHERE LOWER(t.atom) LIKE ?
+                    WHERE LOWER(t.atom) LIKE ? %s
                 UNION ALL
                 SELECT %s FROM baseinfo d, provide as p
                     WHERE d.idpackage = p.idpackage
-                    AND LOWER(p.atom) LIKE ?
+                    AND LOWER(p.atom) LIKE ? %s
             ) WHERE 1=1 %s %s %s
-            """ % (search_elements, search_elements_all,
-                search_elements_provide_all, slotstring, tagstring,
-                order_by_string), searchkeywords)
+            """ % (search_elements, search_elements_all, atom_filter,
+                search_elements_provide_all, provide_filter, slotstring,
+                tagstring, order_by_string), searchkeywords)
 
         if just_id:
             return self._cur2tuple(cur)
         return tuple(cur)
 
+    def searchPackagesRanked(self, keyword, limit = None, just_id = False,
+                             description = True):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        """
+        words = keyword.lower().split()
+        if not words:
+            return tuple()
+        keyword = " ".join(words)
+
+        def _rank(item):
+            atom, package_id, name, score = item
+            name = name.lower()
+            if name == keyword:
+                tier = 0
+            elif name.startswith(keyword):
+                tier = 1
+            elif keyword in name:
+                tier = 2
+            elif all(x in atom.lower() for x in words):
+                tier = 3
+            else:
+                tier = 4
+            return (tier, score, len(name), atom)
+
+        results = sorted(
+            self._searchRankedCandidates(words, description), key = _rank)
+        if limit is not None:
+            results = results[:limit]
+        if just_id:
+            return tuple(x[1] for x in results)
+        return tuple((x[0], x[1]) for x in results)
+
+    def _searchRankedCandidates(self, words, description):
+        """
+        Return the packages matching all the given (lowercase) words in
+        any of their name, atom, provide and, if description is True,
+        description or homepage as an iterable of
+        (atom, package_id, name, score) tuples, where a lower score means
+        a better match.
+        """
+        extra_str = ""
+        extra_count = 0
+        if description:
+            extra_str = """
+            LOWER(extrainfo.description) LIKE ? ESCAPE '!' OR
+            LOWER(extrainfo.homepage) LIKE ? ESCAPE '!' OR"""
+            extra_count = 2
+
+        query_str_list = []
+        query_args = []
+        for word in words:
+            # words are plain text, not LIKE patterns
+            like_word = "%" + word.replace("!", "!!").replace(
+                "%", "!%").replace("_", "!_") + "%"
+            query_str_list.append("""(
+            LOWER(baseinfo.atom) LIKE ? ESCAPE '!' OR%s
+            baseinfo.idpackage IN (
+                SELECT idpackage FROM provide
+                WHERE LOWER(atom) LIKE ? ESCAPE '!'))
+            """ % (extra_str,))
+            query_args.extend([like_word] * (2 + extra_count))
+
+        cur = self._cursor().execute("""
+        SELECT baseinfo.atom, baseinfo.idpackage, baseinfo.name, 0.0
+        FROM baseinfo, extrainfo
+        WHERE baseinfo.idpackage = extrainfo.idpackage AND %s
+        """ % (" AND ".join(query_str_list),), query_args)
+        return cur.fetchall()
+
     def searchProvidedVirtualPackage(self, keyword):
         """
         Search in old-style Portage PROVIDE metadata.
@@ -4447,7 +4990,10 @@ class EntropySQLRepository(EntropyRepositoryBase):
         for sub_keyword in keyword_split:
             query_str_list.append("LOWER(extrainfo.description) LIKE ?")
             query_args.append("%" + sub_keyword + "%")
-        query_str = " AND ".join(query_str_list)
+        index_filter, index_filter_args = self._searchIndexFilter(
+            "baseinfo.idpackage", "description", query_args)
+        query_str = " AND ".join(query_str_list) + index_filter
+        query_args.extend(index_filter_args)
         if just_id:
             cur = self._cursor().execute("""
             SELECT baseinfo.idpackage FROM extrainfo, baseinfo
@@ -4488,19 +5034,23 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
+        like_keyword = "%"+keyword.lower()+"%"
+        index_filter, index_filter_args = self._searchIndexFilter(
+            "baseinfo.idpackage", "homepage", (like_keyword,))
+        query_args = (like_keyword,) + index_filter_args
         if just_id:
             cur = self._cursor().execute("""
             SELECT baseinfo.idpackage FROM extrainfo, baseinfo
-            WHERE LOWER(extrainfo.homepage) LIKE ? AND
+            WHERE LOWER(extrainfo.homepage) LIKE ? %s AND
             baseinfo.idpackage = extrainfo.idpackage
-            """, ("%"+keyword.lower()+"%",))
+            """ % (index_filter,), query_args)
             return self._cur2frozenset(cur)
         else:
             cur = self._cursor().execute("""
             SELECT baseinfo.atom, baseinfo.idpackage FROM extrainfo, baseinfo
-            WHERE LOWER(extrainfo.homepage) LIKE ? AND
+            WHERE LOWER(extrainfo.homepage) LIKE ? %s AND
             baseinfo.idpackage = extrainfo.idpackage
-            """, ("%"+keyword.lower()+"%",))
+            """ % (index_filter,), query_args)
             return frozenset(cur)
 
     def searchName(self, keyword, sensitive = False, just_id = False):
@@ -4567,6 +5117,63 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """, (name, category))
         return tuple(cur)
 
+    def _atomMatchCandidates(self, atoms):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        Read the packages whose name is referenced by atoms with a single
+        query (and their USE flags, if atoms contain USE dependencies).
+        "or" dependencies and old-style virtuals, resolved through the
+        provide table, are left to atomMatch().
+        """
+        names = set()
+        candidate_atoms = set()
+        use_deps = False
+        for atom in atoms:
+            cat_name = self._atomMatchName(atom)
+            if cat_name is None:
+                continue
+            category, name = cat_name
+            if category == self.VIRTUAL_META_PACKAGE_CATEGORY:
+                continue
+            names.add(name)
+            candidate_atoms.add(atom)
+            if not use_deps and "[" in atom:
+                use_deps = True
+
+        if not candidate_atoms:
+            return None
+
+        # stay below SQLITE_MAX_VARIABLE_NUMBER
+        chunk_size = 500
+        names = list(names)
+        packages = []
+        for idx in range(0, len(names), chunk_size):
+            chunk = names[idx:idx + chunk_size]
+            cur = self._cursor().execute("""
+            SELECT idpackage, category, name, version, versiontag,
+                revision, slot
+            FROM baseinfo WHERE name IN ( %s )
+            """ % (", ".join(["?"] * len(chunk)),), chunk)
+            packages.extend(cur)
+
+        useflags = None
+        if use_deps:
+            useflags = {}
+            package_ids = [x[0] for x in packages]
+            for idx in range(0, len(package_ids), chunk_size):
+                chunk = package_ids[idx:idx + chunk_size]
+                cur = self._cursor().execute("""
+                SELECT useflags.idpackage, useflagsreference.flagname
+                FROM useflags, useflagsreference
+                WHERE useflags.idpackage IN ( %s )
+                AND useflags.idflag = useflagsreference.idflag
+                """ % (", ".join(["?"] * len(chunk)),), chunk)
+                for package_id, flag in cur:
+                    obj = useflags.setdefault(package_id, set())
+                    obj.add(flag)
+
+        return _AtomMatchCandidates(self, candidate_atoms, packages, useflags)
+
     def isPackageScopeAvailable(self, atom, slot, revision):
         """
         Reimplemented from EntropyRepositoryBase.
@@ -4813,6 +5420,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         self._cursor().execute("""
         UPDATE baseinfo SET branch = ?
         WHERE idpackage = ?""", (tobranch, package_id,))
+        self._bumpChecksumFingerprint()
         self.clearCache()
 
     def getSetting(self, setting_name):
@@ -4860,6 +5468,56 @@ class EntropySQLRepository(EntropyRepositoryBase):
             const_convert_to_unicode(setting_value),))
         self._settings_cache.clear()
 
+    def _bumpChecksumFingerprint(self):
+        """
+        Advance the persistent repository fingerprint returned by
+        checksum() when do_order is False. Every method writing to the
+        tables covered by checksum() must call this, so that memoized
+        results keyed by the checksum are invalidated.
+        """
+        try:
+            current = self.getSetting(self._CHECKSUM_FINGERPRINT_SETTING)
+        except KeyError:
+            current = ""
+
+        sha = hashlib.sha1()
+        sha.update(const_convert_to_rawstring(current))
+        sha.update(os.urandom(20))
+        self._setSetting(self._CHECKSUM_FINGERPRINT_SETTING, sha.hexdigest())
+        self._clearLiveCache("checksumFingerprint")
+
+    def _checksumFingerprint(self):
+        """
+        Return the persistent repository fingerprint, or None if this
+        repository does not have one yet (it has never been written by
+        a fingerprint aware Entropy version).
+        The fingerprint is mixed with the number of packages and the
+        highest package identifier, as a cheap guard against writers
+        that do not call _bumpChecksumFingerprint().
+        """
+        cached = self._getLiveCache("checksumFingerprint")
+        if cached is not None:
+            return cached
+        # avoid memleak with python3.x
+        del cached
+
+        try:
+            fingerprint = self.getSetting(self._CHECKSUM_FINGERPRINT_SETTING)
+        except KeyError:
+            return None
+
+        cur = self._cursor().execute("""
+        SELECT COUNT(idpackage), MAX(idpackage) FROM baseinfo
+        """)
+        count, max_package_id = cur.fetchone()
+
+        sha = hashlib.sha1()
+        sha.update(const_convert_to_rawstring(
+            "%s|%s|%s" % (fingerprint, count, max_package_id)))
+        result = sha.hexdigest()
+        self._setLiveCache("checksumFingerprint", result)
+        return result
+
     def _setupInitialSettings(self):
         """
         Not implemented, subclasses must implement this.
@@ -4917,6 +5575,119 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         raise NotImplementedError()
 
+    @staticmethod
+    def _canonicalRepr(obj):
+        """
+        Return a string representation of the given package metadata
+        object which does not depend on dict and set ordering.
+        """
+        canonical = EntropySQLRepository._canonicalRepr
+        if isinstance(obj, dict):
+            return "{%s}" % (", ".join(sorted(
+                "%s: %s" % (canonical(k), canonical(v))
+                for k, v in obj.items())),)
+        elif isinstance(obj, (set, frozenset, list)):
+            # lists are built out of sets too, do not trust their order
+            return "[%s]" % (", ".join(sorted(canonical(x) for x in obj)),)
+        elif isinstance(obj, tuple):
+            return "(%s)" % (", ".join(canonical(x) for x in obj),)
+        elif isinstance(obj, const_get_stringtype()):
+            return repr(const_convert_to_unicode(obj))
+        return repr(obj)
+
+    def _packageDataDigest(self, package_id):
+        """
+        Return the digest of the package metadata shipped by repository
+        deltas, see exportDelta().
+        """
+        pkg_data = self.getPackageData(package_id, get_content = False,
+            get_changelog = False, get_content_safety = False)
+        m = hashlib.sha1()
+        m.update(const_convert_to_rawstring(self._canonicalRepr(pkg_data)))
+        return m.hexdigest()
+
+    def _listAllRepositoryUpdatesDigests(self):
+        """
+        Return the tree updates digests of all the repositories as tuple
+        of (repository, digest).
+        """
+        cur = self._cursor().execute("""
+        SELECT repository, digest FROM treeupdates
+        """)
+        return tuple(cur)
+
+    def listAllPackageDataDigests(self):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        """
+        return dict((x, self._packageDataDigest(x)) \
+                        for x in self.listAllPackageIds())
+
+    def exportDelta(self, delta_repo, base_digests):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        """
+        digests = self.listAllPackageDataDigests()
+        removed = sorted(x for x, y in base_digests.items() \
+                             if digests.get(x) != y)
+        added = sorted(x for x, y in digests.items() \
+                           if base_digests.get(x) != y)
+
+        with delta_repo.bulkInsert(drop_indexes = True):
+            for package_id in added:
+                pkg_data = self.getPackageData(package_id,
+                    get_content = False, get_changelog = False,
+                    get_content_safety = False)
+                delta_repo.addPackage(pkg_data,
+                    revision = pkg_data['revision'],
+                    package_id = package_id)
+
+        delta_repo.bumpTreeUpdatesActions(self.listAllTreeUpdatesActions())
+        for repository, digest in self._listAllRepositoryUpdatesDigests():
+            delta_repo.setRepositoryUpdatesDigest(repository, digest)
+        delta_repo.insertPackageSets(self.retrievePackageSets())
+
+        delta_repo._setSetting(self._DELTA_REMOVED_SETTING,
+            " ".join([str(x) for x in removed]))
+        delta_repo._setSetting(self._DELTA_CHECKSUM_SETTING,
+            self.checksum(do_order = True, strict = False,
+                          include_signatures = True))
+        delta_repo.commit()
+        return digests
+
+    def importDelta(self, delta_repo):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        """
+        try:
+            removed = delta_repo.getSetting(self._DELTA_REMOVED_SETTING)
+            checksum = delta_repo.getSetting(self._DELTA_CHECKSUM_SETTING)
+        except KeyError as err:
+            raise SystemDatabaseError(
+                "invalid repository delta: %s" % (err,))
+
+        with self.bulkInsert():
+            # changed packages are both removed and added
+            for package_id in removed.split():
+                self.removePackage(int(package_id))
+            for package_id in delta_repo.listAllPackageIds(
+                    order_by = "package_id"):
+                pkg_data = delta_repo.getPackageData(package_id,
+                    get_content = False, get_changelog = False,
+                    get_content_safety = False)
+                self.addPackage(pkg_data,
+                    revision = pkg_data['revision'],
+                    package_id = package_id)
+
+        self.bumpTreeUpdatesActions(delta_repo.listAllTreeUpdatesActions())
+        for repository, digest in \
+                delta_repo._listAllRepositoryUpdatesDigests():
+            self.setRepositoryUpdatesDigest(repository, digest)
+        self.clearPackageSets()
+        self.insertPackageSets(delta_repo.retrievePackageSets())
+        self.commit()
+        return checksum
+
     def _listAllTables(self):
         """
         Not implemented, subclasses must implement this.
@@ -4935,6 +5706,11 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
+        if not do_order and self._doesTableExist("baseinfo"):
+            fingerprint = self._checksumFingerprint()
+            if fingerprint is not None:
+                return fingerprint
+
         cache_key = "checksum_%s_%s_True_%s_%s" % (
             do_order, strict, include_signatures, include_dependencies)
         cached = self._getLiveCache(cache_key)
@@ -5105,7 +5881,11 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
-        self._cursor().execute('DELETE FROM content')
+        if self._isContentInterned():
+            self._cursor().execute('DELETE FROM contentfiles')
+            self._cursor().execute('DELETE FROM contentdirectories')
+        else:
+            self._cursor().execute('DELETE FROM content')
         self.dropContentSafety()
 
     def dropContentSafety(self):
@@ -5125,6 +5905,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         Reimplemented from EntropyRepositoryBase.
         """
         self._cursor().execute('UPDATE packagesignatures set gpg = NULL')
+        self._bumpChecksumFingerprint()
 
     def dropAllIndexes(self):
         """
@@ -5132,6 +5913,18 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         raise NotImplementedError()
 
+    def _dropIndexes(self, keep_tables):
+        """
+        Drop the indexes of all the tables but the given ones.
+        Subclasses supporting this must reimplement it.
+
+        @param keep_tables: names of the tables whose indexes are kept
+        @type keep_tables: iterable
+        @return: True, if any index has been dropped
+        @rtype: bool
+        """
+        return False
+
     def createAllIndexes(self):
         """
         Reimplemented from EntropyRepositoryBase.
@@ -5145,6 +5938,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         self._createBaseinfoIndex()
         self._createKeywordsIndex()
         self._createDependenciesIndex()
+        self._createReverseDependenciesIndex()
         self._createProvideIndex()
         self._createConflictsIndex()
         self._createExtrainfoIndex()
@@ -5302,6 +6096,9 @@ class EntropySQLRepository(EntropyRepositoryBase):
             pass
 
     def _createContentIndex(self):
+        if self._isContentInterned():
+            self._createContentInternedIndex()
+            return
         try:
             self._cursor().execute("""
                 CREATE INDEX contentindex_couple
@@ -5317,6 +6114,30 @@ class EntropySQLRepository(EntropyRepositoryBase):
         except OperationalError:
             pass
 
+    def _createContentInternedIndex(self):
+        try:
+            self._cursor().execute("""
+                CREATE INDEX contentfilesindex_idpackage
+                    ON contentfiles ( idpackage );
+            """)
+        except OperationalError:
+            pass
+        try:
+            self._cursor().execute("""
+                CREATE INDEX contentfilesindex_iddirectory_name
+                    ON contentfiles ( iddirectory, name );
+            """)
+        except OperationalError:
+            pass
+        try:
+            # serves searchBelongs() case insensitive prefix lookups
+            self._cursor().execute("""
+                CREATE INDEX contentdirectoriesindex_directory
+                    ON contentdirectories ( directory COLLATE NOCASE );
+            """)
+        except OperationalError:
+            pass
+
     def _createConfigProtectReferenceIndex(self):
         try:
             self._cursor().execute("""
@@ -5398,6 +6219,36 @@ class EntropySQLRepository(EntropyRepositoryBase):
         except OperationalError:
             pass
 
+    def _createReverseDependenciesIndex(self):
+        try:
+            self._cursor().execute("""
+            CREATE INDEX reversedependencies_idpackage
+                ON reversedependencies ( idpackage );
+            """)
+        except OperationalError:
+            pass
+        try:
+            self._cursor().execute("""
+            CREATE INDEX reversedependencies_iddependency
+                ON reversedependencies ( iddependency );
+            """)
+        except OperationalError:
+            pass
+        try:
+            self._cursor().execute("""
+            CREATE INDEX reversedependenciesnames_name
+                ON reversedependenciesnames ( name );
+            """)
+        except OperationalError:
+            pass
+        try:
+            self._cursor().execute("""
+            CREATE INDEX reversedependenciesnames_iddependency
+                ON reversedependenciesnames ( iddependency );
+            """)
+        except OperationalError:
+            pass
+
     def _createCountersIndex(self):
         try:
             self._cursor().execute("""
@@ -5553,7 +6404,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
             hash_str = hash_str.encode("utf-8")
         sha = hashlib.sha1()
         sha.update(hash_str)
-        cache_key = "__generateReverseDependenciesMetadata2_" + \
+        cache_key = "__generateReverseDependenciesMetadata3_" + \
             sha.hexdigest()
         rev_deps_data = self._cacher.pop(cache_key)
         if rev_deps_data is not None:
@@ -5561,28 +6412,17 @@ class EntropySQLRepository(EntropyRepositoryBase):
                 rev_deps_data)
             return rev_deps_data
 
+        # package_id -> set(iddependency), this way reverse dependencies
+        # lookups do not require a full scan.
         dep_data = {}
-        for iddep, atom in self.listAllDependencies():
+        dependencies = [x for x in self.listAllDependencies() if x[0] != -1]
+        matches = self._matchReverseDependencies(
+            [dependency for iddep, dependency in dependencies])
 
-            if iddep == -1:
-                continue
-
-            if atom.endswith(etpConst['entropyordepquestion']):
-                or_atoms = atom[:-1].split(etpConst['entropyordepsep'])
-                for or_atom in or_atoms:
-                    # not safe to use cache here, people messing with multiple
-                    # instances can make this crash
-                    package_id, rc = self.atomMatch(or_atom, useCache = False)
-                    if package_id != -1:
-                        obj = dep_data.setdefault(iddep, set())
-                        obj.add(package_id)
-            else:
-                # not safe to use cache here, people messing with multiple
-                # instances can make this crash
-                package_id, rc = self.atomMatch(atom, useCache = False)
-                if package_id != -1:
-                    obj = dep_data.setdefault(iddep, set())
-                    obj.add(package_id)
+        for (iddep, dependency), package_ids in zip(dependencies, matches):
+            for package_id in package_ids:
+                obj = dep_data.setdefault(package_id, set())
+                obj.add(iddep)
 
         self._setLiveCache("reverseDependenciesMetadata", dep_data)
         try:
@@ -5592,6 +6432,248 @@ class EntropySQLRepository(EntropyRepositoryBase):
             pass
         return dep_data
 
+    def _matchReverseDependencies(self, dependencies):
+        """
+        Return the package identifiers each given dependency string
+        resolves to, as seen by the reverse dependencies metadata.
+
+        @param dependencies: list of dependency strings
+        @type dependencies: list
+        @return: list of package identifier sets, one per dependency
+        @rtype: list
+        """
+        or_dep_question = etpConst['entropyordepquestion']
+        or_dep_sep = etpConst['entropyordepsep']
+
+        dependency_atoms = []
+        for dependency in dependencies:
+            if dependency.endswith(or_dep_question):
+                dependency_atoms.append(
+                    dependency[:-1].split(or_dep_sep))
+            else:
+                dependency_atoms.append((dependency,))
+
+        # not safe to use cache here, people messing with multiple
+        # instances can make this crash
+        matches = iter(self.atomMatchMany(
+            itertools.chain.from_iterable(dependency_atoms),
+            useCache = False))
+
+        results = []
+        for atoms in dependency_atoms:
+            package_ids = set()
+            for atom in atoms:
+                package_id, rc = next(matches)
+                if package_id != -1:
+                    package_ids.add(package_id)
+            results.append(package_ids)
+        return results
+
+    def _dependencyNames(self, dependency):
+        """
+        Return the package names that can influence the resolution of
+        the given dependency string (one per "or" dependency element).
+        """
+        if dependency.endswith(etpConst['entropyordepquestion']):
+            atoms = dependency[:-1].split(etpConst['entropyordepsep'])
+        else:
+            atoms = (dependency,)
+
+        names = set()
+        for atom in atoms:
+            atom = entropy.dep.remove_entropy_revision(
+                entropy.dep.remove_slot(atom))
+            key = entropy.dep.dep_getkey(atom)
+            if key:
+                names.add(key.split("/")[-1])
+        return names
+
+    def _isReverseDependenciesIndexAvailable(self):
+        """
+        Return whether the persistent reverse dependencies index can be
+        used. Read-only repositories are not guaranteed to have it in
+        sync with their package masking setup, so they keep using the
+        in-memory metadata.
+        """
+        if self.readonly():
+            return False
+        return self._doesTableExist("reversedependencies")
+
+    def _indexReverseDependencies(self, dependency_ids = None):
+        """
+        Update the persistent reverse dependencies index. If
+        dependency_ids is None, all the dependency strings that have not
+        been indexed yet are processed, otherwise the given ones are
+        (re-)indexed.
+
+        @keyword dependency_ids: list of dependency identifiers
+        @type dependency_ids: iterable
+        """
+        if not self._doesTableExist("reversedependencies"):
+            return
+
+        if dependency_ids is None:
+            cur = self._cursor().execute("""
+            SELECT iddependency, dependency FROM dependenciesreference
+            WHERE iddependency NOT IN (
+                SELECT iddependency FROM reversedependenciesnames)
+            """)
+        else:
+            dependency_ids = frozenset(dependency_ids)
+            if not dependency_ids:
+                return
+            dep_ids_str = ', '.join((str(x) for x in dependency_ids))
+            self._cursor().execute("""
+            DELETE FROM reversedependencies WHERE iddependency IN ( %s )
+            """ % (dep_ids_str,))
+            self._cursor().execute("""
+            DELETE FROM reversedependenciesnames
+            WHERE iddependency IN ( %s )
+            """ % (dep_ids_str,))
+            cur = self._cursor().execute("""
+            SELECT iddependency, dependency FROM dependenciesreference
+            WHERE iddependency IN ( %s )
+            """ % (dep_ids_str,))
+
+        dependencies = tuple(cur)
+        matches = self._matchReverseDependencies(
+            [dependency for iddep, dependency in dependencies])
+
+        names_data = []
+        matches_data = []
+        for (iddep, dependency), package_ids in zip(dependencies, matches):
+            names = self._dependencyNames(dependency)
+            if not names:
+                # keep track of it anyway, it has been indexed
+                names.add("")
+            for name in names:
+                names_data.append((iddep, name))
+            for package_id in package_ids:
+                matches_data.append((iddep, package_id))
+
+        self._cursor().executemany("""
+        INSERT INTO reversedependenciesnames VALUES (?, ?)
+        """, names_data)
+        self._cursor().executemany("""
+        INSERT INTO reversedependencies VALUES (?, ?)
+        """, matches_data)
+
+    def _getReverseDependenciesIndexNames(self, package_id):
+        """
+        Return the names that, if referenced by dependency strings, need
+        to be re-indexed whenever the given package changes.
+        """
+        names = set()
+        name = self.retrieveName(package_id)
+        if name is not None:
+            names.add(name)
+        for provide, is_default in self.retrieveProvide(package_id):
+            names.add(entropy.dep.dep_getkey(provide).split("/")[-1])
+        return names
+
+    def _invalidateReverseDependenciesIndex(self, names = None,
+                                            dependency_ids = None,
+                                            unindexed = False):
+        """
+        Mark the dependency strings referencing the given package names,
+        the given dependency strings and, if unindexed is True, the ones
+        not indexed yet, as to be re-indexed. The work is done by
+        _flushReverseDependenciesIndex(), once per transaction.
+
+        @keyword names: package names
+        @type names: iterable
+        @keyword dependency_ids: list of dependency identifiers
+        @type dependency_ids: iterable
+        @keyword unindexed: if True, new dependency strings may have
+            been added
+        @type unindexed: bool
+        """
+        status = getattr(self._thread_local, "reverse_deps", None)
+        if status is None:
+            status = _ReverseDependenciesIndexStatus()
+            self._thread_local.reverse_deps = status
+        if names is not None:
+            status.names.update(names)
+        if dependency_ids is not None:
+            status.dependency_ids.update(dependency_ids)
+        if unindexed:
+            status.unindexed = True
+
+    def _flushReverseDependenciesIndex(self):
+        """
+        Bring the persistent reverse dependencies index in sync with the
+        changes done by the calling thread connection.
+        """
+        status = getattr(self._thread_local, "reverse_deps", None)
+        if status is None:
+            return
+        if not self._doesTableExist("reversedependencies"):
+            self._thread_local.reverse_deps = None
+            return
+
+        # matching must see the latest repository status
+        self._discardLiveCache()
+        dependency_ids = set(status.dependency_ids)
+        names = tuple(status.names)
+        if names:
+            cur = self._cursor().execute("""
+            SELECT DISTINCT iddependency FROM reversedependenciesnames
+            WHERE name IN ( %s )
+            """ % (", ".join(["?"] * len(names)),), names)
+            dependency_ids.update(self._cur2frozenset(cur))
+        if status.unindexed:
+            self._indexReverseDependencies()
+        self._indexReverseDependencies(dependency_ids)
+        self._thread_local.reverse_deps = None
+
+    def _generateReverseDependenciesIndex(self):
+        """
+        (Re-)generate the whole persistent reverse dependencies index.
+        """
+        self._thread_local.reverse_deps = None
+        self._cursor().execute("DELETE FROM reversedependencies")
+        self._cursor().execute("DELETE FROM reversedependenciesnames")
+        self._indexReverseDependencies()
+
+    def isSearchIndexAvailable(self):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        """
+        return self._isSearchIndexAvailable()
+
+    def _isSearchIndexAvailable(self):
+        """
+        Return whether the full-text search index is available.
+        Subclasses supporting it must reimplement this.
+        """
+        return False
+
+    def _searchIndexFilter(self, id_column, column, like_keywords):
+        """
+        Return an SQL condition (prefixed by " AND ") and its arguments,
+        restricting id_column to the packages whose indexed column matches
+        all the given LIKE patterns. The index may be more permissive than
+        the caller's own LIKE predicates, which must still be evaluated.
+        An empty condition is returned if the index cannot help.
+        Subclasses supporting a full-text search index must reimplement
+        this.
+        """
+        return "", tuple()
+
+    def _updateSearchIndex(self, package_ids):
+        """
+        (Re-)index the searchable metadata of the given packages.
+        Subclasses supporting a full-text search index must reimplement
+        this.
+        """
+
+    def _removeSearchIndex(self, package_ids):
+        """
+        Drop the given packages from the full-text search index.
+        Subclasses supporting a full-text search index must reimplement
+        this.
+        """
+
     def moveSpmUidsToBranch(self, to_branch):
         """
         Reimplemented from EntropyRepositoryBase.
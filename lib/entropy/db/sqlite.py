@@ -11,8 +11,10 @@
 
 """
 import collections
+import contextlib
 import errno
 import os
+import re
 import hashlib
 import time
 try:
@@ -34,7 +36,7 @@ from entropy.db.exceptions import Warning, Error, InterfaceError, \
     DatabaseError, DataError, OperationalError, IntegrityError, \
     InternalError, ProgrammingError, NotSupportedError, LockAcquireError
 from entropy.db.sql import EntropySQLRepository, SQLConnectionWrapper, \
-    SQLCursorWrapper
+    SQLCursorWrapper, _ThreadConnection
 
 from entropy.i18n import _
 
@@ -133,12 +135,59 @@ class EntropySQLiteRepository(EntropySQLRepository):
 
     # bump this every time schema changes and databaseStructureUpdate
     # should be triggered
-    _SCHEMA_REVISION = 6
+    _SCHEMA_REVISION = 8
 
     _INSERT_OR_REPLACE = "INSERT OR REPLACE"
     _INSERT_OR_IGNORE = "INSERT OR IGNORE"
     _UPDATE_OR_REPLACE = "UPDATE OR REPLACE"
     _CACHE_SIZE = 8192
+    # maximum number of idle read-only connections kept by reader()
+    _READER_POOL_SIZE = 4
+
+    # performance profiles, see setProfile()
+    PROFILE_DEFAULT = "default"
+    PROFILE_INSTALLED = "installed"
+    PROFILE_AVAILABLE = "available"
+    PROFILE_BULK = "bulk"
+    # pragmas applied, in order, to every Connection by each profile
+    _PROFILES = {
+        PROFILE_DEFAULT: (),
+        # concurrent readers while a writer is active, durable
+        # across application crashes (but not power failures)
+        PROFILE_INSTALLED: (
+            ("journal_mode", "WAL"),
+            ("synchronous", "NORMAL"),
+            ("wal_autocheckpoint", 1000),
+            ("journal_size_limit", 4194304),
+        ),
+        # read-mostly repositories: memory mapped I/O, 32MiB page cache
+        PROFILE_AVAILABLE: (
+            ("mmap_size", 268435456),
+            ("cache_size", -32768),
+        ),
+        # one-shot rebuilds, the repository file is not durable
+        # until the profile is reverted and is not accessible by
+        # other processes in the meantime
+        PROFILE_BULK: (
+            ("synchronous", "OFF"),
+            ("locking_mode", "EXCLUSIVE"),
+            ("cache_size", -65536),
+        ),
+    }
+    _PROFILE = PROFILE_DEFAULT
+    # minimum number of seconds between two WAL checkpoints run by commit()
+    _WAL_CHECKPOINT_INTERVAL = 30.0
+    # busy timeout of the journal mode switch run by close(), the WAL
+    # journal is kept if the repository is busy for longer
+    _WAL_CLOSE_TIMEOUT = 1.0
+
+    # full-text search index (FTS5, trigram tokenizer), see
+    # _createSearchIndex()
+    _SEARCH_INDEX_TABLE = "packagesearch"
+    _SEARCH_INDEX_SUPPORTED = None
+    # trigram indexes can only serve patterns containing at least
+    # three consecutive non-wildcard characters
+    _SEARCH_INDEX_PATTERN = re.compile("[^%_]{3}")
 
     SETTING_KEYS = ("arch", "on_delete_cascade", "schema_revision",
         "_baseinfo_extrainfo_2010")
@@ -208,6 +257,13 @@ class EntropySQLiteRepository(EntropySQLRepository):
         self._rwsem_lock = threading.RLock()
         self._rwsem = None
 
+        self._reader_pool = []
+        self._reader_pool_mutex = threading.Lock()
+        self._reader_generation = 0
+
+        self._profile = self._PROFILE
+        self._wal_checkpoint_time = 0.0
+
         self._sqlite = self.ModuleProxy.get()
 
         EntropySQLRepository.__init__(
@@ -372,89 +428,294 @@ class EntropySQLiteRepository(EntropySQLRepository):
                 return not const_file_writable(self._db)
         return self._readonly
 
-    def _cursor(self):
+    def _createConnection(self):
         """
         Reimplemented from EntropySQLRepository.
         """
-        current_thread = threading.current_thread()
-        c_key = self._cursor_connection_pool_key()
-
-        _init_db = False
-        cursor = None
-        with self._cursor_pool_mutex():
-            threads = set()
-            cursor_pool = self._cursor_pool()
-            cursor_data = cursor_pool.get(c_key)
-            if cursor_data is not None:
-                cursor, threads = cursor_data
-            # handle possible thread ident clashing
-            # in the cleanup thread function, because
-            # thread idents are recycled
-            # on thread termination
-            threads.add(current_thread)
-
-            if cursor is None:
-                conn = self._connection_impl(_from_cursor=True)
-                cursor = SQLiteCursorWrapper(
-                    conn.cursor(),
-                    self.ModuleProxy.exceptions())
-                # !!! enable foreign keys pragma !!! do not remove this
-                # otherwise removePackage won't work properly
-                cursor.execute("pragma foreign_keys = 1").fetchall()
-                # setup temporary tables and indices storage
-                # to in-memory value
-                # http://www.sqlite.org/pragma.html#pragma_temp_store
-                cursor.execute("pragma temp_store = 2").fetchall()
-                cursor_pool[c_key] = cursor, threads
-                self._start_cleanup_monitor(current_thread, c_key)
-                _init_db = True
-        # memory databases are critical because every new cursor brings
-        # up a totally empty repository. So, enforce initialization.
-        if _init_db and self._is_memory():
-            self.initializeRepository()
+        # check_same_thread still required for
+        # conn.close() called from
+        # arbitrary thread
+        return SQLiteConnectionWrapper.connect(
+            self.ModuleProxy, self._sqlite,
+            SQLiteConnectionWrapper,
+            self._db, timeout=300.0,
+            check_same_thread=False)
+
+    def _setupCursor(self, conn):
+        """
+        Return a new, configured, Cursor object for the given Connection.
+        """
+        cursor = SQLiteCursorWrapper(
+            conn.cursor(),
+            self.ModuleProxy.exceptions())
+        # !!! enable foreign keys pragma !!! do not remove this
+        # otherwise removePackage won't work properly
+        cursor.execute("pragma foreign_keys = 1").fetchall()
+        # setup temporary tables and indices storage
+        # to in-memory value
+        # http://www.sqlite.org/pragma.html#pragma_temp_store
+        cursor.execute("pragma temp_store = 2").fetchall()
+        self._applyProfile(cursor, self._profile)
         return cursor
 
-    def _connection_impl(self, _from_cursor=False):
-        """
-        Connection getter method implementation, adds
-        _from_cursor argument to avoid calling the
-        cleanup routine if True.
-        """
-        current_thread = threading.current_thread()
-        c_key = self._cursor_connection_pool_key()
-
-        conn = None
-        with self._connection_pool_mutex():
-            threads = set()
-            connection_pool = self._connection_pool()
-            conn_data = connection_pool.get(c_key)
-            if conn_data is not None:
-                conn, threads = conn_data
-            # handle possible thread ident clashing
-            # in the cleanup thread function
-            # because thread idents are recycled on
-            # thread termination
-            threads.add(current_thread)
-
-            if conn is None:
-                # check_same_thread still required for
-                # conn.close() called from
-                # arbitrary thread
-                conn = SQLiteConnectionWrapper.connect(
-                    self.ModuleProxy, self._sqlite,
-                    SQLiteConnectionWrapper,
-                    self._db, timeout=300.0,
-                    check_same_thread=False)
-                connection_pool[c_key] = conn, threads
-                if not _from_cursor:
-                    self._start_cleanup_monitor(current_thread, c_key)
-        return conn
+    def _applyProfile(self, cursor, profile):
+        """
+        Apply the pragmas of the given profile to the given Cursor.
+        Pragmas that cannot be changed are skipped.
+
+        @param cursor: the Cursor object
+        @type cursor: SQLiteCursorWrapper
+        @param profile: the profile name, see setProfile()
+        @type profile: string
+        @return: the previous pragma values, as list of (pragma, value)
+        @rtype: list
+        """
+        previous = []
+        for pragma, value in self._PROFILES[profile]:
+            if pragma == "journal_mode" and \
+                    (self._is_memory() or self.readonly()):
+                # the journal mode is stored in the repository file
+                continue
+            try:
+                old_value = cursor.execute(
+                    "pragma %s" % (pragma,)).fetchone()
+                if pragma == "journal_mode" and old_value is not None \
+                        and old_value[0].upper() == value.upper():
+                    # persistent, do not switch it on every open
+                    continue
+                cursor.execute(
+                    "pragma %s = %s" % (pragma, value)).fetchall()
+            except OperationalError as err:
+                # journal_mode cannot be changed inside a transaction
+                # or while other connections are using the repository
+                const_debug_write(
+                    __name__,
+                    "_applyProfile: cannot set %s on %s: %s" % (
+                        pragma, self.name, err))
+                continue
+            if old_value is not None:
+                previous.append((pragma, old_value[0]))
+        return previous
+
+    def _restorePragmas(self, cursor, pragmas):
+        """
+        Restore the pragma values returned by _applyProfile().
+        """
+        for pragma, value in reversed(pragmas):
+            try:
+                cursor.execute(
+                    "pragma %s = %s" % (pragma, value)).fetchall()
+            except OperationalError as err:
+                const_debug_write(
+                    __name__,
+                    "_restorePragmas: cannot set %s on %s: %s" % (
+                        pragma, self.name, err))
+
+    def getProfile(self):
+        """
+        Return the performance profile in use, see setProfile().
+
+        @return: the profile name
+        @rtype: string
+        """
+        return self._profile
+
+    def setProfile(self, profile):
+        """
+        Set the performance profile used by the repository Connections.
+        A profile is a set of SQLite pragmas, tuned for a specific
+        access pattern:
+          - PROFILE_DEFAULT: SQLite defaults.
+          - PROFILE_INSTALLED: WAL journal, readers do not wait for
+            writers (and vice versa). Commits are not durable across
+            power failures, just application crashes.
+          - PROFILE_AVAILABLE: memory mapped I/O and a larger page cache,
+            for repositories that are mostly read.
+          - PROFILE_BULK: no fsync and exclusive file locking, for
+            rebuilds that can be restarted from scratch on failure.
+        The profile is applied to the Connection of the calling thread
+        and to every new Connection. Connections of other threads are
+        not affected. The journal mode is only changed if the repository
+        is writable.
+
+        The profiles do not replace the ResourceLock based locking,
+        shared and exclusive locks still have to be acquired as usual.
+
+        @param profile: the profile name, one of the PROFILE_* constants
+        @type profile: string
+        @raise KeyError: if the profile is not available
+        """
+        if profile not in self._PROFILES:
+            raise KeyError("unsupported profile: %s" % (profile,))
+        self._profile = profile
+        self._applyProfile(self._cursor(), profile)
+
+    @contextlib.contextmanager
+    def profile(self, profile):
+        """
+        Temporarily apply the pragmas of the given performance profile
+        (see setProfile()) to the Connection of the calling thread.
+        Previous values are restored on exit. Pending changes are
+        committed on exit as well, in order to make them durable
+        with the restored settings.
+
+        Example:
+        >>> with repository.profile(repository.PROFILE_BULK):
+        ...     for pkg_data in packages:
+        ...         repository.addPackage(pkg_data)
+
+        @param profile: the profile name, one of the PROFILE_* constants
+        @type profile: string
+        @raise KeyError: if the profile is not available
+        """
+        if profile not in self._PROFILES:
+            raise KeyError("unsupported profile: %s" % (profile,))
+
+        previous = self._applyProfile(self._cursor(), profile)
+        try:
+            yield
+        finally:
+            cursor = self._cursor()
+            self.commit()
+            self._restorePragmas(cursor, previous)
+            # with locking_mode = NORMAL, file locks are only released
+            # on the next repository access
+            cursor.execute("SELECT count(*) FROM sqlite_master").fetchall()
+
+    def _checkpoint(self, mode):
+        """
+        Run a WAL checkpoint, using the given mode (PASSIVE, FULL,
+        RESTART, TRUNCATE). This is a no-op if the repository is not
+        in WAL journal mode.
+        """
+        try:
+            self._cursor().execute(
+                "pragma wal_checkpoint(%s)" % (mode,)).fetchall()
+        except OperationalError as err:
+            const_debug_write(
+                __name__,
+                "_checkpoint: %s on %s: %s" % (mode, self.name, err))
+        self._wal_checkpoint_time = time.time()
+
+    def _uses_wal(self):
+        """
+        Return whether the current profile switches the repository to
+        the WAL journal mode.
+        """
+        if self._is_memory():
+            return False
+        for pragma, value in self._PROFILES[self._profile]:
+            if pragma == "journal_mode":
+                return value == "WAL"
+        return False
+
+    def _cursor(self):
+        """
+        Reimplemented from EntropySQLRepository.
+        """
+        reader = getattr(self._thread_local, "reader", None)
+        if reader is not None:
+            return reader.cursor
+
+        conn_data = self._thread_connection()
+        cursor = conn_data.cursor
+        if cursor is None:
+            cursor = self._setupCursor(conn_data.connection)
+            conn_data.cursor = cursor
+            # memory databases are critical because every new connection
+            # brings up a totally empty repository. So, enforce
+            # initialization.
+            if self._is_memory():
+                self.initializeRepository()
+        return cursor
 
     def _connection(self):
         """
         Reimplemented from EntropySQLRepository.
         """
-        return self._connection_impl()
+        reader = getattr(self._thread_local, "reader", None)
+        if reader is not None:
+            return reader.connection
+        return self._thread_connection().connection
+
+    @contextlib.contextmanager
+    def reader(self):
+        """
+        Execute all the queries issued by the calling thread inside the
+        context using a read-only Connection taken from a pool, instead
+        of the thread Connection. This allows many threads to read the
+        repository concurrently, without waiting for writers when the
+        repository is in WAL journal mode. Any write attempt raises
+        OperationalError. Memory repositories cannot be shared among
+        connections, in this case the thread Connection is used.
+
+        Example:
+        >>> with repository.reader():
+        ...     package_ids = repository.listAllPackageIds()
+        """
+        if self._is_memory() or \
+                getattr(self._thread_local, "reader", None) is not None:
+            yield
+            return
+
+        reader, generation = self._acquire_reader()
+        self._thread_local.reader = reader
+        try:
+            yield
+        finally:
+            self._thread_local.reader = None
+            self._release_reader(reader, generation)
+
+    def _acquire_reader(self):
+        """
+        Return an idle read-only _ThreadConnection from the pool,
+        or a new one, and the current pool generation.
+        """
+        pid = os.getpid()
+        with self._reader_pool_mutex:
+            generation = self._reader_generation
+            while self._reader_pool:
+                reader = self._reader_pool.pop()
+                if reader.pid == pid:
+                    return reader, generation
+
+        conn = self._createConnection()
+        reader = _ThreadConnection(self._db, None, conn)
+        reader.cursor = self._setupCursor(conn)
+        reader.cursor.execute("pragma query_only = 1").fetchall()
+        return reader, generation
+
+    def _release_reader(self, reader, generation):
+        """
+        Put the given read-only _ThreadConnection back into the pool,
+        or close it if the pool is full or the repository got closed.
+        """
+        # do not leave read transactions open, they would prevent
+        # WAL checkpoints from completing
+        try:
+            reader.connection.rollback()
+        except Error:
+            self._close_thread_connection(reader)
+            return
+
+        with self._reader_pool_mutex:
+            if generation == self._reader_generation and \
+                    len(self._reader_pool) < self._READER_POOL_SIZE:
+                self._reader_pool.append(reader)
+                return
+        self._close_thread_connection(reader)
+
+    def _close_readers(self):
+        """
+        Close all the idle read-only Connections and invalidate the
+        ones currently in use.
+        """
+        with self._reader_pool_mutex:
+            readers = self._reader_pool[:]
+            del self._reader_pool[:]
+            self._reader_generation += 1
+        for reader in readers:
+            self._close_thread_connection(reader)
 
     def __show_info(self):
         first_part = "<EntropySQLiteRepository instance at %s, %s" % (
@@ -464,8 +725,8 @@ class EntropySQLiteRepository(EntropySQLRepository):
             self._indexing,)
         third_part = ", name: %s, skip_upd: %s" % (
             self.name, self._skip_checks,)
-        fourth_part = ", conn_pool: %s, cursor_cache: %s>" % (
-            self._connection_pool(), self._cursor_pool(),)
+        fourth_part = ", conn_pool: %s>" % (
+            self._connection_pool(),)
 
         return first_part + second_part + third_part + fourth_part
 
@@ -676,6 +937,22 @@ class EntropySQLiteRepository(EntropySQLRepository):
 
         self._release_reslock(opaque, True)
 
+    def commit(self, force = False, no_plugins = False):
+        """
+        Reimplemented from EntropySQLRepository.
+        Needs to call superclass method.
+        """
+        super(EntropySQLiteRepository, self).commit(
+            force = force, no_plugins = no_plugins)
+
+        # SQLite automatically checkpoints the WAL file once it reaches
+        # wal_autocheckpoint pages, make sure that readers do not have
+        # to scan it for too long in the meantime.
+        if self._uses_wal() and not self.readonly():
+            if time.time() - self._wal_checkpoint_time > \
+                    self._WAL_CHECKPOINT_INTERVAL:
+                self._checkpoint("PASSIVE")
+
     def close(self, safe=False):
         """
         Reimplemented from EntropySQLRepository.
@@ -684,6 +961,10 @@ class EntropySQLiteRepository(EntropySQLRepository):
         super(EntropySQLiteRepository, self).close(safe=safe)
 
         self._cleanup_all(_cleanup_main_thread=not safe)
+        self._close_readers()
+        if self._uses_wal() and not self._temporary \
+                and not self.readonly() and os.path.isfile(self._db):
+            self._closeWal()
         if self._temporary and (not self._is_memory()) and \
             os.path.isfile(self._db):
             try:
@@ -696,6 +977,46 @@ class EntropySQLiteRepository(EntropySQLRepository):
         # like "client-updates-daemon".
         self._discardLiveCache()
 
+    def _closeWal(self):
+        """
+        Switch the repository back to the rollback journal, moving the
+        WAL file content into the repository file, so that users that
+        cannot write to the repository directory (and thus cannot create
+        the WAL index) are still able to read it. This is only possible
+        if no other Connection is using the repository, in this case,
+        the WAL journal mode is kept and the last Connection using it
+        takes care of switching it back. Other Connections are not
+        waited for longer than _WAL_CLOSE_TIMEOUT.
+        This must be called after all the Connections of this
+        instance have been closed.
+        """
+        conn = SQLiteConnectionWrapper.connect(
+            self.ModuleProxy, self._sqlite,
+            SQLiteConnectionWrapper,
+            self._db, timeout=self._WAL_CLOSE_TIMEOUT,
+            check_same_thread=False)
+        try:
+            cursor = SQLiteCursorWrapper(
+                conn.cursor(),
+                self.ModuleProxy.exceptions())
+            try:
+                cursor.execute("pragma journal_mode = DELETE").fetchall()
+                return
+            except OperationalError as err:
+                const_debug_write(
+                    __name__,
+                    "_closeWal: keeping the WAL journal on %s: %s" % (
+                        self.name, err))
+            try:
+                cursor.execute("pragma wal_checkpoint(PASSIVE)").fetchall()
+            except OperationalError as err:
+                const_debug_write(
+                    __name__,
+                    "_closeWal: skipping checkpoint on %s: %s" % (
+                        self.name, err))
+        finally:
+            conn.close()
+
     def vacuum(self):
         """
         Reimplemented from EntropySQLRepository.
@@ -708,6 +1029,7 @@ class EntropySQLiteRepository(EntropySQLRepository):
         """
         my = self.Schema()
         self.dropAllIndexes()
+        self._cursor().execute("DROP VIEW IF EXISTS content")
         for table in self._listAllTables():
             try:
                 self._cursor().execute("DROP TABLE %s" % (table,))
@@ -751,7 +1073,7 @@ class EntropySQLiteRepository(EntropySQLRepository):
             self._cursor().execute(
                 "DELETE FROM baseinfo WHERE idpackage = (?)", (package_id,))
         else:
-            r_tup = (package_id,)*20
+            r_tup = (package_id,)*18
             self._cursor().executescript("""
                 DELETE FROM baseinfo WHERE idpackage = %d;
                 DELETE FROM extrainfo WHERE idpackage = %d;
@@ -763,7 +1085,6 @@ class EntropySQLiteRepository(EntropySQLRepository):
                 DELETE FROM sources WHERE idpackage = %d;
                 DELETE FROM useflags WHERE idpackage = %d;
                 DELETE FROM keywords WHERE idpackage = %d;
-                DELETE FROM content WHERE idpackage = %d;
                 DELETE FROM counters WHERE idpackage = %d;
                 DELETE FROM sizes WHERE idpackage = %d;
                 DELETE FROM triggers WHERE idpackage = %d;
@@ -773,6 +1094,14 @@ class EntropySQLiteRepository(EntropySQLRepository):
                 DELETE FROM packagedesktopmime WHERE idpackage = %d;
                 DELETE FROM provided_mime WHERE idpackage = %d;
             """ % r_tup)
+            if self._isContentInterned():
+                self._cursor().execute("""
+                DELETE FROM contentfiles WHERE idpackage = (?)""",
+                (package_id,))
+            else:
+                self._cursor().execute("""
+                DELETE FROM content WHERE idpackage = (?)""",
+                (package_id,))
             # Added on Aug. 2011
             if self._doesTableExist("packagedownloads"):
                 self._cursor().execute("""
@@ -829,6 +1158,9 @@ class EntropySQLiteRepository(EntropySQLRepository):
             self._cursor().execute("""
             UPDATE baseinfo SET idcategory = (?) WHERE idpackage = (?)
             """, (catid, package_id,))
+        self._invalidateReverseDependenciesIndex(
+            self._getReverseDependenciesIndexNames(package_id))
+        self._bumpChecksumFingerprint()
 
         self._clearLiveCache("retrieveCategory")
         self._clearLiveCache("searchNameCategory")
@@ -2003,11 +2335,19 @@ class EntropySQLiteRepository(EntropySQLRepository):
         # added on Sept. 2014, keep forever? ;-)
         self._migrateNeededLibs()
 
+        # added on Oct. 2026
+        self._migrateContentDirectories()
+
         # added on Sept. 2010, keep forever? ;-)
         self._migrateBaseinfoExtrainfo()
 
         self._foreignKeySupport()
 
+        # added on Oct. 2026, read-only repositories do not use it
+        if not old_readonly and \
+                not self._doesTableExist("reversedependencies"):
+            self._createReverseDependenciesTables()
+
         self._readonly = old_readonly
         self._connection().commit()
 
@@ -2082,6 +2422,11 @@ class EntropySQLiteRepository(EntropySQLRepository):
             )
             if name.startswith("sqlite_"):
                 continue
+            if name == self._SEARCH_INDEX_TABLE or \
+                    name.startswith(self._SEARCH_INDEX_TABLE + "_"):
+                # full-text search index and its shadow tables,
+                # recreated by createAllIndexes()
+                continue
 
             t_cmd = "CREATE TABLE"
             if sql.startswith(t_cmd) and gentle_with_tables:
@@ -2158,6 +2503,11 @@ class EntropySQLiteRepository(EntropySQLRepository):
                 strict = strict,
                 include_signatures = include_signatures)
 
+        if not do_order:
+            fingerprint = self._checksumFingerprint()
+            if fingerprint is not None:
+                return fingerprint
+
         # backward compatibility
         # !!! keep aligned !!!
         cache_key = "checksum_%s_%s_True_%s" % (
@@ -2394,6 +2744,21 @@ class EntropySQLiteRepository(EntropySQLRepository):
                 self._cursor().execute('DROP INDEX IF EXISTS %s' % (index,))
             except OperationalError:
                 continue
+        self._dropSearchIndex()
+
+    def _dropIndexes(self, keep_tables):
+        """
+        Reimplemented from EntropySQLRepository.
+        """
+        keep_tables = tuple(keep_tables)
+        cur = self._cursor().execute("""
+        SELECT name FROM SQLITE_MASTER WHERE type = "index"
+        AND name NOT LIKE "sqlite_%%" AND tbl_name NOT IN (%s)
+        """ % (", ".join(["?"] * len(keep_tables)),), keep_tables)
+        indexes = self._cur2frozenset(cur)
+        for index in indexes:
+            self._cursor().execute('DROP INDEX IF EXISTS %s' % (index,))
+        return bool(indexes)
 
     def createAllIndexes(self):
         """
@@ -2405,6 +2770,150 @@ class EntropySQLiteRepository(EntropySQLRepository):
             self.__createLicensesIndex()
             self.__createCategoriesIndex()
             self.__createCompileFlagsIndex()
+        if self._indexing:
+            self._createSearchIndex()
+
+    @classmethod
+    def _isSearchIndexSupported(cls):
+        """
+        Return whether the SQLite library supports FTS5 with the trigram
+        tokenizer (SQLite >= 3.34).
+        """
+        if cls._SEARCH_INDEX_SUPPORTED is None:
+            sqlite = cls.ModuleProxy.get()
+            try:
+                conn = sqlite.connect(":memory:")
+                try:
+                    conn.execute("""
+                    CREATE VIRTUAL TABLE probe
+                    USING fts5(text, tokenize = 'trigram')""")
+                finally:
+                    conn.close()
+                supported = True
+            except sqlite.Error:
+                supported = False
+            cls._SEARCH_INDEX_SUPPORTED = supported
+        return cls._SEARCH_INDEX_SUPPORTED
+
+    def _isSearchIndexAvailable(self):
+        """
+        Reimplemented from EntropySQLRepository.
+        """
+        return self._doesTableExist(self._SEARCH_INDEX_TABLE) and \
+            self._isSearchIndexSupported()
+
+    def _createSearchIndex(self):
+        """
+        Create and fill the full-text search index over packages name,
+        atom, provide, description and homepage, used to speed up the
+        substring searches and to rank search results.
+        """
+        if not self._isSearchIndexSupported():
+            return
+        if self._doesTableExist(self._SEARCH_INDEX_TABLE):
+            return
+        try:
+            self._cursor().execute("""
+            CREATE VIRTUAL TABLE %s USING fts5(name, atom, provide,
+                description, homepage, tokenize = 'trigram')
+            """ % (self._SEARCH_INDEX_TABLE,))
+        except OperationalError:
+            return
+        finally:
+            self._clearLiveCache("_doesTableExist")
+        self._fillSearchIndex()
+
+    def _dropSearchIndex(self):
+        """
+        Drop the full-text search index, if any.
+        """
+        try:
+            self._cursor().execute(
+                "DROP TABLE IF EXISTS %s" % (self._SEARCH_INDEX_TABLE,))
+        except OperationalError:
+            # FTS5 not supported by this SQLite library
+            return
+        finally:
+            self._clearLiveCache("_doesTableExist")
+
+    def _fillSearchIndex(self, package_ids = None):
+        """
+        Insert the searchable metadata of the given packages (or of all
+        the packages) into the full-text search index.
+        """
+        query = """
+        INSERT INTO %s (rowid, name, atom, provide, description, homepage)
+        SELECT baseinfo.idpackage, baseinfo.name, baseinfo.atom,
+            (SELECT group_concat(provide.atom, ' ') FROM provide
+                WHERE provide.idpackage = baseinfo.idpackage),
+            extrainfo.description, extrainfo.homepage
+        FROM baseinfo LEFT JOIN extrainfo
+            ON extrainfo.idpackage = baseinfo.idpackage
+        """ % (self._SEARCH_INDEX_TABLE,)
+        if package_ids is None:
+            self._cursor().execute(query)
+        else:
+            self._cursor().executemany(
+                query + " WHERE baseinfo.idpackage = ?",
+                [(x,) for x in package_ids])
+
+    def _updateSearchIndex(self, package_ids):
+        """
+        Reimplemented from EntropySQLRepository.
+        """
+        if not self._isSearchIndexAvailable():
+            return
+        self._removeSearchIndex(package_ids)
+        self._fillSearchIndex(package_ids)
+
+    def _removeSearchIndex(self, package_ids):
+        """
+        Reimplemented from EntropySQLRepository.
+        """
+        if not self._isSearchIndexAvailable():
+            return
+        self._cursor().executemany("""
+        DELETE FROM %s WHERE rowid = ?
+        """ % (self._SEARCH_INDEX_TABLE,), [(x,) for x in package_ids])
+
+    def _searchIndexFilter(self, id_column, column, like_keywords):
+        """
+        Reimplemented from EntropySQLRepository.
+        """
+        patterns = [x for x in like_keywords if
+                    self._SEARCH_INDEX_PATTERN.search(x)]
+        if not patterns or not self._isSearchIndexAvailable():
+            return "", tuple()
+        condition = " AND ".join(["%s LIKE ?" % (column,)] * len(patterns))
+        return """ AND %s IN (
+            SELECT rowid FROM %s WHERE %s)""" % (
+                id_column, self._SEARCH_INDEX_TABLE, condition), \
+                tuple(patterns)
+
+    def _searchRankedCandidates(self, words, description):
+        """
+        Reimplemented from EntropySQLRepository.
+        Use the full-text search index and its BM25 ranking, weighting
+        name and atom matches over description and homepage ones.
+        """
+        if not self._isSearchIndexAvailable() or \
+                [x for x in words if len(x) < 3]:
+            # trigram index cannot match shorter words
+            return super(EntropySQLiteRepository,
+                         self)._searchRankedCandidates(words, description)
+
+        columns = ""
+        if not description:
+            columns = "{name atom provide} : "
+        match = " AND ".join(
+            ['%s"%s"' % (columns, x.replace('"', '""'),) for x in words])
+        cur = self._cursor().execute("""
+        SELECT baseinfo.atom, baseinfo.idpackage, baseinfo.name,
+            bm25(%(table)s, 10.0, 5.0, 2.0, 1.0, 0.5)
+        FROM %(table)s, baseinfo
+        WHERE %(table)s MATCH ? AND baseinfo.idpackage = %(table)s.rowid
+        """ % {'table': self._SEARCH_INDEX_TABLE}, (match,))
+        return cur.fetchall()
 
     def __createCompileFlagsIndex(self):
         try:
@@ -2481,6 +2990,72 @@ class EntropySQLiteRepository(EntropySQLRepository):
         self._clearLiveCache("_doesTableExist")
         self._clearLiveCache("_doesColumnInTableExist")
 
+    def _migrateContentDirectories(self):
+        """
+        Migrate from the content table, storing full file paths, to the
+        path-interned contentdirectories and contentfiles tables, read
+        through the content view.
+        """
+        if self._isContentInterned():
+            return
+
+        mytxt = "%s: [%s] %s" % (
+            bold(_("ATTENTION")),
+            purple(self.name),
+            red(_("updating repository metadata layout, please wait!")),
+        )
+        self.output(
+            mytxt,
+            importance = 1,
+            level = "warning"
+        )
+
+        # rtrim(file, replace(file, '/', '')) is the directory part,
+        # including the trailing slash, see _splitContentPath()
+        self._cursor().executescript("""
+        BEGIN TRANSACTION;
+        DROP TABLE IF EXISTS contentdirectories;
+        DROP TABLE IF EXISTS contentfiles;
+        CREATE TABLE contentdirectories (
+            iddirectory INTEGER PRIMARY KEY AUTOINCREMENT,
+            directory VARCHAR UNIQUE
+        );
+        CREATE TABLE contentfiles (
+            idpackage INTEGER,
+            iddirectory INTEGER,
+            name VARCHAR,
+            type VARCHAR,
+            FOREIGN KEY(idpackage)
+                REFERENCES baseinfo(idpackage) ON DELETE CASCADE
+        );
+
+        INSERT OR IGNORE INTO contentdirectories (directory)
+            SELECT rtrim(file, replace(file, '/', '')) FROM content;
+        INSERT INTO contentfiles
+            SELECT content.idpackage, contentdirectories.iddirectory,
+                substr(content.file,
+                    length(contentdirectories.directory) + 1),
+                content.type
+            FROM content, contentdirectories
+            WHERE contentdirectories.directory =
+                rtrim(content.file, replace(content.file, '/', ''))
+            ORDER BY content.rowid;
+
+        DROP TABLE content;
+        CREATE VIEW content AS
+            SELECT contentfiles.idpackage AS idpackage,
+                contentdirectories.directory || contentfiles.name AS file,
+                contentfiles.type AS type
+            FROM contentfiles, contentdirectories
+            WHERE contentdirectories.iddirectory =
+                contentfiles.iddirectory;
+        COMMIT;
+        """)
+        self._clearLiveCache("_doesTableExist")
+        self._clearLiveCache("_doesColumnInTableExist")
+        if self._indexing:
+            self._createContentIndex()
+
     def _isBaseinfoExtrainfo2010(self):
         """
         Return is _baseinfo_extrainfo_2010 setting is
@@ -2768,6 +3343,36 @@ class EntropySQLiteRepository(EntropySQLRepository):
         """)
         self._clearLiveCache("_doesColumnInTableExist")
 
+    def _createReverseDependenciesTables(self):
+        self._cursor().executescript("""
+            CREATE TABLE reversedependencies (
+                iddependency INTEGER,
+                idpackage INTEGER,
+                FOREIGN KEY(idpackage)
+                    REFERENCES baseinfo(idpackage) ON DELETE CASCADE
+            );
+
+            CREATE TABLE reversedependenciesnames (
+                iddependency INTEGER,
+                name VARCHAR
+            );
+        """)
+        self._clearLiveCache("_doesTableExist")
+        self._clearLiveCache("_doesColumnInTableExist")
+
+        mytxt = "%s: %s" % (
+            bold(_("ATTENTION")),
+            red(_("generating reverse dependencies metadata, please wait!")),
+        )
+        self.output(
+            mytxt,
+            importance = 1,
+            level = "warning"
+        )
+        if self._indexing:
+            self._createReverseDependenciesIndex()
+        self._generateReverseDependenciesIndex()
+
     def _createPackageDownloadsTable(self):
         self._cursor().executescript("""
             CREATE TABLE packagedownloads (
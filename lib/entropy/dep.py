@@ -11,7 +11,11 @@
     This module contains Entropy package dependency manipulation functions.
 
 """
+import collections
+import functools
 import re
+import threading
+
 from entropy.exceptions import InvalidAtom, EntropyException
 from entropy.const import etpConst, const_cmp
 
@@ -75,30 +79,6 @@ def _pkgsplit(mypkg):
 
     return  (m.group('pn'), m.group('ver'), rev)
 
-def _generic_sorter(inputlist, cmp_func):
-
-    inputs = inputlist[:]
-    if len(inputs) < 2:
-        return inputs
-    max_idx = len(inputs)
-
-    while True:
-        changed = False
-        for idx in range(max_idx):
-            second_idx = idx+1
-            if second_idx == max_idx:
-                continue
-            str_a = inputs[idx]
-            str_b = inputs[second_idx]
-            if cmp_func(str_a, str_b) < 0:
-                inputs[idx] = str_b
-                inputs[second_idx] = str_a
-                changed = True
-        if not changed:
-            break
-
-    return inputs
-
 def isjustname(mypkg):
     """
     Checks to see if the depstring is only the package name (no version parts)
@@ -498,122 +478,185 @@ def remove_package_operators(atom):
     """
     return atom.lstrip("><=~")
 
-def compare_versions(ver1, ver2):
+# suffix (name, number) value of versions without any suffix
+_SUFFIX_PAD = (suffix_value["p"], 0)
+
+def _version_key_tuple(version):
+    """
+    Build the tuple used by VersionKey for ordering. Return an empty
+    tuple, which compares lower than any valid version, if version is
+    not valid.
+    """
+    match = None
+    if version:
+        match = ver_regexp.match(version)
+    if not match or not match.groups():
+        return ()
+
+    # Components with a leading zero are compared as decimals, so that
+    # 1.02 < 1.1, and they always come before the others. An implicit .0
+    # compares lower than anything, thanks to tuple ordering: 1.0.0 > 1.0.
+    components = []
+    if match.group(3):
+        for comp in match.group(3)[1:].split("."):
+            if comp[0] == "0":
+                components.append((0, float("0." + comp)))
+            else:
+                components.append((1, int(comp)))
+
+    letter = match.group(5)
+    if letter:
+        letter = ord(letter)
+    else:
+        letter = 0
+
+    # Missing suffixes are considered equal to _p0, which is neither the
+    # lowest nor the highest value, thus plain tuple ordering cannot be
+    # used. Runs of _p0 are collapsed and every other suffix is stored
+    # along with its sign (compared to _p0) and the length of the run
+    # preceding it, (0,) terminates the sequence.
+    suffixes = []
+    skipped = 0
+    for suffix in match.group(6).split("_")[1:]:
+        name, number = suffix_regexp.match(suffix).groups()
+        if number:
+            number = int(number)
+        else:
+            number = 0
+        item = (suffix_value[name], number)
+        if item == _SUFFIX_PAD:
+            skipped += 1
+            continue
+        if item > _SUFFIX_PAD:
+            sign = 1
+        else:
+            sign = -1
+        suffixes.append((sign, -sign * skipped, item))
+        skipped = 0
+    suffixes.append((0,))
+
+    revision = match.group(10)
+    if revision:
+        revision = int(revision)
+    else:
+        revision = 0
+
+    return (int(match.group(2)), tuple(components), letter,
+            tuple(suffixes), revision)
+
+
+class VersionKey(object):
     """
-    docstring_title
+    Parsed representation of a package version string, ordered like
+    compare_versions() does. Use version_key() to get memoized instances.
 
-    @param ver1: 
-    @type ver1: 
-    @param ver2: 
-    @type ver2: 
-    @return: 
-    @rtype: 
+    Invalid versions compare lower than any valid one.
+
+    >>> from entropy.dep import version_key
+    >>> version_key("1.0_rc1") < version_key("1.0")
+    True
     """
-    if ver1 == ver2:
-        return 0
-    match1 = None
-    match2 = None
-    if ver1:
-        match1 = ver_regexp.match(ver1)
-    if ver2:
-        match2 = ver_regexp.match(ver2)
-
-    # checking that the versions are valid
-    invalid = False
-    invalid_rc = 0
-    if not match1:
-        invalid = True
-    elif not match1.groups():
-        invalid = True
-    elif not match2:
-        invalid_rc = 1
-        invalid = True
-    elif not match2.groups():
-        invalid_rc = 1
-        invalid = True
-    if invalid:
-        return invalid_rc
-
-    # building lists of the version parts before the suffix
-    # first part is simple
-    list1 = [int(match1.group(2))]
-    list2 = [int(match2.group(2))]
-
-    # this part would greatly benefit from a fixed-length version pattern
-    if len(match1.group(3)) or len(match2.group(3)):
-        vlist1 = match1.group(3)[1:].split(".")
-        vlist2 = match2.group(3)[1:].split(".")
-        for i in range(0, max(len(vlist1), len(vlist2))):
-            # Implcit .0 is given a value of -1, so that 1.0.0 > 1.0, since it
-            # would be ambiguous if two versions that aren't literally equal
-            # are given the same value (in sorting, for example).
-            if len(vlist1) <= i or len(vlist1[i]) == 0:
-                list1.append(-1)
-                list2.append(int(vlist2[i]))
-            elif len(vlist2) <= i or len(vlist2[i]) == 0:
-                list1.append(int(vlist1[i]))
-                list2.append(-1)
-            # Let's make life easy and use integers unless we're forced to use floats
-            elif (vlist1[i][0] != "0" and vlist2[i][0] != "0"):
-                list1.append(int(vlist1[i]))
-                list2.append(int(vlist2[i]))
-            # now we have to use floats so 1.02 compares correctly against 1.1
-            else:
-                list1.append(float("0."+vlist1[i]))
-                list2.append(float("0."+vlist2[i]))
 
-    # and now the final letter
-    if len(match1.group(5)):
-        list1.append(ord(match1.group(5)))
-    if len(match2.group(5)):
-        list2.append(ord(match2.group(5)))
+    __slots__ = ("_version", "_key")
 
-    for i in range(0, max(len(list1), len(list2))):
-        if len(list1) <= i:
-            return -1
-        elif len(list2) <= i:
-            return 1
-        elif list1[i] != list2[i]:
-            return list1[i] - list2[i]
+    def __init__(self, version):
+        self._version = version
+        self._key = _version_key_tuple(version)
 
-    # main version is equal, so now compare the _suffix part
-    list1 = match1.group(6).split("_")[1:]
-    list2 = match2.group(6).split("_")[1:]
+    @property
+    def version(self):
+        """
+        Return the version string this object has been built from.
+        """
+        return self._version
 
-    for i in range(0, max(len(list1), len(list2))):
-        if len(list1) <= i:
-            s1 = ("p", "0")
-        else:
-            s1 = suffix_regexp.match(list1[i]).groups()
-        if len(list2) <= i:
-            s2 = ("p", "0")
-        else:
-            s2 = suffix_regexp.match(list2[i]).groups()
-        if s1[0] != s2[0]:
-            return suffix_value[s1[0]] - suffix_value[s2[0]]
-        if s1[1] != s2[1]:
-            # it's possible that the s(1|2)[1] == ''
-            # in such a case, fudge it.
-            try:
-                r1 = int(s1[1])
-            except ValueError:
-                r1 = 0
-            try:
-                r2 = int(s2[1])
-            except ValueError:
-                r2 = 0
-            return r1 - r2
-
-    # the suffix part is equal to, so finally check the revision
-    if match1.group(10):
-        r1 = int(match1.group(10))
-    else:
-        r1 = 0
-    if match2.group(10):
-        r2 = int(match2.group(10))
-    else:
-        r2 = 0
-    return r1 - r2
+    @property
+    def key(self):
+        """
+        Return the tuple used for ordering.
+        """
+        return self._key
+
+    def is_valid(self):
+        """
+        Return whether the version string is valid.
+        """
+        return self._key != ()
+
+    def __eq__(self, other):
+        return self._key == other._key
+
+    def __ne__(self, other):
+        return self._key != other._key
+
+    def __lt__(self, other):
+        return self._key < other._key
+
+    def __le__(self, other):
+        return self._key <= other._key
+
+    def __gt__(self, other):
+        return self._key > other._key
+
+    def __ge__(self, other):
+        return self._key >= other._key
+
+    def __hash__(self):
+        return hash(self._key)
+
+    def __repr__(self):
+        return "<VersionKey %s>" % (self._version,)
+
+
+_VERSION_KEY_CACHE = collections.OrderedDict()
+_VERSION_KEY_CACHE_SIZE = 10000
+_VERSION_KEY_CACHE_LOCK = threading.Lock()
+
+def version_key(version):
+    """
+    Return the VersionKey object of the given version string. Objects
+    are kept in a bounded LRU cache.
+
+    @param version: package version string
+    @type version: string
+    @return: a VersionKey object
+    @rtype: VersionKey
+    """
+    with _VERSION_KEY_CACHE_LOCK:
+        obj = _VERSION_KEY_CACHE.pop(version, None)
+        if obj is not None:
+            _VERSION_KEY_CACHE[version] = obj
+            return obj
+
+    obj = VersionKey(version)
+    with _VERSION_KEY_CACHE_LOCK:
+        _VERSION_KEY_CACHE[version] = obj
+        while len(_VERSION_KEY_CACHE) > _VERSION_KEY_CACHE_SIZE:
+            _VERSION_KEY_CACHE.popitem(last = False)
+    return obj
+
+def compare_versions(ver1, ver2):
+    """
+    Compare two package version strings.
+
+    @param ver1: package version
+    @type ver1: string
+    @param ver2: package version
+    @type ver2: string
+    @return: negative number if ver1 < ver2, positive number if
+        ver1 > ver2, zero if they are equal or if ver1 is not valid
+    @rtype: int
+    """
+    if ver1 == ver2:
+        return 0
+
+    key1 = version_key(ver1).key
+    if not key1:
+        return 0
+    key2 = version_key(ver2).key
+    if not key2:
+        return 1
+    return const_cmp(key1, key2)
 
 tag_regexp = re.compile("^([A-Za-z0-9+_.-]+)?$")
 def is_valid_package_tag(tag):
@@ -703,7 +746,16 @@ def get_newer_version(versions):
     @return: sorted version list
     @rtype: list
     """
-    return _generic_sorter(versions, compare_versions)
+    return sorted(versions, key = lambda x: version_key(x).key,
+                  reverse = True)
+
+def _entropy_version_sorter(ver_data):
+    """
+    Sort key of (version, tag, revision) tuples, only valid if either
+    all or none of the sorted tuples are tagged.
+    """
+    ver, tag, rev = ver_data
+    return (tag, version_key(ver).key, rev)
 
 def get_entropy_newer_version(versions):
     """
@@ -714,7 +766,16 @@ def get_entropy_newer_version(versions):
     @return: sorted list
     @rtype: list
     """
-    return _generic_sorter(versions, entropy_compare_versions)
+    tagged = len([x for x in versions if x[1]])
+    if tagged == 0 or tagged == len(versions):
+        return sorted(versions, key = _entropy_version_sorter,
+                      reverse = True)
+
+    # tags are compared first only when both sides are tagged, this is
+    # not a total ordering.
+    return sorted(versions,
+                  key = functools.cmp_to_key(entropy_compare_versions),
+                  reverse = True)
 
 sha1_re = re.compile(r"(.*)\.([a-f\d]{40})(.*)")
 def get_entropy_package_sha1(package_name):
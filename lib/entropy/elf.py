@@ -0,0 +1,506 @@
+# -*- coding: utf-8 -*-
+"""
+
+    @author: Fabio Erculiani <lxnay@sabayon.org>
+    @contact: lxnay@sabayon.org
+    @copyright: Fabio Erculiani
+    @license: GPL-2
+
+    B{Entropy Framework ELF objects reader}.
+
+    This module contains a pure Python, in-process reader of the ELF
+    metadata used by Entropy (ELF class, dynamic section, dynamic
+    symbol table and symbol versions), so that scanning thousands of files does not
+    require spawning external tools.
+
+"""
+import collections
+import mmap
+import os
+import struct
+import threading
+
+from entropy.const import const_is_python3, const_convert_to_unicode
+
+ELFCLASS32 = 1
+ELFCLASS64 = 2
+
+_ELF_MAGIC = b"\x7fELF"
+_ELFDATA2LSB = 1
+_ELFDATA2MSB = 2
+
+_PT_LOAD = 1
+_PT_DYNAMIC = 2
+_PT_INTERP = 3
+
+_SHT_DYNSYM = 11
+
+_DT_NULL = 0
+_DT_NEEDED = 1
+_DT_HASH = 4
+_DT_STRTAB = 5
+_DT_SYMTAB = 6
+_DT_SONAME = 14
+_DT_RPATH = 15
+_DT_RUNPATH = 29
+_DT_GNU_HASH = 0x6ffffef5
+_DT_VERSYM = 0x6ffffff0
+_DT_VERDEF = 0x6ffffffc
+_DT_VERDEFNUM = 0x6ffffffd
+_DT_VERNEED = 0x6ffffffe
+_DT_VERNEEDNUM = 0x6fffffff
+
+_VER_NDX_GLOBAL = 1
+_VERSYM_HIDDEN = 0x8000
+_VERSYM_INDEX = 0x7fff
+
+_SHN_UNDEF = 0
+_STB_GLOBAL = 1
+_STB_WEAK = 2
+_STB_GNU_UNIQUE = 10
+
+# (header, program header, section header, dynamic entry, symbol)
+# struct formats, by ELF class.
+_FORMATS = {
+    ELFCLASS32: ("HHIIIIIHHHHHH", "IIIIIIII", "IIIIIIIIII", "iI", "IIIBBH"),
+    ELFCLASS64: ("HHIQQQIHHHHHH", "IIQQQQQQ", "IIQQQQIIQQ", "qQ", "IBBHQQ"),
+}
+# (verdef, verdaux, verneed, vernaux) struct formats, same for both
+# ELF classes.
+_VERSION_FORMATS = ("HHHHIII", "II", "HHIII", "IHHII")
+
+
+class ElfObject(object):
+    """
+    ELF object metadata, as returned by read_elf().
+    """
+
+    __slots__ = ("path", "elf_class", "machine", "dynamic", "soname",
+                 "needed", "rpath", "runpath", "interpreter", "_stat",
+                 "_symbols")
+
+    def __init__(self, path, stat_key):
+        self.path = path
+        self.elf_class = None
+        self.machine = None
+        self.dynamic = False
+        self.soname = None
+        self.needed = []
+        self.rpath = None
+        self.runpath = None
+        self.interpreter = None
+        self._stat = stat_key
+        self._symbols = None
+
+    def symbols(self):
+        """
+        Return the dynamic symbols defined and required by this ELF object.
+        Weak undefined symbols are not considered required.
+
+        @return: tuple composed by (defined symbols, required symbols)
+        @rtype: tuple
+        @raise IOError: if the file cannot be read
+        """
+        symbols = self.versioned_symbols()
+        if symbols is None:
+            return frozenset(), frozenset()
+        defined, required, _versions = symbols
+        return (frozenset(name for name, _version in defined),
+                frozenset(name for name, _version, _file in required))
+
+    def versioned_symbols(self):
+        """
+        Return the dynamic symbols defined and required by this ELF object,
+        together with their symbol versions. Defined symbols are
+        (name, version) tuples, where version is None if the definition
+        satisfies any version (unversioned objects and base definitions).
+        Required symbols are (name, version, file) tuples, where file is
+        the library expected to define the version, both None if the
+        reference is unversioned.
+
+        @return: tuple composed by (defined symbols, required symbols,
+            defined versions), defined versions is None if the object
+            does not define symbol versions. None is returned if the
+            dynamic symbol table cannot be read.
+        @rtype: tuple or None
+        @raise IOError: if the file cannot be read
+        """
+        symbols = self._symbols
+        if symbols is None:
+            with open(self.path, "rb") as f:
+                data = _map_file(f)
+                try:
+                    symbols = _ElfParser(data).symbols()
+                except (ValueError, struct.error):
+                    symbols = False
+                finally:
+                    _unmap_file(data)
+            self._symbols = symbols
+        if symbols is False:
+            return None
+        return symbols
+
+
+class _ElfParser(object):
+
+    def __init__(self, data):
+        self._data = data
+        if data[:4] != _ELF_MAGIC:
+            raise ValueError("not an ELF object")
+
+        self.elf_class = _byte(data, 4)
+        encoding = _byte(data, 5)
+        formats = _FORMATS.get(self.elf_class)
+        if formats is None or encoding not in (_ELFDATA2LSB, _ELFDATA2MSB):
+            raise ValueError("unsupported ELF object")
+
+        order = "<" if encoding == _ELFDATA2LSB else ">"
+        header, phdr, shdr, dyn, sym = [
+            struct.Struct(order + x) for x in formats]
+        self._phdr = phdr
+        self._shdr = shdr
+        self._dyn = dyn
+        self._sym = sym
+        self._word = struct.Struct(order + "I")
+        self._half = struct.Struct(order + "H")
+        self._verdef, self._verdaux, self._verneed, self._vernaux = [
+            struct.Struct(order + x) for x in _VERSION_FORMATS]
+
+        (_e_type, self.machine, _e_version, _e_entry, self._phoff,
+         self._shoff, _e_flags, _e_ehsize, self._phentsize, self._phnum,
+         self._shentsize, self._shnum, _e_shstrndx) = self._unpack(
+             header, 16)
+
+    def _unpack(self, st, offset):
+        end = offset + st.size
+        if offset < 0 or end > len(self._data):
+            raise ValueError("truncated ELF object")
+        return st.unpack(self._data[offset:end])
+
+    def _string(self, offset):
+        data = self._data
+        if offset < 0 or offset >= len(data):
+            raise ValueError("invalid ELF string offset")
+        end = data.find(b"\0", offset)
+        if end == -1:
+            raise ValueError("unterminated ELF string")
+        return _decode(data[offset:end])
+
+    def _program_headers(self):
+        for idx in range(self._phnum):
+            offset = self._phoff + idx * self._phentsize
+            p_type, p_offset, p_vaddr, p_filesz = self._program_header(
+                offset)
+            yield p_type, p_offset, p_vaddr, p_filesz
+
+    def _program_header(self, offset):
+        values = self._unpack(self._phdr, offset)
+        if self.elf_class == ELFCLASS32:
+            (p_type, p_offset, p_vaddr, _p_paddr, p_filesz,
+             _p_memsz, _p_flags, _p_align) = values
+        else:
+            (p_type, _p_flags, p_offset, p_vaddr, _p_paddr,
+             p_filesz, _p_memsz, _p_align) = values
+        return p_type, p_offset, p_vaddr, p_filesz
+
+    def _section_headers(self):
+        for idx in range(self._shnum):
+            offset = self._shoff + idx * self._shentsize
+            (_sh_name, sh_type, _sh_flags, _sh_addr, sh_offset, sh_size,
+             sh_link, _sh_info, _sh_addralign, sh_entsize) = self._unpack(
+                 self._shdr, offset)
+            yield sh_type, sh_offset, sh_size, sh_link, sh_entsize
+
+    def _vaddr_to_offset(self, vaddr):
+        for p_type, p_offset, p_vaddr, p_filesz in self._program_headers():
+            if p_type == _PT_LOAD and p_vaddr <= vaddr < p_vaddr + p_filesz:
+                return vaddr - p_vaddr + p_offset
+        raise ValueError("ELF address not mapped")
+
+    def _dynamic(self):
+        """
+        Return the dynamic section entries as a list of (tag, value).
+        """
+        for p_type, p_offset, _p_vaddr, p_filesz in self._program_headers():
+            if p_type != _PT_DYNAMIC:
+                continue
+            entries = []
+            size = self._dyn.size
+            for offset in range(p_offset, p_offset + p_filesz, size):
+                tag, value = self._unpack(self._dyn, offset)
+                if tag == _DT_NULL:
+                    break
+                entries.append((tag, value))
+            return entries
+        return []
+
+    def _interpreter(self):
+        for p_type, p_offset, _p_vaddr, _p_filesz in self._program_headers():
+            if p_type == _PT_INTERP:
+                return self._string(p_offset)
+        return None
+
+    def metadata(self, obj):
+        """
+        Fill the given ElfObject with the dynamic section metadata.
+        """
+        obj.elf_class = self.elf_class
+        obj.machine = self.machine
+        obj.interpreter = self._interpreter()
+
+        entries = self._dynamic()
+        obj.dynamic = bool(entries)
+        strtab = None
+        for tag, value in entries:
+            if tag == _DT_STRTAB:
+                strtab = self._vaddr_to_offset(value)
+                break
+        if strtab is None:
+            return obj
+
+        for tag, value in entries:
+            if tag == _DT_NEEDED:
+                obj.needed.append(self._string(strtab + value))
+            elif tag == _DT_SONAME and obj.soname is None:
+                obj.soname = self._string(strtab + value)
+            elif tag == _DT_RPATH and obj.rpath is None:
+                obj.rpath = self._string(strtab + value)
+            elif tag == _DT_RUNPATH and obj.runpath is None:
+                obj.runpath = self._string(strtab + value)
+        return obj
+
+    def _symbol_table(self):
+        """
+        Return the dynamic symbol table location as a tuple composed by
+        (symtab offset, symbols count, strtab offset), or None.
+        """
+        for sh_type, sh_offset, sh_size, sh_link, sh_entsize in \
+                self._section_headers():
+            if sh_type != _SHT_DYNSYM or not sh_entsize:
+                continue
+            link_offset = self._shoff + sh_link * self._shentsize
+            strtab = self._unpack(self._shdr, link_offset)[4]
+            return sh_offset, sh_size // sh_entsize, strtab
+
+        # no section headers (stripped), use the dynamic section.
+        # The number of symbols is given by the hash tables.
+        values = dict(self._dynamic())
+        if _DT_SYMTAB not in values or _DT_STRTAB not in values:
+            return None
+        if _DT_HASH in values:
+            hash_offset = self._vaddr_to_offset(values[_DT_HASH])
+            count = self._unpack(self._word, hash_offset + 4)[0]
+        elif _DT_GNU_HASH in values:
+            count = self._gnu_hash_count(
+                self._vaddr_to_offset(values[_DT_GNU_HASH]))
+        else:
+            return None
+        return (self._vaddr_to_offset(values[_DT_SYMTAB]), count,
+                self._vaddr_to_offset(values[_DT_STRTAB]))
+
+    def _gnu_hash_count(self, offset):
+        """
+        Return the number of symbols covered by the DT_GNU_HASH table at
+        the given offset: the highest symbol index referenced by a bucket,
+        plus the length of its chain.
+        """
+        word = self._word
+        nbuckets, symoffset, bloom_size, _bloom_shift = [
+            self._unpack(word, offset + idx * word.size)[0]
+            for idx in range(4)]
+        bloom_word = 4 if self.elf_class == ELFCLASS32 else 8
+        buckets = offset + 16 + bloom_size * bloom_word
+        chains = buckets + nbuckets * word.size
+
+        last = 0
+        for idx in range(nbuckets):
+            last = max(last, self._unpack(word, buckets + idx * word.size)[0])
+        if last < symoffset:
+            return symoffset
+
+        while True:
+            value = self._unpack(
+                word, chains + (last - symoffset) * word.size)[0]
+            last += 1
+            if value & 1:
+                return last
+
+    def _versions(self, strtab):
+        """
+        Return the symbol versions metadata as a tuple composed by
+        (versym offset, {index: defined version}, {index: (needed version,
+        file)}), versym offset is None if the object is not versioned.
+        """
+        values = dict(self._dynamic())
+        versym = values.get(_DT_VERSYM)
+        if versym is None:
+            return None, {}, {}
+        versym = self._vaddr_to_offset(versym)
+
+        defined = {}
+        if _DT_VERDEF in values:
+            offset = self._vaddr_to_offset(values[_DT_VERDEF])
+            for _idx in range(values.get(_DT_VERDEFNUM, 0)):
+                (_vd_version, _vd_flags, vd_ndx, _vd_cnt, _vd_hash,
+                 vd_aux, vd_next) = self._unpack(self._verdef, offset)
+                vda_name = self._unpack(self._verdaux, offset + vd_aux)[0]
+                defined[vd_ndx] = self._string(strtab + vda_name)
+                if not vd_next:
+                    break
+                offset += vd_next
+
+        needed = {}
+        if _DT_VERNEED in values:
+            offset = self._vaddr_to_offset(values[_DT_VERNEED])
+            for _idx in range(values.get(_DT_VERNEEDNUM, 0)):
+                (_vn_version, vn_cnt, vn_file, vn_aux,
+                 vn_next) = self._unpack(self._verneed, offset)
+                filename = self._string(strtab + vn_file)
+                aux_offset = offset + vn_aux
+                for _aux_idx in range(vn_cnt):
+                    (_vna_hash, _vna_flags, vna_other, vna_name,
+                     vna_next) = self._unpack(self._vernaux, aux_offset)
+                    needed[vna_other] = (
+                        self._string(strtab + vna_name), filename)
+                    if not vna_next:
+                        break
+                    aux_offset += vna_next
+                if not vn_next:
+                    break
+                offset += vn_next
+
+        return versym, defined, needed
+
+    def symbols(self):
+        defined = set()
+        required = set()
+        table = self._symbol_table()
+        if table is None:
+            return None
+
+        symtab, count, strtab = table
+        versym, version_defs, version_needs = self._versions(strtab)
+        sym = self._sym
+        size = sym.size
+        is_32 = self.elf_class == ELFCLASS32
+        for idx in range(1, count):
+            values = self._unpack(sym, symtab + idx * size)
+            if is_32:
+                st_name, _value, _size, st_info, _other, st_shndx = values
+            else:
+                st_name, st_info, _other, st_shndx, _value, _size = values
+            if not st_name:
+                continue
+            binding = st_info >> 4
+            if st_shndx == _SHN_UNDEF and binding != _STB_GLOBAL:
+                continue
+            if st_shndx != _SHN_UNDEF and binding not in (
+                    _STB_GLOBAL, _STB_WEAK, _STB_GNU_UNIQUE):
+                continue
+
+            name = self._string(strtab + st_name)
+            ver = _VER_NDX_GLOBAL
+            if versym is not None:
+                ver = self._unpack(self._half, versym + idx * 2)[0]
+            ndx = ver & _VERSYM_INDEX
+
+            if st_shndx == _SHN_UNDEF:
+                version, filename = version_needs.get(ndx, (None, None))
+                required.add((name, version, filename))
+            elif ndx <= _VER_NDX_GLOBAL and not ver & _VERSYM_HIDDEN:
+                # base definitions satisfy any version, like in ld.so
+                defined.add((name, None))
+            else:
+                defined.add((name, version_defs.get(ndx)))
+
+        versions = None
+        if version_defs:
+            versions = frozenset(version_defs.values())
+        return frozenset(defined), frozenset(required), versions
+
+
+if const_is_python3():
+    def _byte(data, idx):
+        return data[idx]
+
+    def _decode(raw):
+        return const_convert_to_unicode(raw)
+else:
+    def _byte(data, idx):
+        return ord(data[idx])
+
+    def _decode(raw):
+        return raw
+
+
+def _map_file(fileobj):
+    """
+    Return a read-only mmap of the given file object, or its content,
+    if the file cannot be mapped.
+    """
+    try:
+        return mmap.mmap(fileobj.fileno(), 0, access = mmap.ACCESS_READ)
+    except (ValueError, EnvironmentError):
+        # empty files and special files cannot be mapped
+        return fileobj.read()
+
+
+def _unmap_file(data):
+    if isinstance(data, mmap.mmap):
+        data.close()
+
+
+_CACHE_SIZE = 8192
+_cache = collections.OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def read_elf(path):
+    """
+    Read the metadata of the ELF object at the given path. Results are
+    cached by path and invalidated when the file modification time,
+    size or inode change.
+
+    @param path: path to ELF object
+    @type path: string
+    @return: an ElfObject instance or None, if path is not a valid
+        ELF object
+    @rtype: ElfObject or None
+    @raise IOError: if the file cannot be read
+    @raise OSError: if the file cannot be stat'd
+    """
+    st = os.stat(path)
+    stat_key = (st.st_mtime, st.st_size, st.st_ino, st.st_dev)
+
+    with _cache_lock:
+        obj = _cache.get(path)
+        if obj is not None and obj._stat == stat_key:
+            _cache.pop(path)
+            _cache[path] = obj
+            return obj
+
+    obj = ElfObject(path, stat_key)
+    with open(path, "rb") as f:
+        data = _map_file(f)
+        try:
+            _ElfParser(data).metadata(obj)
+        except (ValueError, struct.error):
+            obj = None
+        finally:
+            _unmap_file(data)
+
+    if obj is not None:
+        with _cache_lock:
+            _cache.pop(path, None)
+            _cache[path] = obj
+            while len(_cache) > _CACHE_SIZE:
+                _cache.popitem(last = False)
+    return obj
+
+
+def clear_cache():
+    """
+    Drop all the cached ELF objects metadata.
+    """
+    with _cache_lock:
+        _cache.clear()
@@ -10,6 +10,7 @@
 
 """
 import os
+import collections
 import errno
 import sys
 import time
@@ -19,6 +20,8 @@ except ImportError:
     # python 3.x
     import http.client as httplib
 import hashlib
+import json
+import re
 import socket
 import pty
 import subprocess
@@ -32,9 +35,11 @@ from entropy.const import const_is_python3, const_file_readable
 if const_is_python3():
     import urllib.request as urlmod
     import urllib.error as urlmod_error
+    import urllib.parse as urlmod_parse
 else:
     import urllib2 as urlmod
     import urllib2 as urlmod_error
+    import urlparse as urlmod_parse
 
 from entropy.exceptions import InterruptError
 from entropy.tools import print_traceback, \
@@ -49,6 +54,201 @@ from entropy.misc import ParallelTask
 from entropy.core.settings.base import SystemSettings
 
 
+class _PooledHttpResponse(object):
+
+    """
+    urlopen() compatible response object, handing its HTTP connection
+    back to the pool it comes from once the body has been fully read.
+    """
+
+    def __init__(self, pool, key, conn, response, url):
+        self._pool = pool
+        self._key = key
+        self._conn = conn
+        self._response = response
+        self._url = url
+
+    @property
+    def headers(self):
+        return self._response.msg
+
+    def info(self):
+        return self._response.msg
+
+    def geturl(self):
+        return self._url
+
+    def getcode(self):
+        return self._response.status
+
+    def read(self, *args):
+        return self._response.read(*args)
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is None:
+            return
+        if self._response.isclosed() and not self._response.will_close:
+            self._pool.release(self._key, conn)
+        else:
+            self._response.close()
+            conn.close()
+
+
+class _HttpConnectionPool(object):
+
+    """
+    Thread-safe pool of idle keep-alive HTTP and HTTPS connections,
+    indexed by scheme, host, port and SSL certificate validation mode.
+    It avoids a new TCP (and TLS) handshake for every file fetched
+    from the same mirror.
+    """
+
+    # max idle connections kept per host
+    MAX_IDLE_PER_HOST = 8
+    # idle connections older than this (in seconds) are dropped
+    IDLE_TIMEOUT = 30
+
+    _REDIRECT_CODES = (301, 302, 303, 307, 308)
+    _MAX_REDIRECTS = 10
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._idle = {}
+        self._ssl_contexts = {}
+
+    def acquire(self, key):
+        """
+        Return an idle connection for the given key, or None.
+        """
+        expired = []
+        conn = None
+        cur_t = time.time()
+        with self._lock:
+            conns = self._idle.get(key)
+            while conns:
+                idle_conn, last_t = conns.pop()
+                if cur_t - last_t < self.IDLE_TIMEOUT:
+                    conn = idle_conn
+                    break
+                expired.append(idle_conn)
+
+        for idle_conn in expired:
+            idle_conn.close()
+        return conn
+
+    def release(self, key, conn):
+        """
+        Hand an idle connection back to the pool.
+        """
+        with self._lock:
+            conns = self._idle.setdefault(key, [])
+            if len(conns) < self.MAX_IDLE_PER_HOST:
+                conns.append((conn, time.time()))
+                return
+        conn.close()
+
+    def clear(self):
+        """
+        Close all the idle connections.
+        """
+        with self._lock:
+            idle = list(self._idle.values())
+            self._idle.clear()
+        for conns in idle:
+            for conn, _last_t in conns:
+                conn.close()
+
+    def _ssl_context(self, validate_cert):
+        with self._lock:
+            ctx = self._ssl_contexts.get(validate_cert)
+            if ctx is None:
+                ctx = ssl.create_default_context()
+                if not validate_cert:
+                    ctx.check_hostname = False
+                    ctx.verify_mode = ssl.CERT_NONE
+                self._ssl_contexts[validate_cert] = ctx
+            return ctx
+
+    def _request(self, key, path, headers, timeout):
+        scheme, host, port, validate_cert = key
+        conn = self.acquire(key)
+        reused = conn is not None
+        while True:
+            if conn is None:
+                if scheme == "https":
+                    conn = httplib.HTTPSConnection(
+                        host, port, timeout = timeout,
+                        context = self._ssl_context(validate_cert))
+                else:
+                    conn = httplib.HTTPConnection(
+                        host, port, timeout = timeout)
+            else:
+                conn.timeout = timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout)
+
+            try:
+                conn.request("GET", path, headers = headers)
+                return conn, conn.getresponse()
+            except (httplib.BadStatusLine, httplib.CannotSendRequest,
+                    socket.error):
+                conn.close()
+                if not reused:
+                    raise
+                # the server closed the idle connection, try a new one
+                reused = False
+                conn = None
+
+    def urlopen(self, url, headers, timeout, validate_cert = True):
+        """
+        Open given HTTP or HTTPS URL, reusing an idle connection if
+        possible, and following redirects. Errors are raised like
+        urlopen() does.
+
+        @param url: HTTP or HTTPS URL
+        @type url: string
+        @param headers: HTTP request headers
+        @type headers: dict
+        @param timeout: socket timeout, in seconds
+        @type timeout: int
+        @keyword validate_cert: validate HTTPS server certificates
+        @type validate_cert: bool
+        @return: urlopen() compatible response object
+        @rtype: object
+        """
+        for _redirect in range(self._MAX_REDIRECTS + 1):
+            parts = urlmod_parse.urlsplit(url)
+            if parts.scheme not in ("http", "https"):
+                # redirected to something we do not handle
+                return urlmod.urlopen(url, None, timeout)
+
+            path = parts.path or "/"
+            if parts.query:
+                path += "?" + parts.query
+            key = (parts.scheme, parts.hostname, parts.port, validate_cert)
+
+            conn, response = self._request(key, path, headers, timeout)
+            location = response.getheader("location")
+            if response.status in self._REDIRECT_CODES and location:
+                response.read()
+                _PooledHttpResponse(self, key, conn, response, url).close()
+                url = urlmod_parse.urljoin(url, location)
+                continue
+
+            if response.status >= 400:
+                response.close()
+                conn.close()
+                raise urlmod_error.HTTPError(
+                    url, response.status, response.reason,
+                    response.msg, None)
+
+            return _PooledHttpResponse(self, key, conn, response, url)
+
+        raise urlmod_error.HTTPError(
+            url, response.status, "too many redirects", response.msg, None)
+
+
 class UrlFetcher(TextInterface):
 
     """
@@ -74,6 +274,9 @@ class UrlFetcher(TextInterface):
     TIMEOUT_FETCH_ERROR = "-4"
     GENERIC_FETCH_WARN = "-2"
 
+    # keep-alive HTTP(S) connections, shared by all the instances
+    _http_pool = _HttpConnectionPool()
+
     def __init__(self, url, path_to_save, checksum = True,
                  show_speed = True, resume = True,
                  abort_check_func = None, disallow_redirect = False,
@@ -81,7 +284,7 @@ class UrlFetcher(TextInterface):
                  timeout = None, download_context_func = None,
                  pre_download_hook = None, post_download_hook = None,
                  http_basic_user = None, http_basic_pwd = None,
-                 https_validate_cert = True):
+                 https_validate_cert = True, digests = None):
         """
         Entropy URL downloader constructor.
 
@@ -126,8 +329,14 @@ class UrlFetcher(TextInterface):
             inside the download_context_func context. This can be used to verify
             the integrity of the downloaded data.
             The function takes a path (the download path) and the download
-            status and the download id as arguments.
+            status and the download id as arguments. If digests is not None,
+            the download digests (see get_digests()) are passed as fourth
+            argument.
         @type post_download_hook: callable
+        @keyword digests: list of hashlib algorithm names (for eg. "sha256")
+            whose hex digests are computed on the way, together with md5,
+            while data is written to disk.
+        @type digests: list
         """
         self.__supported_uris = {
             'file': self._urllib_download,
@@ -159,6 +368,7 @@ class UrlFetcher(TextInterface):
         self.__download_context_func = download_context_func
         self.__pre_download_hook = pre_download_hook
         self.__post_download_hook = post_download_hook
+        self.__digests = digests
 
         self.__resume = resume
         self.__url = url
@@ -189,7 +399,7 @@ class UrlFetcher(TextInterface):
 
     def _init_vars(self):
         self.__use_md5_checksum = False
-        self.__md5_checksum = hashlib.new("md5")
+        self.__reset_checksums()
         self.__resumed = False
         self.__buffersize = 8192
         self.__status = None
@@ -224,6 +434,19 @@ class UrlFetcher(TextInterface):
         else:
             self.__urllib_open_local_file("wb")
 
+    def __reset_checksums(self):
+        self.__md5_checksum = hashlib.new("md5")
+        self.__checksums = [self.__md5_checksum]
+        self.__checksums_map = {"md5": self.__md5_checksum}
+        for digest in self.__digests or ():
+            checksum = hashlib.new(digest)
+            self.__checksums.append(checksum)
+            self.__checksums_map[digest] = checksum
+
+    def __update_checksums(self, mybuffer):
+        for checksum in self.__checksums:
+            checksum.update(mybuffer)
+
     def __urllib_open_local_file(self, mode):
         # if client uses this instance more than
         # once, make sure we close previously opened
@@ -235,6 +458,14 @@ class UrlFetcher(TextInterface):
                 self.__localfile.close()
             except (IOError, OSError,):
                 pass
+        self.__reset_checksums()
+        if mode.startswith("a"):
+            # feed the digestors with the data we are resuming from
+            with open(self.__path_to_save, "rb") as local_f:
+                mybuffer = local_f.read(self.__buffersize * 16)
+                while mybuffer:
+                    self.__update_checksums(mybuffer)
+                    mybuffer = local_f.read(self.__buffersize * 16)
         self.__localfile = open(self.__path_to_save, mode)
         if mode.startswith("a"):
             self.__resumed = True
@@ -393,11 +624,32 @@ class UrlFetcher(TextInterface):
                 self.update()
 
             if self.__post_download_hook:
-                self.__post_download_hook(
-                    self.__path_to_save, status, self.__th_id)
+                if self.__digests is None:
+                    self.__post_download_hook(
+                        self.__path_to_save, status, self.__th_id)
+                else:
+                    self.__post_download_hook(
+                        self.__path_to_save, status, self.__th_id,
+                        self.get_digests())
 
             return status
 
+    def get_digests(self):
+        """
+        Return the hex digests of the downloaded file, computed on the way,
+        as a dict mapping the algorithm names ("md5" and the ones passed
+        through the digests keyword) to their values.
+        For downloaders that cannot compute digests on the way (rsync),
+        None is returned.
+
+        @return: the download digests or None
+        @rtype: dict or None
+        """
+        if not self.__use_md5_checksum:
+            return None
+        return dict((x, y.hexdigest()) for x, y in \
+                        self.__checksums_map.items())
+
     def _setup_rsync_args(self):
         protocol = UrlFetcher._get_url_protocol(self.__url)
         url = self.__url
@@ -572,6 +824,58 @@ class UrlFetcher(TextInterface):
             # unset
             urlmod._opener = None
 
+    @staticmethod
+    def _use_http_pool(url):
+        """
+        Return whether the keep-alive connection pool can be used
+        for the given HTTP(S) URL. The pool does not support proxies,
+        either configured or set in the environment, nor credentials
+        embedded into the URL.
+        """
+        if getattr(urlmod, "_opener", None) is not None:
+            # proxy opener installed
+            return False
+        proxy_data = SystemSettings()['system']['proxy']
+        if proxy_data['http'] or proxy_data['ftp']:
+            # see _setup_urllib_proxy()
+            return False
+        protocol = UrlFetcher._get_url_protocol(url)
+        if protocol in urlmod.getproxies():
+            return False
+        if "@" in urlmod_parse.urlsplit(url).netloc:
+            # credentials in URL, let urllib handle them
+            return False
+        return True
+
+    def __urlopen(self, request):
+        """
+        Open given URL or urllib Request object, HTTP(S) connections are
+        kept alive and reused if no proxy is set.
+        """
+        if isinstance(request, urlmod.Request):
+            url = request.get_full_url()
+        else:
+            url = request
+        url_protocol = UrlFetcher._get_url_protocol(url)
+
+        if url_protocol in ("http", "https") and self._use_http_pool(url):
+            if isinstance(request, urlmod.Request):
+                headers = dict(request.header_items())
+            else:
+                headers = {}
+            return self._http_pool.urlopen(
+                url, headers, self.__timeout,
+                validate_cert = self.__https_validate_cert)
+
+        if url_protocol == "https" and not self.__https_validate_cert:
+            ctx = ssl.create_default_context()
+            ctx.check_hostname = False
+            ctx.verify_mode = ssl.CERT_NONE
+            return urlmod.urlopen(request, None, self.__timeout,
+                context = ctx)
+
+        return urlmod.urlopen(request, None, self.__timeout)
+
     def _urllib_download(self):
         """
         urrlib2 based downloader. This is the default for HTTP and FTP urls.
@@ -617,18 +921,7 @@ class UrlFetcher(TextInterface):
 
             # get file size if available
             try:
-                if url_protocol in ("https") and \
-                    not self.__https_validate_cert:
-
-                    ctx = ssl.create_default_context()
-                    ctx.check_hostname = False
-                    ctx.verify_mode = ssl.CERT_NONE
-
-                    self.__remotefile = urlmod.urlopen(req, None, self.__timeout,
-                            context=ctx)
-
-                else:
-                    self.__remotefile = urlmod.urlopen(req, None, self.__timeout)
+                self.__remotefile = self.__urlopen(req)
             except KeyboardInterrupt:
                 self.__urllib_close(False)
                 raise
@@ -724,8 +1017,7 @@ class UrlFetcher(TextInterface):
                     self.__remotefile.close()
                 except:
                     pass
-                self.__remotefile = urlmod.urlopen(
-                    request, None, self.__timeout)
+                self.__remotefile = self.__urlopen(request)
 
             elif self.__startingposition == self.__remotesize:
                 # all fine then!
@@ -816,7 +1108,7 @@ class UrlFetcher(TextInterface):
     def __urllib_commit(self, mybuffer):
         # writing file buffer
         self.__localfile.write(mybuffer)
-        self.__md5_checksum.update(mybuffer)
+        self.__update_checksums(mybuffer)
         # update progress info
         self.__downloadedsize = self.__localfile.tell()
         kbytecount = float(self.__downloadedsize)/1000
@@ -1012,7 +1304,8 @@ class MultipleUrlFetcher(TextInterface):
                  download_context_func = None,
                  pre_download_hook = None, post_download_hook = None,
                  http_basic_user = None, http_basic_pwd = None,
-                 https_validate_cert = True):
+                 https_validate_cert = True, workers_per_mirror = None,
+                 digests = None):
         """
         @param url_path_list: list of tuples composed by url and
             path to save, for eg. [(url,path_to_save,),...]
@@ -1054,8 +1347,17 @@ class MultipleUrlFetcher(TextInterface):
             inside the download_context_func context. This can be used to verify
             the integrity of the downloaded data.
             The function takes a path (the download path) and the download
-            status and the download id as arguments.
+            status and the download id as arguments. If digests is not None,
+            the download digests (see UrlFetcher.get_digests()) are passed as
+            fourth argument.
         @type post_download_hook: callable
+        @keyword workers_per_mirror: max number of parallel downloads per
+            mirror (URL host), if None, the value is read from Entropy
+            configuration files.
+        @type workers_per_mirror: int
+        @keyword digests: list of hashlib algorithm names whose hex digests
+            are computed on the way, see UrlFetcher.
+        @type digests: list
         """
         self._progress_data = {}
         self._url_path_list = url_path_list
@@ -1070,6 +1372,7 @@ class MultipleUrlFetcher(TextInterface):
         self.__download_context_func = download_context_func
         self.__pre_download_hook = pre_download_hook
         self.__post_download_hook = post_download_hook
+        self.__digests = digests
 
         # important to have a declaration here
         self.__data_transfer = 0
@@ -1087,6 +1390,11 @@ class MultipleUrlFetcher(TextInterface):
         # SSL Context options
         self.__https_validate_cert = https_validate_cert
 
+        if workers_per_mirror is None:
+            workers_per_mirror = \
+                self.__system_settings['repositories']['download_workers']
+        self.__workers_per_mirror = max(1, workers_per_mirror)
+
     def __handle_threads_stop(self):
         if self.__stop_threads:
             raise InterruptError("interrupted")
@@ -1094,8 +1402,11 @@ class MultipleUrlFetcher(TextInterface):
     def _init_vars(self):
         self._progress_data.clear()
         self._progress_data_lock = threading.Lock()
-        self.__thread_pool = {}
+        self.__thread_pool = []
         self.__download_statuses = {}
+        self.__downloads_done = threading.Event()
+        self.__running_workers = 0
+        self.__running_workers_lock = threading.Lock()
         self.__show_progress = False
         self.__stop_threads = False
         self.__first_refreshes = 50
@@ -1135,10 +1446,24 @@ class MultipleUrlFetcher(TextInterface):
         """
         self._init_vars()
 
+        # downloads are grouped by mirror (URL host), each mirror is
+        # served by a bounded number of workers that pick downloads from
+        # a shared queue, so that keep-alive connections can be reused.
+        mirrors = collections.OrderedDict()
+        th_id = 0
+        for url, path_to_save in self._url_path_list:
+            th_id += 1
+            mirror = spliturl(url)[1]
+            mirrors.setdefault(mirror, collections.deque()).append(
+                (th_id, url, path_to_save))
+
+        workers_count = sum(
+            min(self.__workers_per_mirror, len(x)) for x in mirrors.values())
+
         speed_limit = 0
         dsl = self.__system_settings['repositories']['transfer_limit']
-        if isinstance(dsl, int) and self._url_path_list:
-            speed_limit = dsl/len(self._url_path_list)
+        if isinstance(dsl, int) and workers_count:
+            speed_limit = dsl/workers_count
 
         class MyFetcher(self.__url_fetcher):
 
@@ -1156,54 +1481,73 @@ class MultipleUrlFetcher(TextInterface):
                 return self.__multiple_fetcher.handle_statistics(*args,
                     **kwargs)
 
-        th_id = 0
-        for url, path_to_save in self._url_path_list:
-            th_id += 1
-            downloader = MyFetcher(
-                self.__url_fetcher, self, url, path_to_save,
-                checksum = self.__checksum, show_speed = self.__show_speed,
-                resume = self.__resume,
-                abort_check_func = self.__abort_check_func,
-                disallow_redirect = self.__disallow_redirect,
-                thread_stop_func = self.__handle_threads_stop,
-                speed_limit = speed_limit,
-                timeout = self.__timeout,
-                download_context_func = self.__download_context_func,
-                pre_download_hook = self.__pre_download_hook,
-                post_download_hook = self.__post_download_hook,
-                http_basic_user = self.__http_basic_user,
-                http_basic_pwd = self.__http_basic_pwd,
-                https_validate_cert = self.__https_validate_cert
-            )
-            downloader.set_id(th_id)
-
-            def do_download(ds, dth_id, downloader):
-                ds[dth_id] = downloader.download()
+        def do_download(queue):
+            try:
+                while not self.__stop_threads:
+                    try:
+                        dth_id, url, path_to_save = queue.popleft()
+                    except IndexError:
+                        break
 
-            t = ParallelTask(do_download, self.__download_statuses, th_id,
-                downloader)
-            t.name = "UrlFetcher{%s}" % (url,)
-            t.daemon = True
-            self.__thread_pool[th_id] = t
-            t.start()
+                    try:
+                        downloader = MyFetcher(
+                            self.__url_fetcher, self, url, path_to_save,
+                            checksum = self.__checksum,
+                            show_speed = self.__show_speed,
+                            resume = self.__resume,
+                            abort_check_func = self.__abort_check_func,
+                            disallow_redirect = self.__disallow_redirect,
+                            thread_stop_func = self.__handle_threads_stop,
+                            speed_limit = speed_limit,
+                            timeout = self.__timeout,
+                            download_context_func = \
+                                self.__download_context_func,
+                            pre_download_hook = self.__pre_download_hook,
+                            post_download_hook = self.__post_download_hook,
+                            http_basic_user = self.__http_basic_user,
+                            http_basic_pwd = self.__http_basic_pwd,
+                            https_validate_cert = self.__https_validate_cert,
+                            digests = self.__digests
+                        )
+                        downloader.set_id(dth_id)
+                        self.__download_statuses[dth_id] = \
+                            downloader.download()
+                    except Exception:
+                        print_traceback()
+                        # fail this download only, the next ones
+                        # may still succeed
+                        self.__download_statuses[dth_id] = \
+                            UrlFetcher.GENERIC_FETCH_ERROR
+            finally:
+                with self.__running_workers_lock:
+                    self.__running_workers -= 1
+                    if self.__running_workers == 0:
+                        self.__downloads_done.set()
+
+        self.__running_workers = workers_count
+        if not workers_count:
+            self.__downloads_done.set()
+
+        for mirror, queue in mirrors.items():
+            for _count in range(min(self.__workers_per_mirror, len(queue))):
+                t = ParallelTask(do_download, queue)
+                t.name = "UrlFetcher{%s}" % (mirror,)
+                t.daemon = True
+                self.__thread_pool.append(t)
+                t.start()
 
         self._push_progress_to_output(force = True)
         self.__show_download_files_info()
         self.__show_progress = True
 
-        # wait until all the threads are done
+        # wait until all the downloads are done
         # do not block the main thread
         # but rather use timeout and check
         try:
-            while True:
-                _all_joined = True
-                for th_id, th in self.__thread_pool.items():
-                    th.join(0.3)
-                    if th.is_alive():
-                        # timeout then
-                        _all_joined = False
-                if _all_joined:
-                    break
+            while not self.__downloads_done.wait(0.5):
+                continue
+            for th in self.__thread_pool:
+                th.join()
         except (SystemExit, KeyboardInterrupt):
             self.__stop_threads = True
             raise
@@ -1211,7 +1555,7 @@ class MultipleUrlFetcher(TextInterface):
         if len(self._url_path_list) != len(self.__download_statuses):
             # there has been an error (exception)
             # complete download_statuses with error info
-            for th_id, th in self.__thread_pool.items():
+            for th_id in range(1, len(self._url_path_list) + 1):
                 if th_id not in self.__download_statuses:
                     self.__download_statuses[th_id] = \
                         UrlFetcher.GENERIC_FETCH_ERROR
@@ -1325,12 +1669,19 @@ class MultipleUrlFetcher(TextInterface):
         downloaded_size = 0
         total_size = 0
         time_remaining = 0
+        # sum of the completion ratios of the single downloads
+        completion = 0.0
 
         with self._progress_data_lock:
             all_started = len(self._progress_data) == len(self._url_path_list)
             for th_id, data in self._progress_data.items():
-                downloaded_size += data.get('downloaded_size', 0)
-                total_size += data.get('total_size', 0)
+                item_downloaded_size = data.get('downloaded_size', 0)
+                item_total_size = data.get('total_size', 0)
+                downloaded_size += item_downloaded_size
+                total_size += item_total_size
+                if item_total_size > 0:
+                    completion += min(1.0,
+                        float(item_downloaded_size / 1000) / item_total_size)
                 # data_transfer from Python threading bullshit is not reliable
                 # with multiple threads and causes inaccurate informations to be
                 # printed
@@ -1349,6 +1700,9 @@ class MultipleUrlFetcher(TextInterface):
         # downloaded_size is in bytes
         if total_size > 0 and all_started:
             average = int(float(downloaded_size / 1000) / total_size * 100)
+        elif self._url_path_list:
+            # downloads are queued, sizes are not known yet
+            average = int(completion / len(self._url_path_list) * 100)
 
         time_remaining_str = convert_seconds_to_fancy_output(time_remaining)
         if not all_started:
@@ -1426,3 +1780,545 @@ class MultipleUrlFetcher(TextInterface):
         your output devices.
         """
         return self._push_progress_to_output()
+
+
+class SegmentedUrlFetcher(TextInterface):
+
+    """
+    Entropy multi-mirror segmented URL fetcher. A single file is split
+    into HTTP Range segments that are fetched at the same time from all
+    the given HTTP(S) mirrors and written in place. Each segment is
+    checksummed as it arrives and recorded into a state file, next to
+    the download path, that makes possible to resume the download.
+    Mirrors not supporting Range requests or serving a file of a
+    different size are dropped, their segments go to the other ones.
+    """
+
+    # file extension of the segments state file
+    SEGMENTS_EXT = ".segments"
+    # default segment size, in bytes
+    SEGMENT_SIZE = 4 * 1024 * 1024
+    # errors tolerated per mirror before dropping it
+    MAX_MIRROR_ERRORS = 3
+
+    _CONTENT_RANGE_RE = re.compile(r"^bytes\s+(\d+)-(\d+)/(\d+)$")
+
+    def __init__(self, urls, path_to_save, checksum = True,
+                 show_speed = True, resume = True,
+                 abort_check_func = None, timeout = None,
+                 http_basic_user = None, http_basic_pwd = None,
+                 https_validate_cert = True, segment_size = None):
+        """
+        Entropy segmented URL downloader constructor.
+
+        @param urls: list of download URLs (mirrors) of the same file,
+            only HTTP and HTTPS URLs are used
+        @type urls: list
+        @param path_to_save: file path where to save downloaded data
+        @type path_to_save: string
+        @keyword checksum: return md5 hash instead of status code
+        @type checksum: bool
+        @keyword show_speed: show download speed
+        @type show_speed: bool
+        @keyword resume: enable resume support
+        @type resume: bool
+        @keyword abort_check_func: callback used to stop download, it has to
+            raise an exception that has to be caught by provider application.
+            This exception will be considered an "abort" request.
+        @type abort_check_func: callable
+        @keyword timeout: custom request timeout value (in seconds), if None
+            the value is read from Entropy configuration files.
+        @type timeout: int
+        @keyword segment_size: segment size in bytes, if None,
+            SEGMENT_SIZE is used.
+        @type segment_size: int
+        """
+        self.__system_settings = SystemSettings()
+        if timeout is None:
+            timeout = self.__system_settings['repositories']['timeout']
+        if segment_size is None:
+            segment_size = SegmentedUrlFetcher.SEGMENT_SIZE
+
+        self.__urls = [x for x in urls if \
+            SegmentedUrlFetcher.supports_url(x)]
+        self.__path_to_save = path_to_save
+        self.__state_path = path_to_save + SegmentedUrlFetcher.SEGMENTS_EXT
+        self.__checksum = checksum
+        self.__show_speed = show_speed
+        self.__resume = resume
+        self.__abort_check_func = abort_check_func
+        self.__timeout = timeout
+        self.__segment_size = segment_size
+        self.__https_validate_cert = https_validate_cert
+        self.__buffersize = 65536
+        self.__th_id = 0
+
+        uname = os.uname()
+        self.__headers = {
+            'User-Agent': "Entropy/%s (compatible; %s; %s: %s %s %s)" % (
+                etpConst['entropyversion'],
+                "Entropy",
+                os.path.basename(path_to_save),
+                uname[0],
+                uname[4],
+                uname[2],
+            ),
+        }
+        if http_basic_user and http_basic_pwd:
+            basic_header = base64.b64encode(("%s:%s" % (
+                http_basic_user, http_basic_pwd)).encode("utf-8"))
+            self.__headers['Authorization'] = "Basic %s" % (
+                basic_header.decode("utf-8"),)
+
+        self._init_vars()
+
+    def _init_vars(self):
+        self.__lock = threading.Lock()
+        self.__cond = threading.Condition(self.__lock)
+        self.__stop = False
+        self.__exception = None
+        self.__queue = collections.deque()
+        self.__in_flight = 0
+        self.__segments = {}
+        self.__remotesize = 0
+        self.__downloadedsize = 0
+        self.__startingposition = 0
+        self.__resumed = False
+        self.__datatransfer = 0
+        self.__average = 0
+        self.__oldaverage = 0
+        self.__time_remaining = "(infinite)"
+        self.__time_remaining_secs = 0
+        self.__starttime = time.time()
+        self.__last_output_time = self.__starttime
+
+    @staticmethod
+    def supports_url(url):
+        """
+        Return whether the given URL can be used for segmented downloads.
+        Segments are fetched through the UrlFetcher keep-alive connection
+        pool, thus URLs requiring a proxy or carrying credentials are
+        not supported.
+
+        @param url: download URL
+        @type url: string
+        @rtype: bool
+        """
+        if UrlFetcher._get_url_protocol(url) not in ("http", "https"):
+            return False
+        return UrlFetcher._use_http_pool(url)
+
+    def set_id(self, th_id):
+        """
+        Set instance id (usually the thread identifier).
+        @param th_id: id to set
+        @type th_id: int
+        """
+        self.__th_id = th_id
+
+    def __urlopen(self, url, byte_range):
+        headers = self.__headers.copy()
+        headers['Range'] = "bytes=%d-%d" % byte_range
+        return UrlFetcher._http_pool.urlopen(
+            url, headers, self.__timeout,
+            validate_cert = self.__https_validate_cert)
+
+    def __content_range(self, response):
+        """
+        Return the (start, end, size) tuple of a 206 response, or None.
+        """
+        if response.getcode() != 206:
+            return None
+        content_range = response.headers.get("content-range", "")
+        match = self._CONTENT_RANGE_RE.match(content_range.strip())
+        if match is None:
+            return None
+        return tuple(int(x) for x in match.groups())
+
+    def __probe_size(self):
+        """
+        Return the remote file size, read from the first mirror that
+        supports Range requests, or None.
+        """
+        for url in self.__urls:
+            try:
+                response = self.__urlopen(url, (0, 0))
+            except (urlmod_error.URLError, httplib.HTTPException,
+                    socket.error, ValueError):
+                continue
+            try:
+                content_range = self.__content_range(response)
+                if content_range is not None:
+                    # a single byte, let the connection be reused
+                    response.read()
+            except (httplib.HTTPException, socket.error):
+                content_range = None
+            finally:
+                response.close()
+            if content_range is not None:
+                return content_range[2]
+        return None
+
+    def __load_state(self, segments_count):
+        """
+        Load the completed segments of a previous download, validating
+        their checksum against the data on disk.
+        """
+        if not self.__resume:
+            return {}
+
+        segments = {}
+        try:
+            with open(self.__state_path, "r") as state_f:
+                state = json.load(state_f)
+            if state.get("size") == self.__remotesize and \
+                    state.get("segment_size") == self.__segment_size:
+                for idx, digest in state.get("segments", {}).items():
+                    segments[int(idx)] = digest
+        except (IOError, OSError, ValueError, AttributeError):
+            # no state file, use what a plain download left behind
+            try:
+                prefix_size = os.path.getsize(self.__path_to_save)
+            except OSError:
+                prefix_size = 0
+            if prefix_size <= self.__remotesize:
+                for idx in range(prefix_size // self.__segment_size):
+                    segments[idx] = None
+
+        valid = {}
+        try:
+            with open(self.__path_to_save, "rb") as down_f:
+                for idx in sorted(segments):
+                    if idx >= segments_count:
+                        continue
+                    down_f.seek(idx * self.__segment_size)
+                    data = down_f.read(self.__segment_length(idx))
+                    if len(data) != self.__segment_length(idx):
+                        continue
+                    digest = hashlib.md5(data).hexdigest()
+                    if segments[idx] in (None, digest):
+                        valid[idx] = digest
+        except (IOError, OSError):
+            return {}
+        return valid
+
+    def __save_state(self):
+        """
+        Store the completed segments, called with __lock held.
+        """
+        state = {
+            "size": self.__remotesize,
+            "segment_size": self.__segment_size,
+            "segments": dict((str(k), v) for k, v in \
+                                 self.__segments.items()),
+        }
+        tmp_path = self.__state_path + ".tmp"
+        try:
+            with open(tmp_path, "w") as state_f:
+                json.dump(state, state_f)
+            os.rename(tmp_path, self.__state_path)
+        except (IOError, OSError):
+            pass
+
+    def __truncate_to_prefix(self):
+        """
+        Truncate the download file to the completed segments at its head.
+        """
+        idx = 0
+        while idx in self.__segments:
+            idx += 1
+        length = min(self.__remotesize, idx * self.__segment_size)
+        try:
+            fd = os.open(self.__path_to_save, os.O_WRONLY)
+            try:
+                os.ftruncate(fd, length)
+            finally:
+                os.close(fd)
+        except (IOError, OSError):
+            pass
+
+    def __segment_length(self, idx):
+        start = idx * self.__segment_size
+        return min(self.__remotesize, start + self.__segment_size) - start
+
+    def __fetch_segment(self, url, fd, idx):
+        """
+        Fetch a segment from url and write it to fd. Return its md5
+        checksum, or None in case of errors.
+        """
+        start = idx * self.__segment_size
+        end = start + self.__segment_length(idx) - 1
+        try:
+            response = self.__urlopen(url, (start, end))
+        except (urlmod_error.URLError, httplib.HTTPException,
+                socket.error, ValueError):
+            return None
+
+        md5 = hashlib.md5()
+        offset = start
+        try:
+            if self.__content_range(response) != (
+                    start, end, self.__remotesize):
+                return None
+
+            while offset <= end and not self.__stop:
+                data = response.read(min(self.__buffersize, end + 1 - offset))
+                if not data:
+                    break
+                if self.__abort_check_func is not None:
+                    self.__abort_check_func()
+                os.lseek(fd, offset, os.SEEK_SET)
+                written = 0
+                while written < len(data):
+                    written += os.write(fd, data[written:])
+                md5.update(data)
+                offset += len(data)
+                self.__progress(len(data))
+
+        except (httplib.HTTPException, socket.error):
+            pass
+        finally:
+            response.close()
+            if offset != end + 1:
+                # rollback progress of the failed segment
+                self.__progress(start - offset)
+
+        if offset != end + 1:
+            return None
+        return md5.hexdigest()
+
+    def __worker(self, url):
+        errors = 0
+        fd = None
+        try:
+            fd = os.open(self.__path_to_save, os.O_WRONLY)
+            while True:
+                with self.__cond:
+                    while not self.__queue and self.__in_flight and \
+                            not self.__stop:
+                        # somebody could hand a segment over
+                        self.__cond.wait(0.5)
+                    if self.__stop or not self.__queue:
+                        return
+                    idx = self.__queue.popleft()
+                    self.__in_flight += 1
+
+                digest = None
+                try:
+                    digest = self.__fetch_segment(url, fd, idx)
+                finally:
+                    with self.__cond:
+                        self.__in_flight -= 1
+                        if digest is None:
+                            self.__queue.appendleft(idx)
+                        else:
+                            self.__segments[idx] = digest
+                            self.__save_state()
+                        self.__cond.notify_all()
+
+                if digest is None:
+                    errors += 1
+                    if errors >= SegmentedUrlFetcher.MAX_MIRROR_ERRORS:
+                        const_debug_write(
+                            __name__,
+                            "SegmentedUrlFetcher: dropping %s" % (url,))
+                        return
+
+        except Exception as err:
+            with self.__cond:
+                if self.__exception is None:
+                    self.__exception = err
+                self.__stop = True
+                self.__cond.notify_all()
+        finally:
+            if fd is not None:
+                os.close(fd)
+
+    def __progress(self, delta):
+        with self.__lock:
+            self.__downloadedsize += delta
+            cur_t = time.time()
+            elapsed = cur_t - self.__starttime
+            if elapsed > 0:
+                self.__datatransfer = (self.__downloadedsize - \
+                    self.__startingposition) / elapsed
+            remaining = self.__remotesize - self.__downloadedsize
+            if self.__datatransfer > 0:
+                self.__time_remaining_secs = int(
+                    round(remaining / self.__datatransfer, 0))
+            self.__time_remaining = convert_seconds_to_fancy_output(
+                self.__time_remaining_secs)
+            if self.__remotesize > 0:
+                self.__average = min(100, int(
+                    float(self.__downloadedsize) / self.__remotesize * 100))
+
+            if self.__show_speed:
+                self.handle_statistics(self.__th_id, self.__downloadedsize,
+                    float(self.__remotesize) / 1000, self.__average,
+                    self.__oldaverage, 0.2, self.__show_speed,
+                    self.__datatransfer, self.__time_remaining,
+                    self.__time_remaining_secs)
+                self.update()
+                self.__oldaverage = self.__average
+
+    def download(self):
+        """
+        Start downloading the file given at construction time.
+
+        @return: download status, which can be either one of:
+            UrlFetcher.GENERIC_FETCH_ERROR means error (including no
+                usable mirror, or no Range support).
+            UrlFetcher.GENERIC_FETCH_WARN means warning,
+                downloaded fine but checksum has not been requested.
+        Otherwise returns md5 hash.
+        @rtype: string
+        """
+        self._init_vars()
+        if not self.__urls:
+            return UrlFetcher.GENERIC_FETCH_ERROR
+
+        size = self.__probe_size()
+        if not size:
+            return UrlFetcher.GENERIC_FETCH_ERROR
+        self.__remotesize = size
+
+        segments_count = (size + self.__segment_size - 1) // \
+            self.__segment_size
+        self.__segments = self.__load_state(segments_count)
+        self.__resumed = bool(self.__segments)
+        self.__downloadedsize = sum(
+            self.__segment_length(x) for x in self.__segments)
+        self.__startingposition = self.__downloadedsize
+        self.__queue.extend(x for x in range(segments_count) \
+                                if x not in self.__segments)
+
+        try:
+            flags = os.O_WRONLY | os.O_CREAT
+            if not self.__segments:
+                flags |= os.O_TRUNC
+            fd = os.open(self.__path_to_save, flags, 0o644)
+            try:
+                os.ftruncate(fd, size)
+            finally:
+                os.close(fd)
+        except (IOError, OSError) as err:
+            const_debug_write(
+                __name__,
+                "SegmentedUrlFetcher: cannot setup %s: %s" % (
+                    self.__path_to_save, repr(err)))
+            return UrlFetcher.GENERIC_FETCH_ERROR
+
+        workers = []
+        for url in self.__urls:
+            t = ParallelTask(self.__worker, url)
+            t.name = "SegmentedUrlFetcher{%s}" % (url,)
+            t.daemon = True
+            workers.append(t)
+            t.start()
+
+        try:
+            for t in workers:
+                while t.is_alive():
+                    t.join(0.5)
+        except (SystemExit, KeyboardInterrupt):
+            self.__stop = True
+            raise
+
+        if self.__exception is not None:
+            raise self.__exception
+
+        if len(self.__segments) != segments_count:
+            # every mirror failed, keep the contiguous data, so that
+            # a plain UrlFetcher can resume from there.
+            self.__truncate_to_prefix()
+            return UrlFetcher.GENERIC_FETCH_ERROR
+
+        try:
+            os.remove(self.__state_path)
+        except OSError:
+            pass
+
+        if self.__show_speed:
+            self.update()
+
+        if self.__checksum:
+            return md5sum(self.__path_to_save)
+        return UrlFetcher.GENERIC_FETCH_WARN
+
+    def get_transfer_rate(self):
+        """
+        Return transfer rate, in kb/sec.
+
+        @return: transfer rate
+        @rtype: int
+        """
+        return self.__datatransfer
+
+    def get_average(self):
+        """
+        Get current download percentage.
+
+        @return: download percentage
+        @rtype: float
+        """
+        return self.__average
+
+    def get_seconds_remaining(self):
+        """
+        Return remaining seconds to download completion.
+
+        @return: remaining download seconds
+        @rtype: int
+        """
+        return self.__time_remaining_secs
+
+    def is_resumed(self):
+        """
+        Return whether given download has been resumed.
+        """
+        return self.__resumed
+
+    def handle_statistics(self, th_id, downloaded_size, total_size,
+            average, old_average, update_step, show_speed, data_transfer,
+            time_remaining, time_remaining_secs):
+        """
+        Reimplement this callback to gather information about data currently
+        downloaded. See UrlFetcher.handle_statistics() for the arguments.
+        """
+        return
+
+    def _push_progress_to_output(self):
+
+        mytxt = _("[F]")
+        eta_txt = _("ETA")
+        sec_txt = _("sec") # as in XX kb/sec
+
+        current_txt = darkred("    %s: " % (mytxt,)) + \
+            darkgreen(str(round(float(self.__downloadedsize)/1000, 1))) + \
+            "/" + red(str(round(float(self.__remotesize)/1000, 1))) + " kB"
+        barsize = 10
+        curbarsize = (self.__average * barsize) // 100
+        bartext = "[" + "=" * curbarsize + ">" + \
+            " " * (barsize - curbarsize - 1)
+        if self.__show_speed:
+            bartext += "] => %s" % (bytes_into_human(self.__datatransfer),)
+            bartext += "/%s : %s: %s" % (sec_txt, eta_txt,
+                self.__time_remaining,)
+        else:
+            bartext += "]"
+        average = str(self.__average)
+        if len(average) < 2:
+            average = " "+average
+        current_txt += " <->  "+average+"% "+bartext
+        TextInterface.output(current_txt, back = True)
+
+    def update(self):
+        """
+        Main fetch progress callback. You can reimplement this to refresh
+        your output devices.
+        """
+        update_time_delta = 0.5
+        cur_t = time.time()
+        if cur_t > (self.__last_output_time + update_time_delta):
+            self.__last_output_time = cur_t
+            self._push_progress_to_output()
@@ -13,7 +13,7 @@
     based on Tarjan's.
 
 """
-from entropy.misc import Lifo
+import array
 
 class GraphNode(object):
 
@@ -215,11 +215,39 @@ class GraphArchSet(object):
         return frozenset(self.__endpoints)
 
 
+def _compact_adjacency(successors):
+    """
+    Build a compact (CSR-like) adjacency representation out of a list of
+    successor node id lists, indexed by node id. Duplicated successors are
+    dropped, preserving the first seen order.
+
+    @param successors: list of lists of successor node ids
+    @type successors: list
+    @return: tuple composed by (offsets, targets) arrays; successors of
+        node id N are targets[offsets[N]:offsets[N + 1]]
+    @rtype: tuple
+    """
+    offsets = array.array("i", [0])
+    targets = array.array("i")
+    for node_successors in successors:
+        seen = set()
+        for successor in node_successors:
+            if successor not in seen:
+                seen.add(successor)
+                targets.append(successor)
+        offsets.append(len(targets))
+    return offsets, targets
+
+
 class TopologicalSorter(object):
 
     """
     This class implements the topological sorting algorithm presented by
     R. E. Tarjan in 1972.
+    Nodes are handled through integer ids and a compact (CSR-like)
+    adjacency representation, both the strongly connected components
+    detection and the sorting are iterative, so that huge graphs do not
+    hit the Python recursion limit.
     """
 
     def __init__(self, adjacency_map):
@@ -231,81 +259,141 @@ class TopologicalSorter(object):
         """
         object.__init__(self)
         self.__adjacency_map = adjacency_map
-        self.__stack = Lifo()
-
-    def __topological_sort_visit_node(self, node, low, result):
-        """
-        Internal method, visits a node ad push to stack.
-        """
-        if node in low:
-            return
-
-        num = len(low)
-        low[node] = num
-        stack_pos = len(self.__stack)
-        self.__stack.push(node)
-
-        for successor in self.__adjacency_map[node]:
-            self.__topological_sort_visit_node(successor, low, result)
-            low[node] = min(low[node], low[successor])
-
-        if num == low[node]:
-            component = tuple()
-            while len(self.__stack) > stack_pos:
-                component += (self.__stack.pop(),)
-            result.append(component)
-            for item in component:
-                low[item] = len(self.__adjacency_map)
-
-    def __strongly_connected_nodes(self):
-        """
-        Find the strongly connected nodes in a adjacency_map using
-        Tarjan's algorithm.
-
-        adjacency_map should be a dictionary mapping node names to
-        lists of successor nodes.
-        """
-        result = []
-        low = {}
-
-        for node in self.__adjacency_map:
-            self.__topological_sort_visit_node(node, low, result)
-
-        return result
 
-
-    def __topological_sort(self, graph):
-        """
-        Effectively executes topological sorting on given graph.
+    @staticmethod
+    def _strongly_connected_components(offsets, targets):
+        """
+        Find the strongly connected components of the given compact
+        adjacency representation using Tarjan's algorithm, without
+        recursion. Nodes are visited in id order.
+
+        @return: tuple composed by the list of components (tuples of node
+            ids, in completion order) and the array mapping node ids to
+            their component index
+        @rtype: tuple
+        """
+        nodes_count = len(offsets) - 1
+        low = array.array("i", [-1]) * nodes_count
+        number = array.array("i", [0]) * nodes_count
+        node_component = array.array("i", [0]) * nodes_count
+        components = []
+        stack = []
+        visit_nodes = []
+        visit_positions = []
+        counter = 0
+
+        for root in range(nodes_count):
+            if low[root] != -1:
+                continue
+
+            low[root] = number[root] = counter
+            counter += 1
+            stack.append(root)
+            visit_nodes.append(root)
+            visit_positions.append(offsets[root])
+
+            while visit_nodes:
+                node = visit_nodes[-1]
+                position = visit_positions[-1]
+
+                if position < offsets[node + 1]:
+                    visit_positions[-1] = position + 1
+                    successor = targets[position]
+                    if low[successor] == -1:
+                        low[successor] = number[successor] = counter
+                        counter += 1
+                        stack.append(successor)
+                        visit_nodes.append(successor)
+                        visit_positions.append(offsets[successor])
+                    elif low[successor] < low[node]:
+                        low[node] = low[successor]
+                    continue
+
+                visit_nodes.pop()
+                visit_positions.pop()
+
+                if number[node] == low[node]:
+                    component_index = len(components)
+                    component = []
+                    while True:
+                        item = stack.pop()
+                        component.append(item)
+                        node_component[item] = component_index
+                        # completed nodes must not lower others
+                        low[item] = nodes_count
+                        if item == node:
+                            break
+                    components.append(tuple(component))
+
+                if visit_nodes:
+                    parent = visit_nodes[-1]
+                    if low[node] < low[parent]:
+                        low[parent] = low[node]
+
+        return components, node_component
+
+    @staticmethod
+    def _sort_components(offsets, targets, components, node_component):
+        """
+        Topologically sort the graph of strongly connected components.
+        Components are initially scheduled in order of first appearance
+        of their nodes (by id).
+
+        @return: dict mapping dependency levels to component indexes
+        @rtype: dict
         """
+        nodes_count = len(offsets) - 1
+        components_count = len(components)
+        component_successors = [[] for x in range(components_count)]
+        count = array.array("i", [0]) * components_count
+        component_order = []
+        seen = array.array("b", [0]) * components_count
 
-        # initialize count map
-        count = dict((node, 0) for node in graph)
-
-        for node in graph:
-            for successor in graph[node]:
-                count[successor] += 1
+        for node in range(nodes_count):
+            node_c = node_component[node]
+            if not seen[node_c]:
+                seen[node_c] = 1
+                component_order.append(node_c)
+            obj = component_successors[node_c]
+            for position in range(offsets[node], offsets[node + 1]):
+                successor_c = node_component[targets[position]]
+                if node_c != successor_c:
+                    obj.append(successor_c)
+                    count[successor_c] += 1
 
-        ready_stack = Lifo()
-        for node in graph:
-            if count[node] == 0:
-                ready_stack.push(node)
+        ready_stack = [x for x in component_order if count[x] == 0]
 
         dep_level = 1
         result = {}
-        while ready_stack.is_filled():
+        while ready_stack:
 
-            node = ready_stack.pop()
-            result[dep_level] = node
+            component_index = ready_stack.pop()
+            result[dep_level] = component_index
             dep_level += 1
 
-            for successor in graph[node]:
-                count[successor] -= 1
-                if count[successor] == 0:
-                    ready_stack.push(successor)
+            for successor_c in component_successors[component_index]:
+                count[successor_c] -= 1
+                if count[successor_c] == 0:
+                    ready_stack.append(successor_c)
 
         return result
 
+    @classmethod
+    def _sort_compact(cls, offsets, targets):
+        """
+        Execute the sorting on the given compact adjacency representation.
+
+        @return: sorted graph representation, mapping dependency levels
+            to tuples of node ids
+        @rtype: dict
+        """
+        components, node_component = cls._strongly_connected_components(
+            offsets, targets)
+        sorted_components = cls._sort_components(
+            offsets, targets, components, node_component)
+        return dict((level, components[component_index]) for \
+            level, component_index in sorted_components.items())
+
     def get_stored_adjacency_map(self):
         """
         Return stored adjacency map used for sorting.
@@ -323,26 +411,16 @@ class TopologicalSorter(object):
         @return: sorted graph representation
         @rtype: dict
         """
-        # clear stack
-        self.__stack.clear()
-
-        components = self.__strongly_connected_nodes()
-
-        node_component = {}
-        for component in components:
-            for node in component:
-                node_component[node] = component
-
-        component_graph = {}
-        for node in self.__adjacency_map:
-            node_c = node_component[node]
-            obj = component_graph.setdefault(node_c, [])
-            for successor in self.__adjacency_map[node]:
-                successor_c = node_component[successor]
-                if node_c != successor_c:
-                    obj.append(successor_c)
+        nodes = list(self.__adjacency_map.keys())
+        node_ids = dict((node, node_id) for node_id, node in \
+            enumerate(nodes))
+        offsets, targets = _compact_adjacency(
+            [[node_ids[x] for x in self.__adjacency_map[node]] \
+                 for node in nodes])
 
-        return self.__topological_sort(component_graph)
+        sorted_data = self._sort_compact(offsets, targets)
+        return dict((level, tuple([nodes[x] for x in component])) for \
+            level, component in sorted_data.items())
 
 
 class Graph(object):
@@ -352,6 +430,10 @@ class Graph(object):
     add() method and sorted using solve(). This class can also return an
     adjacency map representing the currently stored elements in graph.
     A topological sorting algorithm (using Tarjan's) is used to by solve().
+
+    Items are internally mapped to integer node ids, in insertion order,
+    GraphNode objects are only built on demand, by the methods returning
+    them.
     """
 
     def __init__(self):
@@ -359,40 +441,93 @@ class Graph(object):
         Graph representation constructor.
         """
         object.__init__(self)
-        self.__graph = {}
-        self.__archs_map = {}
-        self.__graph_map_cache = None
+        self.__items = []
+        self.__item_ids = {}
+        self.__successors = []
+        self.__compact_cache = None
+        self.__nodes_cache = None
+        self.__archs_cache = None
 
     def destroy(self):
         """
         Cleanup any reference.
         """
-        try:
-            for obj in self.__graph.values():
+        self.__invalidate_cache()
+        if self.__nodes_cache is not None:
+            for obj in self.__nodes_cache:
                 obj._clear()
-            self.__graph.clear()
-        except (NameError, AttributeError):
-            pass
-        try:
-            for obj in self.__archs_map.values():
+            for obj in self.__archs_cache:
                 obj._clear()
-            self.__archs_map.clear()
-        except (NameError, AttributeError):
-            pass
-        try:
-            if self.__graph_map_cache is not None:
-                for obj in self.__graph_map_cache.values():
-                    obj._clear()
-                self.__graph_map_cache.clear()
-                self.__graph_map_cache = None
-        except (NameError, AttributeError):
-            pass
+            self.__nodes_cache = None
+            self.__archs_cache = None
+        del self.__items[:]
+        self.__item_ids.clear()
+        del self.__successors[:]
 
     def __invalidate_cache(self):
         """
         Private method, stay away from here.
         """
-        self.__graph_map_cache = None
+        self.__compact_cache = None
+
+    def __item_id(self, item):
+        """
+        Return the node id of item, adding it to the graph if needed.
+        """
+        item_id = self.__item_ids.get(item)
+        if item_id is None:
+            item_id = len(self.__items)
+            self.__item_ids[item] = item_id
+            self.__items.append(item)
+            self.__successors.append([])
+        return item_id
+
+    def __compact(self):
+        """
+        Return the compact adjacency representation of the graph.
+        """
+        if self.__compact_cache is None:
+            self.__compact_cache = _compact_adjacency(self.__successors)
+        return self.__compact_cache
+
+    def __add_nodes(self):
+        """
+        Build the GraphNode objects of the items added after the last call.
+        """
+        nodes = self.__nodes_cache
+        archs = self.__archs_cache
+        for item in self.__items[len(nodes):]:
+            node = GraphNode(item)
+            arch = GraphArchSet(node)
+            node.add_arch(arch)
+            nodes.append(node)
+            archs.append(arch)
+
+    def __add_arch_endpoints(self, item_id, dependency_ids):
+        """
+        Link the GraphNode of item_id to the GraphNode objects of
+        its dependencies.
+        """
+        nodes = self.__nodes_cache
+        arch = self.__archs_cache[item_id]
+        for dep_id in dependency_ids:
+            node_dep = nodes[dep_id]
+            arch.add_endpoint(node_dep)
+            node_dep.add_arch(arch)
+
+    def __nodes(self):
+        """
+        Return the list of GraphNode objects, indexed by node id.
+        GraphNode objects are built on first use and then kept in sync
+        by add().
+        """
+        if self.__nodes_cache is None:
+            self.__nodes_cache = []
+            self.__archs_cache = []
+            self.__add_nodes()
+            for item_id, successors in enumerate(self.__successors):
+                self.__add_arch_endpoints(item_id, successors)
+        return self.__nodes_cache
 
     def get_node(self, item):
         """
@@ -404,7 +539,8 @@ class Graph(object):
         @rtype: entropy.graph.GraphNode
         @raise KeyError: if item is not in Graph
         """
-        return self.__graph[item]
+        item_id = self.__item_ids[item]
+        return self.__nodes()[item_id]
 
     def add(self, item, dependency_items):
         """
@@ -418,15 +554,13 @@ class Graph(object):
         """
         self.__invalidate_cache()
 
-        graph_node = self.__graph.setdefault(item, GraphNode(item))
-        arch = self.__archs_map.setdefault(graph_node, GraphArchSet(graph_node))
-        graph_node.add_arch(arch)
+        item_id = self.__item_id(item)
+        dependency_ids = [self.__item_id(x) for x in dependency_items]
+        self.__successors[item_id].extend(dependency_ids)
 
-        for dep_item in dependency_items:
-            graph_node_dep = self.__graph.setdefault(dep_item,
-                GraphNode(dep_item))
-            arch.add_endpoint(graph_node_dep)
-            graph_node_dep.add_arch(arch)
+        if self.__nodes_cache is not None:
+            self.__add_nodes()
+            self.__add_arch_endpoints(item_id, dependency_ids)
 
     def get_adjacency_map(self):
         """
@@ -435,21 +569,25 @@ class Graph(object):
         @return: adjacency map
         @rtype: dict
         """
-        if self.__graph_map_cache is not None:
-            return self.__graph_map_cache.copy()
-
-        graph_map = {}
-        for node_item in self.__graph.values():
+        offsets, targets = self.__compact()
+        nodes = self.__nodes()
+        return dict((node, set(nodes[targets[x]] for x in \
+            range(offsets[node_id], offsets[node_id + 1]))) for \
+                node_id, node in enumerate(nodes))
 
-            my_graph_map = set()
-            for arch in node_item.arches():
-                if node_item.is_arch_outgoing(arch):
-                    my_graph_map |= arch.endpoints()
-
-            graph_map[node_item] = my_graph_map
+    def get_item_adjacency_map(self):
+        """
+        Return an adjacency map given the current items in Graph, using
+        the items themselves rather than GraphNode objects.
 
-        self.__graph_map_cache = graph_map.copy()
-        return graph_map
+        @return: adjacency map
+        @rtype: dict
+        """
+        offsets, targets = self.__compact()
+        items = self.__items
+        return dict((item, set(items[targets[x]] for x in \
+            range(offsets[item_id], offsets[item_id + 1]))) for \
+                item_id, item in enumerate(items))
 
     def solve_nodes(self):
         """
@@ -460,9 +598,11 @@ class Graph(object):
         @return: sorted graph representation (returning GraphNode objects)
         @rtype: dict
         """
-        adj_map = self.get_adjacency_map()
-        sorter = TopologicalSorter(adj_map)
-        return sorter.sort()
+        offsets, targets = self.__compact()
+        sorted_data = TopologicalSorter._sort_compact(offsets, targets)
+        nodes = self.__nodes()
+        return dict((x, tuple([nodes[k] for k in y])) for x, y in \
+            sorted_data.items())
 
     def solve(self):
         """
@@ -474,11 +614,11 @@ class Graph(object):
         @return: sorted graph representation
         @rtype: dict
         """
-        def trans_vals(node_list):
-            return tuple([x.item() for x in node_list])
-
-        sorted_data = self.solve_nodes()
-        return dict((x, trans_vals(y),) for x, y in sorted_data.items())
+        offsets, targets = self.__compact()
+        sorted_data = TopologicalSorter._sort_compact(offsets, targets)
+        items = self.__items
+        return dict((x, tuple([items[k] for k in y])) for x, y in \
+            sorted_data.items())
 
     def raw(self):
         """
@@ -488,14 +628,14 @@ class Graph(object):
         @return: list of items added to Graph
         @rtype: list
         """
-        return [x.item() for x in self.__graph.values()]
+        return list(self.__items)
 
     def _graph_debug(self):
         """
         This method is used by entropy.debug module and it's not meant for
         general consumption.
         """
-        return self.__graph
+        return dict(zip(self.__items, self.__nodes()))
 
 
 __all__ = ["Graph"]
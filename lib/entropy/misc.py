@@ -20,6 +20,8 @@ import signal
 import errno
 import codecs
 import contextlib
+import itertools
+import multiprocessing
 
 from entropy.const import const_is_python3
 
@@ -35,7 +37,8 @@ import threading
 from collections import deque
 
 from entropy.const import etpConst, const_isunicode, \
-    const_isfileobj, const_convert_log_level, const_setup_file
+    const_isfileobj, const_convert_log_level, const_setup_file, \
+    const_debug_write
 from entropy.exceptions import EntropyException
 
 import entropy.tools
@@ -471,6 +474,214 @@ class ParallelTask(threading.Thread):
         return self.__rc
 
 
+class ParallelTaskPool(object):
+
+    """
+    Pool of daemon ParallelTask threads. join() never blocks the calling
+    thread for long, so that the main thread keeps receiving signals
+    (KeyboardInterrupt) while waiting for the workers.
+
+        >>> from entropy.misc import ParallelTaskPool
+        >>> pool = ParallelTaskPool("Worker")
+        >>> pool.spawn(print, "hello world")
+        >>> pool.join()
+        hello world
+        >>> ParallelTaskPool.map(len, ["a", "bc"], 2, "Worker")
+        {'a': 1, 'bc': 2}
+
+    """
+
+    def __init__(self, name):
+        """
+        ParallelTaskPool constructor.
+
+        @param name: thread names prefix
+        @type name: string
+        """
+        self._name = name
+        self._threads = []
+
+    def __len__(self):
+        return len(self._threads)
+
+    def spawn(self, function, *args, **kwargs):
+        """
+        Run the given function, with the given arguments, on a new
+        daemon thread.
+
+        @param function: the function to run
+        @type function: callable
+        @return: the thread object
+        @rtype: ParallelTask
+        """
+        th = ParallelTask(function, *args, **kwargs)
+        th.name = "%s-%d" % (self._name, len(self._threads))
+        th.daemon = True
+        self._threads.append(th)
+        th.start()
+        return th
+
+    def join(self):
+        """
+        Wait for all the threads to terminate.
+        """
+        for th in self._threads:
+            while th.is_alive():
+                th.join(0.5)
+        del self._threads[:]
+
+    @classmethod
+    def map(cls, function, items, workers, name):
+        """
+        Call function on every item, using at most the given number of
+        worker threads. If a call raises an exception, the pending items
+        are discarded and the first exception is raised once the workers
+        have terminated, the same happens on KeyboardInterrupt.
+
+        @param function: function taking an item as argument
+        @type function: callable
+        @param items: hashable work items
+        @type items: iterable
+        @param workers: maximum number of worker threads, if lower than
+            2, items are processed by the calling thread
+        @type workers: int
+        @param name: thread names prefix
+        @type name: string
+        @return: dict mapping items to their function results
+        @rtype: dict
+        """
+        queue = deque(items)
+        results = {}
+        errors = []
+
+        def _worker():
+            while not errors:
+                try:
+                    item = queue.popleft()
+                except IndexError:
+                    break
+                try:
+                    results[item] = function(item)
+                except Exception as err:
+                    errors.append(err)
+                    break
+
+        workers = min(workers, len(queue))
+        if workers < 2:
+            _worker()
+        else:
+            pool = cls(name)
+            for _count in range(workers):
+                pool.spawn(_worker)
+            try:
+                pool.join()
+            except KeyboardInterrupt:
+                # let the workers complete the items in progress
+                queue.clear()
+                pool.join()
+                raise
+
+        if errors:
+            raise errors[0]
+        return results
+
+
+# functions applied by the ForkPool worker processes, by task identifier,
+# inherited through fork()
+_fork_pool_functions = {}
+
+def _fork_pool_init():
+    # SIGINT is handled by the parent process, which terminates the pool
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def _fork_pool_unit(task):
+    task_id, unit = task
+    return _fork_pool_functions[task_id](unit)
+
+
+class ForkPool(object):
+
+    """
+    Apply a function to work units using a pool of forked worker
+    processes. The function is inherited by the workers through fork(),
+    so it does not need to be picklable, the work units and the results
+    do. If the pool cannot be created, units are processed in-process.
+
+        >>> from entropy.misc import ForkPool
+        >>> list(ForkPool(len, 4).imap(["a", "bc"]))
+        [1, 2]
+
+    """
+
+    _ids = itertools.count()
+    _ids_lock = threading.Lock()
+
+    def __init__(self, function, processes):
+        """
+        ForkPool constructor.
+
+        @param function: function taking a work unit as argument
+        @type function: callable
+        @param processes: maximum number of worker processes
+        @type processes: int
+        """
+        self._function = function
+        self._processes = processes
+
+    def imap(self, units):
+        """
+        Apply the function to the given work units, yielding the results
+        in the units order, so that the outcome is deterministic. Closing
+        the generator terminates the pending work.
+
+        @param units: list of work units
+        @type units: list
+        @return: generator of results
+        @rtype: generator
+        """
+        pool = None
+        task_id = None
+        processes = min(self._processes, len(units))
+        if processes > 1:
+            mp = multiprocessing
+            if hasattr(mp, "get_context"):
+                # workers must inherit _fork_pool_functions
+                mp = mp.get_context("fork")
+            with ForkPool._ids_lock:
+                task_id = next(ForkPool._ids)
+            _fork_pool_functions[task_id] = self._function
+            try:
+                pool = mp.Pool(processes = processes,
+                               initializer = _fork_pool_init)
+            except (OSError, ImportError) as err:
+                const_debug_write(__name__,
+                    "ForkPool: cannot create the worker pool: %s" % (
+                        repr(err),))
+                pool = None
+
+        try:
+            if pool is None:
+                for unit in units:
+                    yield self._function(unit)
+                return
+
+            completed = False
+            try:
+                for result in pool.imap(_fork_pool_unit,
+                                        [(task_id, x) for x in units]):
+                    yield result
+                completed = True
+            finally:
+                if completed:
+                    pool.close()
+                else:
+                    pool.terminate()
+                pool.join()
+        finally:
+            if task_id is not None:
+                _fork_pool_functions.pop(task_id, None)
+
+
 class ReadersWritersSemaphore(object):
 
     """
@@ -17,6 +17,7 @@ import errno
 import curses
 import subprocess
 import threading
+import contextlib
 
 from entropy.const import const_convert_to_rawstring, \
     const_isstring, const_convert_to_unicode, const_isunicode, \
@@ -150,6 +151,8 @@ codes["white"]      = codes["bold"]
 _MUTE = os.getenv("ETP_MUTE") is not None
 # interactive flag, this will go away at some point in future
 _INTERACTIVE = os.getenv("ETP_NONINTERACTIVE") is None
+# per-thread TextInterface.output() buffers, see buffer_output()
+_BUFFERS = threading.local()
 
 def is_mute():
     """
@@ -170,6 +173,23 @@ def set_mute(status):
     global _MUTE
     _MUTE = bool(status)
 
+@contextlib.contextmanager
+def buffer_output():
+    """
+    Collect the TextInterface.output() messages of the calling thread
+    into the yielded list, instead of writing them. Items are dicts of
+    output() keyword arguments. Transient messages (back = True, like
+    progress bars) are discarded. This makes possible to write the
+    output of work done by concurrent threads without interleaving it.
+    """
+    previous = getattr(_BUFFERS, "messages", None)
+    messages = []
+    _BUFFERS.messages = messages
+    try:
+        yield messages
+    finally:
+        _BUFFERS.messages = previous
+
 def is_interactive():
     """
     Return whether interactive mode is enabled.
@@ -734,6 +754,15 @@ class TextInterface(object):
         if is_mute():
             return
 
+        messages = getattr(_BUFFERS, "messages", None)
+        if messages is not None:
+            if not back:
+                messages.append({
+                    'text': text, 'header': header, 'footer': footer,
+                    'importance': importance, 'level': level,
+                    'count': count, 'percent': percent})
+            return
+
         _flush_stdouterr()
 
         myfunc = print_info
@@ -27,10 +27,10 @@ import stat
 import codecs
 
 from entropy.output import TextInterface
-from entropy.misc import Lifo
+from entropy.misc import Lifo, ForkPool
 from entropy.const import etpConst, etpSys, const_debug_write, const_mkdtemp, \
     const_mkstemp, const_debug_write, const_convert_to_rawstring, \
-    const_is_python3
+    const_is_python3, const_get_cpus
 from entropy.output import blue, darkgreen, red, darkred, bold, purple, brown, \
     teal
 from entropy.exceptions import PermissionDenied, SystemDatabaseError, \
@@ -42,6 +42,173 @@ from entropy.db.skel import EntropyRepositoryPlugin, EntropyRepositoryBase
 
 import entropy.tools
 
+
+class _LibraryLinkageScanner(object):
+    """
+    Broken libraries linkage scanner, used by
+    QAInterface.test_shared_objects() either in-process or from a pool of
+    worker processes. All the methods return plain, picklable objects.
+    """
+
+    def __init__(self, qa_interface, broken_symbols, self_dir_check,
+                 broken_syms_list_regexp, broken_libs_mask_regexp,
+                 broken_libs_paths_mask_regexp):
+        self._qa = qa_interface
+        self._broken_symbols = broken_symbols
+        self._self_dir_check = self_dir_check
+        self._broken_syms_list_regexp = broken_syms_list_regexp
+        self._broken_libs_mask_regexp = broken_libs_mask_regexp
+        self._broken_libs_paths_mask_regexp = broken_libs_paths_mask_regexp
+        self._systemroot = etpConst['systemroot']
+        self._ld_paths = entropy.tools.collect_linker_paths()
+        # (library name, elf class) => library path, filled with the
+        # libraries found in the linker paths by walk()
+        self._resolved_libraries = {}
+
+    def walk(self, ldpath):
+        """
+        Walk the given directory (relative to systemroot) and return the
+        list of ELF executables or libraries found, as (path, elf class)
+        tuples.
+        """
+        sys_root_len = len(self._systemroot)
+        if not const_is_python3():
+            try:
+                ldpath = ldpath.encode('utf-8')
+            except (UnicodeEncodeError,):
+                ldpath = ldpath.encode(sys.getfilesystemencoding())
+
+        found = []
+        for currentdir, subdirs, files in os.walk(self._systemroot + ldpath):
+            for item in files:
+                filepath = os.path.join(currentdir, item)
+                if not self._qa._is_elf_executable_or_library(filepath):
+                    continue
+                try:
+                    elf_class = entropy.tools.read_elf_class(filepath)
+                except (OSError, IOError):
+                    elf_class = None
+                found.append((filepath[sys_root_len:], elf_class))
+        return found
+
+    def add_resolved_libraries(self, elf_objects):
+        """
+        Register the ELF objects returned by walk() that live directly in
+        the linker paths, so that resolving them does not require scanning
+        the linker paths again. This is only possible when systemroot is
+        not set, because resolve_dynamic_library() is not systemroot aware.
+        """
+        if self._systemroot:
+            return
+        ld_paths = set(self._ld_paths)
+        for path, elf_class in elf_objects:
+            if elf_class is None:
+                continue
+            lib_dir, lib_name = os.path.split(path)
+            if lib_dir in ld_paths:
+                self._resolved_libraries.setdefault(
+                    (lib_name, elf_class), path)
+
+    def _resolve(self, library, executable, elf_class):
+        path = self._resolved_libraries.get((library, elf_class))
+        if path is not None:
+            return path
+        return entropy.tools.resolve_dynamic_library(
+            library, executable, ld_paths = self._ld_paths)
+
+    def scan(self, executables):
+        """
+        Scan the given executables (relative to systemroot) and return
+        a tuple composed by the number of scanned executables and the list
+        of broken ones, as (executable, broken libraries, broken symbols)
+        tuples, in the given order.
+        """
+        broken = []
+        for executable in executables:
+            outcome = self._scan_executable(executable)
+            if outcome is not None:
+                broken.append(outcome)
+        return len(executables), broken
+
+    def _scan_executable(self, executable):
+        # filter broken paths
+        # there are paths known to be broken and must be
+        # excluded to avoid noisy false positives
+        for reg_path in self._broken_libs_paths_mask_regexp:
+            if reg_path.match(executable):
+                return None
+
+        real_exec_path = self._systemroot + executable
+
+        myelfs = entropy.tools.read_elf_dynamic_libraries(
+            real_exec_path)
+
+        mylibs = set()
+        if myelfs:
+            elf_class = None
+            if self._resolved_libraries:
+                try:
+                    elf_class = entropy.tools.read_elf_class(executable)
+                except (OSError, IOError):
+                    elf_class = None
+
+            for mylib in myelfs:
+                lib_path = self._resolve(mylib, executable, elf_class)
+                if not lib_path:
+                    mylibs.add(mylib)
+
+        # filter broken libraries
+        if mylibs:
+
+            mylib_filter = set()
+            for mylib in mylibs:
+                mylib_matched = False
+                for reg_lib in self._broken_libs_mask_regexp:
+                    if reg_lib.match(mylib):
+                        mylib_matched = True
+                        break
+
+                if mylib_matched: # filter out
+                    mylib_filter.add(mylib)
+
+                elif self._self_dir_check:
+                    # check inside the same directory of the failing ELF
+                    # obviously, we're looking for another ELF object
+                    my_real_exec_dir = os.path.dirname(real_exec_path)
+                    mylib_guess = os.path.join(my_real_exec_dir, mylib)
+                    try:
+                        if self._qa._is_elf_executable_or_library(
+                                mylib_guess):
+                            # we have found the missing library,
+                            # which wasn't in LDPATH, booooo @ package
+                            # developers !! boooo!
+                            mylib_filter.add(mylib)
+                    except (OSError, IOError) as err:
+                        if err.errno != errno.ENOENT:
+                            raise
+
+            mylibs -= mylib_filter
+
+        broken_sym_found = set()
+        if self._broken_symbols and not mylibs:
+
+            try:
+                read_broken_syms = entropy.tools.read_elf_broken_symbols(
+                    real_exec_path)
+            except FileNotFound:
+                read_broken_syms = set()
+
+            for read_broken_sym in read_broken_syms:
+                for reg_sym in self._broken_syms_list_regexp:
+                    if reg_sym.match(read_broken_sym):
+                        broken_sym_found.add(read_broken_sym)
+                        break
+
+        if not (mylibs or broken_sym_found):
+            return None
+        return executable, sorted(mylibs), sorted(broken_sym_found)
+
+
 class QAEntropyRepositoryPlugin(EntropyRepositoryPlugin):
 
     def __init__(self, qa_interface, metadata = None):
@@ -517,9 +684,12 @@ class QAInterface(TextInterface, EntropyPluginStore):
 
         return missing_sonames
 
+    # number of executables scanned by every libtest work unit
+    _LIBTEST_UNIT_SIZE = 32
+
     def test_shared_objects(self, entropy_repository, broken_symbols = False,
         task_bombing_func = None, self_dir_check = True,
-        dump_results_to_file = False, silent = False):
+        dump_results_to_file = False, silent = False, processes = None):
 
         """
         Scan system looking for broken shared object ELF library dependencies.
@@ -538,6 +708,9 @@ class QAInterface(TextInterface, EntropyPluginStore):
         @type dump_results_to_file: bool
         @keyword silent: do not print anything to stdout
         @type silent: bool
+        @keyword processes: number of worker processes used to scan the
+            system, defaults to the number of available CPUs
+        @type processes: int
         @return: tuple of length 3, composed by (1) a dict of matched packages,
             (2) a list (set) of broken ELF objects and (3) the execution status
             (int, 0 means success).
@@ -652,25 +825,43 @@ class QAInterface(TextInterface, EntropyPluginStore):
                         )
                     break
 
-        executables = set()
-        total = len(ldpaths)
-        count = 0
-        sys_root_len = len(etpConst['systemroot'])
+        if processes is None:
+            processes = const_get_cpus()
 
-        def _are_elfs(dt):
-            currentdir, subdirs, files = dt
-
-            def _is_elf(item):
-                filepath = os.path.join(currentdir, item)
-                if self._is_elf_executable_or_library(filepath):
-                    return filepath[sys_root_len:]
-
-            return (x for x in map(_is_elf, files) if x is not None)
-
-        for ldpath in sorted(ldpaths):
+        scanner = _LibraryLinkageScanner(
+            self, broken_symbols, self_dir_check, broken_syms_list_regexp,
+            broken_libs_mask_regexp, broken_libs_paths_mask_regexp)
+        return self._test_shared_objects(
+            entropy_repository, scanner, sorted(ldpaths),
+            processes, task_bombing_func, syms_list_path,
+            files_list_path, silent)
 
+    def _libtest_map(self, func, units, processes, task_bombing_func):
+        """
+        Apply func to every libtest work unit, using a pool of worker
+        processes when possible, and yield the results in the units order,
+        so that the outcome is deterministic.
+        """
+        for result in ForkPool(func, processes).imap(units):
             if hasattr(task_bombing_func, '__call__'):
                 task_bombing_func()
+            yield result
+
+    def _test_shared_objects(self, entropy_repository, scanner, ldpaths,
+                             processes, task_bombing_func, syms_list_path,
+                             files_list_path, silent):
+        """
+        test_shared_objects() scanning engine.
+        """
+        executables = set()
+        elf_objects = []
+        total = len(ldpaths)
+        count = 0
+
+        walk_iter = self._libtest_map(
+            scanner.walk, ldpaths, processes, task_bombing_func)
+        for ldpath_idx, found in enumerate(walk_iter):
+            ldpath = ldpaths[ldpath_idx]
             count += 1
             if not silent:
                 self.output(
@@ -682,14 +873,11 @@ class QAInterface(TextInterface, EntropyPluginStore):
                     percent = True,
                     header = "  "
                 )
-            try:
-                ldpath = ldpath.encode('utf-8')
-            except (UnicodeEncodeError,):
-                ldpath = ldpath.encode(sys.getfilesystemencoding())
-            mywalk_iter = os.walk(etpConst['systemroot'] + ldpath)
+            elf_objects.extend(found)
+            executables.update(x for x, _elf_class in found)
 
-            for x in map(_are_elfs, mywalk_iter):
-                executables.update(x)
+        scanner.add_resolved_libraries(elf_objects)
+        del elf_objects
 
         if not silent:
             self.output(
@@ -717,140 +905,71 @@ class QAInterface(TextInterface, EntropyPluginStore):
         if files_list_path:
             files_list_f = codecs.open(files_list_path, "w", encoding=enc)
 
+        executables = sorted(executables)
+        unit_size = self._LIBTEST_UNIT_SIZE
+        units = [executables[x:x + unit_size] for x in
+                 range(0, len(executables), unit_size)]
+
         plain_brokenexecs = set()
         total = len(executables)
         count = 0
         scan_txt = blue("%s ..." % (_("Scanning libraries"),))
-        for executable in executables:
-
-            # task bombing hook
-            if hasattr(task_bombing_func, '__call__'):
-                task_bombing_func()
-
-            count += 1
-            if (count % 10 == 0) or (count == total) or (count == 1):
-                if not silent:
-                    self.output(
-                        scan_txt,
-                        importance = 0,
-                        level = "info",
-                        count = (count, total),
-                        back = True,
-                        percent = True,
-                        header = "  "
-                    )
-
-            # filter broken paths
-            # there are paths known to be broken and must be
-            # excluded to avoid noisy false positives
-            exec_match = False
-            for reg_path in broken_libs_paths_mask_regexp:
-                if reg_path.match(executable):
-                    exec_match = True
-                    break
-            if exec_match:
-                continue
-
-            real_exec_path = etpConst['systemroot'] + executable
+        scan_iter = self._libtest_map(
+            scanner.scan, units, processes, task_bombing_func)
+        for scanned, broken in scan_iter:
 
-            myelfs = entropy.tools.read_elf_dynamic_libraries(
-                real_exec_path)
-
-            mylibs = set()
-            for mylib in myelfs:
-                lib_path = entropy.tools.resolve_dynamic_library(mylib,
-                    executable)
-                if not lib_path:
-                    mylibs.add(mylib)
-
-            # filter broken libraries
-            if mylibs:
-
-                mylib_filter = set()
-                for mylib in mylibs:
-                    mylib_matched = False
-                    for reg_lib in broken_libs_mask_regexp:
-                        if reg_lib.match(mylib):
-                            mylib_matched = True
-                            break
-
-                    if mylib_matched: # filter out
-                        mylib_filter.add(mylib)
-
-                    elif self_dir_check:
-                        # check inside the same directory of the failing ELF
-                        # obviously, we're looking for another ELF object
-                        my_real_exec_dir = os.path.dirname(real_exec_path)
-                        mylib_guess = os.path.join(my_real_exec_dir, mylib)
-                        try:
-                            if self._is_elf_executable_or_library(mylib_guess):
-                                # we have found the missing library,
-                                # which wasn't in LDPATH, booooo @ package
-                                # developers !! boooo!
-                                mylib_filter.add(mylib)
-                        except (OSError, IOError) as err:
-                            if err.errno != errno.ENOENT:
-                                raise
-
-                mylibs -= mylib_filter
-
-            broken_sym_found = set()
-            if broken_symbols and not mylibs:
+            count += scanned
+            if not silent:
+                self.output(
+                    scan_txt,
+                    importance = 0,
+                    level = "info",
+                    count = (count, total),
+                    back = True,
+                    percent = True,
+                    header = "  "
+                )
 
-                try:
-                    read_broken_syms = entropy.tools.read_elf_broken_symbols(
-                        real_exec_path)
-                except FileNotFound:
-                    read_broken_syms = set()
-
-                my_broken_syms = set()
-                for read_broken_sym in read_broken_syms:
-                    for reg_sym in broken_syms_list_regexp:
-                        if reg_sym.match(read_broken_sym):
-                            my_broken_syms.add(read_broken_sym)
-                            break
-                broken_sym_found.update(my_broken_syms)
-
-            if not (mylibs or broken_sym_found):
-                continue
+            for executable, mylibs, broken_sym_found in broken:
+                real_exec_path = etpConst['systemroot'] + executable
 
-            if mylibs:
+                if mylibs:
 
-                if files_list_f:
-                    files_list_f.write(executable + "\n")
+                    if files_list_f:
+                        files_list_f.write(executable + "\n")
 
-                alllibs = blue(' :: ').join(sorted(mylibs))
-                if not silent:
-                    self.output(
-                        red(real_exec_path)+" [ "+alllibs+" ]",
-                        importance = 1,
-                        level = "info",
-                        percent = True,
-                        count = (count, total),
-                        header = "  "
-                    )
-            elif broken_sym_found:
+                    alllibs = blue(' :: ').join(mylibs)
+                    if not silent:
+                        self.output(
+                            red(real_exec_path)+" [ "+alllibs+" ]",
+                            importance = 1,
+                            level = "info",
+                            percent = True,
+                            count = (count, total),
+                            header = "  "
+                        )
+                elif broken_sym_found:
 
-                allsyms = darkred(' :: ').join([brown(x) for x in \
-                    broken_sym_found])
-                if len(allsyms) > 50:
-                    allsyms = brown(_('various broken symbols'))
+                    allsyms = darkred(' :: ').join([brown(x) for x in \
+                        broken_sym_found])
+                    if len(allsyms) > 50:
+                        allsyms = brown(_('various broken symbols'))
 
-                if syms_list_f and broken_sym_found:
-                    syms_list_f.write("%s => %s\n" % (real_exec_path,
-                        sorted(broken_sym_found),))
+                    if syms_list_f:
+                        syms_list_f.write("%s => %s\n" % (real_exec_path,
+                            broken_sym_found,))
 
-                if not silent:
-                    self.output(
-                        red(real_exec_path)+" { "+allsyms+" }",
-                        importance = 1,
-                        level = "info",
-                        percent = True,
-                        count = (count, total),
-                        header = "  "
-                    )
+                    if not silent:
+                        self.output(
+                            red(real_exec_path)+" { "+allsyms+" }",
+                            importance = 1,
+                            level = "info",
+                            percent = True,
+                            count = (count, total),
+                            header = "  "
+                        )
 
-            plain_brokenexecs.add(executable)
+                plain_brokenexecs.add(executable)
 
         # close open files
         if syms_list_f:
@@ -43,6 +43,7 @@ from entropy.i18n import _
 from entropy.server.interfaces.rss import ServerRssMetadata
 
 import entropy.dep
+import entropy.dump
 import entropy.tools
 
 class ServerRepositoryStatus(Singleton):
@@ -309,8 +310,6 @@ class ServerPackagesRepository(CachedRepository):
 
     _CONNECTION_POOL = {}
     _CONNECTION_POOL_MUTEX = threading.RLock()
-    _CURSOR_POOL = {}
-    _CURSOR_POOL_MUTEX = threading.RLock()
 
     def _connection_pool(self):
         """
@@ -324,18 +323,6 @@ class ServerPackagesRepository(CachedRepository):
         """
         return ServerPackagesRepository._CONNECTION_POOL_MUTEX
 
-    def _cursor_pool(self):
-        """
-        Overridden from EntropyRepository.
-        """
-        return ServerPackagesRepository._CURSOR_POOL
-
-    def _cursor_pool_mutex(self):
-        """
-        Overridden from EntropyRepository.
-        """
-        return ServerPackagesRepository._CURSOR_POOL_MUTEX
-
 
 class ServerPackagesRepositoryUpdater(object):
 
@@ -1445,6 +1432,108 @@ Name:    %s
 
         entropy.tools.compress_files(compressed_dest_path, found_file_list)
 
+    def _create_repository_delta(self, entropy_repository, upload_data,
+        critical, gpg_to_sign_files, db_format, cmethod):
+        """
+        Generate the repository delta between the previously uploaded
+        repository revision and the current one, update the list of
+        available deltas and add both to upload_data. Deltas are stored
+        in etpConst['etpdatabasedeltasmax'] rotating slots, so that
+        old deltas are overwritten on mirrors.
+        """
+        repo_dir = self._entropy._get_local_repository_dir(
+            self._repository_id)
+        deltas_path = os.path.join(
+            repo_dir, etpConst['etpdatabasedeltasfile'])
+        base_path = os.path.join(
+            repo_dir, etpConst['etpdatabasedeltabasefile'])
+        revision = self._entropy.local_repository_revision(
+            self._repository_id)
+
+        try:
+            deltas = entropy.tools.read_repository_deltas(deltas_path)
+        except (IOError, OSError) as err:
+            if err.errno != errno.ENOENT:
+                raise
+            deltas = []
+
+        base_revision = None
+        base_digests = None
+        base = entropy.dump.loadobj(base_path, complete_path = True)
+        if isinstance(base, dict):
+            base_revision = base.get('revision')
+            base_digests = base.get('digests')
+
+        if base_revision != revision:
+            max_deltas = etpConst['etpdatabasedeltasmax']
+            delta_names = [
+                "%s.%s" % (etpConst['etpdatabasedeltafile'] % (x,),
+                           db_format) for x in range(max_deltas)]
+
+            if base_digests is not None and base_revision < revision:
+                slot = 0
+                if deltas and deltas[-1][2] in delta_names:
+                    slot = delta_names.index(deltas[-1][2]) + 1
+                delta_name = delta_names[slot % max_deltas]
+                delta_path = os.path.join(repo_dir, delta_name)
+
+                self._entropy.output(
+                    "[repo:%s|%s] %s: %s -> %s" % (
+                        brown(self._repository_id),
+                        darkgreen(_("upload")),
+                        blue(_("creating repository delta")),
+                        bold(str(base_revision)),
+                        bold(str(revision)),
+                    ),
+                    importance = 0,
+                    level = "info",
+                    header = darkgreen(" * ")
+                )
+
+                tmp_fd, tmp_delta_path = const_mkstemp(
+                    dir = repo_dir, prefix = delta_name)
+                os.close(tmp_fd)
+                try:
+                    delta_repo = self._entropy.open_generic_repository(
+                        tmp_delta_path, indexing_override = False,
+                        xcache = False)
+                    try:
+                        delta_repo.initializeRepository()
+                        digests = entropy_repository.exportDelta(
+                            delta_repo, base_digests)
+                    finally:
+                        delta_repo.close()
+                    self._compress_file(tmp_delta_path, delta_path,
+                        cmethod[0])
+                finally:
+                    os.remove(tmp_delta_path)
+
+                deltas = [x for x in deltas if x[2] != delta_name]
+                deltas.append((base_revision, revision, delta_name,
+                               entropy.tools.md5sum(delta_path)))
+                deltas = deltas[-max_deltas:]
+                entropy.tools.write_repository_deltas(deltas_path, deltas)
+            else:
+                digests = entropy_repository.listAllPackageDataDigests()
+
+            entropy.dump.dumpobj(base_path, {
+                    'revision': revision,
+                    'digests': digests,
+                }, complete_path = True, ignore_exceptions = False)
+
+        if not deltas:
+            return
+
+        upload_data['database_deltas_file'] = deltas_path
+        critical.append(deltas_path)
+        gpg_to_sign_files.append(deltas_path)
+
+        # files of the previous deltas are already on mirrors
+        delta_path = os.path.join(repo_dir, deltas[-1][2])
+        if os.path.isfile(delta_path):
+            upload_data['database_delta_file'] = delta_path
+            critical.append(delta_path)
+
     def _upload(self, uris):
         """
         Upload repository metadata to given repository URIs.
@@ -1526,6 +1615,8 @@ Name:    %s
         except shutil.Error:
             copy_back = False
 
+        self._create_repository_delta(dbconn, upload_data, critical,
+            gpg_to_sign_files, db_format, cmethod)
         self._shrink_and_close(dbconn)
 
         if 2 not in disabled_eapis:
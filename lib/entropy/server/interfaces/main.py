@@ -1092,6 +1092,7 @@ class ServerSystemSettingsPlugin(SystemSettingsPlugin):
             # disabled by default for now
             'nonfree_packages_dir_support': False,
             'sync_speed_limit': None,
+            'sync_connections': etpConst['syncconnectionspermirror'],
             'weak_package_files': False,
             'changelog': True,
             'rss': {
@@ -1202,6 +1203,14 @@ class ServerSystemSettingsPlugin(SystemSettingsPlugin):
                 speed_limit = None
             data['sync_speed_limit'] = speed_limit
 
+        def _syncconnections(line, setting):
+            try:
+                connections = int(setting)
+            except ValueError:
+                return
+            if connections > 0:
+                data['sync_connections'] = connections
+
         def _weak_package_files(line, setting):
             opt = entropy.tools.setting_to_bool(setting)
             if opt is not None:
@@ -1266,6 +1275,7 @@ class ServerSystemSettingsPlugin(SystemSettingsPlugin):
             # backward compatibility
             'sync-speed-limit': _syncspeedlimit,
             'syncspeedlimit': _syncspeedlimit,
+            'sync-connections-per-mirror': _syncconnections,
             'weak-package-files': _weak_package_files,
             'changelog': _changelog,
             'rss-feed': _rss_feed,
@@ -6034,7 +6044,49 @@ class Server(Client):
                 return False
         return True
 
-    def _package_injector(self, repository_id, package_files, inject = False):
+    def _extract_package_metadata_callbacks(self, repository_id):
+        """
+        Return the license and restricted callbacks used by
+        SpmPlugin.extract_package_metadata() for the given repository.
+        """
+        def _check_license(pkg_data):
+            licenses = pkg_data['license'].split()
+            return self._is_pkg_free(repository_id, licenses)
+
+        def _check_restricted(pkg_data):
+            pkgatom = entropy.dep.create_package_atom_string(
+                pkg_data['category'], pkg_data['name'], pkg_data['version'],
+                pkg_data['versiontag'])
+            return self._is_pkg_restricted(repository_id,
+                pkgatom, pkg_data['slot'])
+
+        return _check_license, _check_restricted
+
+    def _extract_package_metadata(self, repository_id, package_file):
+        """
+        Extract the metadata of the given package file, for the given
+        repository.
+        """
+        license_cb, restricted_cb = self._extract_package_metadata_callbacks(
+            repository_id)
+        return self.Spm().extract_package_metadata(package_file,
+            license_callback = license_cb,
+            restricted_callback = restricted_cb)
+
+    def _extract_packages_metadata(self, repository_id, package_files):
+        """
+        Extract the metadata of the given package files, for the given
+        repository, and yield it in the package_files order.
+        See SpmPlugin.extract_packages_metadata().
+        """
+        license_cb, restricted_cb = self._extract_package_metadata_callbacks(
+            repository_id)
+        return self.Spm().extract_packages_metadata(package_files,
+            license_callback = license_cb,
+            restricted_callback = restricted_cb)
+
+    def _package_injector(self, repository_id, package_files, inject = False,
+                          pkg_data = None):
 
         srv_set = self._settings[Server.SYSTEM_SETTINGS_PLG_ID]['server']
 
@@ -6063,9 +6115,11 @@ class Server(Client):
             header = brown(" * "),
             back = True
         )
-        mydata = self.Spm().extract_package_metadata(package_file,
-            license_callback = _package_injector_check_license,
-            restricted_callback = _package_injector_check_restricted)
+        if pkg_data is None:
+            mydata = self._extract_package_metadata(
+                repository_id, package_file)
+        else:
+            mydata = pkg_data
         is_licensed_ugly = not _package_injector_check_license(mydata)
         is_restricted = _package_injector_check_restricted(mydata)
 
@@ -6082,10 +6136,7 @@ class Server(Client):
 
             size = entropy.tools.get_file_size(path)
             disksize = entropy.tools.get_uncompressed_size(path)
-            md5 = entropy.tools.md5sum(path)
-            sha1 = entropy.tools.sha1(path)
-            sha256 = entropy.tools.sha256(path)
-            sha512 = entropy.tools.sha512(path)
+            digests = entropy.tools.file_digests(path)
             gpg = None
             if repo_sec is not None:
                 gpg = self._get_gpg_signature(repo_sec, repository_id, path)
@@ -6094,10 +6145,10 @@ class Server(Client):
                 'type': down_type,
                 'size': size,
                 'disksize': disksize,
-                'md5': md5,
-                'sha1': sha1,
-                'sha256': sha256,
-                'sha512': sha512,
+                'md5': digests['md5'],
+                'sha1': digests['sha1'],
+                'sha256': digests['sha256'],
+                'sha512': digests['sha512'],
                 'gpg': gpg,
             }
             return edw
@@ -6800,75 +6851,94 @@ class Server(Client):
         package_ids_added = set()
         to_be_injected = set()
 
-        for package_filepaths, inject in packages_data:
+        # package files are extracted by worker processes, ahead
+        # of the repository updates
+        packages_metadata = self._extract_packages_metadata(
+            repository_id, [x[0] for x, _inject in packages_data])
 
-            mycount += 1
-            for package_filepath in package_filepaths:
-                header = blue(" @@ ")
-                count = (mycount, maxcount,)
-                if package_filepaths[0] != package_filepath:
-                    self.output(
-                        "%s" % (
-                            brown(os.path.basename(package_filepath)),
-                        ),
-                        importance = 1,
-                        level = "info",
-                        header = teal("     # ")
-                    )
-                else:
-                    self.output(
-                        "[%s] %s: %s" % (
-                            darkgreen(repository_id),
-                            blue(_("adding package")),
-                            darkgreen(os.path.basename(package_filepath)),
-                        ),
-                        importance = 1,
-                        level = "info",
-                        header = blue(" @@ "),
+        # packages are committed one by one, skip fsync() and keep
+        # the repository file locked until all of them are added
+        dbconn = self.open_server_repository(repository_id,
+            read_only = False, no_upload = True)
+        try:
+            with dbconn.profile(dbconn.PROFILE_BULK), dbconn.bulkInsert():
+                for package_filepaths, inject in packages_data:
+
+                    mycount += 1
+                    for package_filepath in package_filepaths:
+                        header = blue(" @@ ")
                         count = (mycount, maxcount,)
-                    )
+                        if package_filepaths[0] != package_filepath:
+                            self.output(
+                                "%s" % (
+                                    brown(os.path.basename(package_filepath)),
+                                ),
+                                importance = 1,
+                                level = "info",
+                                header = teal("     # ")
+                            )
+                        else:
+                            self.output(
+                                "[%s] %s: %s" % (
+                                    darkgreen(repository_id),
+                                    blue(_("adding package")),
+                                    darkgreen(os.path.basename(
+                                        package_filepath)),
+                                ),
+                                importance = 1,
+                                level = "info",
+                                header = blue(" @@ "),
+                                count = (mycount, maxcount,)
+                            )
 
-            if inject and len(package_filepaths) == 1:
-                # just make sure user is aware of the fact that no separate
-                # debug packages will be made.
-                self.output(
-                    "%s" % (
-                        brown(_("injected package, no separate debug package")),
-                    ),
-                    importance = 1,
-                    level = "info",
-                    header = teal("     !! ")
-                )
+                    if inject and len(package_filepaths) == 1:
+                        # just make sure user is aware of the fact that
+                        # no separate debug packages will be made.
+                        self.output(
+                            "%s" % (
+                                brown(_("injected package, no separate "
+                                        "debug package")),
+                            ),
+                            importance = 1,
+                            level = "info",
+                            header = teal("     !! ")
+                        )
 
-            try:
-                # add to database
-                package_id, destination_paths = self._package_injector(
-                    repository_id, package_filepaths, inject = inject)
-                package_ids_added.add(package_id)
-                to_be_injected.add((package_id, destination_paths[0]))
-            except Exception as err:
-                entropy.tools.print_traceback()
-                self.output(
-                    "[%s] %s: %s" % (
-                        darkgreen(repository_id),
-                        darkred(_("Exception caught, closing tasks")),
-                        darkgreen(str(err)),
-                    ),
-                    importance = 1,
-                    level = "error",
-                    header = bold(" !!! "),
-                    count = (mycount, maxcount,)
-                )
-                # reinit librarypathsidpackage table
-                if package_ids_added:
-                    self._add_packages_qa_tests(
-                        [(x, repository_id) for x in package_ids_added],
-                        ask = ask)
-                if to_be_injected:
-                    self._inject_database_into_packages(repository_id,
-                        to_be_injected)
-                self.close_repositories()
-                raise
+                    try:
+                        # add to database
+                        pkg_data = next(packages_metadata)
+                        package_id, destination_paths = self._package_injector(
+                            repository_id, package_filepaths, inject = inject,
+                            pkg_data = pkg_data)
+                        package_ids_added.add(package_id)
+                        to_be_injected.add((package_id, destination_paths[0]))
+                    except Exception as err:
+                        entropy.tools.print_traceback()
+                        self.output(
+                            "[%s] %s: %s" % (
+                                darkgreen(repository_id),
+                                darkred(_("Exception caught, closing tasks")),
+                                darkgreen(str(err)),
+                            ),
+                            importance = 1,
+                            level = "error",
+                            header = bold(" !!! "),
+                            count = (mycount, maxcount,)
+                        )
+                        raise
+        except Exception:
+            # reinit librarypathsidpackage table
+            if package_ids_added:
+                self._add_packages_qa_tests(
+                    [(x, repository_id) for x in package_ids_added],
+                    ask = ask)
+            if to_be_injected:
+                self._inject_database_into_packages(repository_id,
+                    to_be_injected)
+            self.close_repositories()
+            raise
+        finally:
+            packages_metadata.close()
 
         # make sure packages are really available, it can happen
         # after a previous failure to have garbage here
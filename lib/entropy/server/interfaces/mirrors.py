@@ -44,7 +44,8 @@ class Server(object):
 
     def __init__(self, server, repository_id):
 
-        from entropy.server.transceivers import TransceiverServerHandler
+        from entropy.server.transceivers import TransceiverServerHandler, \
+            TransceiverServerUploader
         from entropy.server.interfaces.main import Server as MainServer
 
         if not isinstance(server, MainServer):
@@ -52,6 +53,7 @@ class Server(object):
 
         self._entropy = server
         self.TransceiverServerHandler = TransceiverServerHandler
+        self.TransceiverServerUploader = TransceiverServerUploader
         self.Cacher = EntropyCacher()
         self._settings = SystemSettings()
 
@@ -1467,69 +1469,75 @@ class Server(object):
                 os.remove(expiration_file)
 
 
-    def _sync_run_upload_queue(self, repository_id, uri, upload_queue):
+    def _sync_run_upload_queues(self, repository_id, upload_queues):
+        """
+        Upload the given queues to their mirrors, concurrently.
 
+        @param repository_id: repository identifier
+        @type repository_id: string
+        @param upload_queues: list of (uri, upload_queue) tuples
+        @type upload_queues: list
+        @return: tuple composed by (errors (bool), fine_uris (set),
+            broken_uris (set of (uri, reason) tuples))
+        @rtype: tuple
+        """
         branch = self._settings['repositories']['branch']
-        crippled_uri = EntropyTransceiver.get_uri_name(uri)
-        queue_map = {}
+        uploader = self.TransceiverServerUploader(self._entropy,
+            repo = repository_id)
 
-        for upload_path, rel_path, size in upload_queue:
-            rel_dir = os.path.dirname(rel_path)
-            obj = queue_map.setdefault(rel_dir, [])
-            obj.append(upload_path)
+        for uri, upload_queue in upload_queues:
 
-        errors = False
-        m_fine_uris = set()
-        m_broken_uris = set()
-        for rel_path, myqueue in queue_map.items():
+            queue_map = {}
+            for upload_path, rel_path, size in upload_queue:
+                rel_dir = os.path.dirname(rel_path)
+                obj = queue_map.setdefault(rel_dir, [])
+                obj.append(upload_path)
 
-            remote_dir = self._entropy.complete_remote_package_relative_path(
-                rel_path, repository_id)
+            for rel_path, myqueue in queue_map.items():
 
-            handlers_data = {
-                'branch': branch,
-                'download': rel_path,
-            }
-            uploader = self.TransceiverServerHandler(self._entropy, [uri],
-                myqueue, critical_files = myqueue,
-                txc_basedir = remote_dir, copy_herustic_support = True,
-                handlers_data = handlers_data, repo = repository_id)
+                remote_dir = \
+                    self._entropy.complete_remote_package_relative_path(
+                        rel_path, repository_id)
 
-            xerrors, xm_fine_uris, xm_broken_uris = uploader.go()
-            if xerrors:
-                errors = True
-            m_fine_uris.update(xm_fine_uris)
-            m_broken_uris.update(xm_broken_uris)
+                handlers_data = {
+                    'branch': branch,
+                    'download': rel_path,
+                }
+                uploader.add(uri, myqueue, remote_dir,
+                    handlers_data = handlers_data)
+
+        errors, m_fine_uris, m_broken_uris = uploader.run()
+
+        broken_map = dict(m_broken_uris)
+        for uri, upload_queue in upload_queues:
+            crippled_uri = EntropyTransceiver.get_uri_name(uri)
+
+            if uri in broken_map:
+                self._entropy.output(
+                    "[%s] %s: %s, %s: %s" % (
+                        brown(branch),
+                        blue(_("upload errors")),
+                        red(crippled_uri),
+                        blue(_("reason")),
+                        darkgreen(repr(broken_map[uri])),
+                    ),
+                    importance = 1,
+                    level = "error",
+                    header = darkred(" !!! ")
+                )
+                continue
 
-        if errors:
-            my_broken_uris = [
-                (EntropyTransceiver.get_uri_name(x_uri), x_uri_rc) for \
-                    x_uri, x_uri_rc in m_broken_uris]
-            reason = my_broken_uris[0][1]
             self._entropy.output(
-                "[%s] %s: %s, %s: %s" % (
+                "[%s] %s: %s" % (
                     brown(branch),
-                    blue(_("upload errors")),
+                    blue(_("upload completed successfully")),
                     red(crippled_uri),
-                    blue(_("reason")),
-                    darkgreen(repr(reason)),
                 ),
                 importance = 1,
-                level = "error",
-                header = darkred(" !!! ")
+                level = "info",
+                header = blue(" @@ ")
             )
-            return errors, m_fine_uris, m_broken_uris
 
-        self._entropy.output(
-            "[%s] %s: %s" % (
-                brown(branch),
-                blue(_("upload completed successfully")),
-                red(crippled_uri),
-            ),
-            importance = 1,
-            level = "info",
-            header = blue(" @@ ")
-        )
         return errors, m_fine_uris, m_broken_uris
 
 
@@ -1712,6 +1720,8 @@ class Server(object):
         mirrors_tainted = False
         mirror_errors = False
         mirrors_errors = False
+        upload_queues = []
+        upload_mirrors = set()
 
         for uri in self._entropy.remote_packages_mirrors(repository_id):
 
@@ -1832,14 +1842,6 @@ class Server(object):
                 if upload:
                     mirrors_tainted = True
 
-                if upload:
-                    d_errors, m_fine_uris, \
-                        m_broken_uris = self._sync_run_upload_queue(
-                            repository_id, uri, upload)
-
-                    if d_errors:
-                        mirror_errors = True
-
                 if download:
                     d_errors, m_fine_uris, \
                         m_broken_uris = self._sync_run_download_queue(
@@ -1847,10 +1849,18 @@ class Server(object):
 
                     if d_errors:
                         mirror_errors = True
-                if not mirror_errors:
-                    successfull_mirrors.add(uri)
-                else:
+
+                if upload:
+                    # uploads to all the mirrors are run concurrently,
+                    # once every mirror has been walked through
+                    upload_queues.append((uri, upload))
+
+                if mirror_errors:
                     mirrors_errors = True
+                elif upload:
+                    upload_mirrors.add(uri)
+                else:
+                    successfull_mirrors.add(uri)
 
             except KeyboardInterrupt:
                 self._entropy.output(
@@ -1934,6 +1944,49 @@ class Server(object):
                     )
                 continue
 
+        if upload_queues:
+            try:
+                u_errors, m_fine_uris, \
+                    m_broken_uris = self._sync_run_upload_queues(
+                        repository_id, upload_queues)
+            except KeyboardInterrupt:
+                mirrors_errors = True
+                self._entropy.output(
+                    "[%s|%s|%s] %s" % (
+                        repository_id,
+                        red(_("sync")),
+                        self._settings['repositories']['branch'],
+                        darkgreen(_("keyboard interrupt !")),
+                    ),
+                    importance = 1,
+                    level = "info",
+                    header = darkgreen(" * ")
+                )
+            except Exception as err:
+                entropy.tools.print_traceback()
+                mirrors_errors = True
+                broken_mirrors.update(upload_mirrors)
+                self._entropy.output(
+                    "[%s|%s|%s] %s: %s, %s: %s" % (
+                        repository_id,
+                        red(_("sync")),
+                        self._settings['repositories']['branch'],
+                        darkred(_("exception caught")),
+                        Exception,
+                        _("error"),
+                        err,
+                    ),
+                    importance = 1,
+                    level = "error",
+                    header = darkred(" !!! ")
+                )
+            else:
+                if u_errors:
+                    mirrors_errors = True
+                u_broken_uris = set(x for x, y in m_broken_uris)
+                successfull_mirrors.update(
+                    upload_mirrors - u_broken_uris)
+
         # if at least one server has been synced successfully, move files
         if (len(successfull_mirrors) > 0) and not pretend:
             self._move_files_over_from_upload(repository_id)
@@ -9,16 +9,20 @@
     B{Entropy Server transceivers module}.
 
 """
+import collections
 import os
+import threading
 
 from entropy.const import const_isstring, const_isnumber, etpConst
 from entropy.output import darkred, blue, brown, darkgreen, red, bold
 from entropy.transceivers.exceptions import TransceiverConnectionError
 from entropy.i18n import _
+from entropy.misc import ParallelTaskPool
 from entropy.client.interfaces.db import InstalledPackagesRepository
 from entropy.core.settings.base import SystemSettings
 from entropy.transceivers import EntropyTransceiver
-from entropy.tools import print_traceback, is_valid_md5, compare_md5, md5sum
+from entropy.tools import print_traceback, is_valid_md5, compare_md5, md5sum, \
+    bytes_into_human
 
 class TransceiverServerHandler:
 
@@ -156,11 +160,14 @@ class TransceiverServerHandler:
 
         return valid_remote_md5 # always valid
 
-    def _transceive(self, uri):
-
-        fine = set()
-        broken = set()
-        fail = False
+    def _transceive_file(self, handler, uri, mypath, base_dir, counter,
+                         maxcount):
+        """
+        Transfer (or remove) a single file using the given, already
+        connected, EntropyUriHandler, retrying up to 5 times.
+        Return a (done, lastrc) tuple, where done is True if the file
+        has been transferred successfully.
+        """
         crippled_uri = EntropyTransceiver.get_uri_name(uri)
         action = 'push'
         if self.download:
@@ -168,6 +175,141 @@ class TransceiverServerHandler:
         elif self.remove:
             action = 'remove'
 
+        mypath_fn = os.path.basename(mypath)
+        remote_path = os.path.join(base_dir, mypath_fn)
+
+        syncer = handler.upload
+        myargs = (mypath, remote_path)
+        if self.download:
+            syncer = handler.download
+            local_path = os.path.join(self.local_basedir, mypath_fn)
+            myargs = (remote_path, local_path)
+        elif self.remove:
+            syncer = handler.delete
+            myargs = (remote_path,)
+
+        fallback_syncer, fallback_args = None, None
+        # upload -> remote copy herustic support
+        # if a package file might have been already uploaded
+        # to remote mirror, try to look in other repositories'
+        # package directories if a file, with the same md5 and name
+        # is already available. In this case, use remote copy instead
+        # of upload to save bandwidth.
+        if self._copy_herustic and (syncer == handler.upload):
+            # copy herustic support enabled
+            # we are uploading
+            new_syncer, new_args = self._copy_herustic_support(
+                handler, mypath, base_dir, remote_path)
+            if new_syncer is not None:
+                fallback_syncer, fallback_args = syncer, myargs
+                syncer, myargs = new_syncer, new_args
+                action = "copy"
+
+        tries = 0
+        done = False
+        lastrc = None
+
+        while tries < 5:
+            tries += 1
+            self._entropy.output(
+                "[%s|#%s|(%s/%s)] %s: %s" % (
+                    blue(crippled_uri),
+                    darkgreen(str(tries)),
+                    blue(str(counter)),
+                    bold(str(maxcount)),
+                    blue(action),
+                    red(os.path.basename(mypath)),
+                ),
+                importance = 0,
+                level = "info",
+                header = red(" @@ ")
+            )
+            rc = syncer(*myargs)
+            if (not rc) and (fallback_syncer is not None):
+                # if we have a fallback syncer, try it first
+                # before giving up.
+                rc = fallback_syncer(*fallback_args)
+
+            if rc and not (self.download or self.remove):
+                remote_md5 = handler.get_md5(remote_path)
+                rc = self.handler_verify_upload(mypath, uri,
+                    counter, maxcount, tries, remote_md5 = remote_md5)
+            if rc:
+                self._entropy.output(
+                    "[%s|#%s|(%s/%s)] %s %s: %s" % (
+                                blue(crippled_uri),
+                                darkgreen(str(tries)),
+                                blue(str(counter)),
+                                bold(str(maxcount)),
+                                blue(action),
+                                _("successful"),
+                                red(os.path.basename(mypath)),
+                    ),
+                    importance = 0,
+                    level = "info",
+                    header = darkgreen(" @@ ")
+                )
+                done = True
+                break
+            else:
+                self._entropy.output(
+                    "[%s|#%s|(%s/%s)] %s %s: %s" % (
+                                blue(crippled_uri),
+                                darkgreen(str(tries)),
+                                blue(str(counter)),
+                                bold(str(maxcount)),
+                                blue(action),
+                                brown(_("failed, retrying")),
+                                red(os.path.basename(mypath)),
+                        ),
+                    importance = 0,
+                    level = "warning",
+                    header = brown(" @@ ")
+                )
+                lastrc = rc
+                continue
+
+        if not done:
+
+            self._entropy.output(
+                "[%s|(%s/%s)] %s %s: %s - %s: %s" % (
+                        blue(crippled_uri),
+                        blue(str(counter)),
+                        bold(str(maxcount)),
+                        blue(action),
+                        darkred("failed, giving up"),
+                        red(os.path.basename(mypath)),
+                        _("error"),
+                        lastrc,
+                ),
+                importance = 1,
+                level = "error",
+                header = darkred(" !!! ")
+            )
+
+            if mypath not in self.critical_files:
+                self._entropy.output(
+                    "[%s|(%s/%s)] %s: %s, %s..." % (
+                        blue(crippled_uri),
+                        blue(str(counter)),
+                        bold(str(maxcount)),
+                        blue(_("not critical")),
+                        os.path.basename(mypath),
+                        blue(_("continuing")),
+                    ),
+                    importance = 1,
+                    level = "warning",
+                    header = brown(" @@ ")
+                )
+
+        return done, lastrc
+
+    def _transceive(self, uri):
+
+        fine = set()
+        broken = set()
+        fail = False
+
         try:
             txc = EntropyTransceiver(uri)
             if const_isnumber(self.speed_limit):
@@ -194,140 +336,20 @@ class TransceiverServerHandler:
                 if not handler.is_dir(base_dir):
                     handler.makedirs(base_dir)
 
-                mypath_fn = os.path.basename(mypath)
-                remote_path = os.path.join(base_dir, mypath_fn)
-
-                syncer = handler.upload
-                myargs = (mypath, remote_path)
-                if self.download:
-                    syncer = handler.download
-                    local_path = os.path.join(self.local_basedir, mypath_fn)
-                    myargs = (remote_path, local_path)
-                elif self.remove:
-                    syncer = handler.delete
-                    myargs = (remote_path,)
-
-                fallback_syncer, fallback_args = None, None
-                # upload -> remote copy herustic support
-                # if a package file might have been already uploaded
-                # to remote mirror, try to look in other repositories'
-                # package directories if a file, with the same md5 and name
-                # is already available. In this case, use remote copy instead
-                # of upload to save bandwidth.
-                if self._copy_herustic and (syncer == handler.upload):
-                    # copy herustic support enabled
-                    # we are uploading
-                    new_syncer, new_args = self._copy_herustic_support(
-                        handler, mypath, base_dir, remote_path)
-                    if new_syncer is not None:
-                        fallback_syncer, fallback_args = syncer, myargs
-                        syncer, myargs = new_syncer, new_args
-                        action = "copy"
-
                 counter += 1
-                tries = 0
-                done = False
-                lastrc = None
-
-                while tries < 5:
-                    tries += 1
-                    self._entropy.output(
-                        "[%s|#%s|(%s/%s)] %s: %s" % (
-                            blue(crippled_uri),
-                            darkgreen(str(tries)),
-                            blue(str(counter)),
-                            bold(str(maxcount)),
-                            blue(action),
-                            red(os.path.basename(mypath)),
-                        ),
-                        importance = 0,
-                        level = "info",
-                        header = red(" @@ ")
-                    )
-                    rc = syncer(*myargs)
-                    if (not rc) and (fallback_syncer is not None):
-                        # if we have a fallback syncer, try it first
-                        # before giving up.
-                        rc = fallback_syncer(*myargs)
-
-                    if rc and not (self.download or self.remove):
-                        remote_md5 = handler.get_md5(remote_path)
-                        rc = self.handler_verify_upload(mypath, uri,
-                            counter, maxcount, tries, remote_md5 = remote_md5)
-                    if rc:
-                        self._entropy.output(
-                            "[%s|#%s|(%s/%s)] %s %s: %s" % (
-                                        blue(crippled_uri),
-                                        darkgreen(str(tries)),
-                                        blue(str(counter)),
-                                        bold(str(maxcount)),
-                                        blue(action),
-                                        _("successful"),
-                                        red(os.path.basename(mypath)),
-                            ),
-                            importance = 0,
-                            level = "info",
-                            header = darkgreen(" @@ ")
-                        )
-                        done = True
-                        fine.add(uri)
-                        break
-                    else:
-                        self._entropy.output(
-                            "[%s|#%s|(%s/%s)] %s %s: %s" % (
-                                        blue(crippled_uri),
-                                        darkgreen(str(tries)),
-                                        blue(str(counter)),
-                                        bold(str(maxcount)),
-                                        blue(action),
-                                        brown(_("failed, retrying")),
-                                        red(os.path.basename(mypath)),
-                                ),
-                            importance = 0,
-                            level = "warning",
-                            header = brown(" @@ ")
-                        )
-                        lastrc = rc
-                        continue
+                done, lastrc = self._transceive_file(handler, uri, mypath,
+                    base_dir, counter, maxcount)
+                if done:
+                    fine.add(uri)
+                    continue
 
-                if not done:
+                if mypath not in self.critical_files:
+                    continue
 
-                    self._entropy.output(
-                        "[%s|(%s/%s)] %s %s: %s - %s: %s" % (
-                                blue(crippled_uri),
-                                blue(str(counter)),
-                                bold(str(maxcount)),
-                                blue(action),
-                                darkred("failed, giving up"),
-                                red(os.path.basename(mypath)),
-                                _("error"),
-                                lastrc,
-                        ),
-                        importance = 1,
-                        level = "error",
-                        header = darkred(" !!! ")
-                    )
-
-                    if mypath not in self.critical_files:
-                        self._entropy.output(
-                            "[%s|(%s/%s)] %s: %s, %s..." % (
-                                blue(crippled_uri),
-                                blue(str(counter)),
-                                bold(str(maxcount)),
-                                blue(_("not critical")),
-                                os.path.basename(mypath),
-                                blue(_("continuing")),
-                            ),
-                            importance = 1,
-                            level = "warning",
-                            header = brown(" @@ ")
-                        )
-                        continue
-
-                    fail = True
-                    broken.add((uri, lastrc))
-                    # next mirror
-                    break
+                fail = True
+                broken.add((uri, lastrc))
+                # next mirror
+                break
 
         return fail, fine, broken
 
@@ -438,3 +460,285 @@ class TransceiverServerHandler:
                 errors = True
 
         return errors, fine_uris, broken_uris
+
+
+class TransceiverServerUploader(object):
+    """
+    Concurrent upload engine. Files queued through add() are pushed to all
+    the mirrors at the same time, using up to N connections per mirror.
+    Every file is retried and verified on its own, like
+    TransceiverServerHandler does, while the server-side speed limit
+    (sync-speed-limit) is the global bandwidth budget, equally shared
+    among all the connections.
+    """
+
+    def __init__(self, entropy_interface, repo = None, connections = None):
+        """
+        Object constructor.
+
+        @param entropy_interface: a valid Server instance
+        @type entropy_interface: entropy.server.interfaces.main.Server
+        @keyword repo: repository identifier
+        @type repo: string
+        @keyword connections: max number of connections per mirror, if None,
+            the sync-connections-per-mirror server setting is used
+        @type connections: int
+        """
+        self._entropy = entropy_interface
+        self._settings = SystemSettings()
+        plugin_id = etpConst['system_settings_plugins_ids']['server_plugin']
+        srv_set = self._settings[plugin_id]['server']
+
+        self.speed_limit = srv_set['sync_speed_limit']
+        if connections is None:
+            connections = srv_set['sync_connections']
+        self._connections = max(1, connections)
+        self.repo = repo
+        if self.repo is None:
+            self.repo = self._entropy.repository()
+
+        self._lock = threading.Lock()
+        self._uris = []
+        self._queues = {}
+        self._counters = {}
+        self._maxcounts = {}
+        self._broken = {}
+        self._workers = {}
+        self._connected = {}
+        self._dirs = {}
+        self._dir_locks = {}
+        self._files_done = 0
+        self._files_total = 0
+        self._bytes_done = 0
+        self._bytes_total = 0
+
+    def add(self, uri, files, txc_basedir, critical = True,
+            handlers_data = None):
+        """
+        Queue files for upload to the given mirror.
+
+        @param uri: mirror uri
+        @type uri: string
+        @param files: list of local file paths
+        @type files: list
+        @param txc_basedir: remote directory the files are uploaded to
+        @type txc_basedir: string
+        @keyword critical: if True, failing to upload any of the files makes
+            the whole mirror upload fail
+        @type critical: bool
+        @keyword handlers_data: metadata for the upload handler, see
+            TransceiverServerHandler
+        @type handlers_data: dict
+        """
+        critical_files = []
+        if critical:
+            critical_files = files
+        txc_handler = TransceiverServerHandler(self._entropy, [uri], files,
+            critical_files = critical_files, txc_basedir = txc_basedir,
+            copy_herustic_support = True, handlers_data = handlers_data,
+            repo = self.repo)
+
+        if uri not in self._queues:
+            self._uris.append(uri)
+            self._queues[uri] = collections.deque()
+            self._counters[uri] = 0
+            self._maxcounts[uri] = 0
+            self._workers[uri] = 0
+            self._connected[uri] = 0
+            self._dirs[uri] = set()
+            self._dir_locks[uri] = threading.Lock()
+
+        queue = self._queues[uri]
+        for path in files:
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                size = 0
+            queue.append((txc_handler, path, size))
+            self._maxcounts[uri] += 1
+            self._files_total += 1
+            self._bytes_total += size
+
+    def _pop(self, uri):
+        """
+        Return the next (counter, maxcount, handler, path, size) upload job
+        of the given mirror, or None, if there is nothing left to do, in
+        this case, the calling connection is retired.
+        """
+        with self._lock:
+            queue = self._queues[uri]
+            if not queue:
+                self._workers[uri] -= 1
+                return None
+            txc_handler, path, size = queue.popleft()
+            self._counters[uri] += 1
+            return (self._counters[uri], self._maxcounts[uri],
+                    txc_handler, path, size)
+
+    def _fail(self, uri, lastrc):
+        """
+        Mark the given mirror as broken and drop its pending uploads.
+        """
+        with self._lock:
+            self._broken.setdefault(uri, lastrc)
+            self._queues[uri].clear()
+
+    def _connection_failed(self, uri, job, lastrc):
+        """
+        Handle the failure of one of the mirror connections, job is the
+        upload job it was working on, if any. The job is handed back to
+        the other connections. The mirror is marked as broken only if no
+        connection to it succeeded, or if no connection is left to
+        complete its pending uploads.
+        """
+        with self._lock:
+            if job is not None:
+                _counter, _maxcount, txc_handler, path, size = job
+                self._queues[uri].appendleft((txc_handler, path, size))
+                self._counters[uri] -= 1
+            self._workers[uri] -= 1
+            workers = self._workers[uri]
+            broken = not self._connected[uri] and not workers
+            if not workers and self._queues[uri]:
+                broken = True
+
+        if broken:
+            self._fail(uri, lastrc)
+            return
+
+        crippled_uri = EntropyTransceiver.get_uri_name(uri)
+        self._entropy.output(
+            "[%s|%s] %s: %s" % (
+                blue(crippled_uri),
+                brown("push"),
+                blue(_("connection failed, other connections continue")),
+                darkred(lastrc),
+            ),
+            importance = 1,
+            level = "warning",
+            header = darkred(" !!! ")
+        )
+
+    def _makedirs(self, uri, handler, base_dir):
+        """
+        Create the remote directory, once per mirror.
+        """
+        with self._dir_locks[uri]:
+            if base_dir in self._dirs[uri]:
+                return
+            if not handler.is_dir(base_dir):
+                handler.makedirs(base_dir)
+            self._dirs[uri].add(base_dir)
+
+    def _progress(self, size):
+        """
+        Account a processed file and print the aggregate progress.
+        """
+        with self._lock:
+            self._files_done += 1
+            self._bytes_done += size
+            files_done, bytes_done = self._files_done, self._bytes_done
+
+        self._entropy.output(
+            "[%s] %s: %s/%s %s, %s/%s" % (
+                brown(self.repo),
+                blue(_("upload progress")),
+                darkgreen(str(files_done)),
+                bold(str(self._files_total)),
+                blue(_("files")),
+                darkgreen(bytes_into_human(bytes_done)),
+                bold(bytes_into_human(self._bytes_total)),
+            ),
+            importance = 0,
+            level = "info",
+            header = blue(" @@ ")
+        )
+
+    def _worker(self, uri, speed_limit):
+        """
+        Upload worker thread body, using its own mirror connection.
+        """
+        job = None
+        retired = False
+        try:
+            txc = EntropyTransceiver(uri)
+            if const_isnumber(speed_limit):
+                txc.set_speed_limit(speed_limit)
+            txc.set_output_interface(self._entropy)
+
+            with txc as handler:
+                with self._lock:
+                    self._connected[uri] += 1
+
+                while True:
+                    job = self._pop(uri)
+                    if job is None:
+                        retired = True
+                        break
+                    counter, maxcount, txc_handler, path, size = job
+
+                    base_dir = txc_handler.txc_basedir
+                    self._makedirs(uri, handler, base_dir)
+                    done, lastrc = txc_handler._transceive_file(
+                        handler, uri, path, base_dir, counter, maxcount)
+                    job = None
+                    self._progress(size)
+                    if not done and path in txc_handler.critical_files:
+                        self._fail(uri, lastrc)
+                        break
+        except Exception as err:
+            print_traceback()
+            if not retired:
+                self._connection_failed(uri, job, repr(err))
+
+    def run(self):
+        """
+        Upload the queued files to all the mirrors, in parallel.
+
+        @return: tuple composed by (errors (bool), fine_uris (set),
+            broken_uris (set of (uri, lastrc) tuples))
+        @rtype: tuple
+        """
+        workers = []
+        for uri in self._uris:
+            count = min(self._connections, len(self._queues[uri]))
+            self._workers[uri] = count
+            workers.extend([uri] * count)
+
+        speed_limit = self.speed_limit
+        if const_isnumber(speed_limit) and speed_limit > 0 and workers:
+            # the speed limit is a global budget
+            speed_limit = max(1, speed_limit // len(workers))
+
+        for uri in self._uris:
+            crippled_uri = EntropyTransceiver.get_uri_name(uri)
+            self._entropy.output(
+                "[%s|%s] %s, %s: %s" % (
+                    blue(crippled_uri),
+                    brown("push"),
+                    blue(_("connecting to mirror")),
+                    darkgreen(_("connections")),
+                    bold(str(workers.count(uri))),
+                ),
+                importance = 0,
+                level = "info",
+                header = blue(" @@ ")
+            )
+
+        pool = ParallelTaskPool("TransceiverServerUploader")
+        for uri in workers:
+            pool.spawn(self._worker, uri, speed_limit)
+
+        try:
+            pool.join()
+        except KeyboardInterrupt:
+            # let the workers complete the uploads in progress
+            with self._lock:
+                for queue in self._queues.values():
+                    queue.clear()
+            pool.join()
+            raise
+
+        broken_uris = set(self._broken.items())
+        fine_uris = set(x for x in self._uris if x not in self._broken)
+        return bool(broken_uris), fine_uris, broken_uris
@@ -36,7 +36,7 @@ from entropy.output import darkred, darkgreen, brown, darkblue, teal, \
     purple, red, bold, blue, getcolor, decolorize, is_mute, is_interactive
 from entropy.i18n import _
 from entropy.core.settings.base import SystemSettings
-from entropy.misc import LogFile, ParallelTask
+from entropy.misc import LogFile, ParallelTask, ParallelTaskPool
 from entropy.spm.plugins.skel import SpmPlugin
 import entropy.dep
 import entropy.tools
@@ -574,6 +574,8 @@ class PortagePlugin(SpmPlugin):
     KERNEL_CATEGORY = "sys-kernel"
     _PORTAGE_ENTROPY_PACKAGE_NAME = "sys-apps/portage"
     _ACCEPT_PROPERTIES = const_convert_to_unicode("* -interactive")
+    # number of threads used to scan the files of a package
+    _EXTRACT_FILE_WORKERS = 4
 
     ENV_DIRS = set(["/etc/env.d"])
 
@@ -1399,11 +1401,12 @@ class PortagePlugin(SpmPlugin):
         system_settings = SystemSettings()
 
         # fill package name and version
-        data['digest'] = entropy.tools.md5sum(package_file)
+        digests = entropy.tools.file_digests(package_file)
+        data['digest'] = digests['md5']
         data['signatures'] = {
-            'sha1': entropy.tools.sha1(package_file),
-            'sha256': entropy.tools.sha256(package_file),
-            'sha512': entropy.tools.sha512(package_file),
+            'sha1': digests['sha1'],
+            'sha256': digests['sha256'],
+            'sha512': digests['sha512'],
             'gpg': None, # GPG signature will be filled later on, if enabled
         }
         data['datecreation'] = str(os.path.getmtime(package_file))
@@ -1549,13 +1552,15 @@ class PortagePlugin(SpmPlugin):
         # because checksums have to be calculated against files being available
         # in the package. The case above (when using equo rescue spmsync) is
         # fine too.
+        file_scan = self._extract_pkg_metadata_scan_files(
+            pkg_dir, data['content'])
         data['content_safety'] = self._extract_pkg_metadata_content_safety(
-            data['content'], pkg_dir)
+            data['content'], pkg_dir, file_scan = file_scan)
         data['disksize'] = entropy.tools.sum_file_sizes_hardlinks([
                 os.path.join(pkg_dir, x) for x, y in data['content'].items() \
                     if y == "obj"])
         data['provided_libs'] = self._extract_pkg_metadata_provided_libs(
-            pkg_dir, data['content'])
+            pkg_dir, data['content'], file_scan = file_scan)
 
         needed_elf_file = os.path.join(meta_dir,
             PortagePlugin.xpak_entries['needed.elf.2'])
@@ -1583,7 +1588,7 @@ class PortagePlugin(SpmPlugin):
             data['needed_libs'] = needed_libs
         else:
             needed_libs = self._generate_needed_libs_elf_2(
-                pkg_dir, data['content'])
+                pkg_dir, data['content'], file_scan = file_scan)
             # deprecated, kept for backward compatibility
             # some PMS like pkgcore don't generate NEEDED.ELF.2
             # generate one ourselves if possible. May generate
@@ -4584,27 +4589,93 @@ class PortagePlugin(SpmPlugin):
         }
         return data
 
-    def _extract_pkg_metadata_content_safety(self, content_data, pkg_dir):
+    def _extract_pkg_metadata_scan_file(self, pkg_dir, path, ftype):
+        """
+        Read the metadata of a single package file, see
+        _extract_pkg_metadata_scan_files().
+        """
+        unpack_obj = os.path.join(pkg_dir, path.lstrip("/"))
+        try:
+            st = os.lstat(unpack_obj)
+        except OSError:
+            return None
 
-        def is_reg(file_path):
+        meta = {
+            'sha256': None,
+            'mtime': None,
+            'elf': None,
+        }
+        if stat.S_ISLNK(st.st_mode):
             try:
-                st = os.lstat(file_path)
+                st = os.stat(unpack_obj)
             except OSError:
-                return False
-            return stat.S_ISREG(st.st_mode)
+                # broken symlink
+                return None
+        elif ftype == "obj" and stat.S_ISREG(st.st_mode):
+            meta['sha256'] = entropy.tools.sha256(unpack_obj)
+            meta['mtime'] = st.st_mtime
 
-        def gen_meta(real_path, repo_path):
-            return {
-                'sha256': entropy.tools.sha256(real_path),
-                'mtime': os.path.getmtime(real_path),
-            }
+        # do not trust ftype
+        if stat.S_ISDIR(st.st_mode):
+            return meta
 
-        pkg_files = [(os.path.join(pkg_dir, k.lstrip("/")), k) for k, v in \
-            content_data.items() if v == "obj"]
-        pkg_files = [(real_path, repo_path) for real_path, repo_path in \
-            pkg_files if is_reg(real_path)]
-        return dict((repo_path, gen_meta(real_path, repo_path)) \
-            for real_path, repo_path in pkg_files)
+        try:
+            if not entropy.tools.is_elf_file(unpack_obj):
+                return meta
+        except IOError as err:
+            self.__output.output("%s: %s => %s" % (
+                _("IOError while reading"), unpack_obj, repr(err),),
+                level = "warning")
+            return meta
+
+        try:
+            meta['elf'] = entropy.tools.read_elf_metadata(unpack_obj)
+        except FileNotFound:
+            pass
+        return meta
+
+    def _extract_pkg_metadata_scan_files(self, pkg_dir, content):
+        """
+        Read the metadata of the package files and symlinks (SHA256,
+        mtime and ELF metadata) at once, using a pool of worker threads.
+        Hashing and file reads release the GIL, so files are read
+        concurrently.
+
+        @param pkg_dir: package image directory
+        @type pkg_dir: string
+        @param content: package content metadata
+        @type content: dict
+        @return: dict mapping content paths to dicts with "sha256",
+            "mtime" (None if the path is not a regular file) and "elf"
+            (as returned by entropy.tools.read_elf_metadata) keys
+        @rtype: dict
+        """
+        def _scan(path):
+            return self._extract_pkg_metadata_scan_file(
+                pkg_dir, path, content[path])
+
+        file_scan = ParallelTaskPool.map(
+            _scan, [x for x, y in content.items() if y in ("obj", "sym")],
+            self._EXTRACT_FILE_WORKERS, "SpmFileScan")
+        for path in [x for x, y in file_scan.items() if y is None]:
+            del file_scan[path]
+        return file_scan
+
+    def _extract_pkg_metadata_content_safety(self, content_data, pkg_dir,
+                                             file_scan = None):
+        if file_scan is None:
+            file_scan = self._extract_pkg_metadata_scan_files(
+                pkg_dir, content_data)
+
+        content_safety = {}
+        for repo_path, meta in file_scan.items():
+            if meta['sha256'] is None:
+                continue
+            content_safety[repo_path] = {
+                'sha256': meta['sha256'],
+                'mtime': meta['mtime'],
+            }
+        return content_safety
 
     def _extract_pkg_metadata_content(self, content_file, package_path,
                                       pkg_dir):
@@ -4678,41 +4749,29 @@ class PortagePlugin(SpmPlugin):
 
         return pkg_content
 
-    def _generate_needed_libs_elf_2(self, pkg_dir, content):
+    def _generate_needed_libs_elf_2(self, pkg_dir, content,
+                                    file_scan = None):
         """
         Generate NEEDED.ELF.2 metadata by scraping the package
         content directly. For: needed_libs metadata.
         """
-        needed_libs = set()
-        for obj, ftype in content.items():
+        if file_scan is None:
+            file_scan = self._extract_pkg_metadata_scan_files(
+                pkg_dir, content)
 
-            if ftype != "obj":
-                continue
-            obj_dir, obj_name = os.path.split(obj)
-
-            unpack_obj = os.path.join(pkg_dir, obj.lstrip("/"))
-            try:
-                os.stat(unpack_obj)
-            except OSError:
-                continue
+        needed_libs = set()
+        for obj, meta in file_scan.items():
 
-            try:
-                if not entropy.tools.is_elf_file(unpack_obj):
-                    continue
-                elf_class = entropy.tools.read_elf_class(unpack_obj)
-            except IOError as err:
-                self.__output.output("%s: %s => %s" % (
-                    _("IOError while reading"), unpack_obj, repr(err),),
-                    level = "warning")
+            if content[obj] != "obj":
                 continue
-
-            meta = entropy.tools.read_elf_metadata(unpack_obj)
-            if meta is None:
+            elf_meta = meta['elf']
+            if elf_meta is None:
                 continue
 
-            for soname in meta['needed']:
+            for soname in elf_meta['needed']:
                 needed_libs.add((
-                    obj, meta['soname'], soname, elf_class, meta['runpath']))
+                    obj, elf_meta['soname'], soname, elf_meta['class'],
+                    elf_meta['runpath']))
 
         return frozenset(needed_libs)
 
@@ -4761,42 +4820,20 @@ class PortagePlugin(SpmPlugin):
 
         return frozenset(needed_libs)
 
-    def _extract_pkg_metadata_provided_libs(self, pkg_dir, content):
+    def _extract_pkg_metadata_provided_libs(self, pkg_dir, content,
+                                            file_scan = None):
 
         # NOTE: this does not take into account changes to environment
         # caused by the installation of the package, if this metadata
         # is read off a non-installed one.
-        provided_libs = set()
-        for obj, ftype in content.items():
-
-            if ftype not in ("obj", "sym"):
-                continue
-            obj_dir, obj_name = os.path.split(obj)
+        if file_scan is None:
+            file_scan = self._extract_pkg_metadata_scan_files(
+                pkg_dir, content)
 
-            unpack_obj = os.path.join(pkg_dir, obj.lstrip("/"))
-            try:
-                os.stat(unpack_obj)
-            except OSError:
-                continue
-
-            # do not trust ftype
-            if os.path.isdir(unpack_obj):
-                continue
-
-            try:
-                if not entropy.tools.is_elf_file(unpack_obj):
-                    continue
-            except IOError as err:
-                self.__output.output("%s: %s => %s" % (
-                    _("IOError while reading"), unpack_obj, repr(err),),
-                    level = "warning")
-                continue
-
-            try:
-                elf_meta = entropy.tools.read_elf_metadata(unpack_obj)
-            except FileNotFound:
-                continue
+        provided_libs = set()
+        for obj, meta in file_scan.items():
 
+            elf_meta = meta['elf']
             if elf_meta is None:
                 continue
 
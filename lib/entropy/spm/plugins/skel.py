@@ -11,12 +11,13 @@
 
 """
 import os
+import functools
 
 from entropy.const import etpConst, etpSys, const_is_python3, \
-    const_convert_to_rawstring
+    const_convert_to_rawstring, const_get_cpus
 from entropy.exceptions import SPMError
 from entropy.core import Singleton
-from entropy.misc import LogFile
+from entropy.misc import LogFile, ForkPool
 from entropy.core.settings.base import SystemSettings
 
 import entropy.tools
@@ -458,6 +459,27 @@ class SpmPlugin(Singleton):
         """
         raise NotImplementedError()
 
+    def extract_packages_metadata(self, package_files,
+        license_callback = None, restricted_callback = None):
+        """
+        Extract Source Package Manager package metadata from given files,
+        using a pool of worker processes when possible. Metadata is
+        yielded in package_files order, package files are extracted
+        ahead of the consumer. Closing the generator terminates the
+        pending extractions.
+        See extract_package_metadata() for the arguments meaning.
+
+        @param package_files: list of paths to valid SPM package files
+        @type package_files: list
+        @return: generator of package metadata extracted
+        @rtype: generator
+        @raise entropy.exceptions.SPMError: when something went bad
+        """
+        extract = functools.partial(self.extract_package_metadata,
+            license_callback = license_callback,
+            restricted_callback = restricted_callback)
+        return ForkPool(extract, const_get_cpus()).imap(package_files)
+
     def get_installed_package_content(self, package, root = None):
         """
         Return list of files/directories owned by package.
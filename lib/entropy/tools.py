@@ -41,8 +41,18 @@ from entropy.const import etpConst, const_kill_threads, const_islive, \
     const_mkstemp, const_file_readable
 from entropy.exceptions import FileNotFound, InvalidAtom, DirectoryNotFound
 
+import entropy.elf
+
 
 _READ_SIZE = 1024000
+# Entropy package files trailer: "<offset of the metadata><magic>"
+_EDB_FOOTER = struct.Struct("<Q16s")
+_EDB_FOOTER_MAGIC = const_convert_to_rawstring("|ENTROPY:EDB:FT|")
+# legacy packages: metadata start tag reverse search window and limit
+# NOTE: it was 30Mb, but app-doc/php-docs db size was 31MB
+# xonotic-data wants more, raise to 500Mb and forget
+_EDB_SEARCH_WINDOW = 1024000 * 8 # 8Mb
+_EDB_SEARCH_THRESHOLD = 1024000 * 500 # 500Mb
 
 
 def is_root():
@@ -847,13 +857,7 @@ def md5sum(filepath):
     @return: md5 hex digest
     @rtype: string
     """
-    m = hashlib.md5()
-    with open(filepath, "rb") as readfile:
-        block = readfile.read(_READ_SIZE)
-        while block:
-            m.update(block)
-            block = readfile.read(_READ_SIZE)
-    return m.hexdigest()
+    return file_digests(filepath, ("md5",))["md5"]
 
 def sha512(filepath):
     """
@@ -864,13 +868,7 @@ def sha512(filepath):
     @return: SHA512 hex digest
     @rtype: string
     """
-    m = hashlib.sha512()
-    with open(filepath, "rb") as readfile:
-        block = readfile.read(_READ_SIZE)
-        while block:
-            m.update(block)
-            block = readfile.read(_READ_SIZE)
-    return m.hexdigest()
+    return file_digests(filepath, ("sha512",))["sha512"]
 
 def sha256(filepath):
     """
@@ -881,13 +879,7 @@ def sha256(filepath):
     @return: SHA256 hex digest
     @rtype: string
     """
-    m = hashlib.sha256()
-    with open(filepath, "rb") as readfile:
-        block = readfile.read(_READ_SIZE)
-        while block:
-            m.update(block)
-            block = readfile.read(_READ_SIZE)
-    return m.hexdigest()
+    return file_digests(filepath, ("sha256",))["sha256"]
 
 def sha1(filepath):
     """
@@ -898,13 +890,23 @@ def sha1(filepath):
     @return: SHA1 hex digest
     @rtype: string
     """
-    m = hashlib.sha1()
-    with open(filepath, "rb") as readfile:
-        block = readfile.read(_READ_SIZE)
-        while block:
-            m.update(block)
-            block = readfile.read(_READ_SIZE)
-    return m.hexdigest()
+    return file_digests(filepath, ("sha1",))["sha1"]
+
+def file_digests(filepath, algorithms = ("md5", "sha1", "sha256", "sha512")):
+    """
+    Calculate the hashes of given file at path using the given hashlib
+    algorithms, reading the file only once. Digests of big files are
+    stored in the persistent digest cache (see entropy.cache.DigestCache).
+
+    @param filepath: path to file
+    @type filepath: string
+    @keyword algorithms: hashlib algorithm names
+    @type algorithms: iterable
+    @return: dict mapping algorithm names to hex digests
+    @rtype: dict
+    """
+    from entropy.cache import DigestCache
+    return DigestCache().digests(filepath, algorithms)
 
 def md5sum_directory(directory):
     """
@@ -1503,8 +1505,11 @@ def aggregate_entropy_metadata(entropy_package_file, entropy_metadata_file):
     @type entropy_metadata_file: string
     """
     mmap_size_th = 4096000 # 4mb threshold
+    db_tag = const_convert_to_rawstring(etpConst['databasestarttag'])
     with open(entropy_package_file, "ab") as f:
-        f.write(const_convert_to_rawstring(etpConst['databasestarttag']))
+        f.seek(0, os.SEEK_END)
+        edb_offset = f.tell() + len(db_tag)
+        f.write(db_tag)
         with open(entropy_metadata_file, "rb") as g:
             f_size = os.lstat(entropy_metadata_file).st_size
             mmap_f = None
@@ -1529,6 +1534,10 @@ def aggregate_entropy_metadata(entropy_package_file, entropy_metadata_file):
                 if mmap_f is not None:
                     mmap_f.close()
 
+        # the trailer records where the metadata starts, making
+        # _locate_edb() O(1) for packages written from now on.
+        f.write(_EDB_FOOTER.pack(edb_offset, _EDB_FOOTER_MAGIC))
+
 def dump_entropy_metadata(entropy_package_file, entropy_metadata_file):
     """
     Dump Entropy package metadata from Entropy package file to
@@ -1555,7 +1564,7 @@ def dump_entropy_metadata(entropy_package_file, entropy_metadata_file):
                 return False
             # avoid security flaw caused by file size growing race condition
             # we conside the file size static
-            start_position = None
+            edb_range = None
             if f_size < mmap_size_th:
                 # use mmap
                 try:
@@ -1565,22 +1574,26 @@ def dump_entropy_metadata(entropy_package_file, entropy_metadata_file):
                 except MemoryError:
                     old_mmap = None
                 if old_mmap is not None:
-                    start_position = _locate_edb(old_mmap)
+                    edb_range = _locate_edb_range(old_mmap)
 
             if old_mmap is None:
-                start_position = _locate_edb(old)
-            if start_position is None:
+                edb_range = _locate_edb_range(old)
+            if edb_range is None:
                 return False
 
+            start_position, end_position = edb_range
+            remaining = end_position - start_position
             with open(entropy_metadata_file, "wb") as db:
-                while True:
+                while remaining > 0:
+                    read_len = min(remaining, _READ_SIZE)
                     if old_mmap is None:
-                        data = old.read(_READ_SIZE)
+                        data = old.read(read_len)
                     else:
-                        data = old_mmap.read(_READ_SIZE)
+                        data = old_mmap.read(read_len)
                     if not data:
                         break
                     db.write(data)
+                    remaining -= len(data)
         finally:
             if old_mmap is not None:
                 old_mmap.close()
@@ -1588,44 +1601,129 @@ def dump_entropy_metadata(entropy_package_file, entropy_metadata_file):
     return True
 
 def _locate_edb(fileobj):
+    """
+    Locate the Entropy metadata embedded into an Entropy package file.
 
-    # position old to the end
+    @param fileobj: file object or mmap of the Entropy package file
+    @type fileobj: file or mmap.mmap
+    @return: the offset at which the metadata starts (fileobj is left
+        positioned there), or None if not found
+    @rtype: int or None
+    """
+    edb_range = _locate_edb_range(fileobj)
+    if edb_range is None:
+        return None
+    return edb_range[0]
+
+def _locate_edb_range(fileobj):
+    """
+    Locate the Entropy metadata embedded into an Entropy package file,
+    returning both its start and end offsets. Packages carrying the
+    fixed-size trailer written by aggregate_entropy_metadata() are
+    resolved in O(1), legacy ones through a reverse search of the
+    metadata start tag.
+
+    @param fileobj: file object or mmap of the Entropy package file
+    @type fileobj: file or mmap.mmap
+    @return: (start, end) offsets tuple (fileobj is left positioned at
+        start), or None if not found
+    @rtype: tuple or None
+    """
     fileobj.seek(0, os.SEEK_END)
-    # read backward until we find
     xbytes = fileobj.tell()
-    counter = xbytes - 1
-
-    db_tag = etpConst['databasestarttag']
-    # for Python 3.x
-    raw_db_tag = const_convert_to_rawstring(db_tag)
-    db_tag_len = len(db_tag)
-    # NOTE: it was 30Mb, but app-doc/php-docs db size was 31MB
-    # xonotic-data wants more, raise to 500Mb and forget
-    give_up_threshold = 1024000 * 500 # 500Mb
-    # cannot index a bytes object in Python3, it returns int !
-    entry_point = const_convert_to_rawstring(db_tag[::-1][0])
-    max_read_len = 8
+
+    raw_db_tag = const_convert_to_rawstring(etpConst['databasestarttag'])
+    db_tag_len = len(raw_db_tag)
+
+    end_position = xbytes
     start_position = None
 
-    while counter >= 0:
-        cur_threshold = abs((counter-xbytes))
-        if cur_threshold >= give_up_threshold:
-            start_position = None
+    footer_len = _EDB_FOOTER.size
+    if xbytes >= footer_len + db_tag_len:
+        fileobj.seek(xbytes - footer_len, os.SEEK_SET)
+        footer = fileobj.read(footer_len)
+        if len(footer) == footer_len:
+            edb_offset, magic = _EDB_FOOTER.unpack(footer)
+            if magic == _EDB_FOOTER_MAGIC and \
+                    db_tag_len <= edb_offset <= xbytes - footer_len:
+                # make sure that the trailer is not garbage
+                fileobj.seek(edb_offset - db_tag_len, os.SEEK_SET)
+                if fileobj.read(db_tag_len) == raw_db_tag:
+                    start_position = edb_offset
+                    end_position = xbytes - footer_len
+
+    if start_position is None:
+        tag_idx = _rfind_edb_tag(fileobj, xbytes, raw_db_tag)
+        if tag_idx == -1:
+            return None
+        start_position = tag_idx + db_tag_len
+
+    fileobj.seek(start_position, os.SEEK_SET)
+    return start_position, end_position
+
+def _rfind_edb_tag(fileobj, xbytes, raw_db_tag):
+    """
+    Reverse search raw_db_tag in the last _EDB_SEARCH_THRESHOLD bytes of
+    fileobj, using large mmap'd windows whenever possible and falling
+    back to block-wise reads otherwise.
+
+    @return: the offset of the tag, or -1 if not found
+    @rtype: int
+    """
+    lower = max(0, xbytes - _EDB_SEARCH_THRESHOLD)
+
+    if isinstance(fileobj, mmap.mmap):
+        return fileobj.rfind(raw_db_tag, lower, xbytes)
+
+    # the tag can span two windows, keep some overlap
+    overlap = len(raw_db_tag) - 1
+    window = max(_EDB_SEARCH_WINDOW, len(raw_db_tag) * 2)
+    granularity = mmap.ALLOCATIONGRANULARITY
+    use_mmap = True
+    try:
+        fileno = fileobj.fileno()
+    except (AttributeError, IOError, ValueError):
+        use_mmap = False
+
+    window_end = xbytes
+    while window_end > lower:
+        window_start = max(lower, window_end - window)
+
+        tag_idx = -1
+        data = None
+        if use_mmap:
+            # mmap offsets must be aligned to the allocation granularity
+            map_start = window_start - (window_start % granularity)
+            try:
+                data = mmap.mmap(fileno, window_end - map_start,
+                    access = mmap.ACCESS_READ, offset = map_start)
+            except (EnvironmentError, ValueError, MemoryError,
+                    OverflowError):
+                use_mmap = False
+                data = None
+            if data is not None:
+                try:
+                    tag_idx = data.rfind(
+                        raw_db_tag, window_start - map_start)
+                    if tag_idx != -1:
+                        tag_idx += map_start
+                finally:
+                    data.close()
+
+        if data is None:
+            fileobj.seek(window_start, os.SEEK_SET)
+            data = fileobj.read(window_end - window_start)
+            tag_idx = data.rfind(raw_db_tag)
+            if tag_idx != -1:
+                tag_idx += window_start
+
+        if tag_idx != -1:
+            return tag_idx
+        if window_start <= lower:
             break
-        fileobj.seek(counter-xbytes, os.SEEK_END)
-        read_bytes = fileobj.read(max_read_len)
-        read_len = len(read_bytes)
-        entry_idx = read_bytes.rfind(entry_point)
-        if entry_idx != -1:
-            rollback = (read_len - entry_idx) * -1
-            fileobj.seek(rollback, os.SEEK_CUR)
-            chunk = fileobj.read(db_tag_len)
-            if chunk == raw_db_tag:
-                start_position = fileobj.tell()
-                break
-        counter -= read_len
+        window_end = window_start + overlap
 
-    return start_position
+    return -1
 
 def remove_entropy_metadata(entropy_package_file, save_path):
     """
@@ -1782,6 +1880,58 @@ def get_hash_from_md5file(md5path):
             raise ValueError("invalid md5 file")
         return md5_str
 
+def read_repository_deltas(deltas_path):
+    """
+    Read the list of repository deltas at given path, see
+    etpConst['etpdatabasedeltasfile']. Invalid lines are skipped.
+
+    @param deltas_path: path to repository deltas list file
+    @type deltas_path: string
+    @return: list of (from revision, to revision, delta file name,
+        delta file md5) tuples, in file order
+    @rtype: list
+    @raise IOError: if deltas_path cannot be read
+    """
+    deltas = []
+    enc = etpConst['conf_encoding']
+    with codecs.open(deltas_path, "r", encoding=enc) as deltas_f:
+        for line in deltas_f.readlines():
+            data = line.split()
+            if len(data) != 4:
+                continue
+            from_rev, to_rev, file_name, md5 = data
+            try:
+                from_rev, to_rev = int(from_rev), int(to_rev)
+            except ValueError:
+                continue
+            # file names are relative to the repository directory
+            if file_name != os.path.basename(file_name) \
+                    or file_name in (os.curdir, os.pardir):
+                continue
+            if not is_valid_md5(md5):
+                continue
+            deltas.append((from_rev, to_rev, file_name, md5))
+    return deltas
+
+def write_repository_deltas(deltas_path, deltas):
+    """
+    Write the list of repository deltas to given path, see
+    read_repository_deltas().
+
+    @param deltas_path: path to repository deltas list file
+    @type deltas_path: string
+    @param deltas: list of (from revision, to revision, delta file name,
+        delta file md5) tuples
+    @type deltas: list
+    """
+    enc = etpConst['conf_encoding']
+    tmp_path = deltas_path + ".tmp"
+    with codecs.open(tmp_path, "w", encoding=enc) as deltas_f:
+        for from_rev, to_rev, file_name, md5 in deltas:
+            deltas_f.write("%d %d %s %s\n" % (
+                from_rev, to_rev, file_name, md5))
+    os.rename(tmp_path, deltas_path)
+
 def compare_sha512(filepath, checksum):
     """
     Compare SHA512 of filepath with the one given (checksum).
@@ -2663,7 +2813,7 @@ def parse_rpath(rpath):
     """
     return rpath.split(":")
 
-def resolve_dynamic_library(library, requiring_executable):
+def resolve_dynamic_library(library, requiring_executable, ld_paths = None):
     """
     Resolve given library name (as contained into ELF metadata) to
     a library path.
@@ -2673,6 +2823,10 @@ def resolve_dynamic_library(library, requiring_executable):
     @param requiring_executable: path to ELF object that contains the given
         library name
     @type requiring_executable: string
+    @keyword ld_paths: dynamic linker paths, as returned by
+        collect_linker_paths(), useful to avoid collecting them again
+        when resolving many libraries
+    @type ld_paths: list
     @return: resolved library path
     @rtype: string
     """
@@ -2693,7 +2847,8 @@ def resolve_dynamic_library(library, requiring_executable):
         return found_path
 
     elf_class = read_elf_class(requiring_executable)
-    ld_paths = collect_linker_paths()
+    if ld_paths is None:
+        ld_paths = collect_linker_paths()
     found_path = do_resolve(ld_paths, elf_class)
 
     if not found_path:
@@ -2702,47 +2857,127 @@ def resolve_dynamic_library(library, requiring_executable):
 
     return found_path
 
-def read_elf_dynamic_libraries(elf_file):
+def _read_elf(elf_file):
     """
-    Extract NEEDED metadatum from ELF file at path.
+    Read ELF metadata through entropy.elf, raising FileNotFound if the
+    file cannot be accessed.
+    """
+    try:
+        return entropy.elf.read_elf(elf_file)
+    except (OSError, IOError) as err:
+        raise FileNotFound("cannot read %s: %s" % (elf_file, err,))
 
-    @param elf_file: path to ELF file
-    @type elf_file: string
-    @return: list (set) of strings in NEEDED metadatum
-    @rtype: set
+def _elf_linker_paths(elf_obj, path):
     """
-    proc = None
-    args = ("/usr/bin/scanelf", "-qF", "%n", elf_file)
+    Return the RUNPATH (or RPATH, if RUNPATH is not set) of the given
+    ElfObject as list of directories, with $ORIGIN expanded.
+    """
+    runpath = elf_obj.runpath
+    if runpath is None:
+        runpath = elf_obj.rpath
+    if not runpath:
+        return []
 
-    out = None
-    try:
-        proc = subprocess.Popen(args, stdout = subprocess.PIPE)
-        exit_st = proc.wait()
-        if exit_st != 0:
-            raise FileNotFound("scanelf failure")
-        out = proc.stdout.read()
+    elf_dir = os.path.dirname(path)
+    outcome = []
+    for rpath in runpath.split(":"):
+        if rpath:
+            rpath = rpath.replace("$ORIGIN", elf_dir)
+            rpath = rpath.replace("${ORIGIN}", elf_dir)
+            outcome.append(rpath)
+    return outcome
 
-    except (OSError, IOError) as err:
-        if err.errno != errno.ENOENT:
-            raise
-        raise FileNotFound("/usr/bin/scanelf not found")
+def _elf_dependency_tree(elf_file, elf_obj):
+    """
+    Resolve the dynamic libraries tree of the given ELF object, following
+    the dynamic linker search order (DT_RPATH, LD_LIBRARY_PATH,
+    DT_RUNPATH, ld.so.conf and built-in paths).
 
-    finally:
-        if proc is not None:
+    @return: tuple composed by the list of (path, ElfObject) in load order,
+        starting from elf_file, and the list of unresolved library names
+    @rtype: tuple
+    """
+    env_paths = [x for x in os.getenv("LD_LIBRARY_PATH", "").split(":") if x]
+    ld_paths = list(collect_linker_paths())
+    if elf_obj.elf_class == entropy.elf.ELFCLASS64:
+        ld_paths += ["/lib64", "/usr/lib64"]
+
+    root_rpaths = []
+    if elf_obj.runpath is None:
+        root_rpaths = _elf_linker_paths(elf_obj, elf_file)
+
+    def _resolve(library, requiring_obj, requiring_path):
+        if "/" in library:
+            candidates = [library]
+        else:
+            search_paths = []
+            if requiring_obj.runpath is None:
+                search_paths += _elf_linker_paths(
+                    requiring_obj, requiring_path)
+                search_paths += root_rpaths
+            search_paths += env_paths
+            if requiring_obj.runpath is not None:
+                search_paths += _elf_linker_paths(
+                    requiring_obj, requiring_path)
+            search_paths += ld_paths
+            candidates = [os.path.join(x, library) for x in search_paths]
+
+        for candidate in candidates:
             try:
-                proc.stdout.close()
+                lib_obj = entropy.elf.read_elf(candidate)
             except (OSError, IOError):
-                pass
+                continue
+            if lib_obj is None:
+                continue
+            if lib_obj.elf_class != elf_obj.elf_class:
+                continue
+            if lib_obj.machine != elf_obj.machine:
+                continue
+            return candidate, lib_obj
+        return None, None
 
-    outcome = set()
-    if out is not None:
-        if const_is_python3():
-            out = const_convert_to_unicode(out)
-        for line in out.split("\n"):
-            if line:
-                libs = line.strip().split(" ", -1)[0].split(",")
-                outcome.update(libs)
-    return outcome
+    tree = [(elf_file, elf_obj)]
+    unresolved = []
+    loaded = set()
+    if elf_obj.soname:
+        loaded.add(elf_obj.soname)
+
+    queue = collections.deque([(elf_file, elf_obj)])
+    while queue:
+        obj_path, obj = queue.popleft()
+        needed = list(obj.needed)
+        if obj is elf_obj and obj.interpreter:
+            needed.append(obj.interpreter)
+
+        for library in needed:
+            if library in loaded:
+                continue
+            loaded.add(library)
+
+            lib_path, lib_obj = _resolve(library, obj, obj_path)
+            if lib_obj is None:
+                unresolved.append(library)
+                continue
+            if lib_obj.soname:
+                loaded.add(lib_obj.soname)
+            tree.append((lib_path, lib_obj))
+            queue.append((lib_path, lib_obj))
+
+    return tree, unresolved
+
+def read_elf_dynamic_libraries(elf_file):
+    """
+    Extract NEEDED metadatum from ELF file at path.
+
+    @param elf_file: path to ELF file
+    @type elf_file: string
+    @return: list (set) of strings in NEEDED metadatum
+    @rtype: set
+    """
+    elf_obj = _read_elf(elf_file)
+    if elf_obj is None:
+        return set()
+    return set(elf_obj.needed)
 
 def read_elf_metadata(elf_file):
     """
@@ -2754,57 +2989,30 @@ def read_elf_metadata(elf_file):
         no metadata is found.
     @rtype: dict or None
     """
-    proc = None
-    args = ("/usr/bin/scanelf", "-qF", "%M;%S;%r;%n", elf_file)
-
-    out = None
-    try:
-        proc = subprocess.Popen(args, stdout = subprocess.PIPE)
-        exit_st = proc.wait()
-        if exit_st != 0:
-            raise FileNotFound("scanelf failure")
-        out = proc.stdout.read()
-
-    except (OSError, IOError) as err:
-        if err.errno != errno.ENOENT:
-            raise
-        raise FileNotFound("/usr/bin/scanelf not found")
-
-    finally:
-        if proc is not None:
-            try:
-                proc.stdout.close()
-            except (OSError, IOError):
-                pass
-
-    if out is not None:
-        if const_is_python3():
-            out = const_convert_to_unicode(out)
-        if not out:
-            # no metadata.
-            return None
+    elf_obj = _read_elf(elf_file)
+    if elf_obj is None:
+        # no metadata.
+        return None
 
-        for line in out.split("\n"):
-            if line:
-                data = line.strip().split(" ", -1)[0]
-                elfclass_str, soname, runpath, libs = data.split(";")
-                libs = set(libs.split(","))
-                return {
-                    'soname': soname,
-                    'class': elf_class_strtoint(elfclass_str),
-                    'runpath': runpath,
-                    'needed': libs,
-                }
+    runpath = elf_obj.runpath
+    if runpath is None:
+        runpath = elf_obj.rpath
 
-    raise FileNotFound("scanelf failure")
+    return {
+        'soname': elf_obj.soname or "",
+        'class': elf_obj.elf_class,
+        'runpath': runpath or "",
+        'needed': set(elf_obj.needed),
+    }
 
 def read_elf_real_dynamic_libraries(elf_file):
     """
-    This function is similar to read_elf_dynamic_libraries but uses ldd to
+    This function is similar to read_elf_dynamic_libraries but resolves
+    the whole dynamic libraries tree, like ldd does, in order to
     retrieve a list of "real" .so library dependencies used by the ELF file.
     This is useful to ensure that there are no .so libraries missing in the
-    dependencies, because ldd expands and resolves the .so dependency graph.
-    This is anyway dangerous because the output returned by ldd is somehow
+    dependencies, because the .so dependency graph is expanded and resolved.
+    This is anyway dangerous because the outcome is somehow
     environment-dependent, so make sure this function is only used for
     informative purposes, and not for adding real dependencies to a package.
 
@@ -2812,62 +3020,92 @@ def read_elf_real_dynamic_libraries(elf_file):
     @type elf_file: string
     @return: list (set) of strings in NEEDED metadatum
     @rtype: set
-    @raise FileNotFound: if ldd is not found
+    @raise FileNotFound: if elf_file is not a dynamic ELF object
     """
     # use the real path, so that it can be dropped from the resulting set
     elf_file = os.path.realpath(elf_file)
 
-    proc = None
-    output = None
-    args = ("/usr/bin/lddtree", "-l", elf_file)
+    elf_obj = _read_elf(elf_file)
+    if elf_obj is None or not elf_obj.dynamic:
+        raise FileNotFound("%s is not a dynamic ELF object" % (elf_file,))
 
-    try:
-        proc = subprocess.Popen(args, stdout = subprocess.PIPE)
+    tree, unresolved = _elf_dependency_tree(elf_file, elf_obj)
+    outcome = set(unresolved)
+    for path, _lib_obj in tree[1:]:
+        if path != elf_file:
+            outcome.add(os.path.basename(path))
 
-        output = const_convert_to_unicode("")
-
-        while True:
-
-            out = proc.stdout.read()
-            if not out:
-                break
+    return outcome
 
-            if const_is_python3():
-                out = const_convert_to_unicode(out)
-            output += out
+def read_elf_broken_symbols(elf_file):
+    """
+    Extract broken symbols from ELF file, these are the required symbols
+    that no object in its dynamic libraries tree provides (what ldd -r
+    reports as "undefined symbol"), or that are not provided with the
+    required symbol version (what ldd -r reports as "symbol X version Y
+    not defined"). ldd -r is used for the dependency trees containing
+    objects whose dynamic symbol table cannot be read.
 
-        exit_st = proc.wait()
-        if exit_st != 0:
-            raise FileNotFound("lddtree returned error %d on %s" % (
-                exit_st, elf_file))
+    @param elf_file: path to ELF file
+    @type elf_file: string
+    @return: list of broken symbols in ELF file.
+    @rtype: set
+    @raise FileNotFound: if elf_file is not a dynamic ELF object
+    """
+    elf_obj = _read_elf(elf_file)
+    if elf_obj is None or not elf_obj.dynamic:
+        raise FileNotFound("%s is not a dynamic ELF object" % (elf_file,))
 
-    except (OSError, IOError) as err:
-        if err.errno != errno.ENOENT:
-            raise
-        raise FileNotFound("/usr/bin/lddtree not found")
+    tree, _unresolved = _elf_dependency_tree(elf_file, elf_obj)
 
-    finally:
-        if proc is not None:
-            proc.stdout.close()
+    objects = []
+    for path, lib_obj in tree:
+        try:
+            symbols = lib_obj.versioned_symbols()
+        except (OSError, IOError) as err:
+            raise FileNotFound("cannot read %s: %s" % (path, err,))
+        if symbols is None:
+            return _ldd_broken_symbols(elf_file)
+        objects.append((path, lib_obj, symbols))
+
+    return _elf_broken_symbols(objects)
+
+def _elf_broken_symbols(objects):
+    """
+    Return the broken symbols of the given ELF objects tree, a list of
+    (path, ElfObject, ElfObject.versioned_symbols()) tuples, matching
+    symbols and versions the way ld.so does.
+    """
+    defined = {}
+    required = set()
+    file_versions = {}
+    for path, lib_obj, (lib_defined, lib_required, versions) in objects:
+        for name, version in lib_defined:
+            defined.setdefault(name, set()).add(version)
+        required.update(lib_required)
+        if versions is not None:
+            file_versions.setdefault(os.path.basename(path), versions)
+            if lib_obj.soname:
+                file_versions.setdefault(lib_obj.soname, versions)
 
     outcome = set()
-    if output is not None:
-        for line in output.split("\n"):
-            if line == elf_file:
-                continue
-            if line:
-                outcome.add(os.path.basename(line))
+    for name, version, filename in required:
+        versions = defined.get(name)
+        if versions is None:
+            outcome.add(name)
+        elif version is None:
+            continue
+        elif version not in file_versions.get(filename, (version,)):
+            # the library does not define the version at all
+            outcome.add(name)
+        elif version not in versions and None not in versions:
+            outcome.add(name)
 
     return outcome
 
-def read_elf_broken_symbols(elf_file):
+def _ldd_broken_symbols(elf_file):
     """
-    Extract broken symbols from ELF file.
-
-    @param elf_file: path to ELF file
-    @type elf_file: string
-    @return: list of broken symbols in ELF file.
-    @rtype: set
+    Extract broken symbols from ELF file using ldd -r.
     """
     proc = None
     args = ("/usr/bin/ldd", "-r", elf_file)
@@ -2908,8 +3146,13 @@ def read_elf_broken_symbols(elf_file):
     if output is not None:
         for line in output.split("\n"):
             if line.startswith("undefined symbol: "):
-                symbol = line.split("\t")[0].split()[-1]
-                outcome.add(symbol)
+                # undefined symbol: X[, version Y]	(path)
+                symbol = line.split("\t")[0].split()[2]
+                outcome.add(symbol.rstrip(","))
+            elif line.startswith("symbol ") and " version " in line:
+                # symbol X version Y not defined in file Z with
+                # link time reference
+                outcome.add(line.split()[1])
 
     return outcome
 
@@ -2922,42 +3165,10 @@ def read_elf_linker_paths(elf_file):
     @return: list of extracted built-in linker paths.
     @rtype: list
     """
-    proc = None
-    args = ("/usr/bin/scanelf", "-qF", "%r", elf_file)
-    out = None
-
-    try:
-        proc = subprocess.Popen(args, stdout = subprocess.PIPE)
-        exit_st = proc.wait()
-        if exit_st != 0:
-            raise FileNotFound("scanelf error")
-
-        out = proc.stdout.read()
-
-    except (OSError, IOError) as err:
-        if err.errno != errno.ENOENT:
-            raise
-        raise FileNotFound("/usr/bin/scanelf not found")
-
-    finally:
-        if proc is not None:
-            proc.stdout.close()
-
-    outcome = []
-    if out is not None:
-
-        elf_dir = os.path.dirname(elf_file)
-        if const_is_python3():
-            out = const_convert_to_unicode(out)
-        for line in out.split("\n"):
-            if line:
-                paths = line.strip().split(" ", -1)[0].split(",")
-                for path in paths:
-                    path = path.replace("$ORIGIN", elf_dir)
-                    path = path.replace("${ORIGIN}", elf_dir)
-                    outcome.append(path)
-
-    return outcome
+    elf_obj = _read_elf(elf_file)
+    if elf_obj is None:
+        return []
+    return _elf_linker_paths(elf_obj, elf_file)
 
 def xml_from_dict_extended(dictionary):
     """
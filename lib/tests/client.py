@@ -8,17 +8,20 @@ import unittest
 import os
 import shutil
 import signal
+import threading
 import time
 
 from entropy.client.interfaces import Client
 from entropy.client.interfaces.db import InstalledPackagesRepository
-from entropy.client.interfaces.package.actions._triggers import Trigger
+from entropy.client.interfaces.package.actions._triggers import Trigger, \
+    TriggerQueue
 from entropy.cache import EntropyCacher
 from entropy.const import etpConst, const_mkdtemp
-from entropy.output import set_mute
+from entropy.output import set_mute, TextInterface
 from entropy.core.settings.base import SystemSettings
 from entropy.db import EntropyRepository
-from entropy.exceptions import RepositoryError, EntropyPackageException
+from entropy.exceptions import RepositoryError, EntropyPackageException, \
+    PermissionDenied
 import entropy.tools
 import tests._misc as _misc
 
@@ -193,6 +196,38 @@ class EntropyClientTest(unittest.TestCase):
             set_mute(False)
         self.assertRaises(RepositoryError, test_load)
 
+    def test_atom_search(self):
+        dbconn = self.Client._init_generic_temp_repository(
+            self.mem_repoid, self.mem_repo_desc, temp_file = ":memory:")
+        data = self.Spm.extract_package_metadata(_misc.get_test_package())
+        data2 = self.Spm.extract_package_metadata(_misc.get_test_package2())
+        package_id = dbconn.addPackage(data)
+        dbconn.addPackage(data2)
+        keyword = _misc.get_test_package_name()
+        description = data['description'].split()[-1]
+
+        def _search():
+            return (
+                self.Client.atom_search(keyword,
+                    repositories = [self.mem_repoid], use_cache = False),
+                self.Client.atom_search(description, description = True,
+                    repositories = [self.mem_repoid], use_cache = False),
+                self.Client.atom_search(keyword + ":" + data['slot'],
+                    repositories = [self.mem_repoid], use_cache = False),
+            )
+
+        expected = ([(package_id, self.mem_repoid)],) * 3
+        self.assertFalse(dbconn.isSearchIndexAvailable())
+        self.assertEqual(_search(), expected)
+
+        # the full-text search index must give the same results
+        dbconn._indexing = True
+        dbconn.createAllIndexes()
+        if not dbconn._isSearchIndexSupported():
+            return
+        self.assertTrue(dbconn.isSearchIndexAvailable())
+        self.assertEqual(_search(), expected)
+
     def test_package_repository(self):
         test_pkg = _misc.get_test_entropy_package()
         # this might fail on 32bit arches
@@ -304,6 +339,220 @@ else:
 
         self.assertEqual(exit_st, 42)
 
+    def test_deferred_triggers(self):
+        from entropy.client.interfaces.package.actions import _triggers
+
+        env_updates = []
+        def _environment_update(entropy_client):
+            env_updates.append(entropy_client)
+            return 0
+
+        pkgdata = {
+            'affected_infofiles': set(["/nonexistent/a.info",
+                                       "/nonexistent/b.info"]),
+        }
+        trigger = Trigger(
+            self.Client, "install", 'postinstall', pkgdata, pkgdata)
+        factory = self.Client.PackageActionFactory()
+
+        orig_environment_update = _triggers._environment_update
+        _triggers._environment_update = _environment_update
+        try:
+            with factory.deferred_triggers():
+                with factory.deferred_triggers():
+                    self.assertEqual(trigger._trigger_env_update(), 0)
+                    self.assertEqual(trigger._trigger_env_update(), 0)
+                    self.assertEqual(trigger._trigger_infofile_install(), 0)
+                    self.assertEqual(trigger._trigger_infofile_install(), 0)
+                # still inside the outermost transaction
+                self.assertEqual(env_updates, [])
+
+                queue = TriggerQueue.get(self.Client)
+                self.assertTrue(queue is not None)
+                self.assertTrue(queue.pending())
+                self.assertEqual(queue._infofiles,
+                                 sorted(pkgdata['affected_infofiles']))
+
+                # package phases are a barrier
+                self.assertEqual(trigger._flush_deferred_triggers(), 0)
+                self.assertEqual(len(env_updates), 1)
+                self.assertFalse(queue.pending())
+
+                self.assertEqual(trigger._trigger_env_update(), 0)
+                self.assertEqual(len(env_updates), 1)
+
+            self.assertEqual(len(env_updates), 2)
+            self.assertTrue(TriggerQueue.get(self.Client) is None)
+
+            # without a transaction, triggers run immediately
+            self.assertEqual(trigger._trigger_env_update(), 0)
+            self.assertEqual(len(env_updates), 3)
+        finally:
+            _triggers._environment_update = orig_environment_update
+
+    def test_deferred_triggers_barrier(self):
+        from entropy.client.interfaces.package.actions import _triggers
+
+        events = []
+        def _environment_update(entropy_client):
+            events.append("env-update")
+            return 0
+
+        class FakeSpm(object):
+
+            class PhaseFailure(Exception):
+                pass
+
+            class OutdatedPhaseError(Exception):
+                pass
+
+            class PhaseError(Exception):
+                pass
+
+            def execute_package_phase(self, action_metadata,
+                                      package_metadata, action_name,
+                                      phase_name):
+                events.append((phase_name, package_metadata['name']))
+
+        env_dir = sorted(self.Client.Spm_class().ENV_DIRS)[0]
+        def _pkgdata(name, dependencies):
+            return {
+                'category': "app-misc",
+                'name': name,
+                'spm_phases': None,
+                'trigger': None,
+                'affected_directories': set([env_dir]),
+                'affected_infofiles': set(),
+                'dependencies': frozenset(dependencies),
+            }
+
+        def _install(packages):
+            factory = self.Client.PackageActionFactory()
+            with factory.deferred_triggers():
+                for pkgdata in packages:
+                    trigger = Trigger(
+                        self.Client, "install", 'postinstall',
+                        pkgdata, pkgdata)
+                    trigger._real_spm = FakeSpm()
+                    try:
+                        trigger.prepare()
+                        self.assertEqual(trigger.run(), 0)
+                    finally:
+                        trigger.kill()
+
+        orig_environment_update = _triggers._environment_update
+        _triggers._environment_update = _environment_update
+        try:
+            # unrelated packages, env-update runs once, at the end
+            _install([_pkgdata("foo", []),
+                      _pkgdata("bar", ["dev-libs/baz"])])
+            self.assertEqual(events, [
+                ("postinstall", "foo"), ("postinstall", "bar"),
+                "env-update"])
+
+            # bar depends on foo, already merged: its phases
+            # need an up-to-date environment
+            del events[:]
+            _install([_pkgdata("foo", []),
+                      _pkgdata("bar", [">=app-misc/foo-1.0:0"])])
+            self.assertEqual(events, [
+                ("postinstall", "foo"), "env-update",
+                ("postinstall", "bar")])
+        finally:
+            _triggers._environment_update = orig_environment_update
+
+    def test_install_pipeline(self):
+        from entropy.client.interfaces.package.actions import pipeline
+
+        events = []
+        instances = []
+        lock = threading.Lock()
+
+        class FakeInstallAction(object):
+
+            def __init__(self, entropy_client, package_match, opts = None):
+                self.match = package_match
+                self.opts = opts
+                self.prepared = False
+                self.verified = False
+                self.removed = False
+                instances.append(self)
+
+            def setup(self):
+                pass
+
+            def prepare(self, verified = False):
+                time.sleep(0.01)
+                with lock:
+                    events.append(("prepare", self.match))
+                self.prepared = True
+                self.verified = verified
+                return 0
+
+            def _remove_unpack_dir(self):
+                self.removed = True
+
+            def finalize(self):
+                pass
+
+        queue = [(x, "repo") for x in range(10)]
+        opts_map = dict((x, {'id': x[0]}) for x in queue)
+        factory = self.Client.PackageActionFactory()
+
+        orig_action_class = pipeline._PackageInstallAction
+        pipeline._PackageInstallAction = FakeInstallAction
+        try:
+            actions = []
+            with factory.install_pipeline(
+                    queue, opts_map = opts_map, workers = 3) as pipe:
+                for action in pipe:
+                    # packages are handed over prepared and in order
+                    self.assertTrue(action.prepared)
+                    self.assertEqual(action.opts, opts_map[action.match])
+                    actions.append(action)
+            self.assertEqual([x.match for x in actions], queue)
+            self.assertEqual(sorted(x[1] for x in events), queue)
+
+            # stopping early discards the packages prepared ahead
+            del instances[:]
+            with factory.install_pipeline(queue, workers = 2) as pipe:
+                for action in pipe:
+                    if action.match == queue[3]:
+                        break
+            discarded = [x for x in instances if x.match > queue[3]]
+            self.assertTrue(discarded)
+            for action in discarded:
+                self.assertTrue(action.removed)
+
+            # no workers, nothing is done ahead
+            del events[:]
+            with factory.install_pipeline(queue, workers = 0) as pipe:
+                for action in pipe:
+                    self.assertFalse(action.prepared)
+            self.assertEqual(events, [])
+
+            # packages are not prepared until they are fetched, then
+            # they are not verified again
+            del events[:]
+            with factory.install_pipeline(
+                    queue, workers = 2, fetching = True) as pipe:
+                time.sleep(0.1)
+                self.assertEqual(events, [])
+                pipe.fetched(queue[1])
+                while not events:
+                    time.sleep(0.01)
+                self.assertEqual(events, [("prepare", queue[1])])
+                for package_match in queue[2:]:
+                    pipe.fetched(package_match)
+                actions = list(pipe)
+            self.assertFalse(actions[0].verified)
+            for action in actions:
+                self.assertTrue(action.prepared)
+            for action in actions[1:]:
+                self.assertTrue(action.verified)
+        finally:
+            pipeline._PackageInstallAction = orig_action_class
+
     def _do_pkg_test_new_api(self, pkg_path, pkg_atom):
 
         # this test might be considered controversial, for now, let's keep it
@@ -376,6 +625,90 @@ else:
         etpConst['entropyunpackdir'] = old_unpackdir
 
 
+class RepositoryFetchTest(unittest.TestCase):
+
+    def test_fetch_repositories(self):
+        from entropy.client.interfaces.repository import Repository
+        from entropy.db.skel import EntropyRepositoryBase
+
+        written = []
+        active = []
+        lock = threading.Lock()
+
+        class FakeClient(TextInterface):
+
+            logger = open(os.devnull, "w")
+
+            def output(self, text, **kwargs):
+                with lock:
+                    written.append(text)
+
+        class FakeUpdater(object):
+
+            def __init__(self, repository_id, status):
+                self._repository_id = repository_id
+                self._status = status
+                self._text = TextInterface()
+
+            def fetch(self):
+                with lock:
+                    active.append(self._repository_id)
+                    concurrency.append(len(active))
+                try:
+                    for count in range(3):
+                        self._text.output(
+                            "%s-%d" % (self._repository_id, count))
+                        time.sleep(0.01)
+                    if isinstance(self._status, Exception):
+                        raise self._status
+                    return self._status
+                finally:
+                    with lock:
+                        active.remove(self._repository_id)
+
+        repo_ids = ["repo%d" % (x,) for x in range(6)]
+        repo_intf = Repository.__new__(Repository)
+        repo_intf._entropy = FakeClient()
+        repo_intf.repo_ids = repo_ids
+        repo_intf._settings = {'repositories': {'sync_workers': 3}}
+
+        concurrency = []
+        updaters = dict((x, FakeUpdater(x, 0)) for x in repo_ids[:-1])
+        updaters["repo2"] = FakeUpdater("repo2", PermissionDenied("denied"))
+        try:
+            statuses = repo_intf._fetch_repositories(updaters)
+            expected = dict((x, 0) for x in updaters)
+            expected["repo2"] = \
+                EntropyRepositoryBase.REPOSITORY_PERMISSION_DENIED_ERROR
+            self.assertEqual(statuses, expected)
+            self.assertEqual(max(concurrency), 3)
+
+            # the output of each repository is not interleaved
+            self.assertEqual(len(written), len(updaters) * 3)
+            for index in range(0, len(written), 3):
+                repository_id = written[index].rsplit("-", 1)[0]
+                self.assertEqual(written[index:index + 3],
+                    ["%s-%d" % (repository_id, x) for x in range(3)])
+
+            # workers are clamped to the number of repositories
+            concurrency = []
+            repo_intf._settings['repositories']['sync_workers'] = 10
+            repo_intf._fetch_repositories(
+                dict((x, FakeUpdater(x, 0)) for x in repo_ids[:2]))
+            self.assertTrue(max(concurrency) <= 2)
+
+            # errors are raised, the output is written anyway
+            del written[:]
+            updaters["repo2"] = FakeUpdater("repo2", ValueError("broken"))
+            repo_intf._settings['repositories']['sync_workers'] = 1
+            self.assertRaises(ValueError,
+                repo_intf._fetch_repositories, updaters)
+            self.assertEqual(written[-3:],
+                ["repo2-%d" % (x,) for x in range(3)])
+        finally:
+            FakeClient.logger.close()
+
+
 if __name__ == '__main__':
     unittest.main()
     raise SystemExit(0)
@@ -4,7 +4,9 @@ sys.path.insert(0, 'client')
 sys.path.insert(0, '../../client')
 sys.path.insert(0, '.')
 sys.path.insert(0, '../')
+import os
 import unittest
+from entropy.const import etpConst, const_mkstemp
 from entropy.core import EntropyPluginStore, Singleton
 from entropy.core.settings.base import SystemSettings
 import tests._misc as _misc
@@ -34,6 +36,31 @@ class CoreTest(unittest.TestCase):
         self.assertTrue(isinstance(files, set))
         self.assertTrue(files) # not empty
 
+    def test_repositories_sync_workers(self):
+        sys_set = SystemSettings()
+        setting_files = sys_set._SystemSettings__setting_files
+        orig_repo_conf = setting_files['repositories']
+        fd, tmp_path = const_mkstemp(prefix="repositories.conf")
+        os.close(fd)
+
+        def _parse(value):
+            with open(tmp_path, "w") as conf_f:
+                conf_f.write("sync-workers = %s\n" % (value,))
+            return sys_set._repositories_parser()['sync_workers']
+
+        try:
+            setting_files['repositories'] = tmp_path
+            default = etpConst['repositorysyncworkers']
+            self.assertEqual(_parse("5"), 5)
+            self.assertEqual(_parse("1"), 1)
+            # invalid values keep the default
+            self.assertEqual(_parse("0"), default)
+            self.assertEqual(_parse("-2"), default)
+            self.assertEqual(_parse("foo"), default)
+        finally:
+            setting_files['repositories'] = orig_repo_conf
+            os.remove(tmp_path)
+
     def test_core_singleton(self):
         class myself(Singleton):
             def init_singleton(self):
@@ -1,9 +1,12 @@
 # -*- coding: utf-8 -*-
+import copy
 import sys
 sys.path.insert(0, '.')
 sys.path.insert(0, '../')
 import unittest
 import os
+import shutil
+import tempfile
 import time
 import threading
 
@@ -14,6 +17,7 @@ from entropy.output import set_mute
 from entropy.core.settings.base import SystemSettings
 from entropy.misc import ParallelTask
 from entropy.db import EntropyRepository
+from entropy.db.exceptions import OperationalError
 import tests._misc as _misc
 
 import entropy.dep
@@ -242,6 +246,79 @@ class EntropyRepositoryTest(unittest.TestCase):
             content,
             tuple(sorted(orig_content, key = lambda x: x[0])))
 
+    def test_content_migration(self):
+        test_pkg = _misc.get_test_package3()
+        data = self.Spm.extract_package_metadata(test_pkg)
+        self.assertTrue(self.test_db._isContentInterned())
+
+        # switch back to the legacy content table
+        self.test_db._cursor().executescript("""
+        DROP VIEW content;
+        DROP TABLE contentfiles;
+        DROP TABLE contentdirectories;
+        CREATE TABLE content (
+            idpackage INTEGER,
+            file VARCHAR,
+            type VARCHAR,
+            FOREIGN KEY(idpackage)
+                REFERENCES baseinfo(idpackage) ON DELETE CASCADE
+        );
+        """)
+        self.test_db._clearLiveCache("_doesTableExist")
+        self.assertFalse(self.test_db._isContentInterned())
+
+        idpackage = self.test_db.addPackage(data)
+        content = self.test_db.retrieveContent(
+            idpackage, extended = True, order_by = "file")
+
+        set_mute(True)
+        try:
+            self.test_db._migrateContentDirectories()
+        finally:
+            set_mute(False)
+        self.assertTrue(self.test_db._isContentInterned())
+        self.assertEqual(content, self.test_db.retrieveContent(
+            idpackage, extended = True, order_by = "file"))
+
+        self.assertEqual(self.test_db.searchBelongs("/usr/sbin/htdbm"),
+            frozenset([idpackage]))
+        self.assertEqual(self.test_db.searchBelongs("/usr/sbin"),
+            frozenset([idpackage]))
+        self.assertEqual(self.test_db.searchBelongs("/usr/sbin/htdb"),
+            frozenset())
+        self.assertEqual(
+            self.test_db.searchBelongs("/usr/share/man/%", like = True),
+            frozenset([idpackage]))
+        self.assertEqual(
+            self.test_db.searchBelongs("/usr/lib/%", like = True),
+            frozenset())
+        self.assertTrue(self.test_db.isFileAvailable("/usr/bin/htpasswd"))
+
+        self.test_db.removePackage(idpackage)
+        self.test_db.clean()
+        self.assertEqual(self.test_db.listAllFiles(count = True), 0)
+        cur = self.test_db._cursor().execute(
+            "SELECT count(*) FROM contentdirectories")
+        self.assertEqual(cur.fetchone()[0], 0)
+
+    def test_resolve_file_owners(self):
+        test_pkg = _misc.get_test_package3()
+        data = self.Spm.extract_package_metadata(test_pkg)
+        idpackage = self.test_db.addPackage(data)
+
+        paths = ["/usr/sbin/htdbm", "/usr/sbin", "/usr/bin/htpasswd",
+                 "/usr/sbin/htdb", "/not/owned"]
+        owners = self.test_db.resolveFileOwners(paths)
+        expected = {}
+        for path in paths:
+            package_ids = self.test_db.isFileAvailable(path, get_id = True)
+            if package_ids:
+                expected[path] = package_ids
+        self.assertEqual(owners, expected)
+        self.assertEqual(owners["/usr/bin/htpasswd"], frozenset([idpackage]))
+        self.assertFalse("/not/owned" in owners)
+        self.assertEqual(self.test_db.resolveFileOwners([]), {})
+
     def test_db_creation(self):
         self.assertTrue(isinstance(self.test_db, EntropyRepository))
         self.assertEqual(self.test_db_name, self.test_db.repository_id())
@@ -423,6 +500,44 @@ class EntropyRepositoryTest(unittest.TestCase):
         self.assertTrue(isinstance(results, set))
         self.assertTrue(rc == 1)
 
+    def test_db_match_many(self):
+        test_pkg = _misc.get_test_package()
+        data = self.Spm.extract_package_metadata(test_pkg)
+        self.test_db.addPackage(data)
+
+        for test_pkg in (_misc.get_test_package2(),
+                         _misc.get_test_package3(),
+                         _misc.get_test_entropy_package_tag()):
+            data = self.Spm.extract_package_metadata(test_pkg)
+            self.test_db.addPackage(data)
+
+        pkg_atom = _misc.get_test_package_atom()
+        pkg_name = _misc.get_test_package_name()
+        atoms = [pkg_atom, "slib", pkg_name, "virtual/slib", pkg_atom,
+                 "app-foo/foo;%s?" % (pkg_atom,), ""]
+        for package_id in self.test_db.listAllPackageIds():
+            atom = self.test_db.retrieveAtom(package_id)
+            key, slot = self.test_db.retrieveKeySlot(package_id)
+            tag = self.test_db.retrieveTag(package_id)
+            atoms += [atom, key, "~" + atom, ">=" + atom, "<" + atom,
+                      "%s:%s" % (key, slot), "%s:foo" % (key,),
+                      "%s#%s" % (key, tag), "%s#foo" % (key,)]
+            for use in sorted(self.test_db.retrieveUseflags(package_id))[:2]:
+                atoms += ["%s[%s]" % (key, use), "%s[-%s]" % (key, use)]
+
+        for kwargs in ({}, {'multiMatch': True},
+                       {'extendedResults': True},
+                       {'multiMatch': True, 'extendedResults': True},
+                       {'maskFilter': False}, {'matchSlot': "0"}):
+            expected = [self.test_db.atomMatch(x, **kwargs) for x in atoms]
+            self.assertEqual(expected,
+                self.test_db.atomMatchMany(atoms, **kwargs))
+
+        # packages are read at once
+        candidates = self.test_db._atomMatchCandidates(set(atoms))
+        self.assertTrue(pkg_atom in candidates)
+        self.assertFalse("virtual/slib" in candidates)
+
     def test_db_insert_compare_match_utf(self):
 
         # insert/compare
@@ -609,12 +724,267 @@ class EntropyRepositoryTest(unittest.TestCase):
         t3.join()
         t4.join()
 
-        cur_cache = self.test_db._cursor_pool().keys()
+        cur_cache = self.test_db._connection_pool().keys()
         self.assertTrue(len(cur_cache) > 0)
         self.test_db._cleanup_all()
-        cur_cache = self.test_db._cursor_pool().keys()
+        cur_cache = self.test_db._connection_pool().keys()
         self.assertEqual(len(cur_cache), 0)
 
+    def test_db_thread_connections(self):
+        """
+        Thread connections must be released when their thread exits,
+        read-only connections must not be able to write.
+        """
+        db = self.Client.open_temp_repository(name = "thread_conns")
+        try:
+            test_pkg = _misc.get_test_package()
+            data = self.Spm.extract_package_metadata(test_pkg)
+            package_id = db.addPackage(data)
+            db.commit()
+            self.assertEqual(len(db._connection_pool()), 1)
+
+            _tmp_data = {"ids": None, "write": None}
+
+            def select_pkg():
+                _tmp_data['ids'] = db.listAllPackageIds()
+
+            th = ParallelTask(select_pkg)
+            th.start()
+            th.join()
+            self.assertEqual(_tmp_data['ids'], frozenset([package_id]))
+            # the thread connection is gone with the thread
+            self.assertEqual(len(db._connection_pool()), 1)
+
+            def read_pkg():
+                with db.reader():
+                    _tmp_data['ids'] = db.listAllPackageIds()
+                    try:
+                        db.removePackage(package_id)
+                    except OperationalError:
+                        _tmp_data['write'] = False
+                    else:
+                        _tmp_data['write'] = True
+
+            _tmp_data['ids'] = None
+            th = ParallelTask(read_pkg)
+            th.start()
+            th.join()
+            self.assertEqual(_tmp_data['ids'], frozenset([package_id]))
+            self.assertFalse(_tmp_data['write'])
+            self.assertEqual(db.listAllPackageIds(), frozenset([package_id]))
+
+        finally:
+            db.close()
+        self.assertEqual(len(db._connection_pool()), 0)
+
+    def test_bulk_insert_indexes(self):
+        """
+        bulkInsert() must keep the indexes, unless asked otherwise.
+        bulkInsert(drop_indexes = True) on an empty repository must keep
+        the indexes used by handlePackage() lookups, restore the others
+        on exit, also on errors, and forget the cached identifiers on
+        rollback.
+        """
+        db = self.test_db
+        db._indexing = True
+        db.createAllIndexes()
+
+        def _indexes():
+            cur = db._cursor().execute("""
+            SELECT name, tbl_name FROM SQLITE_MASTER WHERE type = "index"
+            AND name NOT LIKE "sqlite_%"
+            """)
+            return dict(cur.fetchall())
+
+        indexes = _indexes()
+        with db.bulkInsert():
+            self.assertEqual(_indexes(), indexes)
+
+        with db.bulkInsert(drop_indexes = True):
+            bulk_indexes = _indexes()
+            self.assertTrue(len(bulk_indexes) < len(indexes))
+            for table in db._BULK_INSERT_INDEXED_TABLES:
+                self.assertEqual(
+                    set(x for x, y in indexes.items() if y == table),
+                    set(x for x, y in bulk_indexes.items() if y == table))
+
+            db._getReferenceId("keywordsreference", "amd64",
+                db._isKeywordAvailable, db._addKeyword)
+            self.assertTrue(db._bulkInsertStatus().references)
+            db.rollback()
+            self.assertFalse(db._bulkInsertStatus().references)
+        self.assertEqual(_indexes(), indexes)
+
+        def _interrupted():
+            with db.bulkInsert(drop_indexes = True):
+                self.assertNotEqual(_indexes(), indexes)
+                raise KeyboardInterrupt()
+        self.assertRaises(KeyboardInterrupt, _interrupted)
+        self.assertEqual(_indexes(), indexes)
+
+    def test_repository_delta(self):
+        """
+        Applying the delta exported from a repository against the
+        digests of another must make them equal.
+        """
+        test_pkg = _misc.get_test_package()
+        data = self.Spm.extract_package_metadata(test_pkg)
+        test_pkg2 = _misc.get_test_package2()
+        data2 = self.Spm.extract_package_metadata(test_pkg2)
+        test_pkg3 = _misc.get_test_package3()
+        data3 = self.Spm.extract_package_metadata(test_pkg3)
+
+        package_id = self.test_db.addPackage(copy.deepcopy(data))
+        self.test_db2.addPackage(copy.deepcopy(data),
+            revision = data['revision'], package_id = package_id)
+        package_id3 = self.test_db.addPackage(copy.deepcopy(data3))
+        self.test_db2.addPackage(copy.deepcopy(data3),
+            revision = data3['revision'], package_id = package_id3)
+        base_digests = self.test_db.listAllPackageDataDigests()
+        self.assertEqual(base_digests,
+            self.test_db2.listAllPackageDataDigests())
+
+        self.test_db2.setSlot(package_id, "foo")
+        package_id2 = self.test_db2.addPackage(copy.deepcopy(data2))
+        self.test_db2.removePackage(package_id3)
+
+        delta_db = self.__open_test_db(":memory:")
+        try:
+            digests = self.test_db2.exportDelta(delta_db, base_digests)
+            self.assertEqual(digests,
+                self.test_db2.listAllPackageDataDigests())
+            self.assertEqual(sorted(delta_db.listAllPackageIds()),
+                sorted([package_id, package_id2]))
+            # changed packages are removed and added again
+            self.assertEqual(
+                sorted(delta_db.getSetting("delta_removed").split()),
+                sorted([str(package_id), str(package_id3)]))
+            checksum = self.test_db.importDelta(delta_db)
+        finally:
+            delta_db.close()
+
+        self.assertEqual(checksum,
+            self.test_db.checksum(do_order = True, strict = False,
+                include_signatures = True))
+        self.assertEqual(checksum,
+            self.test_db2.checksum(do_order = True, strict = False,
+                include_signatures = True))
+        self.assertEqual(self.test_db.retrieveSlot(package_id), "foo")
+        self.assertFalse(self.test_db.isPackageIdAvailable(package_id3))
+        self.assertEqual(sorted(self.test_db.listAllPackageIds()),
+            sorted([package_id, package_id2]))
+
+    def test_db_profiles(self):
+        """
+        Performance profiles must be applied to the repository
+        Connections and temporary ones must be reverted on exit.
+        """
+        db = self.Client.open_temp_repository(name = "profiles")
+        try:
+            self.assertEqual(db.getProfile(), db.PROFILE_DEFAULT)
+            self.assertRaises(KeyError, db.setProfile, "unknown")
+
+            def _pragma(name):
+                return db._cursor().execute(
+                    "pragma %s" % (name,)).fetchone()[0]
+
+            db.setProfile(db.PROFILE_INSTALLED)
+            self.assertEqual(_pragma("journal_mode"), "wal")
+            # the journal mode is persistent, it is not switched again
+            self.assertEqual([x for x, y in db._applyProfile(
+                db._cursor(), db.PROFILE_INSTALLED) if x == "journal_mode"],
+                [])
+
+            synchronous = _pragma("synchronous")
+            with db.profile(db.PROFILE_BULK):
+                self.assertEqual(_pragma("synchronous"), 0)
+                self.assertEqual(_pragma("locking_mode"), "exclusive")
+                test_pkg = _misc.get_test_package()
+                data = self.Spm.extract_package_metadata(test_pkg)
+                package_id = db.addPackage(data)
+            self.assertEqual(_pragma("synchronous"), synchronous)
+            self.assertEqual(_pragma("locking_mode"), "normal")
+            self.assertEqual(db.listAllPackageIds(), frozenset([package_id]))
+        finally:
+            db.close()
+
+    def test_db_wal_close(self):
+        """
+        Closing a repository using the WAL journal must not wait for
+        the other Connections using it, the journal mode is switched
+        back by the last one.
+        """
+        tmp_dir = tempfile.mkdtemp(prefix="entropy.db.test")
+        db_path = os.path.join(tmp_dir, "repository.db")
+        try:
+            db = EntropyRepository(readOnly = False, dbFile = db_path,
+                name = "wal", xcache = False, indexing = False,
+                skipChecks = True)
+            db.initializeRepository()
+            db.setProfile(db.PROFILE_INSTALLED)
+            db.commit()
+
+            reader = EntropyRepository(readOnly = True, dbFile = db_path,
+                name = "wal_reader", xcache = False, indexing = False,
+                skipChecks = True)
+            try:
+                cursor = reader._cursor()
+                cursor.execute("BEGIN").fetchall()
+                cursor.execute("SELECT count(*) FROM baseinfo").fetchall()
+
+                start_t = time.time()
+                db.close()
+                self.assertTrue(
+                    time.time() - start_t < db._WAL_CLOSE_TIMEOUT * 5)
+                self.assertEqual(cursor.execute(
+                    "pragma journal_mode").fetchone()[0], "wal")
+            finally:
+                reader.close()
+        finally:
+            shutil.rmtree(tmp_dir, True)
+
+    def test_db_wal_close_unprivileged(self):
+        """
+        Once closed, a repository that used the WAL journal must be
+        readable by users that cannot write to its directory.
+        """
+        if os.getuid() != 0:
+            return
+
+        tmp_dir = tempfile.mkdtemp(prefix="entropy.db.test")
+        os.chmod(tmp_dir, 0o755)
+        db_path = os.path.join(tmp_dir, "repository.db")
+        try:
+            db = EntropyRepository(readOnly = False, dbFile = db_path,
+                name = "wal", xcache = False, indexing = False,
+                skipChecks = True)
+            db.initializeRepository()
+            db.setProfile(db.PROFILE_INSTALLED)
+            db._setSetting("wal", "test")
+            db.commit()
+            db.close()
+            os.chmod(db_path, 0o644)
+
+            pid = os.fork()
+            if pid == 0:
+                exit_st = 1
+                try:
+                    os.setgid(65534)
+                    os.setuid(65534)
+                    reader = EntropyRepository(readOnly = True,
+                        dbFile = db_path, name = "wal_reader",
+                        xcache = False, indexing = False,
+                        skipChecks = True)
+                    if reader.getSetting("wal") == "test":
+                        exit_st = 0
+                    reader.close()
+                finally:
+                    os._exit(exit_st)
+            _pid, status = os.waitpid(pid, 0)
+            self.assertEqual(status, 0)
+        finally:
+            shutil.rmtree(tmp_dir, True)
+
     def test_db_close_all(self):
         """
         This tests if EntropyRepository.close() really closes
@@ -676,13 +1046,13 @@ class EntropyRepositoryTest(unittest.TestCase):
             t2.join()
 
             _tmp_data['db']._cleanup_all(_cleanup_main_thread=False)
-            with _tmp_data['db']._cursor_pool_mutex():
-                cur_cache = _tmp_data['db']._cursor_pool().keys()
+            with _tmp_data['db']._connection_pool_mutex():
+                cur_cache = _tmp_data['db']._connection_pool().keys()
             self.assertEqual(len(cur_cache), 1) # just MainThread
 
             _tmp_data['db'].close()
-            with _tmp_data['db']._cursor_pool_mutex():
-                cur_cache = _tmp_data['db']._cursor_pool().keys()
+            with _tmp_data['db']._connection_pool_mutex():
+                cur_cache = _tmp_data['db']._connection_pool().keys()
             self.assertEqual(len(cur_cache), 0) # nothing left
             _tmp_data['T3'] = True
 
@@ -708,8 +1078,8 @@ class EntropyRepositoryTest(unittest.TestCase):
         self.assertTrue(1 in pkg_ids)
         self.assertTrue(len(pkg_ids) == 1)
         _tmp_data['db'].close()
-        with _tmp_data['db']._cursor_pool_mutex():
-            cur_cache = _tmp_data['db']._cursor_pool().keys()
+        with _tmp_data['db']._connection_pool_mutex():
+            cur_cache = _tmp_data['db']._connection_pool().keys()
         self.assertEqual(len(cur_cache), 0) # nothing left
         os.remove(_tmp_data['path'])
 
@@ -752,6 +1122,74 @@ class EntropyRepositoryTest(unittest.TestCase):
         pkg_data = self.test_db.retrieveUnusedPackageIds()
         self.assertEqual(pkg_data, tuple())
 
+    def test_db_reverse_deps_index(self):
+
+        test_pkg = _misc.get_test_package()
+        data = self.Spm.extract_package_metadata(test_pkg)
+        test_pkg2 = _misc.get_test_package2()
+        data2 = self.Spm.extract_package_metadata(test_pkg2)
+        data2['pkg_dependencies'] += ((
+                _misc.get_test_package_atom(),
+                etpConst['dependency_type_ids']['rdepend_id']),)
+
+        self.assertTrue(self.test_db._isReverseDependenciesIndexAvailable())
+
+        # add the dependency first, the index must be refreshed
+        # when its target shows up
+        idpackage2 = self.test_db.addPackage(data2)
+        idpackage = self.test_db.addPackage(data)
+
+        rev_deps = self.test_db.retrieveReverseDependencies(idpackage)
+        self.assertEqual(rev_deps, frozenset([idpackage2]))
+        self.assertEqual(self.test_db.retrieveUnusedPackageIds(),
+            (idpackage2,))
+
+        # the in-memory metadata must agree with the index
+        self.test_db._readonly = True
+        try:
+            self.test_db.clearCache()
+            self.assertEqual(
+                self.test_db.retrieveReverseDependencies(idpackage),
+                rev_deps)
+            self.assertEqual(self.test_db.retrieveUnusedPackageIds(),
+                (idpackage2,))
+        finally:
+            self.test_db._readonly = False
+
+        self.test_db.removePackage(idpackage)
+        idpackage = self.test_db.addPackage(data)
+        self.assertEqual(
+            self.test_db.retrieveReverseDependencies(idpackage),
+            frozenset([idpackage2]))
+
+        # writes only mark the index as stale, it is refreshed once,
+        # when read or at commit time
+        calls = []
+        match = self.test_db._matchReverseDependencies
+        def _match(dependencies):
+            calls.append(tuple(dependencies))
+            return match(dependencies)
+        self.test_db._matchReverseDependencies = _match
+        try:
+            self.test_db.setSlot(idpackage, "1")
+            self.test_db.setRevision(idpackage, 1)
+            self.test_db.setSlot(idpackage, data['slot'])
+            self.assertEqual(calls, [])
+            self.assertEqual(
+                self.test_db.retrieveReverseDependencies(idpackage),
+                frozenset([idpackage2]))
+            self.assertEqual(len(calls), 1)
+
+            self.test_db.setCategory(idpackage, "foo-bar")
+            self.test_db.commit()
+            self.assertEqual(len(calls), 2)
+            self.assertEqual(
+                self.test_db.retrieveReverseDependencies(idpackage),
+                frozenset())
+            self.assertEqual(len(calls), 2)
+        finally:
+            del self.test_db._matchReverseDependencies
+
     def test_similar(self):
         test_pkg = _misc.get_test_package()
         data = self.Spm.extract_package_metadata(test_pkg)
@@ -783,6 +1221,73 @@ class EntropyRepositoryTest(unittest.TestCase):
             slot = "0", just_id = True)
         self.assertEqual(out, (1,))
 
+    def test_search_index(self):
+        test_pkg = _misc.get_test_package()
+        data = self.Spm.extract_package_metadata(test_pkg)
+        test_pkg2 = _misc.get_test_package2()
+        data2 = self.Spm.extract_package_metadata(test_pkg2)
+        idpackage = self.test_db.addPackage(data)
+
+        keyword = _misc.get_test_package_name()
+        description = data['description'].split()[0]
+        expected = (
+            self.test_db.searchPackages(keyword),
+            self.test_db.searchDescription(description),
+            self.test_db.searchHomepage(data['homepage']),
+            self.test_db.searchPackagesRanked(keyword),
+        )
+        self.assertEqual(expected[-1],
+            ((data['atom'], idpackage),))
+        self.assertEqual(self.test_db.searchPackagesRanked(description,
+            description = False), tuple())
+
+        self.test_db._indexing = True
+        self.test_db.createAllIndexes()
+        if not self.test_db._isSearchIndexSupported():
+            return
+        self.assertTrue(self.test_db._isSearchIndexAvailable())
+
+        # the index must be kept in sync
+        idpackage2 = self.test_db.addPackage(data2)
+        self.test_db.removePackage(idpackage2)
+        self.assertEqual((
+            self.test_db.searchPackages(keyword),
+            self.test_db.searchDescription(description),
+            self.test_db.searchHomepage(data['homepage']),
+            self.test_db.searchPackagesRanked(keyword),
+        ), expected)
+
+        self.test_db.setName(idpackage, "foobar")
+        self.test_db.setAtom(idpackage, "sys-libs/foobar-1")
+        self.assertEqual(self.test_db.searchPackages(keyword), tuple())
+        self.assertEqual(self.test_db.searchPackagesRanked("oba"),
+            (("sys-libs/foobar-1", idpackage),))
+
+        self.test_db.setDescription(idpackage, "quuxdesc")
+        self.test_db.setHomepage(idpackage, "http://quuxhome")
+        self.assertEqual(self.test_db.searchPackagesRanked(description),
+            tuple())
+        self.assertEqual(self.test_db.searchPackagesRanked("quuxdesc"),
+            (("sys-libs/foobar-1", idpackage),))
+        self.assertEqual(self.test_db.searchPackagesRanked("quuxhome"),
+            (("sys-libs/foobar-1", idpackage),))
+        self.assertEqual(self.test_db.searchPackagesRanked("quuxdesc",
+            description = False), tuple())
+
+        self.test_db.removeProvide(idpackage)
+        self.test_db.insertProvide(idpackage,
+            [("virtual/quuxprov", 0)])
+        self.assertEqual(self.test_db.retrieveProvide(idpackage),
+            frozenset([("virtual/quuxprov", 0)]))
+        self.assertEqual(self.test_db.searchPackagesRanked("quuxprov",
+            description = False), (("sys-libs/foobar-1", idpackage),))
+        self.test_db.removeProvide(idpackage)
+        self.assertEqual(self.test_db.searchPackagesRanked("quuxprov"),
+            tuple())
+
+        self.test_db.dropAllIndexes()
+        self.assertFalse(self.test_db._isSearchIndexAvailable())
+
     def test_list_packages(self):
         test_pkg = _misc.get_test_package()
         data = self.Spm.extract_package_metadata(test_pkg)
@@ -950,6 +1455,30 @@ class EntropyRepositoryTest(unittest.TestCase):
         self.assertEqual(self.test_db.getSetting("something_cool"),
             "abcdef\nabcdef")
 
+    def test_checksum_fingerprint(self):
+        empty_checksum = self.test_db.checksum()
+
+        test_pkg = _misc.get_test_package()
+        data = self.Spm.extract_package_metadata(test_pkg)
+        idpackage = self.test_db.addPackage(data)
+        checksum = self.test_db.checksum()
+        self.assertNotEqual(checksum, empty_checksum)
+        # memoized, stable across calls
+        self.assertEqual(checksum, self.test_db.checksum())
+
+        # ordered checksums are content based and still comparable
+        idpackage2 = self.test_db2.addPackage(data)
+        self.assertEqual(
+            self.test_db.checksum(do_order = True, strict = False),
+            self.test_db2.checksum(do_order = True, strict = False))
+
+        self.test_db.setSlot(idpackage, "foo")
+        new_checksum = self.test_db.checksum()
+        self.assertNotEqual(checksum, new_checksum)
+
+        self.test_db.removePackage(idpackage)
+        self.assertNotEqual(new_checksum, self.test_db.checksum())
+
     def test_new_entropyrepository_schema(self):
         test_pkg = _misc.get_test_package2()
         data = self.Spm.extract_package_metadata(test_pkg)
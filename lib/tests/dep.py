@@ -113,13 +113,40 @@ class DepTest(unittest.TestCase):
 
     def test_compare_versions(self):
         ver_a = ("1.0.0", "1.0.0", 0,)
-        ver_b = ("1.0.1", "1.0.0", 0.10000000000000001,)
-        ver_c = ("1.0.0", "1.0.1", -0.10000000000000001,)
+        ver_b = ("1.0.1", "1.0.0", 1,)
+        ver_c = ("1.0.0", "1.0.1", -1,)
 
         self.assertEqual(et.compare_versions(ver_a[0], ver_a[1]), ver_a[2])
         self.assertEqual(et.compare_versions(ver_b[0], ver_b[1]), ver_b[2])
         self.assertEqual(et.compare_versions(ver_c[0], ver_c[1]), ver_c[2])
 
+    def test_compare_versions_ordering(self):
+        vers = ["1.0_alpha", "1.0_beta2", "1.0_pre", "1.0_rc1", "1.0",
+            "1.0-r1", "1.0_p1", "1.0a", "1.0.0", "1.01", "1.02", "1.1",
+            "1.10", "2"]
+        for idx, ver in enumerate(vers):
+            for other in vers[idx + 1:]:
+                self.assertEqual(et.compare_versions(ver, other), -1)
+                self.assertEqual(et.compare_versions(other, ver), 1)
+        self.assertEqual(et.compare_versions("1.0_p0", "1.0"), 0)
+        self.assertEqual(et.compare_versions("1.0_p0_alpha", "1.0"), -1)
+        self.assertEqual(et.compare_versions("1.0_p0_p1", "1.0_p1"), -1)
+        self.assertEqual(et.compare_versions("foo", "1.0"), 0)
+        self.assertEqual(et.compare_versions("1.0", "foo"), 1)
+
+    def test_version_key(self):
+        key = et.version_key("1.2.3_rc1-r2")
+        self.assertTrue(key is et.version_key("1.2.3_rc1-r2"))
+        self.assertTrue(key.is_valid())
+        self.assertEqual(key.version, "1.2.3_rc1-r2")
+        self.assertTrue(key < et.version_key("1.2.3"))
+        self.assertTrue(key > et.version_key("1.2.3_rc1-r1"))
+        self.assertEqual(key, et.VersionKey("1.2.3_rc1-r2"))
+
+        invalid = et.version_key("foo")
+        self.assertFalse(invalid.is_valid())
+        self.assertTrue(invalid < et.version_key("0"))
+
     def test_get_newer_version(self):
         vers = ["1.0", "3.4", "0.5", "999", "9999", "10.0"]
         out_vers = ['9999', '999', '10.0', '3.4', '1.0', '0.5']
@@ -132,6 +159,13 @@ class DepTest(unittest.TestCase):
             ('3.4', '2222', 0), ('1.0', '2222', 1)]
         self.assertEqual(et.get_entropy_newer_version(vers), out_vers)
 
+    def test_get_entropy_newer_version_mixed_tags(self):
+        vers = [("1.0", "", 0,), ("2.0", "", 1,), ("1.5", "2222", 0,),
+            ("2.0", "", 0,)]
+        out_vers = [('2.0', '', 1), ('2.0', '', 0), ('1.5', '2222', 0),
+            ('1.0', '', 0)]
+        self.assertEqual(et.get_entropy_newer_version(vers), out_vers)
+
     def test_create_package_filename(self):
         package_category = "app-foo"
         package_name = "foo"
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+import sys
+sys.path.insert(0, '.')
+sys.path.insert(0, '../')
+import unittest
+from entropy.graph import Graph, TopologicalSorter
+
+
+class GraphTest(unittest.TestCase):
+
+    def _check_sorting(self, sorted_map, adj_map):
+        levels = {}
+        for level, items in sorted_map.items():
+            for item in items:
+                levels[item] = level
+        self.assertEqual(sorted(levels), sorted(adj_map))
+        self.assertEqual(sorted(sorted_map),
+            list(range(1, len(sorted_map) + 1)))
+        for item, deps in adj_map.items():
+            for dep in deps:
+                if levels[item] != levels[dep]:
+                    self.assertTrue(levels[item] < levels[dep])
+
+    def test_solve(self):
+        graph = Graph()
+        graph.add("a", set(["b", "c"]))
+        graph.add("b", set(["c"]))
+        graph.add("c", set())
+        graph.add("d", set(["a"]))
+
+        adj_map = graph.get_item_adjacency_map()
+        self.assertEqual(adj_map, {
+            "a": set(["b", "c"]),
+            "b": set(["c"]),
+            "c": set(),
+            "d": set(["a"]),
+        })
+        self.assertEqual(graph.solve(),
+            {1: ("d",), 2: ("a",), 3: ("b",), 4: ("c",)})
+        self.assertEqual(sorted(graph.raw()), ["a", "b", "c", "d"])
+        graph.destroy()
+
+    def test_solve_cycles(self):
+        graph = Graph()
+        graph.add("a", set(["b"]))
+        graph.add("b", set(["c"]))
+        graph.add("c", set(["a", "d"]))
+        graph.add("d", set(["d"]))
+
+        sorted_map = graph.solve()
+        self.assertEqual(len(sorted_map), 2)
+        self.assertEqual(set(sorted_map[1]), set(["a", "b", "c"]))
+        self.assertEqual(sorted_map[2], ("d",))
+        self._check_sorting(sorted_map, graph.get_item_adjacency_map())
+        graph.destroy()
+
+    def test_solve_deep(self):
+        # this used to hit the recursion limit
+        graph = Graph()
+        depth = sys.getrecursionlimit() * 3
+        for item in range(depth):
+            graph.add(item, set([item + 1]))
+        graph.add(depth, set([0]))
+        graph.add(depth + 1, set([depth]))
+
+        sorted_map = graph.solve()
+        self.assertEqual(len(sorted_map), 2)
+        self.assertEqual(sorted_map[1], (depth + 1,))
+        self.assertEqual(len(sorted_map[2]), depth + 1)
+        graph.destroy()
+
+    def test_nodes(self):
+        graph = Graph()
+        graph.add("a", set(["b"]))
+        graph.add("c", set(["b"]))
+
+        node = graph.get_node("b")
+        self.assertEqual(node.item(), "b")
+        revdeps = set([x.origin().item() for x in node.arches() if \
+            not node.is_arch_outgoing(x)])
+        self.assertEqual(revdeps, set(["a", "c"]))
+
+        # GraphNode objects are kept across add() calls
+        graph.add("b", set(["d"]))
+        self.assertTrue(graph.get_node("b") is node)
+        deps = set()
+        for arch in node.arches():
+            if node.is_arch_outgoing(arch):
+                deps |= set([x.item() for x in arch.endpoints()])
+        self.assertEqual(deps, set(["d"]))
+
+        adj_map = dict((x.item(), set([k.item() for k in y])) for x, y in \
+            graph.get_adjacency_map().items())
+        self.assertEqual(adj_map, graph.get_item_adjacency_map())
+
+        sorted_nodes = graph.solve_nodes()
+        self.assertEqual(
+            dict((x, tuple([k.item() for k in y])) for x, y in \
+                sorted_nodes.items()),
+            graph.solve())
+        graph.destroy()
+
+    def test_topological_sorter(self):
+        adj_map = {
+            1: set([2, 3]),
+            2: set([3, 4]),
+            3: set([2]),
+            4: set(),
+            5: set([1, 4]),
+        }
+        sorter = TopologicalSorter(adj_map)
+        sorted_map = sorter.sort()
+        self.assertEqual(len(sorted_map), 4)
+        self._check_sorting(sorted_map, adj_map)
+
+
+if __name__ == '__main__':
+    unittest.main()
+    raise SystemExit(0)
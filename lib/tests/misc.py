@@ -5,10 +5,16 @@ sys.path.insert(0, '../')
 import os
 import unittest
 import tempfile
+import shutil
 import json
 from entropy.const import const_convert_to_unicode, const_mkstemp
 from entropy.misc import Lifo, TimeScheduled, ParallelTask, EmailSender, \
-    FastRSS, FlockFile
+    FastRSS, FlockFile, ParallelTaskPool, ForkPool
+from entropy.output import TextInterface, buffer_output
+from entropy.cache import CacheStore, DigestCache, EntropyCacher
+import entropy.dump
+import hashlib
+import time
 
 class MiscTest(unittest.TestCase):
 
@@ -92,6 +98,88 @@ class MiscTest(unittest.TestCase):
         t.join()
         self.assertTrue(self.t_sched_run)
 
+    def test_parallel_task_pool(self):
+        import threading
+        names = set()
+        lock = threading.Lock()
+
+        def _square(item):
+            with lock:
+                names.add(threading.current_thread().name)
+            time.sleep(0.01)
+            return item * item
+
+        items = list(range(20))
+        results = ParallelTaskPool.map(_square, items, 4, "PoolTest")
+        self.assertEqual(results, dict((x, x * x) for x in items))
+        self.assertEqual(names,
+            set("PoolTest-%d" % (x,) for x in range(4)))
+
+        # workers are limited to the number of items
+        names.clear()
+        ParallelTaskPool.map(_square, [1, 2], 4, "PoolTest")
+        self.assertEqual(names, set(["PoolTest-0", "PoolTest-1"]))
+
+        # less than 2 workers, the calling thread does the work
+        names.clear()
+        ParallelTaskPool.map(_square, items, 1, "PoolTest")
+        self.assertEqual(names, set([threading.current_thread().name]))
+
+        # the first error is raised, the pending items are discarded
+        done = []
+        def _fail(item):
+            if item == 0:
+                raise ValueError(item)
+            time.sleep(0.01)
+            done.append(item)
+        self.assertRaises(ValueError, ParallelTaskPool.map,
+            _fail, items, 2, "PoolTest")
+        self.assertTrue(len(done) < len(items) - 1)
+
+        spawned = []
+        pool = ParallelTaskPool("PoolTest")
+        for item in items:
+            pool.spawn(spawned.append, item)
+        self.assertEqual(len(pool), len(items))
+        pool.join()
+        self.assertEqual(len(pool), 0)
+        self.assertEqual(sorted(spawned), items)
+
+    def test_fork_pool(self):
+        # the function does not need to be picklable, it is inherited
+        # by the workers
+        offset = 10
+        def _unit(item):
+            return (os.getpid(), item + offset)
+
+        items = list(range(20))
+        results = list(ForkPool(_unit, 4).imap(items))
+        self.assertEqual([x[1] for x in results], [x + 10 for x in items])
+        self.assertFalse(os.getpid() in set(x[0] for x in results))
+
+        # a single unit is processed in-process
+        results = list(ForkPool(_unit, 4).imap([1]))
+        self.assertEqual(results, [(os.getpid(), 11)])
+
+        # stopping early terminates the pool
+        imap = ForkPool(_unit, 2).imap(items)
+        self.assertEqual(next(imap)[1], 10)
+        imap.close()
+
+    def test_buffer_output(self):
+        text = TextInterface()
+        with buffer_output() as messages:
+            text.output("first", header = "h")
+            text.output("progress", back = True)
+            with buffer_output() as inner:
+                text.output("inner")
+            text.output("second", importance = 1, level = "warning")
+        self.assertEqual([x['text'] for x in inner], ["inner"])
+        self.assertEqual([x['text'] for x in messages], ["first", "second"])
+        self.assertEqual(messages[0]['header'], "h")
+        self.assertEqual(messages[1]['importance'], 1)
+        self.assertEqual(messages[1]['level'], "warning")
+
     def test_flock_file(self):
         tmp_fd, tmp_path = None, None
         try:
@@ -131,6 +219,131 @@ class MiscTest(unittest.TestCase):
             if tmp_path is not None:
                 os.remove(tmp_path)
 
+    def test_cache_store(self):
+        tmp_dir = tempfile.mkdtemp(prefix="entropy.misc.test")
+        try:
+            path = os.path.join(tmp_dir, "a", "store" + CacheStore.EXT)
+            store = CacheStore(path, "gen1")
+            store.put("key1", [1, 2, 3])
+            store.put("key2", self._lifo_item3)
+            store.put("key1", self._lifo_item4)
+            self.assertEqual(store.get("key1"), self._lifo_item4)
+            self.assertEqual(store.get("key2"), self._lifo_item3)
+            self.assertTrue(store.get("key3") is None)
+
+            # another reader sees the same data, and new appends
+            other = CacheStore(path, "gen1")
+            self.assertEqual(other.get("key2"), self._lifo_item3)
+            other.put("key3", self._lifo_item5)
+            self.assertEqual(store.get("key3"), self._lifo_item5)
+            other.close()
+            self.assertTrue(other.get("key3") is None)
+
+            # a new generation invalidates the old data
+            new_store = CacheStore(path, "gen2")
+            self.assertTrue(new_store.get("key1") is None)
+            new_store.put("key1", self._lifo_item6)
+            self.assertEqual(new_store.get("key1"), self._lifo_item6)
+
+            new_store.remove()
+            self.assertFalse(os.path.exists(path))
+            store.close()
+        finally:
+            shutil.rmtree(tmp_dir, True)
+
+    def test_cacher_save_store(self):
+        tmp_dir = tempfile.mkdtemp(prefix="entropy.misc.test")
+        cacher = EntropyCacher()
+        try:
+            self.assertFalse(cacher.is_started())
+            kwargs = {'cache_dir': tmp_dir, 'store': "a/store",
+                      'generation': "gen1"}
+            # push() is a no-op if the cacher is not started, save() is not
+            cacher.push("key1", self._lifo_item1, async = False, **kwargs)
+            self.assertTrue(cacher.pop("key1", **kwargs) is None)
+            cacher.save("key1", self._lifo_item1, **kwargs)
+            self.assertEqual(cacher.pop("key1", **kwargs), self._lifo_item1)
+            kwargs['generation'] = "gen2"
+            self.assertTrue(cacher.pop("key1", **kwargs) is None)
+        finally:
+            cacher.close_stores()
+            shutil.rmtree(tmp_dir, True)
+
+    def test_digest_cache(self):
+        tmp_dir = tempfile.mkdtemp(prefix="entropy.misc.test")
+        orig_dump_dir = entropy.dump.D_DIR
+        orig_compute = DigestCache.__dict__["_compute"]
+        orig_racy_secs = DigestCache.RACY_SECS
+        computed = []
+
+        def _compute(cls, file_obj, algorithms):
+            computed.append(tuple(algorithms))
+            return orig_compute.__func__(cls, file_obj, algorithms)
+
+        entropy.dump.D_DIR = tmp_dir
+        DigestCache._compute = classmethod(_compute)
+        # the file below has just been written, cache it anyway
+        DigestCache.RACY_SECS = -3600
+        try:
+            cacher = DigestCache()
+            path = os.path.join(tmp_dir, "file")
+            data = os.urandom(DigestCache.MIN_SIZE)
+            with open(path, "wb") as f:
+                f.write(data)
+            old_mtime = int(time.time()) - 3600
+            os.utime(path, (old_mtime, old_mtime))
+
+            digests = cacher.digests(path, ("md5", "sha256"))
+            self.assertEqual(digests, {
+                "md5": hashlib.md5(data).hexdigest(),
+                "sha256": hashlib.sha256(data).hexdigest(),
+            })
+            self.assertEqual(computed.pop(), ("md5", "sha256"))
+            self.assertTrue(os.path.isfile(
+                os.path.join(tmp_dir, "digests" + CacheStore.EXT)))
+
+            # cache hit, the file is not read again
+            self.assertEqual(cacher.digests(path, ("md5",)),
+                {"md5": hashlib.md5(data).hexdigest()})
+            self.assertEqual(computed, [])
+
+            # only the missing algorithms are computed
+            self.assertEqual(cacher.digests(path, ("md5", "sha512")), {
+                "md5": hashlib.md5(data).hexdigest(),
+                "sha512": hashlib.sha512(data).hexdigest(),
+            })
+            self.assertEqual(computed.pop(), ("sha512",))
+
+            # rewritten in place with the same size and mtime, the ctime
+            # changes and invalidates the cached digests
+            with open(path, "r+b") as f:
+                f.write(os.urandom(16))
+            os.utime(path, (old_mtime, old_mtime))
+            with open(path, "rb") as f:
+                data = f.read()
+            self.assertEqual(cacher.digests(path, ("md5",)),
+                {"md5": hashlib.md5(data).hexdigest()})
+            self.assertEqual(computed.pop(), ("md5",))
+
+            # a different mtime invalidates the cached digests
+            os.utime(path, (old_mtime + 1, old_mtime + 1))
+            self.assertEqual(cacher.digests(path, ("md5",)),
+                {"md5": hashlib.md5(data).hexdigest()})
+            self.assertEqual(computed.pop(), ("md5",))
+
+            # recently changed files are not cached
+            DigestCache.RACY_SECS = orig_racy_secs
+            os.utime(path, None)
+            for _count in range(2):
+                self.assertEqual(cacher.digests(path, ("md5",)),
+                    {"md5": hashlib.md5(data).hexdigest()})
+                self.assertEqual(computed.pop(), ("md5",))
+        finally:
+            DigestCache._compute = orig_compute
+            DigestCache.RACY_SECS = orig_racy_secs
+            entropy.dump.D_DIR = orig_dump_dir
+            shutil.rmtree(tmp_dir, True)
+
     def test_email_sender(self):
 
         mail_sender = 'test@test.com'
@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 import sys
+import os
+import shutil
 sys.path.insert(0, '.')
 sys.path.insert(0, '../')
 import unittest
@@ -26,6 +28,34 @@ class QATest(unittest.TestCase):
             self.assertTrue(self.QA.entropy_package_checks(pkg))
         set_mute(False)
 
+    def test_libtest_scanner(self):
+        tmp_dir = tempfile.mkdtemp()
+        paths = []
+        for elf_obj in (_misc.get_dl_so_amd(), _misc.get_dl_so_amd_2(),
+                        _misc.get_test_so_1()):
+            path = os.path.join(tmp_dir, os.path.basename(elf_obj))
+            shutil.copyfile(elf_obj, path)
+            os.chmod(path, 0o755)
+            paths.append(path)
+        paths.sort()
+
+        scanner = entropy.qa._LibraryLinkageScanner(
+            self.QA, False, False, [], [], [])
+        found = scanner.walk(tmp_dir)
+        self.assertEqual(sorted(x for x, _elf_class in found), paths)
+        self.assertEqual(set(x for _path, x in found), set([2]))
+
+        units = [[x] for x in paths]
+        serial = list(self.QA._libtest_map(scanner.scan, units, 1, None))
+        parallel = list(self.QA._libtest_map(scanner.scan, units, 3, None))
+
+        self.assertEqual(serial, parallel)
+        self.assertEqual([x[0] for x in serial], [1, 1, 1])
+        self.assertEqual(scanner.scan(paths),
+            (3, sum([x[1] for x in serial], [])))
+
+        shutil.rmtree(tmp_dir, True)
+
 if __name__ == '__main__':
     unittest.main()
     raise SystemExit(0)
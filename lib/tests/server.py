@@ -5,7 +5,16 @@ sys.path.insert(0, '../')
 import unittest
 import os
 import shutil
+import tempfile
+import threading
+import time
 from entropy.server.interfaces import Server
+import entropy.server.transceivers
+from entropy.server.interfaces.db import ServerPackagesRepositoryUpdater
+from entropy.output import TextInterface
+from entropy.transceivers import EntropyTransceiver
+from entropy.transceivers.exceptions import TransceiverConnectionError
+from entropy.transceivers.uri_handlers.skel import EntropyUriHandler
 from entropy.const import etpConst, initconfig_entropy_constants, etpSys
 from entropy.core.settings.base import SystemSettings
 from entropy.db import EntropyRepository
@@ -151,6 +160,71 @@ class EntropyRepositoryTest(unittest.TestCase):
             self.Server.repository())
         self.assertNotEqual(None, dbconn.retrieveAtom(1))
 
+    def test_repository_delta_upload(self):
+        repository_id = self.Server.repository()
+        spm = self.Server.Spm()
+        dbconn = self.Server.open_server_repository(repository_id)
+        updater = ServerPackagesRepositoryUpdater(
+            self.Server, repository_id, True, False)
+        cmethod = etpConst['etpdatabasecompressclasses']["bz2"]
+        rev_path = self.Server._get_local_repository_revision_file(
+            repository_id)
+
+        def _upload(revision):
+            with open(rev_path, "w") as rev_f:
+                rev_f.write("%d\n" % (revision,))
+            upload_data, critical, gpg_to_sign_files = {}, [], []
+            updater._create_repository_delta(dbconn, upload_data,
+                critical, gpg_to_sign_files, "bz2", cmethod)
+            return upload_data, critical
+
+        def _read_delta(delta_path):
+            tmp_path = getattr(entropy.tools, cmethod[1])(delta_path)
+            delta_repo = self.Server.open_generic_repository(tmp_path)
+            try:
+                return (delta_repo.listAllPackageIds(),
+                        delta_repo.getSetting("delta_removed").split())
+            finally:
+                delta_repo.close()
+                os.remove(tmp_path)
+
+        package_id = dbconn.handlePackage(
+            spm.extract_package_metadata(_misc.get_test_package()))
+
+        # first upload, there is nothing to generate a delta against
+        upload_data, critical = _upload(1)
+        self.assertEqual(upload_data, {})
+        self.assertEqual(critical, [])
+
+        package_id2 = dbconn.handlePackage(
+            spm.extract_package_metadata(_misc.get_test_package2()))
+        upload_data, critical = _upload(2)
+        deltas_path = upload_data['database_deltas_file']
+        delta_path = upload_data['database_delta_file']
+        self.assertEqual(sorted(critical), sorted([deltas_path, delta_path]))
+        deltas = entropy.tools.read_repository_deltas(deltas_path)
+        self.assertEqual(deltas, [(1, 2, os.path.basename(delta_path),
+                                   entropy.tools.md5sum(delta_path))])
+        self.assertEqual(_read_delta(delta_path), (set([package_id2]), []))
+
+        # same revision, the last delta is uploaded again
+        upload_data, critical = _upload(2)
+        self.assertEqual(upload_data['database_delta_file'], delta_path)
+        self.assertEqual(
+            entropy.tools.read_repository_deltas(deltas_path), deltas)
+
+        # removed packages are listed in the delta
+        dbconn.removePackage(package_id)
+        dbconn.commit()
+        upload_data, critical = _upload(3)
+        delta_path2 = upload_data['database_delta_file']
+        self.assertNotEqual(delta_path2, delta_path)
+        deltas2 = entropy.tools.read_repository_deltas(deltas_path)
+        self.assertEqual(deltas2[:-1], deltas)
+        self.assertEqual(deltas2[-1][:2], (2, 3))
+        self.assertEqual(_read_delta(delta_path2),
+            (set(), [str(package_id)]))
+
     def test_constant_backup(self):
         const_key = 'foo_foo_foo'
         const_val = set([1, 2, 3])
@@ -169,6 +243,211 @@ class EntropyRepositoryTest(unittest.TestCase):
         self.assertEqual(False, const_key in etpConst)
         self.assertEqual(None, etpConst.get(const_key))
 
+class TransceiverServerUploaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp_dir = tempfile.mkdtemp()
+        self._files = []
+        for count in range(6):
+            path = os.path.join(self._tmp_dir, "file%d.tbz2" % (count,))
+            with open(path, "wb") as path_f:
+                path_f.write(b"x" * (count + 1))
+            self._files.append(path)
+
+        plugin_id = etpConst['system_settings_plugins_ids']['server_plugin']
+        settings = {plugin_id: {'server': {
+            'sync_speed_limit': 120, 'sync_connections': 3}}}
+        self._orig_settings = entropy.server.transceivers.SystemSettings
+        entropy.server.transceivers.SystemSettings = lambda: settings
+
+        lock = threading.Lock()
+        # uri -> list of uploaded remote paths, directories created and
+        # speed limits, per connection
+        uploads = self._uploads = {}
+        makedirs = self._makedirs = {}
+        limits = self._limits = {}
+
+        class FakeUriHandler(EntropyUriHandler):
+
+            # remote paths failing the upload
+            FAILING = set()
+            # remote paths dropping the connection, once
+            DROPPING = set()
+            # uri -> number of connections failing to connect
+            DOWN = {}
+
+            def __init__(self, uri):
+                EntropyUriHandler.__init__(self, uri)
+                if uri == "fake://down":
+                    raise TransceiverConnectionError("mirror down")
+                with lock:
+                    down = FakeUriHandler.DOWN.get(uri, 0)
+                    if down:
+                        FakeUriHandler.DOWN[uri] = down - 1
+                if down:
+                    raise TransceiverConnectionError("connection refused")
+                self._dirs = set()
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, exc_type, exc_value, traceback):
+                pass
+
+            @staticmethod
+            def approve_uri(uri):
+                return uri.startswith("fake://")
+
+            @staticmethod
+            def get_uri_name(uri):
+                return uri[len("fake://"):]
+
+            @staticmethod
+            def hide_sensible_data(uri):
+                return uri
+
+            def set_speed_limit(self, speed_limit):
+                with lock:
+                    limits.setdefault(self._uri, []).append(speed_limit)
+
+            def is_dir(self, remote_path):
+                # give the other connections a chance to race
+                time.sleep(0.01)
+                with lock:
+                    return remote_path in makedirs.get(self._uri, [])
+
+            def makedirs(self, remote_path):
+                with lock:
+                    makedirs.setdefault(self._uri, []).append(remote_path)
+
+            def upload(self, load_path, remote_path):
+                time.sleep(0.01)
+                if (self._uri, remote_path) in FakeUriHandler.FAILING:
+                    return False
+                with lock:
+                    dropped = (self._uri, remote_path) in \
+                        FakeUriHandler.DROPPING
+                    FakeUriHandler.DROPPING.discard((self._uri, remote_path))
+                if dropped:
+                    raise TransceiverConnectionError("connection reset")
+                with lock:
+                    uploads.setdefault(self._uri, []).append(remote_path)
+                return True
+
+            def get_md5(self, remote_path):
+                return None
+
+            def close(self):
+                pass
+
+        self._handler_class = FakeUriHandler
+        EntropyTransceiver.add_uri_handler(FakeUriHandler)
+
+    def tearDown(self):
+        EntropyTransceiver.remove_uri_handler(self._handler_class)
+        entropy.server.transceivers.SystemSettings = self._orig_settings
+        shutil.rmtree(self._tmp_dir, True)
+
+    def _uploader(self):
+        db_path = os.path.join(self._tmp_dir, "packages.db")
+
+        class FakeServer(TextInterface):
+
+            def output(self, *args, **kwargs):
+                pass
+
+            def repository(self):
+                return "foo"
+
+            def _get_local_repository_file(self, repository_id):
+                return db_path
+
+        return entropy.server.transceivers.TransceiverServerUploader(
+            FakeServer(), repo = "foo")
+
+    def test_upload(self):
+        files = self._files
+        uploader = self._uploader()
+        uploader.add("fake://one", files[:4], "a/b")
+        uploader.add("fake://one", files[4:], "a/c")
+        uploader.add("fake://two", files, "a/b")
+        uploader.add("fake://down", files, "a/b")
+        # a critical file failing stops the mirror uploads, the non
+        # critical ones do not
+        uploader.add("fake://broken", files[:2], "a/b", critical = False)
+        uploader.add("fake://broken", files[2:], "a/b")
+        self._handler_class.FAILING.add(("fake://broken", "a/b/file1.tbz2"))
+        self._handler_class.FAILING.add(("fake://broken", "a/b/file3.tbz2"))
+
+        errors, fine_uris, broken_uris = uploader.run()
+        self.assertTrue(errors)
+        self.assertEqual(fine_uris, set(["fake://one", "fake://two"]))
+        self.assertEqual(set(x for x, _rc in broken_uris),
+            set(["fake://down", "fake://broken"]))
+        self.assertEqual(uploader._connected["fake://down"], 0)
+
+        # the failing mirrors do not affect the others
+        expected = ["a/b/" + os.path.basename(x) for x in files[:4]] + \
+            ["a/c/" + os.path.basename(x) for x in files[4:]]
+        self.assertEqual(sorted(self._uploads["fake://one"]), expected)
+        self.assertEqual(sorted(self._uploads["fake://two"]),
+            ["a/b/" + os.path.basename(x) for x in files])
+        self.assertFalse("fake://down" in self._uploads)
+        broken = sorted(self._uploads["fake://broken"])
+        self.assertTrue("a/b/file0.tbz2" in broken)
+        self.assertFalse("a/b/file1.tbz2" in broken)
+        self.assertFalse("a/b/file3.tbz2" in broken)
+
+        self.assertEqual(uploader._counters["fake://one"], len(files))
+        self.assertEqual(uploader._maxcounts["fake://one"], len(files))
+        self.assertEqual(uploader._counters["fake://two"], len(files))
+        self.assertTrue(uploader._counters["fake://broken"] <= len(files))
+        self.assertEqual(uploader._maxcounts["fake://broken"], len(files))
+        self.assertEqual(uploader._files_done,
+            2 * len(files) + uploader._counters["fake://broken"])
+
+        # remote directories are created once per mirror
+        self.assertEqual(sorted(self._makedirs["fake://one"]), ["a/b", "a/c"])
+        self.assertEqual(self._makedirs["fake://two"], ["a/b"])
+
+        # 3 connections per mirror, the speed limit is shared among all
+        self.assertEqual(len(self._limits["fake://one"]), 3)
+        self.assertEqual(len(self._limits["fake://two"]), 3)
+        self.assertEqual(len(self._limits["fake://broken"]), 3)
+        connections = 12
+        for limits in self._limits.values():
+            self.assertEqual(set(limits), set([120 // connections]))
+
+    def test_upload_connection_error(self):
+        files = self._files
+        uploader = self._uploader()
+        uploader.add("fake://flaky", files, "a/b")
+        uploader.add("fake://reset", files, "a/b")
+        uploader.add("fake://gone", files, "a/b")
+        # one connection out of three cannot connect
+        self._handler_class.DOWN["fake://flaky"] = 1
+        # one connection drops in the middle of an upload
+        self._handler_class.DROPPING.add(("fake://reset", "a/b/file2.tbz2"))
+        # no connection works
+        self._handler_class.DOWN["fake://gone"] = 3
+
+        errors, fine_uris, broken_uris = uploader.run()
+        self.assertTrue(errors)
+        self.assertEqual(fine_uris, set(["fake://flaky", "fake://reset"]))
+        self.assertEqual([x for x, _rc in broken_uris], ["fake://gone"])
+
+        # the other connections take over the pending uploads
+        expected = ["a/b/" + os.path.basename(x) for x in files]
+        self.assertEqual(sorted(self._uploads["fake://flaky"]), expected)
+        self.assertEqual(sorted(self._uploads["fake://reset"]), expected)
+        self.assertFalse("fake://gone" in self._uploads)
+        self.assertEqual(uploader._connected["fake://flaky"], 2)
+        self.assertEqual(uploader._connected["fake://reset"], 3)
+        self.assertEqual(uploader._counters["fake://flaky"], len(files))
+        self.assertEqual(uploader._counters["fake://reset"], len(files))
+        self.assertEqual(uploader._files_done, 2 * len(files))
+
+
 if __name__ == '__main__':
     unittest.main()
     raise SystemExit(0)
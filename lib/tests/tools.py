@@ -63,6 +63,54 @@ class ToolsTest(unittest.TestCase):
 
         os.remove(tmp_path)
 
+    def test_aggregate_entropy_metadata(self):
+
+        tmp_dir = const_mkdtemp()
+        pkg_path = os.path.join(tmp_dir, "pkg.tbz2")
+        edb_path = os.path.join(tmp_dir, "pkg.edb")
+        out_path = os.path.join(tmp_dir, "out")
+        payload = const_convert_to_rawstring("payload") * 100000
+        metadata = const_convert_to_rawstring("metadata") * 5000
+
+        with open(pkg_path, "wb") as f:
+            f.write(payload)
+        with open(edb_path, "wb") as f:
+            f.write(metadata)
+        et.aggregate_entropy_metadata(pkg_path, edb_path)
+        self.assertTrue(et.is_entropy_package_file(pkg_path))
+
+        with open(pkg_path, "rb") as f:
+            f.seek(-et._EDB_FOOTER.size, os.SEEK_END)
+            edb_offset, magic = et._EDB_FOOTER.unpack(f.read())
+            self.assertEqual(magic, et._EDB_FOOTER_MAGIC)
+            self.assertEqual(et._locate_edb(f), edb_offset)
+            self.assertEqual(f.tell(), edb_offset)
+
+        self.assertTrue(et.dump_entropy_metadata(pkg_path, out_path))
+        with open(out_path, "rb") as f:
+            self.assertEqual(f.read(), metadata)
+        self.assertTrue(et.remove_entropy_metadata(pkg_path, out_path))
+        with open(out_path, "rb") as f:
+            self.assertEqual(f.read(), payload)
+
+        # legacy packages (no trailer), with the tag spanning two
+        # search windows
+        with open(pkg_path, "r+b") as f:
+            f.seek(-et._EDB_FOOTER.size, os.SEEK_END)
+            f.truncate()
+        orig_window = et._EDB_SEARCH_WINDOW
+        try:
+            et._EDB_SEARCH_WINDOW = len(metadata) + 10
+            with open(pkg_path, "rb") as f:
+                self.assertEqual(et._locate_edb(f), edb_offset)
+            self.assertTrue(et.dump_entropy_metadata(pkg_path, out_path))
+            with open(out_path, "rb") as f:
+                self.assertEqual(f.read(), metadata)
+        finally:
+            et._EDB_SEARCH_WINDOW = orig_window
+
+        shutil.rmtree(tmp_dir, True)
+
     def test_tb(self):
         # traceback test
         tb = None
@@ -207,6 +255,16 @@ class ToolsTest(unittest.TestCase):
         self.assertEqual(sha256, r_sha256)
         self.assertEqual(sha512, r_sha512)
 
+        digests = et.file_digests(tmp_path)
+        self.assertEqual(digests, {
+            'md5': et.md5sum(tmp_path),
+            'sha1': r_sha1,
+            'sha256': r_sha256,
+            'sha512': r_sha512,
+        })
+        self.assertEqual(et.file_digests(tmp_path, ("sha256",)),
+            {'sha256': r_sha256})
+
         os.close(fd)
         os.remove(tmp_path)
 
@@ -225,6 +283,29 @@ class ToolsTest(unittest.TestCase):
 
         shutil.rmtree(tmp_dir)
 
+    def test_repository_deltas(self):
+        tmp_dir = const_mkdtemp()
+        deltas_path = os.path.join(tmp_dir, "packages.db.deltas")
+        deltas = [
+            (1, 2, "packages.db.delta.0.bz2",
+             "5eb63bbbe01eeed093cb22bb8f5acdc3"),
+            (2, 4, "packages.db.delta.1.bz2",
+             "d41d8cd98f00b204e9800998ecf8427e"),
+        ]
+        et.write_repository_deltas(deltas_path, deltas)
+        self.assertEqual(et.read_repository_deltas(deltas_path), deltas)
+
+        with open(deltas_path, "a") as deltas_f:
+            deltas_f.write("4 5 ../packages.db "
+                           "d41d8cd98f00b204e9800998ecf8427e\n")
+            deltas_f.write("4 x packages.db.delta.2.bz2 "
+                           "d41d8cd98f00b204e9800998ecf8427e\n")
+            deltas_f.write("4 5 packages.db.delta.2.bz2 foo\n")
+            deltas_f.write("garbage\n")
+        self.assertEqual(et.read_repository_deltas(deltas_path), deltas)
+
+        shutil.rmtree(tmp_dir)
+
     def test_XXcompress_file(self):
 
         import bz2
@@ -462,6 +543,37 @@ class ToolsTest(unittest.TestCase):
         metadata = et.read_elf_dynamic_libraries(elf_obj)
         self.assertEqual(metadata, known_meta)
 
+    def test_read_elf_metadata(self):
+        elf_obj = _misc.get_dl_so_amd_2()
+        known_meta = {
+            'soname': 'libkdb5.so.4',
+            'class': 2,
+            'runpath': '/usr/lib64',
+            'needed': set(['libcom_err.so.2', 'libkrb5.so.3',
+                'libkrb5support.so.0', 'libgssrpc.so.4', 'libk5crypto.so.3',
+                'libc.so.6']),
+        }
+        self.assertEqual(et.read_elf_metadata(elf_obj), known_meta)
+        self.assertEqual(et.read_elf_metadata(_misc.get_random_file()), None)
+
+    def test_read_elf_cache(self):
+        import entropy.elf
+        tmp_dir = const_mkdtemp()
+        elf_obj = os.path.join(tmp_dir, "libdl.so")
+        shutil.copy2(_misc.get_dl_so_amd(), elf_obj)
+
+        meta = entropy.elf.read_elf(elf_obj)
+        self.assertEqual(meta.soname, "libdl.so.2")
+        self.assertTrue(entropy.elf.read_elf(elf_obj) is meta)
+
+        # the cache must notice the file change
+        shutil.copy2(_misc.get_dl_so_amd_2(), elf_obj)
+        new_meta = entropy.elf.read_elf(elf_obj)
+        self.assertFalse(new_meta is meta)
+        self.assertEqual(new_meta.soname, "libkdb5.so.4")
+
+        shutil.rmtree(tmp_dir, True)
+
     def test_read_elf_real_dynamic_libraries(self):
         elf_obj = _misc.get_dl_so_amd_2()
         known_meta = set(
@@ -538,6 +650,68 @@ class ToolsTest(unittest.TestCase):
         metadata = et.read_elf_broken_symbols(elf_obj)
         self.assertEqual(metadata, known_meta)
 
+    def test_read_elf_versioned_symbols(self):
+        import entropy.elf
+        elf_obj = entropy.elf.read_elf(_misc.get_dl_so_amd())
+        defined, required, versions = elf_obj.versioned_symbols()
+        self.assertTrue(("dlopen", "GLIBC_2.2.5") in defined)
+        self.assertTrue(("_dlfcn_hook", "GLIBC_PRIVATE") in defined)
+        self.assertTrue(("free", "GLIBC_2.2.5", "libc.so.6") in required)
+        self.assertTrue(
+            ("_rtld_global", "GLIBC_PRIVATE", "ld-linux-x86-64.so.2")
+            in required)
+        self.assertEqual(versions, frozenset(["libdl.so.2", "GLIBC_2.2.5",
+            "GLIBC_2.3.3", "GLIBC_2.3.4", "GLIBC_PRIVATE"]))
+
+        # objects linked with --hash-style=gnu only have DT_GNU_HASH
+        with open(_misc.get_dl_so_amd(), "rb") as f:
+            parser = entropy.elf._ElfParser(f.read())
+        values = dict(parser._dynamic())
+        gnu_hash = parser._vaddr_to_offset(values[entropy.elf._DT_GNU_HASH])
+        sysv_hash = parser._vaddr_to_offset(values[entropy.elf._DT_HASH])
+        self.assertEqual(parser._gnu_hash_count(gnu_hash),
+            parser._unpack(parser._word, sysv_hash + 4)[0])
+
+    def test_elf_broken_symbols_versions(self):
+
+        class FakeElfObject(object):
+            def __init__(self, soname):
+                self.soname = soname
+
+        def _tree(lib_defined, lib_versions):
+            return [
+                ("/usr/bin/foo", FakeElfObject(None), (
+                    frozenset(),
+                    frozenset([("foo", "LIBT_1.0", "libt.so.1"),
+                               ("bar", "LIBT_2.0", "libt.so.1"),
+                               ("baz", None, None)]),
+                    None)),
+                ("/usr/lib/libt.so.1.2", FakeElfObject("libt.so.1"), (
+                    frozenset(lib_defined), frozenset(), lib_versions)),
+            ]
+
+        # all the versions are defined
+        tree = _tree([("foo", "LIBT_1.0"), ("bar", "LIBT_2.0"),
+                      ("baz", "LIBT_1.0")],
+                     frozenset(["libt.so.1", "LIBT_1.0", "LIBT_2.0"]))
+        self.assertEqual(et._elf_broken_symbols(tree), set())
+
+        # LIBT_2.0 is gone: bar is defined with another version
+        tree = _tree([("foo", "LIBT_1.0"), ("bar", "LIBT_1.0"),
+                      ("baz", "LIBT_1.0")],
+                     frozenset(["libt.so.1", "LIBT_1.0"]))
+        self.assertEqual(et._elf_broken_symbols(tree), set(["bar"]))
+
+        # bar moved to another version, LIBT_2.0 is still there
+        tree = _tree([("foo", "LIBT_1.0"), ("bar", "LIBT_3.0")],
+                     frozenset(["libt.so.1", "LIBT_1.0", "LIBT_2.0",
+                                "LIBT_3.0"]))
+        self.assertEqual(et._elf_broken_symbols(tree), set(["bar", "baz"]))
+
+        # unversioned libraries satisfy any version
+        tree = _tree([("foo", None), ("bar", None), ("baz", None)], None)
+        self.assertEqual(et._elf_broken_symbols(tree), set())
+
     def test_read_elf_linker_paths(self):
         elf_obj = _misc.get_dl_so_amd_2()
         known_meta = ['/usr/lib64']
@@ -2018,79 +2018,80 @@ class RigoDaemonService(dbus.service.Object):
         action_factory = self._entropy.PackageActionFactory()
 
         try:
-            for pkg_match in removal_queue:
+            with action_factory.deferred_triggers():
+                for pkg_match in removal_queue:
 
-                package_id, repository_id = pkg_match
-
-                write_output(
-                    "_process_install_merge_action: "
-                    "%s, count: %s, total: %s" % (
-                        pkg_match, (count + 1),
-                        total),
-                    debug=True)
-
-                # signal progress
-                count += 1
-                progress = int(round(float(count) / total * 100, 0))
-                GLib.idle_add(
-                    self.activity_progress, activity, progress)
-
-                pkg = None
-                try:
-                    pkg = action_factory.get(
-                        action_factory.REMOVE_ACTION,
-                        (package_id, repository_id))
+                    package_id, repository_id = pkg_match
 
-                    msg = "-- %s" % (purple(_("Application Removal")),)
-                    self._entropy.output(msg, count=(count, total),
-                                         importance=1, level="info")
+                    write_output(
+                        "_process_install_merge_action: "
+                        "%s, count: %s, total: %s" % (
+                            pkg_match, (count + 1),
+                            total),
+                        debug=True)
 
+                    # signal progress
+                    count += 1
+                    progress = int(round(float(count) / total * 100, 0))
                     GLib.idle_add(
-                        self.processing_application,
-                        package_id, repository_id, action,
-                        AppTransactionStates.MANAGE)
-                    _signal_merge_process(package_id, repository_id, 50)
+                        self.activity_progress, activity, progress)
 
-                    if simulate:
-                        # simulate time taken
-                        time.sleep(5.0)
-                        rc = 0
-                    else:
-                        rc = pkg.start()
-                    if rc != 0:
-                        self._txs.unset(package_id, repository_id)
-                        _signal_merge_process(
-                            package_id, repository_id, -1)
+                    pkg = None
+                    try:
+                        pkg = action_factory.get(
+                            action_factory.REMOVE_ACTION,
+                            (package_id, repository_id))
+
+                        msg = "-- %s" % (purple(_("Application Removal")),)
+                        self._entropy.output(msg, count=(count, total),
+                                             importance=1, level="info")
 
-                        outcome = AppTransactionOutcome.REMOVE_ERROR
                         GLib.idle_add(
-                            self.application_processed,
+                            self.processing_application,
                             package_id, repository_id, action,
-                            outcome)
+                            AppTransactionStates.MANAGE)
+                        _signal_merge_process(package_id, repository_id, 50)
+
+                        if simulate:
+                            # simulate time taken
+                            time.sleep(5.0)
+                            rc = 0
+                        else:
+                            rc = pkg.start()
+                        if rc != 0:
+                            self._txs.unset(package_id, repository_id)
+                            _signal_merge_process(
+                                package_id, repository_id, -1)
+
+                            outcome = AppTransactionOutcome.REMOVE_ERROR
+                            GLib.idle_add(
+                                self.application_processed,
+                                package_id, repository_id, action,
+                                outcome)
 
-                        write_output(
-                            "_process_remove_merge_action: "
-                            "%s, count: %s, total: %s, error: %s" % (
-                                pkg_match, count,
-                                total, rc))
-                        return outcome
-                finally:
-                    if pkg is not None:
-                        pkg.finalize()
+                            write_output(
+                                "_process_remove_merge_action: "
+                                "%s, count: %s, total: %s, error: %s" % (
+                                    pkg_match, count,
+                                    total, rc))
+                            return outcome
+                    finally:
+                        if pkg is not None:
+                            pkg.finalize()
 
-                write_output(
-                    "_process_remove_merge_action: "
-                    "%s, count: %s, total: %s, done." % (
-                        pkg_match, count, total), debug=True)
+                    write_output(
+                        "_process_remove_merge_action: "
+                        "%s, count: %s, total: %s, done." % (
+                            pkg_match, count, total), debug=True)
 
-                # Remove us from the ongoing transactions
-                self._txs.unset(package_id, repository_id)
+                    # Remove us from the ongoing transactions
+                    self._txs.unset(package_id, repository_id)
 
-                _signal_merge_process(package_id, repository_id, 100)
+                    _signal_merge_process(package_id, repository_id, 100)
 
-                GLib.idle_add(
-                    self.application_processed,
-                    package_id, repository_id, action,
+                    GLib.idle_add(
+                        self.application_processed,
+                        package_id, repository_id, action,
                     AppTransactionOutcome.SUCCESS)
 
             outcome = AppTransactionOutcome.SUCCESS
@@ -2545,83 +2546,84 @@ class RigoDaemonService(dbus.service.Object):
         action_factory = self._entropy.PackageActionFactory()
 
         try:
-            for pkg_match in install_queue:
-
-                package_id, repository_id = pkg_match
+            with action_factory.deferred_triggers():
+                for pkg_match in install_queue:
 
-                write_output(
-                    "_process_install_merge_action: "
-                    "%s, count: %s, total: %s" % (
-                        pkg_match, (count + 1),
-                        total),
-                    debug=True)
-
-                # signal progress
-                count += 1
-                progress = int(round(float(count) / total * 100, 0))
-                GLib.idle_add(
-                    self.activity_progress, activity, progress)
-
-                pkg = None
-                try:
-                    pkg = action_factory.get(
-                        action_factory.INSTALL_ACTION,
-                        pkg_match)
+                    package_id, repository_id = pkg_match
 
-                    msg = "++ %s" % (purple(_("Application Install")),)
-                    self._entropy.output(msg, count=(count, total),
-                                         importance=1, level="info")
+                    write_output(
+                        "_process_install_merge_action: "
+                        "%s, count: %s, total: %s" % (
+                            pkg_match, (count + 1),
+                            total),
+                        debug=True)
 
+                    # signal progress
+                    count += 1
+                    progress = int(round(float(count) / total * 100, 0))
                     GLib.idle_add(
-                        self.processing_application,
-                        package_id, repository_id, action,
-                        AppTransactionStates.MANAGE)
-                    _signal_merge_process(package_id, repository_id, 50)
+                        self.activity_progress, activity, progress)
 
-                    if simulate:
-                        # simulate time taken
-                        time.sleep(5.0)
-                        rc = 0
-                    else:
-                        rc = pkg.start()
-                    if rc != 0:
-                        self._txs.unset(package_id, repository_id)
-                        _signal_merge_process(
-                            package_id, repository_id, -1)
+                    pkg = None
+                    try:
+                        pkg = action_factory.get(
+                            action_factory.INSTALL_ACTION,
+                            pkg_match)
+
+                        msg = "++ %s" % (purple(_("Application Install")),)
+                        self._entropy.output(msg, count=(count, total),
+                                             importance=1, level="info")
 
-                        outcome = AppTransactionOutcome.INSTALL_ERROR
                         GLib.idle_add(
-                            self.application_processed,
+                            self.processing_application,
                             package_id, repository_id, action,
-                            outcome)
+                            AppTransactionStates.MANAGE)
+                        _signal_merge_process(package_id, repository_id, 50)
+
+                        if simulate:
+                            # simulate time taken
+                            time.sleep(5.0)
+                            rc = 0
+                        else:
+                            rc = pkg.start()
+                        if rc != 0:
+                            self._txs.unset(package_id, repository_id)
+                            _signal_merge_process(
+                                package_id, repository_id, -1)
+
+                            outcome = AppTransactionOutcome.INSTALL_ERROR
+                            GLib.idle_add(
+                                self.application_processed,
+                                package_id, repository_id, action,
+                                outcome)
 
-                        write_output(
-                            "_process_install_merge_action: "
-                            "%s, count: %s, total: %s, error: %s" % (
-                                pkg_match, count,
-                                total, rc))
-                        return outcome
-                finally:
-                    if pkg is None:
-                        pkg.finalize()
+                            write_output(
+                                "_process_install_merge_action: "
+                                "%s, count: %s, total: %s, error: %s" % (
+                                    pkg_match, count,
+                                    total, rc))
+                            return outcome
+                    finally:
+                        if pkg is None:
+                            pkg.finalize()
 
-                write_output(
-                    "_process_install_merge_action: "
-                    "%s, count: %s, total: %s, done." % (
-                        pkg_match, count, total), debug=True)
+                    write_output(
+                        "_process_install_merge_action: "
+                        "%s, count: %s, total: %s, done." % (
+                            pkg_match, count, total), debug=True)
 
-                # Remove us from the ongoing transactions
-                self._txs.unset(package_id, repository_id)
+                    # Remove us from the ongoing transactions
+                    self._txs.unset(package_id, repository_id)
 
-                _signal_merge_process(package_id, repository_id, 100)
+                    _signal_merge_process(package_id, repository_id, 100)
 
-                GLib.idle_add(
-                    self.application_processed,
-                    package_id, repository_id, action,
-                    AppTransactionOutcome.SUCCESS)
+                    GLib.idle_add(
+                        self.application_processed,
+                        package_id, repository_id, action,
+                        AppTransactionOutcome.SUCCESS)
 
-                if self._interrupt_activity:
-                    outcome = AppTransactionOutcome.PERMISSION_DENIED
+                    if self._interrupt_activity:
+                        outcome = AppTransactionOutcome.PERMISSION_DENIED
                     return outcome
 
             outcome = AppTransactionOutcome.SUCCESS